@@ -411,9 +411,42 @@ def _check_and_install_playwright():
     
     return playwright_installed
 
+def _playwright_browsers_cached():
+    """只检查文件系统中是否已有Playwright的Chromium（不启动浏览器），用于跳过启动时的完整检查"""
+    candidates = []
+    if os.getenv('PLAYWRIGHT_BROWSERS_PATH'):
+        candidates.append(Path(os.environ['PLAYWRIGHT_BROWSERS_PATH']))
+    if sys.platform == 'darwin':
+        candidates.append(Path.home() / 'Library' / 'Caches' / 'ms-playwright')
+    elif sys.platform != 'win32':
+        candidates.append(Path(os.getenv('XDG_CACHE_HOME', Path.home() / '.cache')) / 'ms-playwright')
+
+    for path in candidates:
+        if path.exists() and any(p.is_dir() and any(p.iterdir()) for p in path.glob('chromium*')):
+            return True
+    return False
+
+
+def _check_playwright_in_background():
+    try:
+        _check_and_install_playwright()
+    except Exception as e:
+        print(f"{_WARN} Playwright浏览器检查失败: {e}")
+        print("   Playwright功能可能不可用")
+
+
 # 检查并安装Playwright浏览器
 try:
-    _check_and_install_playwright()
+    if getattr(sys, 'frozen', False):
+        # 打包的exe需要先提取浏览器并设置PLAYWRIGHT_BROWSERS_PATH，必须在启动前完成
+        _check_and_install_playwright()
+    elif _playwright_browsers_cached():
+        print(f"{_OK} 已找到Playwright浏览器，跳过启动检查")
+    else:
+        # 需要启动浏览器检测或下载安装，放到后台线程，不阻塞启动
+        import threading
+        print(f"{_INFO} 在后台检查Playwright浏览器...")
+        threading.Thread(target=_check_playwright_in_background, daemon=True, name='playwright-check').start()
 except Exception as e:
     print(f"{_WARN} Playwright浏览器检查失败: {e}")
     print("   程序将继续启动，但Playwright功能可能不可用")
@@ -548,6 +581,8 @@ except Exception as e:
 
 # ==================== 现在可以安全地导入其他模块 ====================
 import asyncio
+import atexit
+import signal
 import threading
 import uvicorn
 from urllib.parse import urlparse
@@ -562,14 +597,14 @@ if sys.platform.startswith('linux'):
     except Exception as e:
         logger.debug(f"设置事件循环策略失败: {e}")
 
-from config import AUTO_REPLY, COOKIES_LIST
+from config import AUTO_REPLY, COOKIES_LIST, SHARDING_CONFIG, API_SERVER_CONFIG
 import cookie_manager as cm
 from db_manager import db_manager
 from file_log_collector import setup_file_logging
 
 
-def _start_api_server():
-    """后台线程启动 FastAPI 服务"""
+def _resolve_api_address():
+    """解析 Web 服务监听地址"""
     api_conf = AUTO_REPLY.get('api', {})
 
     # 优先使用环境变量配置
@@ -590,6 +625,13 @@ def _start_api_server():
             host = parsed.hostname
         port = parsed.port or 8080
 
+    return host, port
+
+
+def _start_api_server():
+    """后台线程启动 FastAPI 服务"""
+    host, port = _resolve_api_address()
+
     logger.info(f"启动Web服务器: http://{host}:{port}")
     # 在后台线程中创建独立事件循环并直接运行 server.serve()
     import uvicorn
@@ -612,6 +654,60 @@ def _start_api_server():
 
 
 
+class _ApiProcess:
+    """以独立进程运行 FastAPI 服务（uvicorn），通过 RPC 访问账号运行时，异常退出时自动重启；主程序退出时终止该进程"""
+
+    def __init__(self, rpc_env: dict):
+        self.rpc_env = rpc_env
+        self._process = None
+        self._closing = threading.Event()
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def run(self):
+        import subprocess
+        import time
+
+        host, port = _resolve_api_address()
+        env = dict(os.environ, **self.rpc_env)
+        cmd = [sys.executable, '-m', 'uvicorn', 'reply_server:app',
+               '--host', str(host), '--port', str(port), '--log-level', 'info']
+
+        while not self._closing.is_set():
+            logger.info(f"启动Web服务器进程: http://{host}:{port}")
+            started_at = time.time()
+            with self._lock:
+                if self._closing.is_set():
+                    break
+                self._process = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+            exit_code = self._process.wait()
+            if self._closing.is_set():
+                break
+            logger.error(f"Web服务器进程已退出 (退出码: {exit_code})，稍后重启")
+            # 启动后很快退出（如端口被占用）时延长等待，避免反复拉起
+            self._closing.wait(3 if time.time() - started_at > 60 else 30)
+
+    def shutdown(self, timeout: float = 10):
+        """停止自动重启并终止 Web 服务器进程，超时未退出时强制结束"""
+        import subprocess
+
+        with self._lock:
+            if self._closing.is_set():
+                return
+            self._closing.set()
+            process = self._process
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Web服务器进程未在 {timeout} 秒内退出，强制终止")
+            process.kill()
+            process.wait()
+        logger.info("Web服务器进程已停止")
+
+
 def load_keywords_file(path: str):
     """从文件读取关键字 -> [(keyword, reply)]"""
     kw_list = []
@@ -645,14 +741,32 @@ async def main():
 
     loop = asyncio.get_running_loop()
 
+    # 账号分片：账号分散到多个工作进程运行，本进程只负责转发控制命令和 API 服务
+    shard_supervisor = None
+    shard_workers = int(os.getenv('SHARD_WORKERS', '0') or 0)
+    if not shard_workers and SHARDING_CONFIG.get('enabled'):
+        shard_workers = SHARDING_CONFIG.get('workers', 2)
+    if shard_workers > 0:
+        from utils.account_sharding import ShardSupervisor
+        print(f"启动账号分片，工作进程数: {shard_workers}...")
+        shard_supervisor = ShardSupervisor(
+            workers=shard_workers,
+            vnodes=SHARDING_CONFIG.get('vnodes', 100),
+            health_interval=SHARDING_CONFIG.get('health_interval', 10),
+            restart_on_crash=SHARDING_CONFIG.get('restart_on_crash', True),
+            ack_timeout=SHARDING_CONFIG.get('ack_timeout', 30)
+        )
+        shard_supervisor.start()
+
     # 创建 CookieManager 并在全局暴露
     print("创建 CookieManager...")
-    cm.manager = cm.CookieManager(loop)
+    cm.manager = cm.CookieManager(loop, shard_supervisor=shard_supervisor)
     manager = cm.manager
     print("CookieManager 创建完成")
 
     # 1) 从数据库加载的 Cookie 已经在 CookieManager 初始化时完成
-    # 为每个启用的 Cookie 启动任务
+    # 为每个启用的 Cookie 安排启动（由启动调度器按速率放行，最近活跃的账号优先）
+    startup_accounts = []
     for cid, val in manager.cookies.items():
         # 检查账号是否启用
         if not manager.get_cookie_status(cid):
@@ -666,16 +780,14 @@ async def main():
             cookie_info = db_manager.get_cookie_details(cid)
             user_id = cookie_info.get('user_id') if cookie_info else None
             logger.info(f"Cookie详细信息获取成功: {cid}, user_id: {user_id}")
-
-            logger.info(f"正在创建异步任务: {cid}")
-            task = loop.create_task(manager._run_xianyu(cid, val, user_id))
-            manager.tasks[cid] = task
-            logger.info(f"启动数据库中的 Cookie 任务: {cid} (用户ID: {user_id})")
-            logger.info(f"任务已添加到管理器，当前任务数: {len(manager.tasks)}")
+            startup_accounts.append((cid, val, user_id))
         except Exception as e:
             logger.error(f"启动 Cookie 任务失败: {cid}, {e}")
             import traceback
             logger.error(f"详细错误信息: {traceback.format_exc()}")
+
+    if startup_accounts:
+        manager.start_accounts(startup_accounts)
     
     # 2) 如果配置文件中有新的 Cookie，也加载它们
     for entry in COOKIES_LIST:
@@ -695,10 +807,33 @@ async def main():
         manager.add_cookie('default', env_cookie)
         logger.info("从环境变量加载 default Cookie")
 
-    # 启动 API 服务线程
-    print("启动 API 服务线程...")
-    threading.Thread(target=_start_api_server, daemon=True).start()
-    print("API 服务线程已启动")
+    # 启动 API 服务：默认在本进程的后台线程中运行；process 模式下运行在独立进程，通过 RPC 访问账号运行时
+    api_mode = os.getenv('API_MODE', API_SERVER_CONFIG.get('mode', 'thread'))
+    if api_mode == 'process':
+        from utils.runtime_rpc import RuntimeRPCServer, RPC_AUTHKEY_ENV
+        workers = int(os.getenv('API_WORKERS', API_SERVER_CONFIG.get('workers', 1)))
+        if workers != 1:
+            # 扫码/密码登录会话等状态保存在 Web 服务进程内存中，多个 worker 之间不共享
+            raise ValueError(f"API_SERVER.workers 目前只支持 1（当前为 {workers}）：登录会话等状态保存在进程内存中，"
+                             f"多 worker 会导致请求落到没有对应状态的进程")
+        authkey = bytes.fromhex(os.environ[RPC_AUTHKEY_ENV]) if os.getenv(RPC_AUTHKEY_ENV) else None
+        rpc_server = RuntimeRPCServer(
+            manager,
+            host=API_SERVER_CONFIG.get('rpc_host', '127.0.0.1'),
+            port=int(API_SERVER_CONFIG.get('rpc_port', 0)),
+            authkey=authkey
+        )
+        rpc_server.start()
+        print("启动 API 服务进程...")
+        api_process = _ApiProcess(rpc_server.env())
+        # SIGTERM（如 docker stop）默认直接结束进程、不执行 atexit，转为正常退出以便终止 Web 服务器进程
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        threading.Thread(target=api_process.run, daemon=True).start()
+        print("API 服务进程已启动")
+    else:
+        print("启动 API 服务线程...")
+        threading.Thread(target=_start_api_server, daemon=True).start()
+        print("API 服务线程已启动")
 
     # 阻塞保持运行
     print("主程序启动完成，保持运行...")
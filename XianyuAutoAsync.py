@@ -1,4 +1,5 @@
 import asyncio
+import hashlib
 import json
 import re
 import time
@@ -6,27 +7,62 @@ import base64
 import os
 import random
 from enum import Enum
+from contextlib import asynccontextmanager
 from loguru import logger
 import websockets
 from utils.xianyu_utils import (
     decrypt, generate_mid, generate_uuid, trans_cookies,
     generate_device_id, generate_sign
 )
+from utils.cookie_jar import AccountCookieJar
+from utils.http_pool import get_http_pool
 from config import (
     WEBSOCKET_URL, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT,
     TOKEN_REFRESH_INTERVAL, TOKEN_RETRY_INTERVAL, COOKIES_STR,
     LOG_CONFIG, AUTO_REPLY, DEFAULT_HEADERS, WEBSOCKET_HEADERS,
-    APP_CONFIG, API_ENDPOINTS
+    APP_CONFIG, API_ENDPOINTS, STARTUP_CONFIG, REFRESH_SCHEDULER_CONFIG
 )
 from config import config as cfg  # 导入config实例（不是模块），使用别名避免冲突
 import sys
 import aiohttp
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from db_manager import db_manager
+from utils.notification_dispatcher import get_notification_dispatcher
+from utils.mail_transport import get_mail_transport
 
 # 滑块验证补丁已废弃，使用集成的 Playwright 登录方法
 # 不再需要猴子补丁，所有功能已集成到 XianyuSliderStealth 类中
 
+# 账号会话 Cookie 的作用域（只发送给闲鱼域名，不会带到第三方接口）
+ACCOUNT_COOKIE_DOMAIN = 'goofish.com'
+
+# token刷新请求头，与浏览器完全一致（Cookie由账号会话的cookie_jar携带）
+TOKEN_REQUEST_HEADERS = {
+    'accept': 'application/json',
+    'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'cache-control': 'no-cache',
+    'content-type': 'application/x-www-form-urlencoded',
+    'pragma': 'no-cache',
+    'priority': 'u=1, i',
+    'sec-ch-ua': '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-site',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
+    'referer': 'https://www.goofish.com/',
+    'origin': 'https://www.goofish.com',
+}
+
+# 图片尺寸探测请求头：不接受AVIF格式（PIL默认不支持），让CDN返回WEBP/JPEG等格式
+IMAGE_REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/jpeg,image/png,image/gif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Referer': 'https://www.goofish.com/',
+}
+
 class ConnectionState(Enum):
     """WebSocket连接状态枚举"""
     DISCONNECTED = "disconnected"  # 未连接
@@ -637,6 +673,24 @@ class XianyuLive:
             logger.error(f"【{self.cookie_id}】清理日志文件时出错: {self._safe_str(e)}")
             return 0
 
+    @property
+    def cookies(self) -> AccountCookieJar:
+        """当前账号的Cookie（按字典读取；赋值为字典或字符串时整体替换）"""
+        return self.cookie_jar
+
+    @cookies.setter
+    def cookies(self, value):
+        self.cookie_jar.replace(value)
+
+    @property
+    def cookies_str(self) -> str:
+        """序列化后的Cookie字符串（缓存，Cookie变化时才重新生成）"""
+        return self.cookie_jar.value
+
+    @cookies_str.setter
+    def cookies_str(self, value: str):
+        self.cookie_jar.replace(value)
+
     def __init__(self, cookies_str=None, cookie_id: str = "default", user_id: int = None):
         """初始化闲鱼直播类"""
         logger.info(f"【{cookie_id}】开始初始化XianyuLive...")
@@ -647,11 +701,10 @@ class XianyuLive:
             raise ValueError("未提供cookies，请在global_config.yml中配置COOKIES_STR或通过参数传入")
 
         logger.info(f"【{cookie_id}】解析cookies...")
-        self.cookies = trans_cookies(cookies_str)
+        self.cookie_jar = AccountCookieJar(cookies_str)  # 解析一次，之后增量更新（cookies/cookies_str 均由它提供）
         logger.info(f"【{cookie_id}】cookies解析完成，包含字段: {list(self.cookies.keys())}")
 
         self.cookie_id = cookie_id  # 唯一账号标识
-        self.cookies_str = cookies_str  # 保存原始cookie字符串
         self.user_id = user_id  # 保存用户ID，用于token刷新时保持正确的所有者关系
         self.base_url = WEBSOCKET_URL
 
@@ -714,6 +767,7 @@ class XianyuLive:
         self.item_sync_max_pages = cfg.get('ITEM_SYNC', {}).get('max_pages', 5)
         self.last_item_sync_time = 0
         self.item_sync_lock = asyncio.Lock()  # 使用Lock防止重复执行商品同步
+        self._item_detail_failures = {}  # {item_id: 'captcha'/'timeout'}，浏览器获取详情的失败类型，供自适应并发降速
 
         # 扫码登录Cookie刷新标志
         self.last_qr_cookie_refresh_time = 0  # 记录上次扫码登录Cookie刷新时间
@@ -722,6 +776,11 @@ class XianyuLive:
         # 消息接收标识 - 用于控制Cookie刷新
         self.last_message_received_time = 0  # 记录上次收到消息的时间
         self.message_cookie_refresh_cooldown = 300  # 收到消息后5分钟内不执行Cookie刷新
+        self.last_activity_time = 0  # 最近收到消息的时间（不随token刷新重置，持久化后用于启动排序）
+
+        # 连接缓存：在token刷新间隔内复用上次的token和设备ID，重启时跳过token请求
+        self._token_from_cache = False
+        self._load_connect_cache()
 
         # 浏览器Cookie刷新成功标志
         self.browser_cookie_refreshed = False  # 标记_refresh_cookies_via_browser是否成功更新过数据库
@@ -739,6 +798,20 @@ class XianyuLive:
         self.last_successful_connection = 0  # 上次成功连接时间
         self.last_state_change_time = time.time()  # 上次状态变化时间
 
+        # Token轮换时先建后断：新连接注册完成后交给main循环接管，再关闭旧连接
+        self._handover = None  # 轮换中的新连接（完成时结果为新连接，失败为None）
+        self._rotation_closed_at = 0  # 因Token轮换关闭旧连接的时间，用于统计接收中断时长
+        self._rotation_replay_until = 0  # 在此时间前，新连接上收到的与旧连接重复的同步包计为重放
+        self._recent_sync_keys = OrderedDict()  # 最近收到的同步包（用于识别重放）
+        self.rotation_stats = {
+            'rotations': 0,  # 先建后断轮换次数
+            'fallbacks': 0,  # 轮换失败、回退为断开重连的次数
+            'last_gap_ms': None,  # 最近一次轮换的接收中断时长
+            'max_gap_ms': 0,
+            'total_gap_ms': 0,
+            'replayed_messages': 0  # 轮换后新连接重放的消息数（已跳过处理）
+        }
+
         # 后台任务追踪（用于清理未等待的任务）
         self.background_tasks = set()  # 追踪所有后台任务
         
@@ -784,12 +857,46 @@ class XianyuLive:
         except Exception as e:
             logger.error(f"【{self.cookie_id}】注册实例失败: {self._safe_str(e)}")
 
+    def _load_connect_cache(self):
+        """从连接缓存恢复最近一次有效的token和设备ID（仍在token刷新间隔内时）"""
+        if not STARTUP_CONFIG.get('token_cache', True):
+            return
+        cache = db_manager.get_connect_cache(self.cookie_id)
+        if not cache:
+            return
+
+        self.last_activity_time = cache['last_message_time']
+        token_age = time.time() - cache['token_time']
+        if cache['access_token'] and cache['device_id'] and cache['unb'] == self.myid \
+                and 0 <= token_age < self.token_refresh_interval:
+            self.current_token = cache['access_token']
+            self.device_id = cache['device_id']
+            self.last_token_refresh_time = cache['token_time']
+            self._token_from_cache = True
+            logger.info(f"【{self.cookie_id}】复用缓存的token（{int(token_age)}秒前获取），跳过初始token请求")
+
+    def _save_connect_cache(self):
+        """保存当前token和设备ID到连接缓存"""
+        if not STARTUP_CONFIG.get('token_cache', True) or not self.current_token:
+            return
+        db_manager.save_connect_cache(
+            self.cookie_id, self.myid, self.current_token, self.device_id,
+            self.last_token_refresh_time, self.last_activity_time
+        )
+
     def _unregister_instance(self):
         """从类级别字典中注销当前实例"""
         try:
             if self.cookie_id in XianyuLive._instances:
                 del XianyuLive._instances[self.cookie_id]
                 logger.warning(f"【{self.cookie_id}】实例已从全局字典中注销")
+
+            # 从商品同步调度器中移除（仅当注册的是当前实例）
+            from cookie_manager import manager as cookie_manager
+            if cookie_manager:
+                cookie_manager.item_sync_scheduler.unregister(self.cookie_id, self)
+                cookie_manager.refresh_scheduler.unregister(self.cookie_id, self)
+                cookie_manager.heartbeat_scheduler.unregister(self.cookie_id, self)
         except Exception as e:
             logger.error(f"【{self.cookie_id}】注销实例失败: {self._safe_str(e)}")
 
@@ -1365,8 +1472,6 @@ class XianyuLive:
                     if new_cookies_str != self.cookies_str:
                         logger.info(f"【{self.cookie_id}】检测到数据库中的cookie已更新，重新加载cookie")
                         self.cookies_str = new_cookies_str
-                        # 更新cookies字典
-                        self.cookies = trans_cookies(self.cookies_str)
                         logger.warning(f"【{self.cookie_id}】Cookie已从数据库重新加载")
             except Exception as reload_e:
                 logger.warning(f"【{self.cookie_id}】从数据库重新加载cookie失败，继续使用当前cookie: {self._safe_str(reload_e)}")
@@ -1401,30 +1506,13 @@ class XianyuLive:
 
             # 获取token
             token = None
-            token = trans_cookies(self.cookies_str).get('_m_h5_tk', '').split('_')[0] if trans_cookies(self.cookies_str).get('_m_h5_tk') else ''
+            token = self.cookie_jar.token
 
             sign = generate_sign(params['t'], token, data_val)
             params['sign'] = sign
 
             # 发送请求 - 使用与浏览器完全一致的请求头
-            headers = {
-                'accept': 'application/json',
-                'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'cache-control': 'no-cache',
-                'content-type': 'application/x-www-form-urlencoded',
-                'pragma': 'no-cache',
-                'priority': 'u=1, i',
-                'sec-ch-ua': '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"Windows"',
-                'sec-fetch-dest': 'empty',
-                'sec-fetch-mode': 'cors',
-                'sec-fetch-site': 'same-site',
-                'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
-                'referer': 'https://www.goofish.com/',
-                'origin': 'https://www.goofish.com',
-                'cookie': self.cookies_str
-            }
+            headers = TOKEN_REQUEST_HEADERS
 
             # 打印所有请求参数（用于调试）
             api_url = API_ENDPOINTS.get('token')
@@ -1453,22 +1541,20 @@ class XianyuLive:
             logger.info(f"【{self.cookie_id}】")
             logger.info(f"【{self.cookie_id}】--- 请求头 (headers) ---")
             for key, value in sorted(headers.items()):
-                if key == 'cookie':
-                    # Cookie很长，只显示关键信息
-                    cookie_dict = trans_cookies(self.cookies_str)
-                    logger.info(f"【{self.cookie_id}】  {key}: [Cookie字符串，长度: {len(value)}]")
-                    logger.info(f"【{self.cookie_id}】    Cookie字段数: {len(cookie_dict)}")
-                    logger.info(f"【{self.cookie_id}】    关键字段:")
-                    important_keys = ['unb', '_m_h5_tk', '_m_h5_tk_enc', 'cookie2', 't', 'sgcookie']
-                    for k in important_keys:
-                        if k in cookie_dict:
-                            val = cookie_dict[k]
-                            if len(val) > 50:
-                                logger.info(f"【{self.cookie_id}】      {k}: {val[:30]}...{val[-20:]} (长度: {len(val)})")
-                            else:
-                                logger.info(f"【{self.cookie_id}】      {k}: {val}")
-                else:
-                    logger.info(f"【{self.cookie_id}】  {key}: {value}")
+                logger.info(f"【{self.cookie_id}】  {key}: {value}")
+            # Cookie很长，只显示关键信息
+            cookie_dict = self.cookies
+            logger.info(f"【{self.cookie_id}】  cookie: [Cookie字符串，长度: {len(self.cookies_str)}]")
+            logger.info(f"【{self.cookie_id}】    Cookie字段数: {len(cookie_dict)}")
+            logger.info(f"【{self.cookie_id}】    关键字段:")
+            important_keys = ['unb', '_m_h5_tk', '_m_h5_tk_enc', 'cookie2', 't', 'sgcookie']
+            for k in important_keys:
+                if k in cookie_dict:
+                    val = cookie_dict[k]
+                    if len(val) > 50:
+                        logger.info(f"【{self.cookie_id}】      {k}: {val[:30]}...{val[-20:]} (长度: {len(val)})")
+                    else:
+                        logger.info(f"【{self.cookie_id}】      {k}: {val}")
             logger.info(f"【{self.cookie_id}】")
             logger.info(f"【{self.cookie_id}】--- 其他信息 ---")
             logger.info(f"【{self.cookie_id}】  device_id: {self.device_id}")
@@ -1476,189 +1562,181 @@ class XianyuLive:
             logger.info(f"【{self.cookie_id}】  完整Cookie字符串长度: {len(self.cookies_str)}")
             logger.info(f"【{self.cookie_id}】==========================================")
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    api_url,
-                    params=params,
-                    data=data,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    # 打印响应信息
-                    logger.info(f"【{self.cookie_id}】--- API响应信息 ---")
-                    logger.info(f"【{self.cookie_id}】  状态码: {response.status}")
-                    logger.info(f"【{self.cookie_id}】  响应头: {dict(response.headers)}")
+            if not self.session:
+                await self.create_session()
+            async with self.session.post(
+                api_url,
+                params=params,
+                data=data,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=30)
+            ) as response:
+                # 打印响应信息
+                logger.info(f"【{self.cookie_id}】--- API响应信息 ---")
+                logger.info(f"【{self.cookie_id}】  状态码: {response.status}")
+                logger.info(f"【{self.cookie_id}】  响应头: {dict(response.headers)}")
                     
-                    res_json = await response.json()
-                    logger.info(f"【{self.cookie_id}】  响应内容: {json.dumps(res_json, ensure_ascii=False, indent=2)}")
-                    logger.info(f"【{self.cookie_id}】================================")
-
-                    # 检查并更新Cookie
-                    if 'set-cookie' in response.headers:
-                        new_cookies = {}
-                        for cookie in response.headers.getall('set-cookie', []):
-                            if '=' in cookie:
-                                name, value = cookie.split(';')[0].split('=', 1)
-                                new_cookies[name.strip()] = value.strip()
-
-                        # 更新cookies
-                        if new_cookies:
-                            self.cookies.update(new_cookies)
-                            # 生成新的cookie字符串
-                            self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
-                            # 更新数据库中的Cookie
-                            await self.update_config_cookies()
-                            logger.warning("已更新Cookie到数据库")
-
-                    if isinstance(res_json, dict):
-                        ret_value = res_json.get('ret', [])
-                        # 检查ret是否包含成功信息
-                        if any('SUCCESS::调用成功' in ret for ret in ret_value):
-                            if 'data' in res_json and 'accessToken' in res_json['data']:
-                                new_token = res_json['data']['accessToken']
-                                self.current_token = new_token
-                                self.last_token_refresh_time = time.time()
-
-                                # 【消息接收时间重置】Token刷新成功后重置消息接收标志，与 cookie_refresh_loop 保持一致
-                                self.last_message_received_time = 0
-                                logger.warning(f"【{self.cookie_id}】Token刷新成功，已重置消息接收时间标识")
-
-                                logger.info(f"【{self.cookie_id}】Token刷新成功")
-                                # 标记为成功
-                                self.last_token_refresh_status = "success"
-                                return new_token
-
-                    # 检查是否需要滑块验证
-                    if self._need_captcha_verification(res_json):
-                        logger.warning(f"【{self.cookie_id}】检测到需要滑块验证，开始处理...")
-
-                        # 记录滑块验证检测到日志文件
-                        verification_url = res_json.get('data', {}).get('url', 'Token刷新时检测')
-                        log_captcha_event(self.cookie_id, "检测到滑块验证", None, f"触发场景: Token刷新, URL: {verification_url}")
-
-                        # 添加风控日志记录
-                        log_id = None
-                        try:
-                            from db_manager import db_manager
-                            success = db_manager.add_risk_control_log(
-                                cookie_id=self.cookie_id,
-                                event_type='slider_captcha',
-                                event_description=f"检测到需要滑块验证，触发场景: Token刷新, URL: {verification_url}",
-                                processing_status='processing'
-                            )
-                            if success:
-                                # 获取刚插入的记录ID（简单方式，实际应该返回ID）
-                                logs = db_manager.get_risk_control_logs(cookie_id=self.cookie_id, limit=1)
-                                if logs:
-                                    log_id = logs[0].get('id')
-                                logger.info(f"【{self.cookie_id}】风控日志记录成功，ID: {log_id}")
-                        except Exception as log_e:
-                            logger.error(f"【{self.cookie_id}】记录风控日志失败: {log_e}")
+                res_json = await response.json()
+                logger.info(f"【{self.cookie_id}】  响应内容: {json.dumps(res_json, ensure_ascii=False, indent=2)}")
+                logger.info(f"【{self.cookie_id}】================================")
 
-                        try:
-                            # 尝试通过滑块验证获取新的cookies
-                            captcha_start_time = time.time()
-                            new_cookies_str = await self._handle_captcha_verification(res_json)
-                            captcha_duration = time.time() - captcha_start_time
+                # 检查并更新Cookie
+                if self.cookie_jar.update_from_set_cookie(response.headers):
+                    # 更新数据库中的Cookie
+                    await self.update_config_cookies()
+                    logger.warning("已更新Cookie到数据库")
 
-                            if new_cookies_str:
-                                logger.info(f"【{self.cookie_id}】滑块验证成功，准备重启实例...")
+                if isinstance(res_json, dict):
+                    ret_value = res_json.get('ret', [])
+                    # 检查ret是否包含成功信息
+                    if any('SUCCESS::调用成功' in ret for ret in ret_value):
+                        if 'data' in res_json and 'accessToken' in res_json['data']:
+                            new_token = res_json['data']['accessToken']
+                            self.current_token = new_token
+                            self.last_token_refresh_time = time.time()
+                            self._token_from_cache = False
+                            self._save_connect_cache()
+
+                            # 【消息接收时间重置】Token刷新成功后重置消息接收标志，与 cookie_refresh_loop 保持一致
+                            self.last_message_received_time = 0
+                            logger.warning(f"【{self.cookie_id}】Token刷新成功，已重置消息接收时间标识")
+
+                            logger.info(f"【{self.cookie_id}】Token刷新成功")
+                            # 标记为成功
+                            self.last_token_refresh_status = "success"
+                            return new_token
+
+                # 检查是否需要滑块验证
+                if self._need_captcha_verification(res_json):
+                    logger.warning(f"【{self.cookie_id}】检测到需要滑块验证，开始处理...")
+
+                    # 记录滑块验证检测到日志文件
+                    verification_url = res_json.get('data', {}).get('url', 'Token刷新时检测')
+                    log_captcha_event(self.cookie_id, "检测到滑块验证", None, f"触发场景: Token刷新, URL: {verification_url}")
+
+                    # 添加风控日志记录
+                    log_id = None
+                    try:
+                        from db_manager import db_manager
+                        success = db_manager.add_risk_control_log(
+                            cookie_id=self.cookie_id,
+                            event_type='slider_captcha',
+                            event_description=f"检测到需要滑块验证，触发场景: Token刷新, URL: {verification_url}",
+                            processing_status='processing'
+                        )
+                        if success:
+                            # 获取刚插入的记录ID（简单方式，实际应该返回ID）
+                            logs = db_manager.get_risk_control_logs(cookie_id=self.cookie_id, limit=1)
+                            if logs:
+                                log_id = logs[0].get('id')
+                            logger.info(f"【{self.cookie_id}】风控日志记录成功，ID: {log_id}")
+                    except Exception as log_e:
+                        logger.error(f"【{self.cookie_id}】记录风控日志失败: {log_e}")
 
-                                # 更新风控日志为成功状态
-                                if 'log_id' in locals() and log_id:
-                                    try:
-                                        from db_manager import db_manager
-                                        db_manager.update_risk_control_log(
-                                            log_id=log_id,
-                                            processing_result=f"滑块验证成功，耗时: {captcha_duration:.2f}秒, cookies长度: {len(new_cookies_str)}",
-                                            processing_status='success'
-                                        )
-                                    except Exception as update_e:
-                                        logger.error(f"【{self.cookie_id}】更新风控日志失败: {update_e}")
+                    try:
+                        # 尝试通过滑块验证获取新的cookies
+                        captcha_start_time = time.time()
+                        new_cookies_str = await self._handle_captcha_verification(res_json)
+                        captcha_duration = time.time() - captcha_start_time
 
-                                # 重启实例（cookies已在_handle_captcha_verification中更新到数据库）
-                                # await self._restart_instance()
-                                
-                                # 重新尝试刷新token（递归调用，但有深度限制）
-                                return await self.refresh_token(captcha_retry_count + 1)
-                            else:
-                                logger.error(f"【{self.cookie_id}】滑块验证失败")
+                        if new_cookies_str:
+                            logger.info(f"【{self.cookie_id}】滑块验证成功，准备重启实例...")
 
-                                # 更新风控日志为失败状态
-                                if 'log_id' in locals() and log_id:
-                                    try:
-                                        from db_manager import db_manager
-                                        db_manager.update_risk_control_log(
-                                            log_id=log_id,
-                                            processing_result=f"滑块验证失败，耗时: {captcha_duration:.2f}秒, 原因: 未获取到新cookies",
-                                            processing_status='failed'
-                                        )
-                                    except Exception as update_e:
-                                        logger.error(f"【{self.cookie_id}】更新风控日志失败: {update_e}")
+                            # 更新风控日志为成功状态
+                            if 'log_id' in locals() and log_id:
+                                try:
+                                    from db_manager import db_manager
+                                    db_manager.update_risk_control_log(
+                                        log_id=log_id,
+                                        processing_result=f"滑块验证成功，耗时: {captcha_duration:.2f}秒, cookies长度: {len(new_cookies_str)}",
+                                        processing_status='success'
+                                    )
+                                except Exception as update_e:
+                                    logger.error(f"【{self.cookie_id}】更新风控日志失败: {update_e}")
+
+                            # 重启实例（cookies已在_handle_captcha_verification中更新到数据库）
+                            # await self._restart_instance()
                                 
-                                # 标记已发送通知（通知已在_handle_captcha_verification中发送）
-                                notification_sent = True
-                        except Exception as captcha_e:
-                            logger.error(f"【{self.cookie_id}】滑块验证处理异常: {self._safe_str(captcha_e)}")
+                            # 重新尝试刷新token（递归调用，但有深度限制）
+                            return await self.refresh_token(captcha_retry_count + 1)
+                        else:
+                            logger.error(f"【{self.cookie_id}】滑块验证失败")
 
-                            # 更新风控日志为异常状态
-                            captcha_duration = time.time() - captcha_start_time if 'captcha_start_time' in locals() else 0
+                            # 更新风控日志为失败状态
                             if 'log_id' in locals() and log_id:
                                 try:
                                     from db_manager import db_manager
                                     db_manager.update_risk_control_log(
                                         log_id=log_id,
-                                        processing_result=f"滑块验证处理异常，耗时: {captcha_duration:.2f}秒",
-                                        processing_status='failed',
-                                        error_message=str(captcha_e)
+                                        processing_result=f"滑块验证失败，耗时: {captcha_duration:.2f}秒, 原因: 未获取到新cookies",
+                                        processing_status='failed'
                                     )
                                 except Exception as update_e:
                                     logger.error(f"【{self.cookie_id}】更新风控日志失败: {update_e}")
-                            
+                                
                             # 标记已发送通知（通知已在_handle_captcha_verification中发送）
                             notification_sent = True
+                    except Exception as captcha_e:
+                        logger.error(f"【{self.cookie_id}】滑块验证处理异常: {self._safe_str(captcha_e)}")
 
-                    # 检查是否包含"令牌过期"或"Session过期"
-                    if isinstance(res_json, dict):
-                        res_json_str = json.dumps(res_json, ensure_ascii=False, separators=(',', ':'))
-                        if '令牌过期' in res_json_str or 'Session过期' in res_json_str:
-                            # 调用统一的密码登录刷新方法
-                            refresh_success = await self._try_password_login_refresh("令牌/Session过期")
+                        # 更新风控日志为异常状态
+                        captcha_duration = time.time() - captcha_start_time if 'captcha_start_time' in locals() else 0
+                        if 'log_id' in locals() and log_id:
+                            try:
+                                from db_manager import db_manager
+                                db_manager.update_risk_control_log(
+                                    log_id=log_id,
+                                    processing_result=f"滑块验证处理异常，耗时: {captcha_duration:.2f}秒",
+                                    processing_status='failed',
+                                    error_message=str(captcha_e)
+                                )
+                            except Exception as update_e:
+                                logger.error(f"【{self.cookie_id}】更新风控日志失败: {update_e}")
                             
-                            if not refresh_success:
-                                # 标记已发送通知，避免重复通知
-                                notification_sent = True
-                                # 返回None，让调用者知道刷新失败
-                                return None
-                            else:
-                                # 刷新成功后，重新尝试获取token
-                                return await self.refresh_token(captcha_retry_count)
+                        # 标记已发送通知（通知已在_handle_captcha_verification中发送）
+                        notification_sent = True
+
+                # 检查是否包含"令牌过期"或"Session过期"
+                if isinstance(res_json, dict):
+                    res_json_str = json.dumps(res_json, ensure_ascii=False, separators=(',', ':'))
+                    if '令牌过期' in res_json_str or 'Session过期' in res_json_str:
+                        # 调用统一的密码登录刷新方法
+                        refresh_success = await self._try_password_login_refresh("令牌/Session过期")
+                            
+                        if not refresh_success:
+                            # 标记已发送通知，避免重复通知
+                            notification_sent = True
+                            # 返回None，让调用者知道刷新失败
+                            return None
+                        else:
+                            # 刷新成功后，重新尝试获取token
+                            return await self.refresh_token(captcha_retry_count)
                                 
-                                # 刷新失败时继续执行原有的失败处理逻辑
+                            # 刷新失败时继续执行原有的失败处理逻辑
 
-                    logger.error(f"【{self.cookie_id}】Token刷新失败: {res_json}")
+                logger.error(f"【{self.cookie_id}】Token刷新失败: {res_json}")
 
-                    # 清空当前token，确保下次重试时重新获取
-                    self.current_token = None
+                # 清空当前token，确保下次重试时重新获取
+                self.current_token = None
 
-                    # 只有在没有发送过通知的情况下才发送Token刷新失败通知
-                    # 并且WebSocket未连接时才发送（已连接说明只是暂时失败）
-                    if not notification_sent:
-                        # 检查WebSocket连接状态
-                        is_ws_connected = (
-                            self.connection_state == ConnectionState.CONNECTED and 
-                            self.ws and 
-                            not self.ws.closed
-                        )
+                # 只有在没有发送过通知的情况下才发送Token刷新失败通知
+                # 并且WebSocket未连接时才发送（已连接说明只是暂时失败）
+                if not notification_sent:
+                    # 检查WebSocket连接状态
+                    is_ws_connected = (
+                        self.connection_state == ConnectionState.CONNECTED and 
+                        self.ws and 
+                        not self.ws.closed
+                    )
                         
-                        if is_ws_connected:
-                            logger.info(f"【{self.cookie_id}】WebSocket连接正常，Token刷新失败可能是暂时的，跳过失败通知")
-                        else:
-                            logger.warning(f"【{self.cookie_id}】WebSocket未连接，发送Token刷新失败通知")
-                            await self.send_token_refresh_notification(f"Token刷新失败: {res_json}", "token_refresh_failed")
+                    if is_ws_connected:
+                        logger.info(f"【{self.cookie_id}】WebSocket连接正常，Token刷新失败可能是暂时的，跳过失败通知")
                     else:
-                        logger.info(f"【{self.cookie_id}】已发送滑块验证相关通知，跳过Token刷新失败通知")
-                    return None
+                        logger.warning(f"【{self.cookie_id}】WebSocket未连接，发送Token刷新失败通知")
+                        await self.send_token_refresh_notification(f"Token刷新失败: {res_json}", "token_refresh_failed")
+                else:
+                    logger.info(f"【{self.cookie_id}】已发送滑块验证相关通知，跳过Token刷新失败通知")
+                return None
 
         except Exception as e:
             logger.error(f"Token刷新异常: {self._safe_str(e)}")
@@ -1821,12 +1899,10 @@ class XianyuLive:
                     # 自动更新数据库中的cookie
                     try:
                         # 备份原有cookies
-                        old_cookies_str = self.cookies_str
                         old_cookies_dict = self.cookies.copy()
 
-                        # 更新当前实例的cookies（使用合并后的cookies）
-                        self.cookies_str = cookies_str
-                        self.cookies = updated_cookies
+                        # 更新当前实例的cookies（只合并x5相关字段）
+                        self.cookie_jar.merge(x5sec_cookies)
 
                         # 更新数据库中的cookies
                         await self.update_config_cookies()
@@ -1848,7 +1924,6 @@ class XianyuLive:
                         logger.error(f"【{self.cookie_id}】自动更新数据库cookies失败: {self._safe_str(update_e)}")
 
                         # 回滚cookies
-                        self.cookies_str = old_cookies_str
                         self.cookies = old_cookies_dict
 
                         # 记录更新失败到日志文件，包含获取到的x5 cookies
@@ -1958,7 +2033,7 @@ class XianyuLive:
             # 合并cookies：保留原有cookies，只更新新获取到的字段
             try:
                 # 获取当前的cookies字典
-                current_cookies_dict = trans_cookies(self.cookies_str)
+                current_cookies_dict = self.cookies
                 logger.info(f"【{self.cookie_id}】当前cookies包含 {len(current_cookies_dict)} 个字段")
 
                 # 合并cookies：新cookies覆盖旧cookies中的相同字段
@@ -2014,12 +2089,10 @@ class XianyuLive:
                 # 如果合并失败，继续使用原始的new_cookies_str
 
             # 备份原有cookies，以防更新失败需要回滚
-            old_cookies_str = self.cookies_str
             old_cookies_dict = self.cookies.copy()
 
             try:
                 # 更新当前实例的cookies
-                self.cookies_str = new_cookies_str
                 self.cookies = new_cookies_dict
 
                 # 更新数据库中的cookies
@@ -2040,7 +2113,6 @@ class XianyuLive:
 
                 # 回滚cookies
                 try:
-                    self.cookies_str = old_cookies_str
                     self.cookies = old_cookies_dict
                     await self.update_config_cookies()
                     logger.info(f"【{self.cookie_id}】cookies已回滚到原始状态")
@@ -2133,7 +2205,6 @@ class XianyuLive:
             if db_cookie_value and db_cookie_value != self.cookies_str:
                 logger.info(f"【{self.cookie_id}】检测到数据库中的cookie已更新，重新加载cookie")
                 self.cookies_str = db_cookie_value
-                self.cookies = trans_cookies(self.cookies_str)
                 logger.info(f"【{self.cookie_id}】Cookie已从数据库重新加载，跳过密码登录刷新")
                 return True
             
@@ -2357,8 +2428,7 @@ class XianyuLive:
                 logger.info(f"【{self.cookie_id}】已创建测试图片: {test_image_path}")
                 
                 # 创建图片上传实例
-                from utils.image_uploader import ImageUploader
-                uploader = ImageUploader(cookies_str=self.cookies_str)
+                uploader = await self._create_image_uploader()
                 
                 # 创建session
                 await uploader.create_session()
@@ -2644,136 +2714,95 @@ class XianyuLive:
             raise
 
     async def _fetch_item_detail_from_browser(self, item_id: str) -> str:
-        """使用浏览器获取商品详情"""
-        playwright = None
-        browser = None
+        """使用浏览器获取商品详情（复用浏览器池中该账号的上下文）"""
         try:
-            from playwright.async_api import async_playwright
+            from utils.browser_pool import get_browser_pool
 
             logger.info(f"开始使用浏览器获取商品详情: {item_id}")
 
-            playwright = await async_playwright().start()
-
-            # 启动浏览器（参照order_detail_fetcher的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
+            async with get_browser_pool().lease(self.cookie_id, self.cookies_str, block_preset='data_only') as page:
+                # 构造商品详情页面URL
+                item_url = f"https://www.goofish.com/item?id={item_id}"
+                logger.info(f"访问商品页面: {item_url}")
 
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
+                # 访问页面
+                await page.goto(item_url, wait_until='networkidle', timeout=30000)
 
-            # 创建浏览器上下文
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            )
+                # 等待页面完全加载
+                await asyncio.sleep(3)
 
-            # 设置Cookie
-            cookies = []
-            for cookie_pair in self.cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
-            logger.warning(f"已设置 {len(cookies)} 个Cookie")
-
-            # 创建页面
-            page = await context.new_page()
-
-            # 构造商品详情页面URL
-            item_url = f"https://www.goofish.com/item?id={item_id}"
-            logger.info(f"访问商品页面: {item_url}")
-
-            # 访问页面
-            await page.goto(item_url, wait_until='networkidle', timeout=30000)
+                if any(keyword in page.url for keyword in ('punish', 'captcha', 'baxia')):
+                    self._item_detail_failures[item_id] = 'captcha'
+                    logger.warning(f"获取商品详情触发滑块验证: {item_id}")
+                    return ""
 
-            # 等待页面完全加载
-            await asyncio.sleep(3)
-
-            # 获取商品详情内容
-            detail_text = ""
-            try:
-                # 等待目标元素出现
-                await page.wait_for_selector('.desc--GaIUKUQY', timeout=10000)
-
-                # 获取商品详情文本
-                detail_element = await page.query_selector('.desc--GaIUKUQY')
-                if detail_element:
-                    detail_text = await detail_element.inner_text()
-                    logger.info(f"成功获取商品详情: {item_id}, 长度: {len(detail_text)}")
-                    return detail_text.strip()
-                else:
-                    logger.warning(f"未找到商品详情元素: {item_id}")
+                # 获取商品详情内容
+                try:
+                    # 等待目标元素出现
+                    await page.wait_for_selector('.desc--GaIUKUQY', timeout=10000)
+
+                    # 获取商品详情文本
+                    detail_element = await page.query_selector('.desc--GaIUKUQY')
+                    if detail_element:
+                        detail_text = await detail_element.inner_text()
+                        logger.info(f"成功获取商品详情: {item_id}, 长度: {len(detail_text)}")
+                        return detail_text.strip()
+                    else:
+                        logger.warning(f"未找到商品详情元素: {item_id}")
 
-            except Exception as e:
-                logger.warning(f"获取商品详情元素失败: {item_id}, 错误: {self._safe_str(e)}")
+                except Exception as e:
+                    logger.warning(f"获取商品详情元素失败: {item_id}, 错误: {self._safe_str(e)}")
 
             return ""
 
         except Exception as e:
+            if 'Timeout' in type(e).__name__:
+                self._item_detail_failures[item_id] = 'timeout'
             logger.error(f"浏览器获取商品详情异常: {item_id}, 错误: {self._safe_str(e)}")
             return ""
-        finally:
-            # 确保资源被正确清理
-            try:
-                if browser:
-                    await browser.close()
-                    logger.warning(f"Browser已关闭: {item_id}")
-            except Exception as e:
-                logger.warning(f"关闭browser时出错: {self._safe_str(e)}")
-            
-            try:
-                if playwright:
-                    await playwright.stop()
-                    logger.warning(f"Playwright已停止: {item_id}")
-            except Exception as e:
-                logger.warning(f"停止playwright时出错: {self._safe_str(e)}")
 
 
+    def _build_item_record(self, item):
+        """把商品列表接口返回的商品转换为 item_info 记录"""
+        item_detail = {
+            'title': item.get('title', ''),
+            'price': item.get('price', ''),
+            'price_text': item.get('price_text', ''),
+            'category_id': item.get('category_id', ''),
+            'auction_type': item.get('auction_type', ''),
+            'item_status': item.get('item_status', 0),
+            'detail_url': item.get('detail_url', ''),
+            'pic_info': item.get('pic_info', {}),
+            'detail_params': item.get('detail_params', {}),
+            'track_params': item.get('track_params', {}),
+            'item_label_data': item.get('item_label_data', {}),
+            'card_type': item.get('card_type', 0)
+        }
+        return {
+            'cookie_id': self.cookie_id,
+            'item_id': item.get('id'),
+            'item_title': item.get('title', ''),
+            'item_description': '',  # 暂时为空
+            'item_category': str(item.get('category_id', '')),
+            'item_price': item.get('price_text', ''),
+            'item_detail': json.dumps(item_detail, ensure_ascii=False)
+        }
+
+    @staticmethod
+    def _item_content_hash(item):
+        """商品内容哈希，只包含会在页面上体现的字段（埋点参数等每次请求都会变化的字段不参与计算）"""
+        content = {
+            'title': item.get('title', ''),
+            'price_text': item.get('price_text', ''),
+            'category_id': item.get('category_id', ''),
+            'auction_type': item.get('auction_type', ''),
+            'item_status': item.get('item_status', 0),
+            'detail_url': item.get('detail_url', ''),
+            'pic_url': (item.get('pic_info') or {}).get('picUrl', ''),
+            'card_type': item.get('card_type', 0)
+        }
+        return hashlib.md5(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
     async def save_items_list_to_db(self, items_list):
         """批量保存商品列表信息到数据库（并发安全）
 
@@ -2792,35 +2821,11 @@ class XianyuLive:
                 if not item_id or item_id.startswith('auto_'):
                     continue
 
-                # 构造商品详情数据
-                item_detail = {
-                    'title': item.get('title', ''),
-                    'price': item.get('price', ''),
-                    'price_text': item.get('price_text', ''),
-                    'category_id': item.get('category_id', ''),
-                    'auction_type': item.get('auction_type', ''),
-                    'item_status': item.get('item_status', 0),
-                    'detail_url': item.get('detail_url', ''),
-                    'pic_info': item.get('pic_info', {}),
-                    'detail_params': item.get('detail_params', {}),
-                    'track_params': item.get('track_params', {}),
-                    'item_label_data': item.get('item_label_data', {}),
-                    'card_type': item.get('card_type', 0)
-                }
-
                 # 检查数据库中是否已有详情
                 existing_item = db_manager.get_item_info(self.cookie_id, item_id)
                 has_detail = existing_item and existing_item.get('item_detail') and existing_item['item_detail'].strip()
 
-                batch_data.append({
-                    'cookie_id': self.cookie_id,
-                    'item_id': item_id,
-                    'item_title': item.get('title', ''),
-                    'item_description': '',  # 暂时为空
-                    'item_category': str(item.get('category_id', '')),
-                    'item_price': item.get('price_text', ''),
-                    'item_detail': json.dumps(item_detail, ensure_ascii=False)
-                })
+                batch_data.append(self._build_item_record(item))
 
                 # 如果没有详情，添加到需要获取详情的列表
                 if not has_detail:
@@ -2875,17 +2880,22 @@ class XianyuLive:
             max_concurrent = auto_fetch_config.get('max_concurrent', 3)
             retry_delay = auto_fetch_config.get('retry_delay', 0.5)
 
-            # 限制并发数量，避免对API服务器造成压力
-            semaphore = asyncio.Semaphore(max_concurrent)
+            # 自适应限制并发数量（max_concurrent为上限），遇到滑块或超时自动降速，避免触发风控
+            from utils.adaptive_concurrency import get_account_limiter
+            limiter = get_account_limiter(self.cookie_id, 'item_detail', max_limit=max_concurrent)
 
             async def fetch_single_item_detail(item_info):
-                async with semaphore:
+                async with limiter.slot() as slot:
                     try:
                         item_id = item_info['item_id']
                         item_title = item_info['item_title']
 
                         # 获取商品详情
+                        self._item_detail_failures.pop(item_id, None)
                         item_detail_text = await self.fetch_item_detail_from_api(item_id)
+                        failure = self._item_detail_failures.pop(item_id, None)
+                        if failure:
+                            slot.fail(failure)
 
                         if item_detail_text:
                             # 保存详情到数据库
@@ -2897,12 +2907,15 @@ class XianyuLive:
                                 logger.warning(f"❌ 获取详情成功但保存失败: {item_id}")
                         else:
                             logger.warning(f"❌ 未能获取商品详情: {item_id} - {item_title}")
+                            if not failure:
+                                slot.fail('error')
 
                         # 添加延迟，避免请求过于频繁
                         await asyncio.sleep(retry_delay)
                         return 0
 
                     except Exception as e:
+                        slot.fail('error')
                         logger.error(f"获取单个商品详情异常: {item_info.get('item_id', 'unknown')}, 错误: {self._safe_str(e)}")
                         return 0
 
@@ -2917,6 +2930,9 @@ class XianyuLive:
                 elif isinstance(result, Exception):
                     logger.error(f"获取商品详情任务异常: {result}")
 
+            stats = limiter.get_stats()
+            logger.info(f"商品详情获取完成: 成功 {success_count}/{len(items_need_detail)}，"
+                        f"自适应并发 {stats['limit']}，吞吐 {stats['throughput_per_min']} 个/分钟")
             return success_count
 
         except Exception as e:
@@ -2954,7 +2970,7 @@ class XianyuLive:
         }
 
         # 始终从最新的cookies中获取_m_h5_tk token（刷新后cookies会被更新）
-        token = trans_cookies(self.cookies_str).get('_m_h5_tk', '').split('_')[0] if trans_cookies(self.cookies_str).get('_m_h5_tk') else ''
+        token = self.cookie_jar.token
 
         if token:
             logger.warning(f"使用cookies中的_m_h5_tk token: {token}")
@@ -2974,21 +2990,10 @@ class XianyuLive:
                 res_json = await response.json()
 
                 # 检查并更新Cookie
-                if 'set-cookie' in response.headers:
-                    new_cookies = {}
-                    for cookie in response.headers.getall('set-cookie', []):
-                        if '=' in cookie:
-                            name, value = cookie.split(';')[0].split('=', 1)
-                            new_cookies[name.strip()] = value.strip()
-
-                    # 更新cookies
-                    if new_cookies:
-                        self.cookies.update(new_cookies)
-                        # 生成新的cookie字符串
-                        self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
-                        # 更新数据库中的Cookie
-                        await self.update_config_cookies()
-                        logger.warning("已更新Cookie到数据库")
+                if self.cookie_jar.update_from_set_cookie(response.headers):
+                    # 更新数据库中的Cookie
+                    await self.update_config_cookies()
+                    logger.warning("已更新Cookie到数据库")
 
                 logger.warning(f"商品信息获取成功: {res_json}")
                 # 检查返回状态
@@ -3313,8 +3318,7 @@ class XianyuLive:
                     logger.info(f"准备上传本地图片到闲鱼CDN: {local_image_path}")
 
                     # 使用图片上传器上传到闲鱼CDN
-                    from utils.image_uploader import ImageUploader
-                    uploader = ImageUploader(self.cookies_str)
+                    uploader = await self._create_image_uploader()
 
                     async with uploader:
                         cdn_url = await uploader.upload_image(local_image_path)
@@ -3379,31 +3383,24 @@ class XianyuLive:
         Returns:
             (width, height) 元组，失败返回 (None, None)
         """
-        import aiohttp
         from io import BytesIO
         
         try:
             logger.info(f"【{self.cookie_id}】开始从URL获取图片尺寸: {image_url[:80]}...")
-            
-            # 不接受AVIF格式（PIL默认不支持），让CDN返回WEBP/JPEG等格式
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'image/jpeg,image/png,image/gif,image/webp,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://www.goofish.com/',
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status == 200:
-                        image_data = await response.read()
-                        from PIL import Image
-                        with Image.open(BytesIO(image_data)) as img:
-                            width, height = img.size
-                            logger.info(f"【{self.cookie_id}】解析图片尺寸成功: {width}x{height}")
-                            return (width, height)
-                    else:
-                        logger.warning(f"【{self.cookie_id}】下载图片失败，HTTP状态码: {response.status}")
+
+            if not self.session:
+                await self.create_session()
+
+            async with self.session.get(image_url, headers=IMAGE_REQUEST_HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status == 200:
+                    image_data = await response.read()
+                    from PIL import Image
+                    with Image.open(BytesIO(image_data)) as img:
+                        width, height = img.size
+                        logger.info(f"【{self.cookie_id}】解析图片尺寸成功: {width}x{height}")
+                        return (width, height)
+                else:
+                    logger.warning(f"【{self.cookie_id}】下载图片失败，HTTP状态码: {response.status}")
         except Exception as e:
             logger.warning(f"【{self.cookie_id}】从URL获取图片尺寸失败: {e}")
         
@@ -3475,9 +3472,9 @@ class XianyuLive:
                     'desc': item_info_raw.get('item_detail', '暂无商品描述')
                 }
 
-            # 生成AI回复
+            # 生成AI回复（异步执行，不阻塞事件循环）
             # 由于外部已实现防抖机制，跳过内部等待（skip_wait=True）
-            reply = ai_reply_engine.generate_reply(
+            reply = await ai_reply_engine.generate_reply_async(
                 message=send_message,
                 item_info=item_info,
                 chat_id=chat_id,
@@ -3513,7 +3510,6 @@ class XianyuLive:
         """发送消息通知"""
         try:
             from db_manager import db_manager
-            import aiohttp
             import hashlib
 
             # 过滤系统默认消息，不发送通知
@@ -3553,16 +3549,7 @@ class XianyuLive:
                 for key in expired_keys:
                     del self.last_notification_time[key]
 
-            logger.info(f"📱 开始发送消息通知 - 账号: {self.cookie_id}, 买家: {send_user_name}")
-
-            # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
-
-            if not notifications:
-                logger.warning(f"📱 账号 {self.cookie_id} 未配置消息通知，跳过通知发送")
-                return
-
-            logger.info(f"📱 找到 {len(notifications)} 个通知渠道配置")
+            logger.info(f"📱 消息通知加入发件箱 - 账号: {self.cookie_id}, 买家: {send_user_name}")
 
             # 构建通知消息
             notification_msg = f"🚨 接收消息通知\n\n" \
@@ -3573,59 +3560,40 @@ class XianyuLive:
                              f"消息内容: {send_message}\n" \
                              f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
 
-            # 发送通知到各个渠道
-            for i, notification in enumerate(notifications, 1):
-                logger.info(f"📱 处理第 {i} 个通知渠道: {notification.get('channel_name', 'Unknown')}")
-
-                if not notification.get('enabled', True):
-                    logger.warning(f"📱 通知渠道 {notification.get('channel_name')} 已禁用，跳过")
-                    continue
-
-                channel_type = notification.get('channel_type')
-                channel_config = notification.get('channel_config')
-
-                logger.info(f"📱 渠道类型: {channel_type}, 配置: {channel_config}")
-
-                try:
-                    # 解析配置数据
-                    config_data = self._parse_notification_config(channel_config)
-                    logger.info(f"📱 解析后的配置数据: {config_data}")
-
-                    match channel_type:
-                        case 'ding_talk' | 'dingtalk':
-                            logger.info(f"📱 开始发送钉钉通知...")
-                            await self._send_dingtalk_notification(config_data, notification_msg)
-                        case 'feishu' | 'lark':
-                            logger.info(f"📱 开始发送飞书通知...")
-                            await self._send_feishu_notification(config_data, notification_msg)
-                        case 'bark':
-                            logger.info(f"📱 开始发送Bark通知...")
-                            await self._send_bark_notification(config_data, notification_msg)
-                        case 'email':
-                            logger.info(f"📱 开始发送邮件通知...")
-                            await self._send_email_notification(config_data, notification_msg)
-                        case 'webhook':
-                            logger.info(f"📱 开始发送Webhook通知...")
-                            await self._send_webhook_notification(config_data, notification_msg)
-                        case 'wechat':
-                            logger.info(f"📱 开始发送微信通知...")
-                            await self._send_wechat_notification(config_data, notification_msg)
-                        case 'telegram':
-                            logger.info(f"📱 开始发送Telegram通知...")
-                            await self._send_telegram_notification(config_data, notification_msg)
-                        case _:
-                            logger.warning(f"📱 不支持的通知渠道类型: {channel_type}")
-
-                except Exception as notify_error:
-                    logger.error(f"📱 发送通知失败 ({notification.get('channel_name', 'Unknown')}): {self._safe_str(notify_error)}")
-                    import traceback
-                    logger.error(f"📱 详细错误信息: {traceback.format_exc()}")
+            # 入队后立即返回：渠道加载、合并发送和失败重试都由后台发件箱完成，不阻塞消息处理
+            get_notification_dispatcher().submit(
+                self.cookie_id, notification_msg, self._deliver_notification, db_manager.get_account_notifications
+            )
 
         except Exception as e:
             logger.error(f"📱 处理消息通知失败: {self._safe_str(e)}")
             import traceback
             logger.error(f"📱 详细错误信息: {traceback.format_exc()}")
 
+    async def _deliver_notification(self, notification: dict, message: str, attachment_path: str = None):
+        """按渠道类型发送一条通知，返回True成功/False可重试失败/None不支持或配置无效"""
+        channel_type = notification.get('channel_type')
+        config_data = self._parse_notification_config(notification.get('channel_config'))
+
+        match channel_type:
+            case 'ding_talk' | 'dingtalk':
+                return await self._send_dingtalk_notification(config_data, message)
+            case 'feishu' | 'lark':
+                return await self._send_feishu_notification(config_data, message)
+            case 'bark':
+                return await self._send_bark_notification(config_data, message)
+            case 'email':
+                return await self._send_email_notification(config_data, message, attachment_path)
+            case 'webhook':
+                return await self._send_webhook_notification(config_data, message)
+            case 'wechat':
+                return await self._send_wechat_notification(config_data, message)
+            case 'telegram':
+                return await self._send_telegram_notification(config_data, message)
+            case _:
+                logger.warning(f"📱 不支持的通知渠道类型: {channel_type}")
+                return None
+
     def _parse_notification_config(self, config: str) -> dict:
         """解析通知配置数据"""
         try:
@@ -3639,7 +3607,6 @@ class XianyuLive:
     async def _send_dingtalk_notification(self, config_data: dict, message: str):
         """发送钉钉通知"""
         try:
-            import aiohttp
             import json
             import hmac
             import hashlib
@@ -3673,20 +3640,21 @@ class XianyuLive:
                 }
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(webhook_url, json=data, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info(f"钉钉通知发送成功")
-                    else:
-                        logger.warning(f"钉钉通知发送失败: {response.status}")
+            status, _ = await get_notification_dispatcher().post('dingtalk', webhook_url, json=data)
+            if status == 200:
+                logger.info(f"钉钉通知发送成功")
+                return True
+            else:
+                logger.warning(f"钉钉通知发送失败: {status}")
+                return False
 
         except Exception as e:
             logger.error(f"发送钉钉通知异常: {self._safe_str(e)}")
+            return False
 
     async def _send_feishu_notification(self, config_data: dict, message: str):
         """发送飞书通知"""
         try:
-            import aiohttp
             import json
             import hmac
             import hashlib
@@ -3735,33 +3703,35 @@ class XianyuLive:
             logger.info(f"📱 飞书通知 - 请求数据构建完成")
 
             # 发送POST请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(webhook_url, json=data, timeout=10) as response:
-                    response_text = await response.text()
-                    logger.info(f"📱 飞书通知 - 响应状态: {response.status}")
-                    logger.info(f"📱 飞书通知 - 响应内容: {response_text}")
+            status, response_text = await get_notification_dispatcher().post('feishu', webhook_url, json=data)
+            logger.info(f"📱 飞书通知 - 响应状态: {status}")
+            logger.info(f"📱 飞书通知 - 响应内容: {response_text}")
 
-                    if response.status == 200:
-                        try:
-                            response_json = json.loads(response_text)
-                            if response_json.get('code') == 0:
-                                logger.info(f"📱 飞书通知发送成功")
-                            else:
-                                logger.warning(f"📱 飞书通知发送失败: {response_json.get('msg', '未知错误')}")
-                        except json.JSONDecodeError:
-                            logger.info(f"📱 飞书通知发送成功（响应格式异常）")
+            if status == 200:
+                try:
+                    response_json = json.loads(response_text)
+                    if response_json.get('code') == 0:
+                        logger.info(f"📱 飞书通知发送成功")
+                        return True
                     else:
-                        logger.warning(f"📱 飞书通知发送失败: HTTP {response.status}, 响应: {response_text}")
+                        logger.warning(f"📱 飞书通知发送失败: {response_json.get('msg', '未知错误')}")
+                        return False
+                except json.JSONDecodeError:
+                    logger.info(f"📱 飞书通知发送成功（响应格式异常）")
+                    return True
+            else:
+                logger.warning(f"📱 飞书通知发送失败: HTTP {status}, 响应: {response_text}")
+                return False
 
         except Exception as e:
             logger.error(f"📱 发送飞书通知异常: {self._safe_str(e)}")
             import traceback
             logger.error(f"📱 飞书通知异常详情: {traceback.format_exc()}")
+            return False
 
     async def _send_bark_notification(self, config_data: dict, message: str):
         """发送Bark通知"""
         try:
-            import aiohttp
             import json
             from urllib.parse import quote
 
@@ -3809,32 +3779,36 @@ class XianyuLive:
             logger.info(f"📱 Bark通知 - 请求数据构建完成")
 
             # 发送POST请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_url, json=data, timeout=10) as response:
-                    response_text = await response.text()
-                    logger.info(f"📱 Bark通知 - 响应状态: {response.status}")
-                    logger.info(f"📱 Bark通知 - 响应内容: {response_text}")
+            status, response_text = await get_notification_dispatcher().post('bark', api_url, json=data)
+            logger.info(f"📱 Bark通知 - 响应状态: {status}")
+            logger.info(f"📱 Bark通知 - 响应内容: {response_text}")
 
-                    if response.status == 200:
-                        try:
-                            response_json = json.loads(response_text)
-                            if response_json.get('code') == 200:
-                                logger.info(f"📱 Bark通知发送成功")
-                            else:
-                                logger.warning(f"📱 Bark通知发送失败: {response_json.get('message', '未知错误')}")
-                        except json.JSONDecodeError:
-                            # 某些Bark服务器可能返回纯文本
-                            if 'success' in response_text.lower() or 'ok' in response_text.lower():
-                                logger.info(f"📱 Bark通知发送成功")
-                            else:
-                                logger.warning(f"📱 Bark通知响应格式异常: {response_text}")
+            if status == 200:
+                try:
+                    response_json = json.loads(response_text)
+                    if response_json.get('code') == 200:
+                        logger.info(f"📱 Bark通知发送成功")
+                        return True
                     else:
-                        logger.warning(f"📱 Bark通知发送失败: HTTP {response.status}, 响应: {response_text}")
+                        logger.warning(f"📱 Bark通知发送失败: {response_json.get('message', '未知错误')}")
+                        return False
+                except json.JSONDecodeError:
+                    # 某些Bark服务器可能返回纯文本
+                    if 'success' in response_text.lower() or 'ok' in response_text.lower():
+                        logger.info(f"📱 Bark通知发送成功")
+                        return True
+                    else:
+                        logger.warning(f"📱 Bark通知响应格式异常: {response_text}")
+                        return False
+            else:
+                logger.warning(f"📱 Bark通知发送失败: HTTP {status}, 响应: {response_text}")
+                return False
 
         except Exception as e:
             logger.error(f"📱 发送Bark通知异常: {self._safe_str(e)}")
             import traceback
             logger.error(f"📱 Bark通知异常详情: {traceback.format_exc()}")
+            return False
 
     async def _send_email_notification(self, config_data: dict, message: str, attachment_path: str = None):
         """发送邮件通知（支持附件）
@@ -3844,8 +3818,8 @@ class XianyuLive:
             message: 邮件正文
             attachment_path: 附件文件路径（可选）
         """
+        import smtplib
         try:
-            import smtplib
             from email.mime.text import MIMEText
             from email.mime.multipart import MIMEMultipart
             from email.mime.image import MIMEImage
@@ -3894,68 +3868,55 @@ class XianyuLive:
                 except Exception as attach_error:
                     logger.error(f"添加邮件附件失败: {self._safe_str(attach_error)}")
 
-            # 发送邮件
-            server = None
+            # 发送邮件（通过连接池在专用线程中执行，不阻塞事件循环）
+            dispatcher = get_notification_dispatcher()
+            start_time = time.time()
             try:
-                if smtp_port == 465:
-                    # 使用SSL连接（端口465）
-                    server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=30)
+                await get_mail_transport().send(
+                    smtp_server, smtp_port, email_user, email_password, msg, [recipient_email],
+                    use_ssl=smtp_port == 465, use_tls=bool(smtp_use_tls)
+                )
+            except smtplib.SMTPAuthenticationError as auth_error:
+                dispatcher.record('email', time.time() - start_time, False)
+                error_code = auth_error.smtp_code if hasattr(auth_error, 'smtp_code') else None
+                error_msg = str(auth_error)
+
+                # 提供详细的错误提示
+                logger.error(f"邮件SMTP认证失败 (错误码: {error_code})")
+                logger.error(f"邮箱地址: {email_user}")
+                logger.error(f"SMTP服务器: {smtp_server}:{smtp_port}")
+                logger.error(f"错误详情: {error_msg}")
+
+                # 根据常见错误提供解决建议
+                suggestions = []
+                if 'qq.com' in email_user.lower() or 'qq' in smtp_server.lower():
+                    suggestions.append("QQ邮箱需要使用授权码而不是登录密码")
+                    suggestions.append("请到QQ邮箱设置 -> 账户 -> 开启SMTP服务 -> 生成授权码")
+                elif 'gmail.com' in email_user.lower() or 'gmail' in smtp_server.lower():
+                    suggestions.append("Gmail需要使用应用专用密码")
+                    suggestions.append("请到Google账户 -> 安全性 -> 两步验证 -> 应用专用密码")
+                    suggestions.append("或启用'允许不够安全的应用访问'（不推荐）")
+                elif '163.com' in email_user.lower() or '126.com' in email_user.lower() or 'yeah.net' in email_user.lower():
+                    suggestions.append("网易邮箱需要使用授权码")
+                    suggestions.append("请到邮箱设置 -> POP3/SMTP/IMAP -> 开启SMTP服务 -> 生成授权码")
                 else:
-                    # 使用普通连接，然后升级到TLS（端口587）
-                    server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
-                    if smtp_use_tls:
-                        server.starttls()
-                
-                # 尝试登录
-                try:
-                    server.login(email_user, email_password)
-                except smtplib.SMTPAuthenticationError as auth_error:
-                    error_code = auth_error.smtp_code if hasattr(auth_error, 'smtp_code') else None
-                    error_msg = str(auth_error)
-                    
-                    # 提供详细的错误提示
-                    logger.error(f"邮件SMTP认证失败 (错误码: {error_code})")
-                    logger.error(f"邮箱地址: {email_user}")
-                    logger.error(f"SMTP服务器: {smtp_server}:{smtp_port}")
-                    logger.error(f"错误详情: {error_msg}")
-                    
-                    # 根据常见错误提供解决建议
-                    suggestions = []
-                    if 'qq.com' in email_user.lower() or 'qq' in smtp_server.lower():
-                        suggestions.append("QQ邮箱需要使用授权码而不是登录密码")
-                        suggestions.append("请到QQ邮箱设置 -> 账户 -> 开启SMTP服务 -> 生成授权码")
-                    elif 'gmail.com' in email_user.lower() or 'gmail' in smtp_server.lower():
-                        suggestions.append("Gmail需要使用应用专用密码")
-                        suggestions.append("请到Google账户 -> 安全性 -> 两步验证 -> 应用专用密码")
-                        suggestions.append("或启用'允许不够安全的应用访问'（不推荐）")
-                    elif '163.com' in email_user.lower() or '126.com' in email_user.lower() or 'yeah.net' in email_user.lower():
-                        suggestions.append("网易邮箱需要使用授权码")
-                        suggestions.append("请到邮箱设置 -> POP3/SMTP/IMAP -> 开启SMTP服务 -> 生成授权码")
-                    else:
-                        suggestions.append("请检查邮箱密码/授权码是否正确")
-                        suggestions.append("某些邮箱服务商需要使用授权码而不是登录密码")
-                        suggestions.append("请查看邮箱服务商的SMTP设置说明")
-                    
-                    if suggestions:
-                        logger.error("解决建议:")
-                        for i, suggestion in enumerate(suggestions, 1):
-                            logger.error(f"  {i}. {suggestion}")
-                    
-                    raise  # 重新抛出异常
-                
-                server.send_message(msg)
-                logger.info(f"邮件通知发送成功: {recipient_email}")
+                    suggestions.append("请检查邮箱密码/授权码是否正确")
+                    suggestions.append("某些邮箱服务商需要使用授权码而不是登录密码")
+                    suggestions.append("请查看邮箱服务商的SMTP设置说明")
 
-            finally:
-                # 确保关闭连接
-                if server:
-                    try:
-                        server.quit()
-                    except:
-                        try:
-                            server.close()
-                        except:
-                            pass
+                if suggestions:
+                    logger.error("解决建议:")
+                    for i, suggestion in enumerate(suggestions, 1):
+                        logger.error(f"  {i}. {suggestion}")
+
+                raise  # 重新抛出异常
+            except Exception:
+                dispatcher.record('email', time.time() - start_time, False)
+                raise
+
+            dispatcher.record('email', time.time() - start_time, True)
+            logger.info(f"邮件通知发送成功: {recipient_email}")
+            return True
 
         except smtplib.SMTPAuthenticationError:
             # 认证错误已在上面处理，这里不再重复记录
@@ -3964,15 +3925,16 @@ class XianyuLive:
             logger.error(f"SMTP协议错误: {self._safe_str(smtp_error)}")
             logger.error(f"SMTP服务器: {smtp_server}:{smtp_port}")
             logger.error(f"请检查SMTP服务器地址和端口配置是否正确")
+            return False
         except Exception as e:
             logger.error(f"发送邮件通知异常: {self._safe_str(e)}")
             import traceback
             logger.error(f"邮件发送详细错误: {traceback.format_exc()}")
+            return False
 
     async def _send_webhook_notification(self, config_data: dict, message: str):
         """发送Webhook通知"""
         try:
-            import aiohttp
             import json
 
             # 解析配置
@@ -4001,29 +3963,25 @@ class XianyuLive:
                 'source': 'xianyu-auto-reply'
             }
 
-            async with aiohttp.ClientSession() as session:
-                if http_method == 'POST':
-                    async with session.post(webhook_url, json=data, headers=headers, timeout=10) as response:
-                        if response.status == 200:
-                            logger.info(f"Webhook通知发送成功")
-                        else:
-                            logger.warning(f"Webhook通知发送失败: {response.status}")
-                elif http_method == 'PUT':
-                    async with session.put(webhook_url, json=data, headers=headers, timeout=10) as response:
-                        if response.status == 200:
-                            logger.info(f"Webhook通知发送成功")
-                        else:
-                            logger.warning(f"Webhook通知发送失败: {response.status}")
-                else:
-                    logger.warning(f"不支持的HTTP方法: {http_method}")
+            if http_method not in ('POST', 'PUT'):
+                logger.warning(f"不支持的HTTP方法: {http_method}")
+                return
+
+            status, _ = await get_notification_dispatcher().request('webhook', http_method, webhook_url, json=data, headers=headers)
+            if status == 200:
+                logger.info(f"Webhook通知发送成功")
+                return True
+            else:
+                logger.warning(f"Webhook通知发送失败: {status}")
+                return False
 
         except Exception as e:
             logger.error(f"发送Webhook通知异常: {self._safe_str(e)}")
+            return False
 
     async def _send_wechat_notification(self, config_data: dict, message: str):
         """发送微信通知"""
         try:
-            import aiohttp
             import json
 
             # 解析配置
@@ -4040,21 +3998,21 @@ class XianyuLive:
                 }
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(webhook_url, json=data, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info(f"微信通知发送成功")
-                    else:
-                        logger.warning(f"微信通知发送失败: {response.status}")
+            status, _ = await get_notification_dispatcher().post('wechat', webhook_url, json=data)
+            if status == 200:
+                logger.info(f"微信通知发送成功")
+                return True
+            else:
+                logger.warning(f"微信通知发送失败: {status}")
+                return False
 
         except Exception as e:
             logger.error(f"发送微信通知异常: {self._safe_str(e)}")
+            return False
 
     async def _send_telegram_notification(self, config_data: dict, message: str):
         """发送Telegram通知"""
         try:
-            import aiohttp
-
             # 解析配置
             bot_token = config_data.get('bot_token', '')
             chat_id = config_data.get('chat_id', '')
@@ -4072,15 +4030,17 @@ class XianyuLive:
                 'parse_mode': 'HTML'
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_url, json=data, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info(f"Telegram通知发送成功")
-                    else:
-                        logger.warning(f"Telegram通知发送失败: {response.status}")
+            status, _ = await get_notification_dispatcher().post('telegram', api_url, json=data)
+            if status == 200:
+                logger.info(f"Telegram通知发送成功")
+                return True
+            else:
+                logger.warning(f"Telegram通知发送失败: {status}")
+                return False
 
         except Exception as e:
             logger.error(f"发送Telegram通知异常: {self._safe_str(e)}")
+            return False
 
     async def send_token_refresh_notification(self, error_message: str, notification_type: str = "token_refresh", chat_id: str = None, attachment_path: str = None, verification_url: str = None):
         """发送Token刷新异常通知（带防重复机制，支持附件）
@@ -4289,17 +4249,10 @@ class XianyuLive:
         return False
 
     async def send_delivery_failure_notification(self, send_user_name: str, send_user_id: str, item_id: str, error_message: str, chat_id: str = None):
-        """发送自动发货失败通知"""
+        """发送自动发货失败通知（入队发件箱后立即返回，不阻塞发货流程）"""
         try:
             from db_manager import db_manager
 
-            # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
-
-            if not notifications:
-                logger.warning("未配置消息通知，跳过自动发货通知")
-                return
-
             # 构造通知消息
             notification_message = f"🚨 自动发货通知\n\n" \
                                  f"账号: {self.cookie_id}\n" \
@@ -4310,43 +4263,9 @@ class XianyuLive:
                                  f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n" \
                                  f"请及时处理！"
 
-            # 发送通知到所有已启用的通知渠道
-            for notification in notifications:
-                if notification.get('enabled', False):
-                    channel_type = notification.get('channel_type', 'qq')
-                    channel_config = notification.get('channel_config', '')
-
-                    try:
-                        # 解析配置数据
-                        config_data = self._parse_notification_config(channel_config)
-
-                        match channel_type:
-                            case 'ding_talk' | 'dingtalk':
-                                await self._send_dingtalk_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到钉钉")
-                            case 'email':
-                                await self._send_email_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到邮箱")
-                            case 'webhook':
-                                await self._send_webhook_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到Webhook")
-                            case 'wechat':
-                                await self._send_wechat_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到微信")
-                            case 'telegram':
-                                await self._send_telegram_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到Telegram")
-                            case 'bark':
-                                await self._send_bark_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到Bark")
-                            case 'feishu' | 'lark':
-                                await self._send_feishu_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到飞书")
-                            case _:
-                                logger.warning(f"不支持的通知渠道类型: {channel_type}")
-
-                    except Exception as notify_error:
-                        logger.error(f"发送自动发货通知失败: {self._safe_str(notify_error)}")
+            get_notification_dispatcher().submit(
+                self.cookie_id, notification_message, self._deliver_notification, db_manager.get_account_notifications
+            )
 
         except Exception as e:
             logger.error(f"发送自动发货通知异常: {self._safe_str(e)}")
@@ -4372,7 +4291,6 @@ class XianyuLive:
 
             # 同步更新后的cookies和token
             if secure_confirm.cookies_str != self.cookies_str:
-                self.cookies_str = secure_confirm.cookies_str
                 self.cookies = secure_confirm.cookies
                 logger.warning(f"【{self.cookie_id}】已同步确认发货模块更新的cookies")
 
@@ -4438,7 +4356,7 @@ class XianyuLive:
                     logger.info(f"【{self.cookie_id}】🖥️ 启用有头模式进行调试")
 
                 # 异步获取订单详情（使用当前账号的cookie）
-                result = await fetch_order_detail_simple(order_id, cookie_string, headless=headless_mode)
+                result = await fetch_order_detail_simple(order_id, cookie_string, headless=headless_mode, cookie_id=self.cookie_id)
 
                 if result:
                     logger.info(f"【{self.cookie_id}】订单详情获取成功: {order_id}")
@@ -5080,8 +4998,154 @@ class XianyuLive:
         else:
             return obj
 
+    async def _refresh_token_and_reconnect(self) -> bool:
+        """定时刷新Token：成功后关闭WebSocket让main循环用新Token重连，失败时清空Token并发送通知
+
+        Returns:
+            bool: 是否刷新成功
+        """
+        logger.info("Token即将过期，准备刷新...")
+        new_token = await self.refresh_token()
+        if new_token:
+            # WebSocket连接建立时使用的是旧Token，新Token需要在新连接上注册才能生效
+            # 先建后断：新连接注册完成后再关闭旧连接，接收不中断；失败时回退为关闭后重连
+            if REFRESH_SCHEDULER_CONFIG.get('make_before_break', True) and await self._rotate_connection():
+                logger.info(f"【{self.cookie_id}】Token刷新完成，已切换到使用新Token的连接")
+                return True
+
+            logger.info(f"【{self.cookie_id}】Token刷新成功，将关闭WebSocket以使用新Token重连")
+            # 注意：只关闭WebSocket，不重启整个实例（后台任务继续运行）
+            if self.ws and not self.ws.closed:
+                try:
+                    logger.info(f"【{self.cookie_id}】关闭当前WebSocket连接以使用新Token重连...")
+                    self._rotation_closed_at = time.time()
+                    await self.ws.close()
+                    logger.info(f"【{self.cookie_id}】WebSocket连接已关闭，将自动重连")
+                except Exception as close_e:
+                    logger.warning(f"【{self.cookie_id}】关闭WebSocket时出错: {self._safe_str(close_e)}")
+
+            logger.info(f"【{self.cookie_id}】Token刷新完成，WebSocket将使用新Token重新连接")
+            return True
+
+        # 根据上一次刷新状态决定日志级别（冷却/已重启为正常情况）
+        if getattr(self, 'last_token_refresh_status', None) in ("skipped_cooldown", "restarted_after_cookie_refresh"):
+            logger.info(f"【{self.cookie_id}】Token刷新未执行或已重启（正常），将在{self.token_retry_interval // 60}分钟后重试")
+        else:
+            logger.error(f"【{self.cookie_id}】Token刷新失败，将在{self.token_retry_interval // 60}分钟后重试")
+
+        # 清空当前token，确保下次重试时重新获取
+        self.current_token = None
+
+        # 发送Token刷新失败通知
+        await self.send_token_refresh_notification("Token定时刷新失败，将自动重试", "token_scheduled_refresh_failed")
+        return False
+
+    async def _rotate_connection(self) -> bool:
+        """先建后断：用当前Token建立并注册新连接，交给main循环接管后再关闭旧连接
+
+        服务端没有在已有连接上更换Token的接口，所以用新连接替换旧连接；新连接在旧连接关闭前就已注册，
+        期间的消息会缓存在新连接上，两个连接都收到的同步包在接管后按重放跳过。
+
+        Returns:
+            bool: 是否已切换（False 时旧连接保持不变，由调用方回退为断开重连）
+        """
+        old_ws = self.ws
+        if not old_ws or old_ws.closed or self._handover is not None:
+            return False
+
+        self._handover = asyncio.get_running_loop().create_future()
+        new_ws = None
+        try:
+            headers = WEBSOCKET_HEADERS.copy()
+            headers['Cookie'] = self.cookies_str
+            connector = await self._create_websocket_connection(headers)
+            new_ws = await asyncio.wait_for(connector, timeout=30)
+            await asyncio.wait_for(self.init(new_ws), timeout=30)
+        except BaseException as e:
+            handover, self._handover = self._handover, None
+            handover.set_result(None)
+            if new_ws is not None:
+                try:
+                    await asyncio.wait_for(new_ws.close(), timeout=2.0)
+                except BaseException:
+                    pass
+            if not isinstance(e, Exception):
+                raise
+            self.rotation_stats['fallbacks'] += 1
+            logger.warning(f"【{self.cookie_id}】新连接建立失败，回退为断开重连: {self._safe_str(e)}")
+            return False
+
+        self.rotation_stats['rotations'] += 1
+        self._rotation_replay_until = time.time() + REFRESH_SCHEDULER_CONFIG.get('replay_window', 30)
+        self._handover.set_result(new_ws)
+        logger.info(f"【{self.cookie_id}】新连接已注册，关闭旧连接并切换...")
+        self._rotation_closed_at = time.time()
+        try:
+            await asyncio.wait_for(old_ws.close(), timeout=5.0)
+        except Exception as close_e:
+            logger.warning(f"【{self.cookie_id}】关闭旧WebSocket时出错: {self._safe_str(close_e)}")
+        return True
+
+    @staticmethod
+    @asynccontextmanager
+    async def _adopt_websocket(ws):
+        """让已建立的连接和 websockets.connect 一样用于 async with，退出时关闭连接"""
+        try:
+            yield ws
+        finally:
+            await ws.close()
+
+    async def _take_handover_connection(self):
+        """取出轮换中已注册好的新连接（轮换尚未完成时等待其完成），没有时返回None"""
+        handover = self._handover
+        if handover is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(handover), timeout=70)
+        except asyncio.TimeoutError:
+            logger.warning(f"【{self.cookie_id}】等待新连接超时，重新建立连接")
+            return None
+        finally:
+            if self._handover is handover:
+                self._handover = None
+
+    def _record_rotation_gap(self, handover: bool):
+        """记录因Token轮换关闭旧连接到新连接开始接收消息之间的中断时长"""
+        if not self._rotation_closed_at:
+            return
+        gap_ms = round((time.time() - self._rotation_closed_at) * 1000, 1)
+        self._rotation_closed_at = 0
+        stats = self.rotation_stats
+        stats['last_gap_ms'] = gap_ms
+        stats['max_gap_ms'] = max(stats['max_gap_ms'], gap_ms)
+        stats['total_gap_ms'] = round(stats['total_gap_ms'] + gap_ms, 1)
+        logger.info(f"【{self.cookie_id}】Token轮换{'（先建后断）' if handover else '（断开重连）'}接收中断 {gap_ms} 毫秒")
+
+    def _is_replayed_sync(self, message_data) -> bool:
+        """判断同步包是否是轮换后新连接重放的（旧连接已收到过），同时记录最近收到的同步包"""
+        if not self.is_sync_package(message_data):
+            return False
+        try:
+            key = hashlib.md5(json.dumps(message_data["body"]["syncPushPackage"]["data"],
+                                         sort_keys=True).encode('utf-8')).hexdigest()
+        except Exception:
+            return False
+        if key in self._recent_sync_keys:
+            if time.time() < self._rotation_replay_until:
+                self.rotation_stats['replayed_messages'] += 1
+                return True
+            self._recent_sync_keys.move_to_end(key)
+            return False
+        self._recent_sync_keys[key] = True
+        if len(self._recent_sync_keys) > 500:
+            self._recent_sync_keys.popitem(last=False)
+        return False
+
     async def token_refresh_loop(self):
-        """Token刷新循环"""
+        """Token刷新循环
+
+        只在没有 CookieManager（独立运行）时使用，正常运行时由 RefreshScheduler 统一调度
+        """
         try:
             while True:
                 try:
@@ -5093,42 +5157,12 @@ class XianyuLive:
 
                     current_time = time.time()
                     if current_time - self.last_token_refresh_time >= self.token_refresh_interval:
-                        logger.info("Token即将过期，准备刷新...")
-                        new_token = await self.refresh_token()
-                        if new_token:
-                            logger.info(f"【{self.cookie_id}】Token刷新成功，将关闭WebSocket以使用新Token重连")
-                            
-                            # Token刷新成功后，需要关闭WebSocket连接，让它用新Token重新连接
-                            # 原因：WebSocket连接建立时使用的是旧Token，新Token需要重新建立连接才能生效
-                            # 注意：只关闭WebSocket，不重启整个实例（后台任务继续运行）
-                            
-                            # 关闭当前WebSocket连接
-                            if self.ws and not self.ws.closed:
-                                try:
-                                    logger.info(f"【{self.cookie_id}】关闭当前WebSocket连接以使用新Token重连...")
-                                    await self.ws.close()
-                                    logger.info(f"【{self.cookie_id}】WebSocket连接已关闭，将自动重连")
-                                except Exception as close_e:
-                                    logger.warning(f"【{self.cookie_id}】关闭WebSocket时出错: {self._safe_str(close_e)}")
-                            
+                        if await self._refresh_token_and_reconnect():
                             # 退出Token刷新循环，让main循环重新建立连接
                             # 后台任务（心跳、清理等）继续运行
-                            logger.info(f"【{self.cookie_id}】Token刷新完成，WebSocket将使用新Token重新连接")
                             break
-                        else:
-                            # 根据上一次刷新状态决定日志级别（冷却/已重启为正常情况）
-                            if getattr(self, 'last_token_refresh_status', None) in ("skipped_cooldown", "restarted_after_cookie_refresh"):
-                                logger.info(f"【{self.cookie_id}】Token刷新未执行或已重启（正常），将在{self.token_retry_interval // 60}分钟后重试")
-                            else:
-                                logger.error(f"【{self.cookie_id}】Token刷新失败，将在{self.token_retry_interval // 60}分钟后重试")
-
-                            # 清空当前token，确保下次重试时重新获取
-                            self.current_token = None
-
-                            # 发送Token刷新失败通知
-                            await self.send_token_refresh_notification("Token定时刷新失败，将自动重试", "token_scheduled_refresh_failed")
-                            await self._interruptible_sleep(self.token_retry_interval)
-                            continue
+                        await self._interruptible_sleep(self.token_retry_interval)
+                        continue
                     await self._interruptible_sleep(60)
                 except asyncio.CancelledError:
                     # 收到取消信号，立即退出循环
@@ -5273,21 +5307,53 @@ class XianyuLive:
         await ws.send(json.dumps(msg))
         logger.info(f'【{self.cookie_id}】连接注册完成')
 
+    def _build_heartbeat(self):
+        """构造心跳包，返回 (mid, 消息内容)"""
+        mid = generate_mid()
+        return mid, json.dumps({"lwp": "/!", "headers": {"mid": mid}})
+
+    def _heartbeat_scheduler(self):
+        """共享心跳调度器（未启用或不在 CookieManager 下运行时返回 None，使用自身的心跳循环）"""
+        from cookie_manager import manager as cookie_manager
+        scheduler = getattr(cookie_manager, 'heartbeat_scheduler', None) if cookie_manager else None
+        return scheduler if scheduler and scheduler.enabled else None
+
+    def _start_heartbeat(self, ws):
+        """开始对连接发送心跳：交给共享心跳调度器，或启动自身的心跳循环"""
+        scheduler = self._heartbeat_scheduler()
+        if scheduler:
+            scheduler.register(self, ws)
+        else:
+            self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(ws))
+
+    def _pause_heartbeat(self) -> bool:
+        """暂停心跳，返回暂停前心跳是否在运行"""
+        scheduler = self._heartbeat_scheduler()
+        if scheduler and scheduler.is_registered(self.cookie_id):
+            return scheduler.pause(self.cookie_id)
+        if self.heartbeat_task and not self.heartbeat_task.done():
+            self.heartbeat_task.cancel()
+            return True
+        return False
+
+    def _resume_heartbeat(self):
+        """恢复被暂停的心跳"""
+        scheduler = self._heartbeat_scheduler()
+        if scheduler and scheduler.is_registered(self.cookie_id):
+            scheduler.resume(self.cookie_id)
+        elif self.ws and not self.ws.closed and (not self.heartbeat_task or self.heartbeat_task.done()):
+            self._start_heartbeat(self.ws)
+
     async def send_heartbeat(self, ws):
         """发送心跳包"""
         # 检查WebSocket连接状态，如果已关闭则不发送
         if ws.closed:
             raise ConnectionError("WebSocket连接已关闭，无法发送心跳")
         
-        msg = {
-            "lwp": "/!",
-            "headers": {
-                "mid": generate_mid()
-            }
-        }
+        _, msg = self._build_heartbeat()
         # 添加超时保护，避免在WebSocket关闭时阻塞
         try:
-            await asyncio.wait_for(ws.send(json.dumps(msg)), timeout=2.0)
+            await asyncio.wait_for(ws.send(msg), timeout=2.0)
             self.last_heartbeat_time = time.time()
             logger.warning(f"【{self.cookie_id}】心跳包已发送")
         except asyncio.TimeoutError:
@@ -5352,6 +5418,9 @@ class XianyuLive:
         try:
             if message_data.get("code") == 200:
                 self.last_heartbeat_response = time.time()
+                scheduler = self._heartbeat_scheduler()
+                if scheduler:
+                    scheduler.on_response(self.cookie_id, message_data.get("headers", {}).get("mid"))
                 logger.warning("心跳响应正常")
                 return True
         except Exception as e:
@@ -5474,7 +5543,8 @@ class XianyuLive:
     async def item_sync_loop(self):
         """商品同步定时任务 - 按配置间隔定时同步商品信息
 
-        支持动态配置更新：每次循环时从数据库读取最新配置
+        支持动态配置更新：每次循环时从数据库读取最新配置。
+        只在没有 CookieManager（独立运行）时使用，正常运行时由 ItemSyncScheduler 统一调度
         """
         try:
             while True:
@@ -5522,10 +5592,10 @@ class XianyuLive:
                             result = await self.get_all_items(page_size=20, max_pages=item_sync_max_pages)
 
                             if result.get('success'):
-                                total_count = result.get('total_count', 0)
-                                saved_count = result.get('total_saved', 0)
+                                stats = result.get('stats', {})
                                 self.last_item_sync_time = current_time
-                                logger.info(f"【{self.cookie_id}】✅ 商品同步完成: 共 {total_count} 件商品，保存/更新 {saved_count} 件")
+                                logger.info(f"【{self.cookie_id}】✅ 商品同步完成: 共 {result.get('total_count', 0)} 件商品，"
+                                            f"变化 {stats.get('new', 0) + stats.get('changed', 0)} 件，写入 {result.get('total_saved', 0)} 件")
                             else:
                                 error_msg = result.get('error', '未知错误')
                                 logger.warning(f"【{self.cookie_id}】❌ 商品同步失败: {error_msg}")
@@ -5561,7 +5631,10 @@ class XianyuLive:
 
 
     async def cookie_refresh_loop(self):
-        """Cookie刷新定时任务 - 每小时执行一次"""
+        """Cookie刷新定时任务 - 每小时执行一次
+
+        只在没有 CookieManager（独立运行）时使用，正常运行时由 RefreshScheduler 统一调度
+        """
         try:
             while True:
                 try:
@@ -5625,10 +5698,8 @@ class XianyuLive:
                 logger.info(f"【{self.cookie_id}】开始Cookie刷新任务，暂时暂停心跳以避免连接冲突...")
 
                 # 暂时暂停心跳任务，避免与浏览器操作冲突
-                heartbeat_was_running = False
-                if self.heartbeat_task and not self.heartbeat_task.done():
-                    heartbeat_was_running = True
-                    self.heartbeat_task.cancel()
+                heartbeat_was_running = self._pause_heartbeat()
+                if heartbeat_was_running:
                     logger.warning(f"【{self.cookie_id}】已暂停心跳任务")
 
                 # 为整个Cookie刷新任务添加超时保护（3分钟，缩短时间减少影响）
@@ -5640,7 +5711,7 @@ class XianyuLive:
                 # 重新启动心跳任务
                 if heartbeat_was_running and self.ws and not self.ws.closed:
                     logger.warning(f"【{self.cookie_id}】重新启动心跳任务")
-                    self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(self.ws))
+                    self._resume_heartbeat()
 
                 if success:
                     self.last_cookie_refresh_time = current_time
@@ -5688,10 +5759,9 @@ class XianyuLive:
                 self.last_cookie_refresh_time = current_time
             finally:
                 # 确保心跳任务恢复（如果WebSocket仍然连接）
-                if (self.ws and not self.ws.closed and
-                    (not self.heartbeat_task or self.heartbeat_task.done())):
+                if self.ws and not self.ws.closed:
                     logger.info(f"【{self.cookie_id}】Cookie刷新完成，心跳任务正常运行")
-                    self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(self.ws))
+                    self._resume_heartbeat()
 
                 # 清空消息接收标志，允许下次正常执行Cookie刷新
                 self.last_message_received_time = 0
@@ -6038,7 +6108,6 @@ class XianyuLive:
                 # 如果当前实例的cookie_id匹配，更新实例的cookie信息
                 if target_cookie_id == self.cookie_id:
                     self.cookies = real_cookies_dict
-                    self.cookies_str = real_cookies_str
                     logger.info(f"【{target_cookie_id}】已更新当前实例的Cookie信息")
 
                 # 更新扫码登录Cookie刷新时间标志
@@ -6637,9 +6706,8 @@ class XianyuLive:
                 elif old_value != new_value:
                     changed_cookies.append(name)
 
-            # 更新self.cookies和cookies_str
-            self.cookies.update(new_cookies_dict)
-            self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
+            # 增量更新cookies（cookies_str 随之更新）
+            self.cookie_jar.merge(new_cookies_dict)
 
             logger.info(f"【{self.cookie_id}】Cookie已更新，包含 {len(new_cookies_dict)} 个字段")
 
@@ -6964,18 +7032,26 @@ class XianyuLive:
     async def create_session(self):
         """创建aiohttp session"""
         if not self.session:
-            # 创建带有cookies和headers的session
-            headers = DEFAULT_HEADERS.copy()
-            headers['cookie'] = self.cookies_str
-
-            self.session = aiohttp.ClientSession(
-                headers=headers,
+            # 账号的所有HTTP请求共用这个会话，底层连接来自进程内共享的连接池（DNS缓存、keep-alive）
+            # Cookie 放在会话的 cookie_jar 中，由 self.cookie_jar 增量同步（不再固定在请求头里）
+            self.session = get_http_pool().create_session(
+                headers=DEFAULT_HEADERS.copy(),
+                cookie_jar=aiohttp.CookieJar(quote_cookie=False),
                 timeout=aiohttp.ClientTimeout(total=30)
             )
+            self.cookie_jar.bind(self.session.cookie_jar, domain=ACCOUNT_COOKIE_DOMAIN)
+
+    async def _create_image_uploader(self):
+        """创建使用账号会话的图片上传器"""
+        from utils.image_uploader import ImageUploader
+        if not self.session:
+            await self.create_session()
+        return ImageUploader(self.cookies_str, session=self.session)
 
     async def close_session(self):
         """关闭aiohttp session"""
         if self.session:
+            self.cookie_jar.unbind()
             await self.session.close()
             self.session = None
 
@@ -7327,8 +7403,7 @@ class XianyuLive:
                                         if os.path.exists(local_image_path):
                                             logger.info(f"【{self.cookie_id}】准备上传默认回复本地图片到闲鱼CDN: {local_image_path}")
                                             
-                                            from utils.image_uploader import ImageUploader
-                                            uploader = ImageUploader(self.cookies_str)
+                                            uploader = await self._create_image_uploader()
                                             
                                             async with uploader:
                                                 cdn_url = await uploader.upload_image(local_image_path)
@@ -7412,6 +7487,26 @@ class XianyuLive:
         except Exception as e:
             logger.error(f"处理聊天消息回复时发生错误: {self._safe_str(e)}")
 
+    async def _send_ack(self, message, websocket):
+        """发送消息确认"""
+        try:
+            ack = {
+                "code": 200,
+                "headers": {
+                    "mid": message["headers"]["mid"] if "mid" in message["headers"] else generate_mid(),
+                    "sid": message["headers"]["sid"] if "sid" in message["headers"] else '',
+                }
+            }
+            if 'app-key' in message["headers"]:
+                ack["headers"]["app-key"] = message["headers"]["app-key"]
+            if 'ua' in message["headers"]:
+                ack["headers"]["ua"] = message["headers"]["ua"]
+            if 'dt' in message["headers"]:
+                ack["headers"]["dt"] = message["headers"]["dt"]
+            await websocket.send(json.dumps(ack))
+        except Exception as e:
+            pass
+
     async def handle_message(self, message_data, websocket):
         """处理所有类型的消息"""
         try:
@@ -7422,24 +7517,7 @@ class XianyuLive:
                 return
 
             # 发送确认消息
-            try:
-                message = message_data
-                ack = {
-                    "code": 200,
-                    "headers": {
-                        "mid": message["headers"]["mid"] if "mid" in message["headers"] else generate_mid(),
-                        "sid": message["headers"]["sid"] if "sid" in message["headers"] else '',
-                    }
-                }
-                if 'app-key' in message["headers"]:
-                    ack["headers"]["app-key"] = message["headers"]["app-key"]
-                if 'ua' in message["headers"]:
-                    ack["headers"]["ua"] = message["headers"]["ua"]
-                if 'dt' in message["headers"]:
-                    ack["headers"]["dt"] = message["headers"]["dt"]
-                await websocket.send(json.dumps(ack))
-            except Exception as e:
-                pass
+            await self._send_ack(message_data, websocket)
 
             # 如果不是同步包消息，直接返回
             if not self.is_sync_package(message_data):
@@ -7501,6 +7579,7 @@ class XianyuLive:
 
             # 【消息接收标识】记录收到消息的时间，用于控制Cookie刷新
             self.last_message_received_time = time.time()
+            self.last_activity_time = self.last_message_received_time
             logger.warning(f"【{self.cookie_id}】收到消息，更新消息接收时间标识")
 
             # 【优先处理】尝试获取订单ID并获取订单详情
@@ -7901,24 +7980,36 @@ class XianyuLive:
                     headers = WEBSOCKET_HEADERS.copy()
                     headers['Cookie'] = self.cookies_str
 
+                    # Token轮换时接管已注册好的新连接（先建后断），无需重新初始化
+                    handover_ws = await self._take_handover_connection()
+
                     # 更新连接状态为连接中
                     self._set_connection_state(ConnectionState.CONNECTING, "准备建立WebSocket连接")
                     logger.info(f"【{self.cookie_id}】WebSocket目标地址: {self.base_url}")
 
                     # 兼容不同版本的websockets库
-                    async with await self._create_websocket_connection(headers) as websocket:
+                    if handover_ws is not None:
+                        connection = self._adopt_websocket(handover_ws)
+                    else:
+                        connection = await self._create_websocket_connection(headers)
+                    async with connection as websocket:
                         self.ws = websocket
-                        logger.info(f"【{self.cookie_id}】WebSocket连接建立成功，开始初始化...")
 
                         try:
-                            # 开始初始化
-                            await self.init(websocket)
-                            logger.info(f"【{self.cookie_id}】WebSocket初始化完成！")
+                            if handover_ws is None:
+                                logger.info(f"【{self.cookie_id}】WebSocket连接建立成功，开始初始化...")
+                                await self.init(websocket)
+                                logger.info(f"【{self.cookie_id}】WebSocket初始化完成！")
+                            else:
+                                logger.info(f"【{self.cookie_id}】已接管Token轮换建立的新连接")
 
                             # 初始化完成后才设置为已连接状态
                             self._set_connection_state(ConnectionState.CONNECTED, "初始化完成，连接就绪")
+                            self._record_rotation_gap(handover_ws is not None)
                             self.connection_failures = 0
                             self.last_successful_connection = time.time()
+                            if cookie_manager:
+                                cookie_manager.startup_scheduler.mark_connected(self.cookie_id)
 
                             # 记录后台任务启动前的状态
                             logger.warning(f"【{self.cookie_id}】准备启动后台任务 - 当前状态: heartbeat={self.heartbeat_task}, token_refresh={self.token_refresh_task}, cleanup={self.cleanup_task}, cookie_refresh={self.cookie_refresh_task}")
@@ -7930,17 +8021,29 @@ class XianyuLive:
 
                             # 启动心跳任务（依赖WebSocket，每次重连都需要重启）
                             logger.info(f"【{self.cookie_id}】启动心跳任务...")
-                            self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(websocket))
+                            self._start_heartbeat(websocket)
 
                             # 启动其他后台任务（不依赖WebSocket，只在首次连接时启动）
                             tasks_started = []
                             
-                            if not self.token_refresh_task or self.token_refresh_task.done():
-                                logger.info(f"【{self.cookie_id}】启动Token刷新任务...")
-                                self.token_refresh_task = asyncio.create_task(self.token_refresh_loop())
-                                tasks_started.append("Token刷新")
+                            # Token和Cookie刷新：由 CookieManager 的刷新调度器统一安排，独立运行时才使用自身的刷新循环
+                            if cookie_manager:
+                                if cookie_manager.refresh_scheduler.register(self):
+                                    tasks_started.append("Token/Cookie刷新")
                             else:
-                                logger.info(f"【{self.cookie_id}】Token刷新任务已在运行，跳过启动")
+                                if not self.token_refresh_task or self.token_refresh_task.done():
+                                    logger.info(f"【{self.cookie_id}】启动Token刷新任务...")
+                                    self.token_refresh_task = asyncio.create_task(self.token_refresh_loop())
+                                    tasks_started.append("Token刷新")
+                                else:
+                                    logger.info(f"【{self.cookie_id}】Token刷新任务已在运行，跳过启动")
+
+                                if not self.cookie_refresh_task or self.cookie_refresh_task.done():
+                                    logger.info(f"【{self.cookie_id}】启动Cookie刷新任务...")
+                                    self.cookie_refresh_task = asyncio.create_task(self.cookie_refresh_loop())
+                                    tasks_started.append("Cookie刷新")
+                                else:
+                                    logger.info(f"【{self.cookie_id}】Cookie刷新任务已在运行，跳过启动")
 
                             if not self.cleanup_task or self.cleanup_task.done():
                                 logger.info(f"【{self.cookie_id}】启动暂停记录清理任务...")
@@ -7949,15 +8052,11 @@ class XianyuLive:
                             else:
                                 logger.info(f"【{self.cookie_id}】暂停记录清理任务已在运行，跳过启动")
 
-                            if not self.cookie_refresh_task or self.cookie_refresh_task.done():
-                                logger.info(f"【{self.cookie_id}】启动Cookie刷新任务...")
-                                self.cookie_refresh_task = asyncio.create_task(self.cookie_refresh_loop())
-                                tasks_started.append("Cookie刷新")
-                            else:
-                                logger.info(f"【{self.cookie_id}】Cookie刷新任务已在运行，跳过启动")
-
-                            # 启动商品同步任务
-                            if self.item_sync_enabled:
+                            # 启动商品同步：由 CookieManager 的调度器统一安排，独立运行时才使用自身的同步循环
+                            if cookie_manager:
+                                if cookie_manager.item_sync_scheduler.register(self):
+                                    tasks_started.append("商品同步")
+                            elif self.item_sync_enabled:
                                 if not self.item_sync_task or self.item_sync_task.done():
                                     logger.info(f"【{self.cookie_id}】启动商品同步任务（间隔: {self.item_sync_interval}秒）...")
                                     self.item_sync_task = asyncio.create_task(self.item_sync_loop())
@@ -7970,8 +8069,16 @@ class XianyuLive:
                             # 记录所有后台任务状态
                             if tasks_started:
                                 logger.info(f"【{self.cookie_id}】✅ 新启动的任务: {', '.join(tasks_started)}")
-                            item_sync_status = '运行中' if self.item_sync_task and not self.item_sync_task.done() else '已启动' if self.item_sync_enabled else '未启用'
-                            logger.info(f"【{self.cookie_id}】✅ 所有后台任务状态: 心跳(已启动), Token刷新({'运行中' if self.token_refresh_task and not self.token_refresh_task.done() else '已启动'}), 暂停清理({'运行中' if self.cleanup_task and not self.cleanup_task.done() else '已启动'}), Cookie刷新({'运行中' if self.cookie_refresh_task and not self.cookie_refresh_task.done() else '已启动'}), 商品同步({item_sync_status})")
+                            if cookie_manager and cookie_manager.item_sync_scheduler.is_registered(self.cookie_id):
+                                item_sync_status = '统一调度'
+                            else:
+                                item_sync_status = '运行中' if self.item_sync_task and not self.item_sync_task.done() else '已启动' if self.item_sync_enabled else '未启用'
+                            if cookie_manager and cookie_manager.refresh_scheduler.is_registered(self.cookie_id):
+                                token_refresh_status = cookie_refresh_status = '统一调度'
+                            else:
+                                token_refresh_status = '运行中' if self.token_refresh_task and not self.token_refresh_task.done() else '已启动'
+                                cookie_refresh_status = '运行中' if self.cookie_refresh_task and not self.cookie_refresh_task.done() else '已启动'
+                            logger.info(f"【{self.cookie_id}】✅ 所有后台任务状态: 心跳(已启动), Token刷新({token_refresh_status}), 暂停清理({'运行中' if self.cleanup_task and not self.cleanup_task.done() else '已启动'}), Cookie刷新({cookie_refresh_status}), 商品同步({item_sync_status})")
                             
                             logger.info(f"【{self.cookie_id}】开始监听WebSocket消息...")
                             logger.info(f"【{self.cookie_id}】WebSocket连接状态正常，等待服务器消息...")
@@ -7986,6 +8093,11 @@ class XianyuLive:
                                     if await self.handle_heartbeat_response(message_data):
                                         continue
 
+                                    # Token轮换后新连接重放的、旧连接已处理过的同步包只确认不处理
+                                    if self._is_replayed_sync(message_data):
+                                        self._create_tracked_task(self._send_ack(message_data, websocket))
+                                        continue
+
                                     # 处理其他消息
                                     # 使用追踪的异步任务处理消息，防止阻塞后续消息接收
                                     # 并通过信号量控制并发数量，防止内存泄漏
@@ -8002,6 +8114,11 @@ class XianyuLive:
                                 logger.info(f"【{self.cookie_id}】WebSocket连接已退出，引用已清理")
 
                 except Exception as e:
+                    # Token轮换中旧连接被关闭（如服务端在新连接注册后断开旧连接），直接切换到新连接
+                    if self._handover is not None:
+                        logger.info(f"【{self.cookie_id}】Token轮换中旧连接已断开: {self._safe_str(e)}")
+                        continue
+
                     error_msg = self._safe_str(e)
                     import traceback
                     error_type = type(e).__name__
@@ -8107,6 +8224,10 @@ class XianyuLive:
                         if self.current_token:
                             logger.warning(f"【{self.cookie_id}】清空当前token，重新连接时将重新获取")
                             self.current_token = None
+                        # 缓存的token可能已失效，作废后下次启动重新获取
+                        if self._token_from_cache:
+                            db_manager.invalidate_connect_token(self.cookie_id)
+                            self._token_from_cache = False
 
                         # 直接重置任务引用，不等待取消（快速重连方案）
                         # 这样可以避免等待任务取消导致的阻塞问题
@@ -8203,6 +8324,14 @@ class XianyuLive:
                 logger.info(f"【{self.cookie_id}】程序退出，清空当前token")
                 self.current_token = None
 
+            # 关闭Token轮换建立但尚未接管的新连接
+            handover, self._handover = self._handover, None
+            if handover is not None and handover.done() and handover.result() is not None:
+                try:
+                    await asyncio.wait_for(handover.result().close(), timeout=2.0)
+                except Exception:
+                    pass
+
             # 检查是否还有未取消的后台任务，如果有才执行清理
             has_pending_tasks = any([
                 self.heartbeat_task and not self.heartbeat_task.done(),
@@ -8248,6 +8377,10 @@ class XianyuLive:
                 except asyncio.TimeoutError:
                     logger.warning(f"【{self.cookie_id}】后台任务清理超时，强制继续")
             
+            # 保存最近收到消息的时间，供下次启动排序
+            if self.last_activity_time:
+                db_manager.update_connect_activity(self.cookie_id, self.last_activity_time)
+
             # 确保关闭session
             await self.close_session()
 
@@ -8255,13 +8388,14 @@ class XianyuLive:
             self._unregister_instance()
             logger.info(f"【{self.cookie_id}】XianyuLive主程序已完全退出")
 
-    async def get_item_list_info(self, page_number=1, page_size=20, retry_count=0):
+    async def get_item_list_info(self, page_number=1, page_size=20, retry_count=0, save=True):
         """获取商品信息，自动处理token失效的情况
 
         Args:
             page_number (int): 页码，从1开始
             page_size (int): 每页数量，默认20
             retry_count (int): 重试次数，内部使用
+            save (bool): 是否直接保存到数据库（商品同步会在所有页获取完成后统一比对保存）
         """
         if retry_count >= 4:  # 最多重试3次
             logger.error("获取商品信息失败，重试次数过多")
@@ -8298,7 +8432,7 @@ class XianyuLive:
         }
 
         # 始终从最新的cookies中获取_m_h5_tk token（刷新后cookies会被更新）
-        token = trans_cookies(self.cookies_str).get('_m_h5_tk', '').split('_')[0] if trans_cookies(self.cookies_str).get('_m_h5_tk') else ''
+        token = self.cookie_jar.token
 
         logger.warning(f"准备获取商品列表，token: {token}")
         if token:
@@ -8320,21 +8454,10 @@ class XianyuLive:
                 res_json = await response.json()
 
                 # 检查并更新Cookie
-                if 'set-cookie' in response.headers:
-                    new_cookies = {}
-                    for cookie in response.headers.getall('set-cookie', []):
-                        if '=' in cookie:
-                            name, value = cookie.split(';')[0].split('=', 1)
-                            new_cookies[name.strip()] = value.strip()
-
-                    # 更新cookies
-                    if new_cookies:
-                        self.cookies.update(new_cookies)
-                        # 生成新的cookie字符串
-                        self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
-                        # 更新数据库中的Cookie
-                        await self.update_config_cookies()
-                        logger.warning("已更新Cookie到数据库")
+                if self.cookie_jar.update_from_set_cookie(response.headers):
+                    # 更新数据库中的Cookie
+                    await self.update_config_cookies()
+                    logger.warning("已更新Cookie到数据库")
 
                 logger.info(f"商品信息获取响应: {res_json}")
 
@@ -8394,7 +8517,8 @@ class XianyuLive:
                     print("="*80)
 
                     # 自动保存商品信息到数据库
-                    if items_list:
+                    saved_count = 0
+                    if items_list and save:
                         saved_count = await self.save_items_list_to_db(items_list)
                         logger.info(f"已将 {saved_count} 个商品信息保存到数据库")
 
@@ -8404,7 +8528,7 @@ class XianyuLive:
                         "page_size": page_size,
                         "current_count": len(items_list),
                         "items": items_list,
-                        "saved_count": saved_count if items_list else 0,
+                        "saved_count": saved_count,
                         "raw_data": items_data  # 保留原始数据以备调试
                     }
                 else:
@@ -8413,7 +8537,7 @@ class XianyuLive:
                     if 'FAIL_SYS_TOKEN_EXOIRED' in error_msg or 'token' in error_msg.lower():
                         logger.warning(f"Token失效，准备重试: {error_msg}")
                         await asyncio.sleep(0.5)
-                        return await self.get_item_list_info(page_number, page_size, retry_count + 1)
+                        return await self.get_item_list_info(page_number, page_size, retry_count + 1, save)
                     else:
                         logger.error(f"获取商品信息失败: {res_json}")
                         return {"error": f"获取商品信息失败: {error_msg}"}
@@ -8421,64 +8545,135 @@ class XianyuLive:
         except Exception as e:
             logger.error(f"商品信息API请求异常: {self._safe_str(e)}")
             await asyncio.sleep(0.5)
-            return await self.get_item_list_info(page_number, page_size, retry_count + 1)
+            return await self.get_item_list_info(page_number, page_size, retry_count + 1, save)
 
-    async def get_all_items(self, page_size=20, max_pages=None):
-        """获取所有商品信息（自动分页）
+    async def get_all_items(self, page_size=20, max_pages=None, page_concurrency=None):
+        """获取所有商品信息并增量同步到数据库（自动分页）
+
+        每轮并发获取 page_concurrency 页；全部获取完成后按内容哈希与数据库比对，
+        只在一个事务中写入新增或内容变化的商品，并检测已不在列表中的商品
 
         Args:
             page_size (int): 每页数量，默认20
             max_pages (int): 最大页数限制，None表示无限制
+            page_concurrency (int): 并发获取的页数，默认读取 ITEM_SYNC.page_concurrency
 
         Returns:
-            dict: 包含所有商品信息的字典
+            dict: 包含所有商品信息和同步统计的字典
         """
-        all_items = []
-        page_number = 1
-        total_saved = 0
+        sync_config = cfg.get('ITEM_SYNC', {})
+        if page_concurrency is None:
+            page_concurrency = sync_config.get('page_concurrency', 3)
+        page_concurrency = max(1, int(page_concurrency))
+        start_time = time.time()
 
-        logger.info(f"开始获取所有商品信息，每页{page_size}条")
+        logger.info(f"【{self.cookie_id}】开始获取所有商品信息，每页{page_size}条，并发{page_concurrency}页")
 
-        while True:
-            if max_pages and page_number > max_pages:
-                logger.info(f"达到最大页数限制 {max_pages}，停止获取")
-                break
-
-            logger.info(f"正在获取第 {page_number} 页...")
-            result = await self.get_item_list_info(page_number, page_size)
-
-            if not result.get("success"):
-                logger.error(f"获取第 {page_number} 页失败: {result}")
-                break
-
-            current_items = result.get("items", [])
-            if not current_items:
-                logger.info(f"第 {page_number} 页没有数据，获取完成")
-                break
-
-            all_items.extend(current_items)
-            total_saved += result.get("saved_count", 0)
+        async def fetch_page(number):
+            return number, await self.get_item_list_info(number, page_size, save=False)
 
-            logger.info(f"第 {page_number} 页获取到 {len(current_items)} 个商品")
-
-            # 如果当前页商品数量少于页面大小，说明已经是最后一页
-            if len(current_items) < page_size:
-                logger.info(f"第 {page_number} 页商品数量({len(current_items)})少于页面大小({page_size})，获取完成")
+        all_items = {}
+        page_number = 1
+        pages_fetched = 0
+        complete = False  # 是否已获取到最后一页（只有完整扫描才能判断商品是否已下架）
+        error = None
+
+        while not complete and not error:
+            last_page = page_number + page_concurrency - 1
+            if max_pages:
+                last_page = min(last_page, max_pages)
+            if page_number > last_page:
+                logger.info(f"达到最大页数限制 {max_pages}，停止获取")
                 break
 
-            page_number += 1
-
-            # 添加延迟避免请求过快
-            await asyncio.sleep(1)
+            results = await asyncio.gather(*[fetch_page(n) for n in range(page_number, last_page + 1)])
+            for number, result in sorted(results, key=lambda r: r[0]):
+                if not result.get("success"):
+                    error = result.get("error", f"获取第 {number} 页失败")
+                    logger.error(f"获取第 {number} 页失败: {result}")
+                    break
+
+                current_items = result.get("items", [])
+                pages_fetched = number
+                for item in current_items:
+                    if item.get('id'):
+                        all_items[item['id']] = item
+
+                # 当前页商品数量少于页面大小，说明已经是最后一页
+                if len(current_items) < page_size:
+                    logger.info(f"第 {number} 页商品数量({len(current_items)})少于页面大小({page_size})，获取完成")
+                    complete = True
+                    break
+
+            page_number = last_page + 1
+            if not complete and not error:
+                # 每轮之间稍作延迟避免请求过快
+                await asyncio.sleep(1)
+
+        # 与数据库中的内容哈希比对，只写入新增或变化的商品
+        existing = db_manager.get_item_sync_state(self.cookie_id)
+        changed_records = []
+        items_need_detail = []
+        new_count = 0
+        for item_id, item in all_items.items():
+            if item_id.startswith('auto_'):
+                continue
+            content_hash = self._item_content_hash(item)
+            state = existing.get(item_id)
+            if state is None or state['content_hash'] != content_hash:
+                record = self._build_item_record(item)
+                record['content_hash'] = content_hash
+                changed_records.append(record)
+                if state is None:
+                    new_count += 1
+            if state is None or not state['has_detail']:
+                items_need_detail.append({'item_id': item_id, 'item_title': item.get('title', '')})
+
+        written = db_manager.batch_save_item_basic_info(changed_records) if changed_records else 0
+
+        # 检测已不在在售列表中的商品（只有完整扫描且没有出错时才可靠）
+        missing = []
+        deleted = 0
+        if complete and not error:
+            missing = [item_id for item_id in existing if item_id not in all_items and not item_id.startswith('auto_')]
+            if missing and sync_config.get('delete_missing', False):
+                deleted = db_manager.batch_delete_item_info(
+                    [{'cookie_id': self.cookie_id, 'item_id': item_id} for item_id in missing])
+
+        if items_need_detail:
+            auto_fetch_config = cfg.get('ITEM_DETAIL', {}).get('auto_fetch', {})
+            if auto_fetch_config.get('enabled', True):
+                logger.info(f"发现 {len(items_need_detail)} 个商品缺少详情，开始获取...")
+                detail_success_count = await self._fetch_missing_item_details(items_need_detail)
+                logger.info(f"成功获取 {detail_success_count}/{len(items_need_detail)} 个商品的详情")
+
+        stats = {
+            'pages': pages_fetched,
+            'scanned': len(all_items),
+            'new': new_count,
+            'changed': len(changed_records) - new_count,
+            'unchanged': len(all_items) - len(changed_records),
+            'written': written,
+            'missing': len(missing),
+            'deleted': deleted,
+            'complete': complete,
+            'elapsed': round(time.time() - start_time, 2)
+        }
+        logger.info(f"【{self.cookie_id}】商品同步统计: 扫描 {stats['scanned']} 件（{stats['pages']} 页），"
+                    f"新增 {stats['new']}，变化 {stats['changed']}，写入 {stats['written']}，"
+                    f"已下架 {stats['missing']}（删除 {stats['deleted']}），耗时 {stats['elapsed']}秒")
 
-        logger.info(f"所有商品获取完成，共 {len(all_items)} 个商品，保存了 {total_saved} 个")
+        if error and not all_items:
+            return {"success": False, "error": error, "stats": stats}
 
         return {
             "success": True,
-            "total_pages": page_number,
+            "total_pages": pages_fetched,
             "total_count": len(all_items),
-            "total_saved": total_saved,
-            "items": all_items
+            "total_saved": written,
+            "items": list(all_items.values()),
+            "missing_item_ids": missing,
+            "stats": stats
         }
 
     async def send_image_msg(self, ws, cid, toid, image_url, width=800, height=600, card_id=None):
@@ -8497,8 +8692,7 @@ class XianyuLive:
                     logger.info(f"【{self.cookie_id}】准备上传本地图片到闲鱼CDN: {local_image_path}")
 
                     # 使用图片上传器上传到闲鱼CDN
-                    from utils.image_uploader import ImageUploader
-                    uploader = ImageUploader(self.cookies_str)
+                    uploader = await self._create_image_uploader()
 
                     async with uploader:
                         cdn_url = await uploader.upload_image(local_image_path)
@@ -8610,8 +8804,7 @@ class XianyuLive:
             # 上传图片到闲鱼CDN
             logger.info(f"【{self.cookie_id}】开始上传图片: {image_path}")
 
-            from utils.image_uploader import ImageUploader
-            uploader = ImageUploader(self.cookies_str)
+            uploader = await self._create_image_uploader()
 
             async with uploader:
                 image_url = await uploader.upload_image(image_path)
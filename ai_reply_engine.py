@@ -10,16 +10,408 @@ AI回复引擎模块
 """
 
 import os
+import re
+import asyncio
+import contextlib
 import json
 import time
+import hashlib
 import sqlite3
 import requests  # 确保已导入
 import threading
-from typing import List, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Callable, TYPE_CHECKING
 from loguru import logger
-from openai import OpenAI
 from db_manager import db_manager
 
+if TYPE_CHECKING:
+    # openai 导入较慢，只在创建客户端时才导入
+    from openai import OpenAI
+
+
+class ProviderStats:
+    """单个AI服务提供方的延迟/错误统计（EWMA + 最近延迟样本）"""
+
+    def __init__(self, alpha: float = 0.2, window: int = 100):
+        self.alpha = alpha
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.total_calls = 0
+        self.total_errors = 0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, success: bool):
+        """记录一次调用结果"""
+        with self._lock:
+            self.total_calls += 1
+            if success:
+                self._samples.append(latency)
+                if self.latency_ewma is None:
+                    self.latency_ewma = latency
+                else:
+                    self.latency_ewma = self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+            else:
+                self.total_errors += 1
+            self.error_ewma = self.alpha * (0.0 if success else 1.0) + (1 - self.alpha) * self.error_ewma
+
+    def percentile(self, q: float) -> Optional[float]:
+        """返回最近成功调用延迟的分位数，样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < 5:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        with self._lock:
+            return {
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'error_ewma': round(self.error_ewma, 3),
+                'p50': round(p50, 3) if p50 is not None else None,
+                'p95': round(p95, 3) if p95 is not None else None,
+                'total_calls': self.total_calls,
+                'total_errors': self.total_errors,
+            }
+
+
+class AIProviderRouter:
+    """
+    AI服务提供方路由器
+    - 故障转移：按健康度排序候选模型，失败时依次尝试下一个
+    - 对冲请求：主模型超过其p95延迟仍未返回时，并发请求下一个候选，取最先成功的结果
+    - 按提供方记录延迟与错误率的EWMA，用于排序和计算对冲截止时间
+    """
+
+    # 错误率EWMA超过该阈值的提供方会被排到候选链末尾
+    UNHEALTHY_ERROR_RATE = 0.5
+    # 样本不足时使用的默认对冲等待时间（秒）
+    DEFAULT_HEDGE_DELAY = 3.0
+    MIN_HEDGE_DELAY = 0.5
+    MAX_HEDGE_DELAY = 10.0
+
+    def __init__(self, call_fn: Callable[[dict, list], str], max_workers: int = 8):
+        self._call_fn = call_fn
+        self._stats: Dict[str, ProviderStats] = {}
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-provider')
+
+    @staticmethod
+    def provider_key(settings: dict) -> str:
+        return f"{settings.get('base_url', '')}|{settings.get('model_name', '')}"
+
+    def _get_stats(self, key: str) -> ProviderStats:
+        with self._stats_lock:
+            if key not in self._stats:
+                self._stats[key] = ProviderStats()
+            return self._stats[key]
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """获取所有提供方的统计快照"""
+        with self._stats_lock:
+            items = list(self._stats.items())
+        return {key: stats.snapshot() for key, stats in items}
+
+    def order_candidates(self, candidates: List[dict]) -> List[dict]:
+        """健康的提供方保持配置顺序在前，不健康的排到后面"""
+        healthy = []
+        unhealthy = []
+        for candidate in candidates:
+            stats = self._get_stats(self.provider_key(candidate))
+            if stats.error_ewma >= self.UNHEALTHY_ERROR_RATE:
+                unhealthy.append(candidate)
+            else:
+                healthy.append(candidate)
+        return healthy + unhealthy
+
+    def hedge_delay(self, settings: dict) -> float:
+        """根据提供方的p95延迟计算对冲截止时间"""
+        p95 = self._get_stats(self.provider_key(settings)).percentile(0.95)
+        delay = p95 if p95 is not None else self.DEFAULT_HEDGE_DELAY
+        return max(self.MIN_HEDGE_DELAY, min(self.MAX_HEDGE_DELAY, delay))
+
+    def _timed_call(self, settings: dict, messages: list) -> str:
+        key = self.provider_key(settings)
+        start = time.monotonic()
+        try:
+            reply = self._call_fn(settings, messages)
+            if not reply:
+                raise ValueError("AI服务返回空回复")
+        except Exception:
+            self._get_stats(key).record(time.monotonic() - start, False)
+            raise
+        self._get_stats(key).record(time.monotonic() - start, True)
+        return reply
+
+    def call(self, candidates: List[dict], messages: list, hedge: bool = False) -> str:
+        """按候选链调用AI服务，返回第一个成功的回复；全部失败时抛出最后一个异常"""
+        if not candidates:
+            raise ValueError("没有可用的AI服务提供方")
+
+        ordered = self.order_candidates(candidates)
+        pending = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_index
+            candidate = ordered[next_index]
+            next_index += 1
+            future = self._executor.submit(self._timed_call, candidate, messages)
+            pending[future] = candidate
+            return candidate
+
+        current = launch()
+        while pending:
+            timeout = None
+            # 同一时刻最多保留一个对冲请求，避免放大下游负载
+            if hedge and next_index < len(ordered) and len(pending) == 1:
+                timeout = self.hedge_delay(current)
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info(f"AI提供方 {current.get('model_name')} 超过对冲截止时间 {timeout:.2f}s 未响应，发起对冲请求")
+                current = launch()
+                continue
+
+            for future in done:
+                candidate = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"AI提供方 {candidate.get('model_name')} 调用失败: {e}")
+
+            # 有请求失败时立即故障转移到下一个候选（在途请求最多两个）
+            if next_index < len(ordered) and len(pending) < 2:
+                current = launch()
+                logger.info(f"故障转移到备用AI提供方: {current.get('model_name')}")
+
+        raise last_error or Exception("所有AI服务提供方均调用失败")
+
+
+class _KeyedMutexEntry:
+    __slots__ = ('locked', 'refs', 'waiters')
+
+    def __init__(self):
+        self.locked = False
+        self.refs = 0  # 持有者 + 等待者数量
+        self.waiters = deque()
+
+
+def _wake_waiter(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class KeyedMutex:
+    """
+    按key串行化的异步互斥锁
+    - 等待者挂在事件循环的Future上，不占用任何线程
+    - 引用计数归零时立即移除条目，锁表大小只与当前活跃的key数量相关
+    - 锁表本身由 threading.Lock 保护，可被不同线程/事件循环中的协程共同使用
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _KeyedMutexEntry] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    async def acquire(self, key: str):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _KeyedMutexEntry()
+            entry.refs += 1
+            if not entry.locked:
+                entry.locked = True
+                return
+            waiter = (loop, loop.create_future())
+            entry.waiters.append(waiter)
+
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                handed_over = waiter not in entry.waiters
+                if not handed_over:
+                    entry.waiters.remove(waiter)
+                    entry.refs -= 1
+            # 取消时锁已经移交给当前协程，需要继续移交给下一个等待者
+            if handed_over:
+                self.release(key)
+            raise
+
+    def release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.locked:
+                raise RuntimeError(f"释放未持有的锁: {key}")
+            entry.refs -= 1
+            while entry.waiters:
+                loop, future = entry.waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(_wake_waiter, future)
+                    return
+                except RuntimeError:
+                    # 等待者所在的事件循环已关闭，跳过
+                    entry.refs -= 1
+            entry.locked = False
+            if entry.refs == 0:
+                del self._entries[key]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key: str):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+
+class PromptBuilder:
+    """
+    AI回复提示词组装
+    - 按 item_id 缓存精简后的商品描述（ai_item_cache 表），源数据变化时自动重建
+    - 按token预算裁剪：先丢弃较早的对话历史，再压缩商品描述，用户消息和议价设置始终保留
+    - 商品信息放在用户提示词最前面，同一商品的多轮对话共享稳定前缀，便于服务端前缀缓存命中
+    """
+
+    TOKEN_BUDGET = 1200
+    ITEM_DESC_MAX_TOKENS = 300
+    ITEM_DESC_MIN_TOKENS = 60
+    MESSAGE_MAX_TOKENS = 200
+    CONTEXT_TURN_MAX_TOKENS = 80
+    MAX_CONTEXT_TURNS = 10
+    MIN_CONTEXT_TURNS = 2
+
+    _URL_PATTERN = re.compile(r'https?://\S+')
+    _SPACE_PATTERN = re.compile(r'[ \t　]+')
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """粗略估算token数：中日韩字符按1个token计，其余字符按4个字符1个token计"""
+        if not text:
+            return 0
+        cjk = sum(1 for ch in text if '⺀' <= ch <= '鿿' or '豈' <= ch <= '﫿' or '＀' <= ch <= '￯')
+        return cjk + (len(text) - cjk + 3) // 4
+
+    @classmethod
+    def truncate_to_tokens(cls, text: str, max_tokens: int) -> str:
+        """将文本截断到不超过max_tokens（按估算）"""
+        if not text or cls.estimate_tokens(text) <= max_tokens:
+            return text or ''
+        cost = 0.0
+        for index, ch in enumerate(text):
+            is_cjk = '⺀' <= ch <= '鿿' or '豈' <= ch <= '﫿' or '＀' <= ch <= '￯'
+            cost += 1 if is_cjk else 0.25
+            if cost > max_tokens - 1:
+                return text[:index].rstrip() + '…'
+        return text
+
+    @classmethod
+    def _condense_text(cls, raw: str) -> str:
+        """清理商品描述：解析JSON详情、去掉链接、合并空白、去除重复行"""
+        text = raw or ''
+        if text.strip().startswith('{'):
+            try:
+                detail = json.loads(text)
+                if isinstance(detail, dict):
+                    text = detail.get('desc') or detail.get('description') or detail.get('title') or ''
+            except (json.JSONDecodeError, TypeError):
+                pass
+        text = cls._URL_PATTERN.sub('', str(text))
+        lines = []
+        seen = set()
+        for line in text.splitlines():
+            line = cls._SPACE_PATTERN.sub(' ', line).strip()
+            if line and line not in seen:
+                seen.add(line)
+                lines.append(line)
+        return '\n'.join(lines)
+
+    def get_item_description(self, item_id: str, item_info: dict) -> str:
+        """获取精简后的商品描述，命中 ai_item_cache 时直接复用"""
+        raw_desc = str(item_info.get('desc') or '')
+        source_hash = hashlib.md5(raw_desc.encode('utf-8')).hexdigest()
+
+        if item_id:
+            cached = db_manager.get_ai_item_cache(item_id)
+            if cached and cached['data'].get('source_hash') == source_hash:
+                return cached['description']
+
+        condensed = self.truncate_to_tokens(self._condense_text(raw_desc), self.ITEM_DESC_MAX_TOKENS) or '无'
+
+        if item_id:
+            price = item_info.get('price')
+            db_manager.save_ai_item_cache(
+                item_id,
+                {'source_hash': source_hash, 'title': item_info.get('title', '')},
+                price=price if isinstance(price, (int, float)) else None,
+                description=condensed
+            )
+        return condensed
+
+    def _render(self, item_info: dict, item_desc: str, turns: List[str], bargain: dict, message: str) -> str:
+        context_str = "\n".join(turns)
+        return f"""商品信息：
+商品标题: {item_info.get('title', '未知')}
+商品价格: {item_info.get('price', '未知')}元
+商品描述: {item_desc}
+
+对话历史：
+{context_str}
+
+议价设置：
+- 当前议价次数：{bargain['bargain_count']}
+- 最大议价轮数：{bargain['max_bargain_rounds']}
+- 最大优惠百分比：{bargain['max_discount_percent']}%
+- 最大优惠金额：{bargain['max_discount_amount']}元
+
+用户消息：{message}
+
+请根据以上信息生成回复："""
+
+    def build_user_prompt(self, item_id: str, item_info: dict, context: List[Dict], bargain: dict, message: str) -> str:
+        """在token预算内组装用户提示词"""
+        message = self.truncate_to_tokens(message, self.MESSAGE_MAX_TOKENS)
+        item_desc = self.get_item_description(item_id, item_info)
+        turns = [
+            f"{msg['role']}: {self.truncate_to_tokens(msg['content'], self.CONTEXT_TURN_MAX_TOKENS)}"
+            for msg in context[-self.MAX_CONTEXT_TURNS:]
+        ]
+
+        prompt = self._render(item_info, item_desc, turns, bargain, message)
+        overflow = self.estimate_tokens(prompt) - self.TOKEN_BUDGET
+
+        # 1. 丢弃较早的对话历史（至少保留 MIN_CONTEXT_TURNS 条）
+        while overflow > 0 and len(turns) > self.MIN_CONTEXT_TURNS:
+            overflow -= self.estimate_tokens(turns.pop(0)) + 1
+
+        # 2. 压缩商品描述
+        if overflow > 0:
+            desc_tokens = self.estimate_tokens(item_desc)
+            target = max(self.ITEM_DESC_MIN_TOKENS, desc_tokens - overflow)
+            if target < desc_tokens:
+                item_desc = self.truncate_to_tokens(item_desc, target)
+
+        # 3. 仍超出预算时丢弃剩余历史
+        prompt = self._render(item_info, item_desc, turns, bargain, message)
+        while self.estimate_tokens(prompt) > self.TOKEN_BUDGET and turns:
+            turns.pop(0)
+            prompt = self._render(item_info, item_desc, turns, bargain, message)
+
+        logger.debug(f"提示词组装完成: 约{self.estimate_tokens(prompt)} tokens, 历史{len(turns)}条")
+        return prompt
+
 
 class AIReplyEngine:
     """AI回复引擎"""
@@ -30,9 +422,13 @@ class AIReplyEngine:
         # self.agents = {}   # 已移除
         # self.client_last_used = {}  # 已移除
         self._init_default_prompts()
-        # 用于控制同一chat_id消息的串行处理
-        self._chat_locks = {}
-        self._chat_locks_lock = threading.Lock()
+        # 用于控制同一chat_id消息的串行处理（空闲即回收，锁表大小只与活跃对话数相关）
+        self._chat_mutex = KeyedMutex()
+        # 多提供方路由（故障转移 + 对冲请求）
+        self.provider_router = AIProviderRouter(self._call_provider)
+        # 带token预算的提示词组装
+        self.prompt_builder = PromptBuilder()
+        self._system_prompt_cache = {}
     
     def _init_default_prompts(self):
         """初始化默认提示词"""
@@ -59,7 +455,19 @@ class AIReplyEngine:
 注意：结合商品信息，给出实用建议。'''
         }
     
-    def _create_openai_client(self, cookie_id: str) -> Optional[OpenAI]:
+    def _get_system_prompt(self, intent: str, custom_prompts_raw: str) -> str:
+        """获取系统提示词，相同配置复用同一字符串，保证提示词前缀稳定"""
+        key = (intent, custom_prompts_raw or '')
+        prompt = self._system_prompt_cache.get(key)
+        if prompt is None:
+            custom_prompts = json.loads(custom_prompts_raw) if custom_prompts_raw else {}
+            prompt = custom_prompts.get(intent, self.default_prompts[intent])
+            if len(self._system_prompt_cache) >= 256:
+                self._system_prompt_cache.clear()
+            self._system_prompt_cache[key] = prompt
+        return prompt
+
+    def _create_openai_client(self, cookie_id: str) -> Optional['OpenAI']:
         """
         (原 get_client) 创建指定账号的OpenAI客户端
         修复 P0-2: 移除了缓存逻辑，以支持多进程无状态部署
@@ -67,8 +475,13 @@ class AIReplyEngine:
         settings = db_manager.get_ai_reply_settings(cookie_id)
         if not settings['ai_enabled'] or not settings['api_key']:
             return None
-        
+        return self._build_openai_client(settings, cookie_id)
+
+    def _build_openai_client(self, settings: dict, cookie_id: str = '') -> Optional['OpenAI']:
+        """根据给定的提供方配置创建OpenAI客户端"""
         try:
+            from openai import OpenAI
+
             logger.info(f"创建新的OpenAI客户端实例 {cookie_id}: base_url={settings['base_url']}, api_key={'***' + settings['api_key'][-4:] if settings['api_key'] else 'None'}")
             client = OpenAI(
                 api_key=settings['api_key'],
@@ -80,6 +493,65 @@ class AIReplyEngine:
             logger.error(f"创建OpenAI客户端失败 {cookie_id}: {e}")
             return None
 
+    def _get_provider_chain(self, settings: dict) -> List[dict]:
+        """
+        根据AI回复设置构建提供方候选链：主模型 + fallback_models 中声明的备用模型
+        fallback_models 为JSON数组，元素可以是模型名字符串，或包含 model_name/api_key/base_url 的对象，
+        未填写的 api_key/base_url 继承主模型配置
+        """
+        primary = {
+            'model_name': settings.get('model_name', ''),
+            'api_key': settings.get('api_key', ''),
+            'base_url': settings.get('base_url', ''),
+        }
+        chain = [primary]
+
+        raw = settings.get('fallback_models') or ''
+        if not raw:
+            return chain
+        try:
+            fallbacks = json.loads(raw) if isinstance(raw, str) else raw
+        except json.JSONDecodeError as e:
+            logger.warning(f"备用模型配置解析失败，忽略: {e}")
+            return chain
+        if not isinstance(fallbacks, list):
+            logger.warning(f"备用模型配置应为JSON数组，忽略: {raw}")
+            return chain
+
+        for entry in fallbacks:
+            if isinstance(entry, str):
+                entry = {'model_name': entry}
+            if not isinstance(entry, dict) or not entry.get('model_name'):
+                continue
+            candidate = {
+                'model_name': entry['model_name'],
+                'api_key': entry.get('api_key') or primary['api_key'],
+                'base_url': entry.get('base_url') or primary['base_url'],
+            }
+            if candidate['api_key'] and candidate not in chain:
+                chain.append(candidate)
+        return chain
+
+    def _call_provider(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """按提供方类型分发调用（DashScope / Gemini / OpenAI兼容）"""
+        if self._is_dashscope_api(settings):
+            logger.info(f"使用DashScope API生成回复")
+            return self._call_dashscope_api(settings, messages, max_tokens=max_tokens, temperature=temperature)
+
+        if self._is_gemini_api(settings):
+            logger.info(f"使用Gemini API生成回复")
+            return self._call_gemini_api(settings, messages, max_tokens=max_tokens, temperature=temperature)
+
+        logger.info(f"使用OpenAI兼容API生成回复")
+        client = self._build_openai_client(settings)
+        if not client:
+            raise Exception(f"创建OpenAI客户端失败: {settings.get('base_url')}")
+        return self._call_openai_api(client, settings, messages, max_tokens=max_tokens, temperature=temperature)
+
+    def get_provider_stats(self) -> Dict[str, Dict]:
+        """获取各AI提供方的延迟/错误率统计"""
+        return self.provider_router.get_stats()
+
     def _is_dashscope_api(self, settings: dict) -> bool:
         """判断是否为DashScope API - 只有选择自定义模型时才使用"""
         model_name = settings.get('model_name', '')
@@ -219,7 +691,7 @@ class AIReplyEngine:
             logger.error(f"Gemini API 响应格式错误: {result} - {e}")
             raise Exception(f"Gemini API 响应格式错误: {result}")
 
-    def _call_openai_api(self, client: OpenAI, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+    def _call_openai_api(self, client: 'OpenAI', settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
         """调用OpenAI兼容API"""
         try:
             logger.info(f"调用OpenAI API: model={settings['model_name']}, base_url={settings.get('base_url', 'default')}")
@@ -282,144 +754,50 @@ class AIReplyEngine:
             logger.error(f"本地意图检测失败 {cookie_id}: {e}")
             return 'default'
     
-    def _get_chat_lock(self, chat_id: str) -> threading.Lock:
-        """获取指定chat_id的锁，如果不存在则创建"""
-        with self._chat_locks_lock:
-            if chat_id not in self._chat_locks:
-                self._chat_locks[chat_id] = threading.Lock()
-            return self._chat_locks[chat_id]
-    
     def generate_reply(self, message: str, item_info: dict, chat_id: str,
                       cookie_id: str, user_id: str, item_id: str,
                       skip_wait: bool = False) -> Optional[str]:
-        """生成AI回复"""
-        if not self.is_ai_enabled(cookie_id):
-            return None
-        
+        """
+        生成AI回复（同步入口）
+        在当前线程中新建事件循环执行 `generate_reply_async`，不可在事件循环线程内调用
+        """
+        return asyncio.run(self.generate_reply_async(message, item_info, chat_id, cookie_id, user_id, item_id, skip_wait))
+
+    async def generate_reply_async(self, message: str, item_info: dict, chat_id: str,
+                                   cookie_id: str, user_id: str, item_id: str,
+                                   skip_wait: bool = False) -> Optional[str]:
+        """
+        生成AI回复（异步入口）
+        数据库和模型调用在线程池中执行；等待同一chat_id的锁和10秒收集窗口时不占用线程池线程
+        """
         try:
+            if not await asyncio.to_thread(self.is_ai_enabled, cookie_id):
+                return None
+
             # 先检测意图（用于后续保存）
-            intent = self.detect_intent(message, cookie_id)
+            intent = await asyncio.to_thread(self.detect_intent, message, cookie_id)
             logger.info(f"检测到意图: {intent} (账号: {cookie_id})")
-            
+
             # 在锁外先保存用户消息到数据库，让所有消息都能立即保存
-            message_created_at = self.save_conversation(chat_id, cookie_id, user_id, item_id, "user", message, intent)
-            
+            message_created_at = await asyncio.to_thread(
+                self.save_conversation, chat_id, cookie_id, user_id, item_id, "user", message, intent
+            )
+
             # 如果调用方已经实现了去抖（debounce），可以通过 skip_wait=True 跳过内部等待
             if not skip_wait:
                 logger.info(f"【{cookie_id}】消息已保存，等待10秒收集后续消息: {message[:20]}... (时间:{message_created_at})")
                 # 固定等待10秒，等待可能的后续消息（在锁外延迟，避免阻塞其他消息保存）
-                time.sleep(10)
+                await asyncio.sleep(10)
             else:
                 logger.info(f"【{cookie_id}】消息已保存（外部防抖已启用，跳过内部等待）: {message[:20]}... (时间:{message_created_at})")
-            
-            # 获取该chat_id的锁，确保同一对话的消息串行处理
-            chat_lock = self._get_chat_lock(chat_id)
-            
-            # 使用锁确保同一chat_id的消息串行处理
-            with chat_lock:
-                # 获取最近时间窗口内的所有用户消息
-                # 如果 skip_wait=True（外部防抖），查询窗口为6秒（1秒防抖 + 5秒缓冲）
-                # 如果 skip_wait=False（内部等待），查询窗口为25秒（10秒等待 + 10秒消息间隔 + 5秒缓冲）
-                query_seconds = 6 if skip_wait else 25
-                recent_messages = self._get_recent_user_messages(chat_id, cookie_id, seconds=query_seconds)
-                logger.info(f"【{cookie_id}】最近{query_seconds}秒内的消息: {[msg['content'][:20] for msg in recent_messages]}")
-                
-                if recent_messages and len(recent_messages) > 0:
-                    # 只处理最后一条消息（时间戳最新的）
-                    latest_message = recent_messages[-1]
-                    if message_created_at != latest_message['created_at']:
-                        logger.info(f"【{cookie_id}】检测到有更新的消息，跳过当前消息: {message[:20]}... (时间:{message_created_at})，最新消息: {latest_message['content'][:20]}... (时间:{latest_message['created_at']})")
-                        return None
-                    else:
-                        logger.info(f"【{cookie_id}】当前消息是最新消息，开始处理: {message[:20]}... (时间:{message_created_at})")
-                
-                # 1. 获取AI回复设置
-                settings = db_manager.get_ai_reply_settings(cookie_id)
-
-                # 3. 获取对话历史
-                context = self.get_conversation_context(chat_id, cookie_id)
-
-                # 4. 获取议价次数
-                bargain_count = self.get_bargain_count(chat_id, cookie_id)
 
-                # 5. 检查议价轮数限制 (P0-1 竞争条件风险点 - 遵照指示未修改)
-                if intent == "price":
-                    max_bargain_rounds = settings.get('max_bargain_rounds', 3)
-                    if bargain_count >= max_bargain_rounds:
-                        logger.info(f"议价次数已达上限 ({bargain_count}/{max_bargain_rounds})，拒绝继续议价")
-                        refuse_reply = f"抱歉，这个价格已经是最优惠的了，不能再便宜了哦！"
-                        self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", refuse_reply, intent)
-                        return refuse_reply
-
-                # 6. 构建提示词
-                custom_prompts = json.loads(settings['custom_prompts']) if settings['custom_prompts'] else {}
-                system_prompt = custom_prompts.get(intent, self.default_prompts[intent])
-
-                # 7. 构建商品信息
-                item_desc = f"商品标题: {item_info.get('title', '未知')}\n"
-                item_desc += f"商品价格: {item_info.get('price', '未知')}元\n"
-                item_desc += f"商品描述: {item_info.get('desc', '无')}"
-
-                # 8. 构建对话历史
-                context_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in context[-10:]])  # 最近10条
-
-                # 9. 构建用户消息
-                max_bargain_rounds = settings.get('max_bargain_rounds', 3)
-                max_discount_percent = settings.get('max_discount_percent', 10)
-                max_discount_amount = settings.get('max_discount_amount', 100)
-
-                user_prompt = f"""商品信息：
-{item_desc}
-
-对话历史：
-{context_str}
-
-议价设置：
-- 当前议价次数：{bargain_count}
-- 最大议价轮数：{max_bargain_rounds}
-- 最大优惠百分比：{max_discount_percent}%
-- 最大优惠金额：{max_discount_amount}元
-
-用户消息：{message}
-
-请根据以上信息生成回复："""
+            # 使用按chat_id的异步互斥锁确保同一对话的消息串行处理
+            async with self._chat_mutex.hold(chat_id):
+                return await asyncio.to_thread(
+                    self._generate_reply_locked, message, item_info, chat_id, cookie_id,
+                    user_id, item_id, intent, message_created_at, skip_wait
+                )
 
-                # 10. 调用AI生成回复
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-
-                reply = None # 初始化 reply 变量
-
-                if self._is_dashscope_api(settings):
-                    logger.info(f"使用DashScope API生成回复")
-                    reply = self._call_dashscope_api(settings, messages, max_tokens=100, temperature=0.7)
-                
-                elif self._is_gemini_api(settings):
-                    logger.info(f"使用Gemini API生成回复")
-                    reply = self._call_gemini_api(settings, messages, max_tokens=100, temperature=0.7)
-                
-                else:
-                    logger.info(f"使用OpenAI兼容API生成回复")
-                    # 修复 P0-2: 调用已修改的无状态客户端创建方法
-                    client = self._create_openai_client(cookie_id)
-                    if not client:
-                        return None
-                    logger.info(f"messages:{messages}")
-                    reply = self._call_openai_api(client, settings, messages, max_tokens=100, temperature=0.7)
-
-                # 11. 保存AI回复到对话记录
-                self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", reply, intent)
-
-                # 12. 更新议价次数 (此方法已在 get_bargain_count 中通过 SQL COUNT(*) 隐式实现)
-                if intent == "price":
-                    # self.increment_bargain_count(chat_id, cookie_id) # 此行原先就没有，保持不变
-                    pass
-                
-                logger.info(f"AI回复生成成功 (账号: {cookie_id}): {reply}")
-                return reply
-                
         except Exception as e:
             logger.error(f"AI回复生成失败 {cookie_id}: {e}")
             if hasattr(e, 'response') and hasattr(e.response, 'url'):
@@ -428,20 +806,78 @@ class AIReplyEngine:
                 logger.error(f"请求URL: {e.request.url}")
             return None
 
-    async def generate_reply_async(self, message: str, item_info: dict, chat_id: str,
-                                   cookie_id: str, user_id: str, item_id: str,
-                                   skip_wait: bool = False) -> Optional[str]:
-        """
-        异步包装器：在独立线程池中执行同步的 `generate_reply`，并返回结果。
-        这样可以在异步代码中直接 await，而不阻塞事件循环。
-        """
-        try:
-            import asyncio as _asyncio
-            return await _asyncio.to_thread(self.generate_reply, message, item_info, chat_id, cookie_id, user_id, item_id, skip_wait)
-        except Exception as e:
-            logger.error(f"异步生成回复失败: {e}")
-            return None
-    
+    def _generate_reply_locked(self, message: str, item_info: dict, chat_id: str,
+                               cookie_id: str, user_id: str, item_id: str,
+                               intent: str, message_created_at: Optional[str],
+                               skip_wait: bool) -> Optional[str]:
+        """持有chat_id锁时执行：合并最近消息、组装提示词并调用模型"""
+        # 获取最近时间窗口内的所有用户消息
+        # 如果 skip_wait=True（外部防抖），查询窗口为6秒（1秒防抖 + 5秒缓冲）
+        # 如果 skip_wait=False（内部等待），查询窗口为25秒（10秒等待 + 10秒消息间隔 + 5秒缓冲）
+        query_seconds = 6 if skip_wait else 25
+        recent_messages = self._get_recent_user_messages(chat_id, cookie_id, seconds=query_seconds)
+        logger.info(f"【{cookie_id}】最近{query_seconds}秒内的消息: {[msg['content'][:20] for msg in recent_messages]}")
+        
+        if recent_messages and len(recent_messages) > 0:
+            # 只处理最后一条消息（时间戳最新的）
+            latest_message = recent_messages[-1]
+            if message_created_at != latest_message['created_at']:
+                logger.info(f"【{cookie_id}】检测到有更新的消息，跳过当前消息: {message[:20]}... (时间:{message_created_at})，最新消息: {latest_message['content'][:20]}... (时间:{latest_message['created_at']})")
+                return None
+            else:
+                logger.info(f"【{cookie_id}】当前消息是最新消息，开始处理: {message[:20]}... (时间:{message_created_at})")
+        
+        # 1. 获取AI回复设置
+        settings = db_manager.get_ai_reply_settings(cookie_id)
+
+        # 3. 获取对话历史
+        context = self.get_conversation_context(chat_id, cookie_id)
+
+        # 4. 获取议价次数
+        bargain_count = self.get_bargain_count(chat_id, cookie_id)
+
+        # 5. 检查议价轮数限制 (P0-1 竞争条件风险点 - 遵照指示未修改)
+        if intent == "price":
+            max_bargain_rounds = settings.get('max_bargain_rounds', 3)
+            if bargain_count >= max_bargain_rounds:
+                logger.info(f"议价次数已达上限 ({bargain_count}/{max_bargain_rounds})，拒绝继续议价")
+                refuse_reply = f"抱歉，这个价格已经是最优惠的了，不能再便宜了哦！"
+                self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", refuse_reply, intent)
+                return refuse_reply
+
+        # 6. 构建提示词（系统提示词保持稳定前缀）
+        system_prompt = self._get_system_prompt(intent, settings['custom_prompts'])
+
+        # 7. 在token预算内组装商品信息、对话历史、议价设置和用户消息
+        bargain = {
+            'bargain_count': bargain_count,
+            'max_bargain_rounds': settings.get('max_bargain_rounds', 3),
+            'max_discount_percent': settings.get('max_discount_percent', 10),
+            'max_discount_amount': settings.get('max_discount_amount', 100),
+        }
+        user_prompt = self.prompt_builder.build_user_prompt(item_id, item_info, context, bargain, message)
+
+        # 8. 调用AI生成回复
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        # 通过提供方路由调用：主模型失败时故障转移，启用对冲时慢请求会并发请求备用模型
+        provider_chain = self._get_provider_chain(settings)
+        reply = self.provider_router.call(provider_chain, messages, hedge=bool(settings.get('hedge_enabled')))
+
+        # 9. 保存AI回复到对话记录
+        self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", reply, intent)
+
+        # 10. 更新议价次数 (此方法已在 get_bargain_count 中通过 SQL COUNT(*) 隐式实现)
+        if intent == "price":
+            # self.increment_bargain_count(chat_id, cookie_id) # 此行原先就没有，保持不变
+            pass
+        
+        logger.info(f"AI回复生成成功 (账号: {cookie_id}): {reply}")
+        return reply
+
     def get_conversation_context(self, chat_id: str, cookie_id: str, limit: int = 20) -> List[Dict]:
         """获取对话上下文"""
         try:
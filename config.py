@@ -101,6 +101,90 @@ SLIDER_VERIFICATION = config.get('SLIDER_VERIFICATION', {
     'max_concurrent': 3,
     'wait_timeout': 60
 })
+BROWSER_POOL_CONFIG = config.get('BROWSER_POOL', {
+    'max_browsers': 1,
+    'max_contexts': 6,
+    'idle_timeout': 300,
+    'acquire_timeout': 60,
+    'warm_pages': 2,
+    'reap_interval': 30,
+    'max_browser_rss_mb': 800,
+    'max_total_rss_mb': 1500,
+    'max_uses': 200
+})
+ADAPTIVE_CONCURRENCY_CONFIG = config.get('ADAPTIVE_CONCURRENCY', {
+    'initial_limit': 3,
+    'min_limit': 1,
+    'max_limit': 10,
+    'latency_threshold': 15,
+    'backoff_factor': 0.5,
+    'error_factor': 0.75,
+    'captcha_cooldown': 30
+})
+ORDER_REFRESH_CONFIG = config.get('ORDER_REFRESH', {
+    'workers': 2,
+    'max_concurrent': 3,
+    'chunk_size': 20,
+    'max_orders_per_account': 1000,
+    'history_size': 50,
+    'max_attempts': 6,
+    'backoff_base': 300,
+    'backoff_max': 86400,
+    'pending_backoff_max': 3600,
+    'lease_ttl': 60
+})
+SHARDING_CONFIG = config.get('SHARDING', {
+    'enabled': False,
+    'workers': 2,
+    'vnodes': 100,
+    'health_interval': 10,
+    'restart_on_crash': True,
+    'ack_timeout': 30
+})
+API_SERVER_CONFIG = config.get('API_SERVER', {
+    'mode': 'thread',
+    'workers': 1,
+    'rpc_host': '127.0.0.1',
+    'rpc_port': 0
+})
+STARTUP_CONFIG = config.get('STARTUP', {
+    'rate': 2,
+    'burst': 5,
+    'max_connecting': 10,
+    'connect_timeout': 120,
+    'token_cache': True,
+    'import_budget_ms': {'XianyuAutoAsync': 1500, 'reply_server': 2500}
+})
+REFRESH_SCHEDULER_CONFIG = config.get('REFRESH_SCHEDULER', {
+    'max_token_concurrent': 5,
+    'max_browser_concurrent': 2,
+    'jitter': 0.1,
+    'initial_spread': 600,
+    'idle_slack': 30,
+    'make_before_break': True,
+    'replay_window': 30
+})
+HTTP_POOL_CONFIG = config.get('HTTP_POOL', {
+    'limit': 100,
+    'limit_per_host': 20,
+    'accounts_per_connector': 10,
+    'dns_cache_ttl': 300,
+    'keepalive_timeout': 30,
+    'timeout': 30
+})
+JS_WORKER_CONFIG = config.get('JS_WORKER', {
+    'enabled': True,
+    'workers': 2,
+    'call_timeout': 10
+})
+HEARTBEAT_SCHEDULER_CONFIG = config.get('HEARTBEAT_SCHEDULER', {
+    'enabled': True,
+    'tick': 1,
+    'max_missed': 2,
+    'max_send_failures': 3,
+    'send_timeout': 2,
+    'rtt_window': 100
+})
 API_ENDPOINTS = config.get('API_ENDPOINTS', {})
 DEFAULT_HEADERS = config.get('DEFAULT_HEADERS', {})
 WEBSOCKET_HEADERS = config.get('WEBSOCKET_HEADERS', {})
@@ -115,6 +199,20 @@ AUTO_REPLY = config.get('AUTO_REPLY', {
     }
 })
 MANUAL_MODE = config.get('MANUAL_MODE', {})
+NOTIFICATION_CONFIG = config.get('NOTIFICATION', {
+    'timeout': 10,
+    'connect_timeout': 5,
+    'pool_limit': 100,
+    'pool_limit_per_host': 10,
+    'dns_cache_ttl': 300,
+    'batch_window': 3,
+    'max_retries': 3,
+    'retry_base_delay': 2,
+    'smtp_workers': 4,
+    'smtp_max_connections': 2,
+    'smtp_idle_timeout': 60,
+    'smtp_timeout': 30
+})
 LOG_CONFIG = config.get('LOG_CONFIG', {}) 
 _cookies_raw = config.get('COOKIES', [])
 if isinstance(_cookies_raw, list):
@@ -1,8 +1,12 @@
 from __future__ import annotations
 import asyncio
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 from loguru import logger
 from db_manager import db_manager
+from utils.heartbeat_scheduler import HeartbeatScheduler
+from utils.item_sync_scheduler import ItemSyncScheduler
+from utils.refresh_scheduler import RefreshScheduler
+from utils.startup_scheduler import StartupScheduler
 
 __all__ = ["CookieManager", "manager"]
 
@@ -10,14 +14,62 @@ __all__ = ["CookieManager", "manager"]
 class CookieManager:
     """管理多账号 Cookie 及其对应的 XianyuLive 任务和关键字"""
 
-    def __init__(self, loop: asyncio.AbstractEventLoop):
+    def __init__(self, loop: asyncio.AbstractEventLoop, shard_supervisor=None):
+        """
+        Args:
+            loop: 运行账号任务的事件循环
+            shard_supervisor: 账号分片管理器（utils.account_sharding.ShardSupervisor），
+                设置后账号运行在工作进程中，本进程只转发控制命令
+        """
         self.loop = loop
+        self.shard_supervisor = shard_supervisor
         self.cookies: Dict[str, str] = {}
         self.tasks: Dict[str, asyncio.Task] = {}
         self.keywords: Dict[str, List[Tuple[str, str]]] = {}
         self.cookie_status: Dict[str, bool] = {}  # 账号启用状态
         self.auto_confirm_settings: Dict[str, bool] = {}  # 自动确认发货设置
         self._task_locks: Dict[str, asyncio.Lock] = {}  # 每个cookie_id的任务锁，防止重复创建
+        # 所有账号共享的商品同步调度器
+        from config import config
+        item_sync_config = config.get('ITEM_SYNC', {})
+        self.item_sync_scheduler = ItemSyncScheduler(
+            loop,
+            max_concurrent=item_sync_config.get('max_concurrent', 3),
+            jitter=item_sync_config.get('jitter', 0.1),
+            initial_spread=item_sync_config.get('initial_spread', 120)
+        )
+        # 所有账号共享的 token/Cookie 刷新调度器
+        from config import REFRESH_SCHEDULER_CONFIG
+        self.refresh_scheduler = RefreshScheduler(
+            loop,
+            max_token_concurrent=REFRESH_SCHEDULER_CONFIG.get('max_token_concurrent', 5),
+            max_browser_concurrent=REFRESH_SCHEDULER_CONFIG.get('max_browser_concurrent', 2),
+            jitter=REFRESH_SCHEDULER_CONFIG.get('jitter', 0.1),
+            initial_spread=REFRESH_SCHEDULER_CONFIG.get('initial_spread', 600),
+            idle_slack=REFRESH_SCHEDULER_CONFIG.get('idle_slack', 30)
+        )
+        # 所有账号共享的心跳调度器
+        from config import HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HEARTBEAT_SCHEDULER_CONFIG
+        self.heartbeat_scheduler = HeartbeatScheduler(
+            loop,
+            interval=HEARTBEAT_INTERVAL,
+            timeout=HEARTBEAT_TIMEOUT,
+            tick=HEARTBEAT_SCHEDULER_CONFIG.get('tick', 1),
+            max_missed=HEARTBEAT_SCHEDULER_CONFIG.get('max_missed', 2),
+            max_send_failures=HEARTBEAT_SCHEDULER_CONFIG.get('max_send_failures', 3),
+            send_timeout=HEARTBEAT_SCHEDULER_CONFIG.get('send_timeout', 2),
+            rtt_window=HEARTBEAT_SCHEDULER_CONFIG.get('rtt_window', 100),
+            enabled=HEARTBEAT_SCHEDULER_CONFIG.get('enabled', True)
+        )
+        # 启动时按速率放行账号任务
+        from config import STARTUP_CONFIG
+        self.startup_scheduler = StartupScheduler(
+            self,
+            rate=STARTUP_CONFIG.get('rate', 2),
+            burst=STARTUP_CONFIG.get('burst', 5),
+            max_connecting=STARTUP_CONFIG.get('max_connecting', 10),
+            connect_timeout=STARTUP_CONFIG.get('connect_timeout', 120)
+        )
         self._load_from_db()
 
     def _load_from_db(self):
@@ -59,6 +111,10 @@ class CookieManager:
     # ------------------------ 内部协程 ------------------------
     async def _run_xianyu(self, cookie_id: str, cookie_value: str, user_id: int = None):
         """在事件循环中启动 XianyuLive.main"""
+        if self.shard_supervisor:
+            await self._run_sharded(cookie_id, cookie_value, user_id)
+            return
+
         logger.info(f"【{cookie_id}】_run_xianyu方法开始执行...")
 
         try:
@@ -109,7 +165,16 @@ class CookieManager:
             except:
                 pass
 
-    async def _add_cookie_async(self, cookie_id: str, cookie_value: str, user_id: int = None):
+    async def _run_sharded(self, cookie_id: str, cookie_value: str, user_id: int = None):
+        """分片模式：账号运行在所属工作进程中，本任务代表其运行状态，启动时通知工作进程启动，被取消时通知其停止"""
+        self.shard_supervisor.start_account(cookie_id, cookie_value, user_id)
+        logger.info(f"【{cookie_id}】已转发到工作进程 {self.shard_supervisor.owner_of(cookie_id)}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.shard_supervisor.stop_account(cookie_id)
+
+    async def _add_cookie_async(self, cookie_id: str, cookie_value: str, user_id: int = None, save_to_db: bool = True):
         # 获取或创建该cookie_id的锁
         if cookie_id not in self._task_locks:
             self._task_locks[cookie_id] = asyncio.Lock()
@@ -138,7 +203,8 @@ class CookieManager:
             
             self.cookies[cookie_id] = cookie_value
             # 保存到数据库，如果没有指定user_id，则保持原有绑定关系
-            db_manager.save_cookie(cookie_id, cookie_value, user_id)
+            if save_to_db:
+                db_manager.save_cookie(cookie_id, cookie_value, user_id)
 
             # 获取实际保存的user_id（如果没有指定，数据库会返回实际的user_id）
             actual_user_id = user_id
@@ -174,15 +240,41 @@ class CookieManager:
             
             self.cookies.pop(cookie_id, None)
             self.keywords.pop(cookie_id, None)
+            self.item_sync_scheduler.unregister(cookie_id)
+            self.refresh_scheduler.unregister(cookie_id)
+            self.heartbeat_scheduler.unregister(cookie_id)
             # 清理锁
             self._task_locks.pop(cookie_id, None)
             # 从数据库删除
             db_manager.delete_cookie(cookie_id)
             logger.info(f"已移除账号: {cookie_id}")
 
+    async def _cancel_task_async(self, cookie_id: str):
+        """停止账号任务但保留账号数据（分片工作进程停止或迁移账号时使用）"""
+        if cookie_id not in self._task_locks:
+            self._task_locks[cookie_id] = asyncio.Lock()
+
+        async with self._task_locks[cookie_id]:
+            task = self.tasks.pop(cookie_id, None)
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await asyncio.wait_for(task, timeout=10.0)
+                except asyncio.TimeoutError:
+                    logger.warning(f"【{cookie_id}】等待任务停止超时（10秒），强制继续")
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.error(f"等待任务清理时出错: {cookie_id}, {e}")
+            self.item_sync_scheduler.unregister(cookie_id)
+            self.refresh_scheduler.unregister(cookie_id)
+            self.heartbeat_scheduler.unregister(cookie_id)
+            logger.info(f"已停止账号任务: {cookie_id}")
+
     # ------------------------ 对外线程安全接口 ------------------------
-    def add_cookie(self, cookie_id: str, cookie_value: str, kw_list: Optional[List[Tuple[str, str]]] = None, user_id: int = None):
-        """线程安全新增 Cookie 并启动任务"""
+    def add_cookie(self, cookie_id: str, cookie_value: str, kw_list: Optional[List[Tuple[str, str]]] = None, user_id: int = None,
+                   save_to_db: bool = True):
+        """线程安全新增 Cookie 并启动任务（save_to_db=False 时只启动任务，用于账号信息已由调用方写入数据库的情况）"""
         if kw_list is not None:
             self.keywords[cookie_id] = kw_list
         else:
@@ -194,10 +286,10 @@ class CookieManager:
 
         if current_loop and current_loop == self.loop:
             # 同一事件循环中，直接调度
-            return self.loop.create_task(self._add_cookie_async(cookie_id, cookie_value, user_id))
+            return self.loop.create_task(self._add_cookie_async(cookie_id, cookie_value, user_id, save_to_db))
         else:
-            fut = asyncio.run_coroutine_threadsafe(self._add_cookie_async(cookie_id, cookie_value, user_id), self.loop)
-            return fut.result()
+            fut = asyncio.run_coroutine_threadsafe(self._add_cookie_async(cookie_id, cookie_value, user_id, save_to_db), self.loop)
+            return fut.result(timeout=30)
 
     def remove_cookie(self, cookie_id: str):
         try:
@@ -209,7 +301,7 @@ class CookieManager:
             return self.loop.create_task(self._remove_cookie_async(cookie_id))
         else:
             fut = asyncio.run_coroutine_threadsafe(self._remove_cookie_async(cookie_id), self.loop)
-            return fut.result()
+            return fut.result(timeout=30)
 
     # 更新 Cookie 值
     def update_cookie(self, cookie_id: str, new_value: str, save_to_db: bool = True):
@@ -285,7 +377,7 @@ class CookieManager:
             return self.loop.create_task(_update())
         else:
             fut = asyncio.run_coroutine_threadsafe(_update(), self.loop)
-            return fut.result()
+            return fut.result(timeout=30)
 
     def update_keywords(self, cookie_id: str, kw_list: List[Tuple[str, str]]):
         """线程安全更新关键字"""
@@ -385,6 +477,9 @@ class CookieManager:
                         logger.error(f"等待任务清理时出错: {cookie_id}, {e}")
                     logger.info(f"已取消Cookie任务: {cookie_id}")
                 del self.tasks[cookie_id]
+                self.item_sync_scheduler.unregister(cookie_id)
+                self.refresh_scheduler.unregister(cookie_id)
+                self.heartbeat_scheduler.unregister(cookie_id)
                 logger.info(f"成功停止Cookie任务: {cookie_id}")
             except Exception as e:
                 logger.error(f"停止Cookie任务失败: {cookie_id}, {e}")
@@ -419,6 +514,80 @@ class CookieManager:
         except Exception as e:
             logger.error(f"更新自动确认发货设置失败: {cookie_id}, {e}")
 
+    async def _send_message_async(self, cookie_id: str, chat_id: str, to_user_id: str, message: str) -> Dict[str, Any]:
+        """通过本进程中的账号实例发送消息"""
+        from XianyuAutoAsync import XianyuLive
+        live_instance = XianyuLive.get_instance(cookie_id)
+        if not live_instance:
+            return {'success': False, 'message': '账号实例不存在或未连接，请检查账号状态'}
+        if not live_instance.ws or live_instance.ws.closed:
+            return {'success': False, 'message': '账号WebSocket连接已断开，请等待重连'}
+
+        await live_instance.send_msg(live_instance.ws, chat_id, to_user_id, message)
+        return {'success': True, 'message': '消息发送成功'}
+
+    def send_message(self, cookie_id: str, chat_id: str, to_user_id: str, message: str) -> Dict[str, Any]:
+        """发送消息（阻塞，不能在账号事件循环中调用）：账号在本进程时在其事件循环中发送，分片模式下转发给所属工作进程"""
+        if self.shard_supervisor:
+            return self.shard_supervisor.send_message(cookie_id, chat_id, to_user_id, message)
+        fut = asyncio.run_coroutine_threadsafe(
+            self._send_message_async(cookie_id, chat_id, to_user_id, message), self.loop
+        )
+        return fut.result(timeout=30)
+
+    def notify_item_sync_settings_changed(self):
+        """商品同步系统设置已修改，通知调度器重新读取（线程安全）"""
+        self.item_sync_scheduler.notify_settings_changed()
+        if self.shard_supervisor:
+            self.shard_supervisor.broadcast('item_sync_settings')
+
+    def start_accounts(self, accounts: List[Tuple[str, str, Optional[int]]]):
+        """按启动调度器的速率启动一批账号（最近活跃的优先），需在事件循环中调用
+
+        Args:
+            accounts: [(cookie_id, cookie_value, user_id)]
+        """
+        self.startup_scheduler.schedule(accounts)
+
+    def get_startup_status(self) -> Dict[str, Any]:
+        """账号启动进度（包括所有账号连接成功的耗时，线程安全）"""
+        fut = asyncio.run_coroutine_threadsafe(self._get_startup_status_async(), self.loop)
+        return fut.result(timeout=10)
+
+    async def _get_startup_status_async(self) -> Dict[str, Any]:
+        return self.startup_scheduler.get_status()
+
+    def get_refresh_status(self) -> Dict[str, Any]:
+        """token/Cookie 刷新调度状态（线程安全）"""
+        if self.shard_supervisor:
+            raise ValueError('分片模式下刷新在各工作进程中调度')
+        fut = asyncio.run_coroutine_threadsafe(self._get_refresh_status_async(), self.loop)
+        return fut.result(timeout=10)
+
+    async def _get_refresh_status_async(self) -> Dict[str, Any]:
+        return self.refresh_scheduler.get_status()
+
+    def get_http_stats(self) -> Dict[str, Any]:
+        """账号HTTP连接池按主机的连接复用率和请求延迟（线程安全）"""
+        if self.shard_supervisor:
+            raise ValueError('分片模式下HTTP请求在各工作进程中发出')
+        fut = asyncio.run_coroutine_threadsafe(self._get_http_stats_async(), self.loop)
+        return fut.result(timeout=10)
+
+    async def _get_http_stats_async(self) -> Dict[str, Any]:
+        from utils.http_pool import get_http_pool
+        return get_http_pool().get_stats()
+
+    def get_heartbeat_status(self) -> Dict[str, Any]:
+        """心跳调度状态和各账号的心跳往返时间分布（线程安全）"""
+        if self.shard_supervisor:
+            raise ValueError('分片模式下心跳在各工作进程中调度')
+        fut = asyncio.run_coroutine_threadsafe(self._get_heartbeat_status_async(), self.loop)
+        return fut.result(timeout=10)
+
+    async def _get_heartbeat_status_async(self) -> Dict[str, Any]:
+        return self.heartbeat_scheduler.get_status()
+
     def get_auto_confirm_setting(self, cookie_id: str) -> bool:
         """获取账号的自动确认发货设置"""
         return self.auto_confirm_settings.get(cookie_id, True)  # 默认开启
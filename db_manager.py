@@ -9,13 +9,28 @@ import string
 import aiohttp
 import io
 import base64
-from PIL import Image, ImageDraw, ImageFont
 from typing import List, Tuple, Dict, Optional, Any
 from loguru import logger
 
 class DBManager:
     """SQLite数据库管理，持久化存储Cookie和关键字"""
-    
+
+    # 订单已处于最终状态（已发货/交易成功/已关闭）的SQL条件
+    ORDER_TERMINAL_SQL = "COALESCE(order_status, '') IN ('shipped', 'completed', 'cancelled')"
+
+    # 订单信息已完整且状态稳定（已发货/交易成功/已关闭）的SQL条件，满足时后台刷新不再获取该订单
+    ORDER_COMPLETE_SQL = """(
+        order_status IN ('shipped', 'completed', 'cancelled')
+        AND COALESCE(buyer_id, '') NOT IN ('', 'unknown_user')
+        AND COALESCE(amount, '') != ''
+        AND COALESCE(receiver_name, '') NOT IN ('', 'unknown')
+        AND COALESCE(receiver_phone, '') NOT IN ('', 'unknown')
+        AND COALESCE(receiver_address, '') NOT IN ('', 'unknown')
+    )"""
+
+    # 等待其他连接（分片工作进程、API进程）释放写锁的时间（毫秒），超时才报 "database is locked"
+    BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '30000'))
+
     def __init__(self, db_path: str = None):
         """初始化数据库连接和表结构"""
         # 支持环境变量配置数据库路径
@@ -64,10 +79,29 @@ class DBManager:
 
         self.init_db()
     
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接：多个进程同时读写同一个数据库文件，使用WAL日志（读写互不阻塞）并设置忙等待时间"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.BUSY_TIMEOUT_MS / 1000)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            logger.warning(f"启用WAL日志模式失败，使用默认日志模式: {e}")
+        conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+        return conn
+
+    def checkpoint(self):
+        """把WAL日志中的内容写回数据库文件（直接复制数据库文件前调用）"""
+        with self.lock:
+            try:
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e:
+                logger.warning(f"WAL检查点失败: {e}")
+
     def init_db(self):
         """初始化数据库表结构"""
         try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn = self._connect()
             cursor = self.conn.cursor()
             
             # 创建用户表
@@ -159,6 +193,8 @@ class DBManager:
                 max_discount_amount INTEGER DEFAULT 100,
                 max_bargain_rounds INTEGER DEFAULT 3,
                 custom_prompts TEXT,
+                fallback_models TEXT DEFAULT '',
+                hedge_enabled BOOLEAN DEFAULT FALSE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
@@ -264,6 +300,20 @@ class DBManager:
                 self._execute_sql(cursor, "ALTER TABLE orders ADD COLUMN version INTEGER DEFAULT 1")
                 logger.info("orders 表 version 列添加完成")
 
+            # 检查并添加订单刷新记录列（用于增量刷新：上次获取时间、连续不完整次数、下次可刷新时间、是否已完整）
+            try:
+                self._execute_sql(cursor, "SELECT refresh_stable FROM orders LIMIT 1")
+            except sqlite3.OperationalError:
+                logger.info("正在为 orders 表添加刷新记录列...")
+                self._execute_sql(cursor, "ALTER TABLE orders ADD COLUMN refresh_last_fetched REAL DEFAULT 0")
+                self._execute_sql(cursor, "ALTER TABLE orders ADD COLUMN refresh_attempts INTEGER DEFAULT 0")
+                self._execute_sql(cursor, "ALTER TABLE orders ADD COLUMN refresh_due_at REAL DEFAULT 0")
+                self._execute_sql(cursor, "ALTER TABLE orders ADD COLUMN refresh_stable INTEGER DEFAULT 0")
+                # 已有的完整订单直接标记为稳定，不再参与刷新
+                self._execute_sql(cursor, f"UPDATE orders SET refresh_stable = 1 WHERE {self.ORDER_COMPLETE_SQL}")
+                logger.info("orders 表刷新记录列添加完成")
+            self._execute_sql(cursor, "CREATE INDEX IF NOT EXISTS idx_orders_refresh_due ON orders(cookie_id, refresh_stable, refresh_due_at)")
+
             # 检查并添加 user_id 列（用于数据库迁移）
             try:
                 self._execute_sql(cursor, "SELECT user_id FROM cards LIMIT 1")
@@ -320,6 +370,14 @@ class DBManager:
                 self._execute_sql(cursor, "ALTER TABLE item_info ADD COLUMN multi_quantity_delivery BOOLEAN DEFAULT FALSE")
                 logger.info("item_info 表 multi_quantity_delivery 列添加完成")
 
+            # 检查并添加 content_hash 列（用于商品同步时只写入新增或变化的商品）
+            try:
+                self._execute_sql(cursor, "SELECT content_hash FROM item_info LIMIT 1")
+            except sqlite3.OperationalError:
+                logger.info("正在为 item_info 表添加 content_hash 列...")
+                self._execute_sql(cursor, "ALTER TABLE item_info ADD COLUMN content_hash TEXT")
+                logger.info("item_info 表 content_hash 列添加完成")
+
             # 创建自动发货规则表
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS delivery_rules (
@@ -461,6 +519,62 @@ class DBManager:
             )
             ''')
 
+            # 创建订单刷新任务表（后台刷新任务的进度和结果）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_refresh_jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                cookie_ids TEXT,
+                status_filter TEXT,
+                state TEXT NOT NULL DEFAULT 'queued',
+                total INTEGER DEFAULT 0,
+                processed INTEGER DEFAULT 0,
+                updated INTEGER DEFAULT 0,
+                no_change INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                results TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP,
+                owner TEXT,
+                lease_until REAL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            ''')
+
+            # 检查并添加订单刷新任务的所有者和租约列（多个API进程共用任务表时区分任务由哪个进程执行、是否仍在执行）
+            try:
+                self._execute_sql(cursor, "SELECT lease_until FROM order_refresh_jobs LIMIT 1")
+            except sqlite3.OperationalError:
+                logger.info("正在为 order_refresh_jobs 表添加租约列...")
+                self._execute_sql(cursor, "ALTER TABLE order_refresh_jobs ADD COLUMN owner TEXT")
+                self._execute_sql(cursor, "ALTER TABLE order_refresh_jobs ADD COLUMN lease_until REAL DEFAULT 0")
+                logger.info("order_refresh_jobs 表租约列添加完成")
+
+            # 创建订单刷新账号租约表（同一账号同一时间只由一个任务刷新，跨进程生效）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_refresh_leases (
+                cookie_id TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                lease_until REAL NOT NULL
+            )
+            ''')
+
+            # 创建账号连接缓存表（最近一次有效的token和设备ID，重启时可跳过token请求；最近消息时间用于启动排序）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS account_connect_cache (
+                cookie_id TEXT PRIMARY KEY,
+                unb TEXT,
+                access_token TEXT,
+                device_id TEXT,
+                token_time REAL,
+                last_message_time REAL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+            )
+            ''')
+
             # 插入默认系统设置（不包括管理员密码，由reply_server.py初始化）
             cursor.execute('''
             INSERT OR IGNORE INTO system_settings (key, value, description) VALUES
@@ -524,6 +638,19 @@ class DBManager:
                 cursor.execute("ALTER TABLE cookies ADD COLUMN pause_duration INTEGER DEFAULT 10")
                 logger.info("数据库迁移完成：添加pause_duration列")
 
+            # 检查ai_reply_settings表是否存在备用模型链相关列
+            cursor.execute("PRAGMA table_info(ai_reply_settings)")
+            ai_columns = [column[1] for column in cursor.fetchall()]
+
+            if 'fallback_models' not in ai_columns:
+                logger.info("添加ai_reply_settings表的fallback_models列...")
+                cursor.execute("ALTER TABLE ai_reply_settings ADD COLUMN fallback_models TEXT DEFAULT ''")
+                logger.info("数据库迁移完成：添加fallback_models列")
+            if 'hedge_enabled' not in ai_columns:
+                logger.info("添加ai_reply_settings表的hedge_enabled列...")
+                cursor.execute("ALTER TABLE ai_reply_settings ADD COLUMN hedge_enabled BOOLEAN DEFAULT FALSE")
+                logger.info("数据库迁移完成：添加hedge_enabled列")
+
             # 确保商品同步配置存在
             cursor.execute("SELECT key FROM system_settings WHERE key IN ('item_sync_enabled', 'item_sync_interval', 'item_sync_max_pages')")
             existing_keys = [row[0] for row in cursor.fetchall()]
@@ -1200,7 +1327,7 @@ class DBManager:
     def get_connection(self):
         """获取数据库连接，如果已关闭则重新连接"""
         if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn = self._connect()
         return self.conn
 
     def _log_sql(self, sql: str, params: tuple = None, operation: str = "EXECUTE"):
@@ -1298,6 +1425,8 @@ class DBManager:
                 cursor = self.conn.cursor()
                 # 删除关联的关键字
                 self._execute_sql(cursor, "DELETE FROM keywords WHERE cookie_id = ?", (cookie_id,))
+                # 删除连接缓存（缓存的token）
+                self._execute_sql(cursor, "DELETE FROM account_connect_cache WHERE cookie_id = ?", (cookie_id,))
                 # 删除Cookie
                 self._execute_sql(cursor, "DELETE FROM cookies WHERE id = ?", (cookie_id,))
                 self.conn.commit()
@@ -1871,8 +2000,8 @@ class DBManager:
                 INSERT OR REPLACE INTO ai_reply_settings
                 (cookie_id, ai_enabled, model_name, api_key, base_url,
                  max_discount_percent, max_discount_amount, max_bargain_rounds,
-                 custom_prompts, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                 custom_prompts, fallback_models, hedge_enabled, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (
                     cookie_id,
                     settings.get('ai_enabled', False),
@@ -1882,7 +2011,9 @@ class DBManager:
                     settings.get('max_discount_percent', 10),
                     settings.get('max_discount_amount', 100),
                     settings.get('max_bargain_rounds', 3),
-                    settings.get('custom_prompts', '')
+                    settings.get('custom_prompts', ''),
+                    settings.get('fallback_models', ''),
+                    settings.get('hedge_enabled', False)
                 ))
                 self.conn.commit()
                 logger.debug(f"AI回复设置保存成功: {cookie_id}")
@@ -1908,7 +2039,7 @@ class DBManager:
                 cursor.execute('''
                 SELECT ai_enabled, model_name, api_key, base_url,
                        max_discount_percent, max_discount_amount, max_bargain_rounds,
-                       custom_prompts
+                       custom_prompts, fallback_models, hedge_enabled
                 FROM ai_reply_settings WHERE cookie_id = ?
                 ''', (cookie_id,))
 
@@ -1938,7 +2069,9 @@ class DBManager:
                         'max_discount_percent': result[4],
                         'max_discount_amount': result[5],
                         'max_bargain_rounds': result[6],
-                        'custom_prompts': result[7]
+                        'custom_prompts': result[7],
+                        'fallback_models': result[8] or '',
+                        'hedge_enabled': bool(result[9])
                     }
                 else:
                     # 账号没有设置，使用系统设置作为默认值
@@ -1950,7 +2083,9 @@ class DBManager:
                         'max_discount_percent': 10,
                         'max_discount_amount': 100,
                         'max_bargain_rounds': 3,
-                        'custom_prompts': ''
+                        'custom_prompts': '',
+                        'fallback_models': '',
+                        'hedge_enabled': False
                     }
             except Exception as e:
                 logger.error(f"获取AI回复设置失败: {e}")
@@ -1962,7 +2097,9 @@ class DBManager:
                     'max_discount_percent': 10,
                     'max_discount_amount': 100,
                     'max_bargain_rounds': 3,
-                    'custom_prompts': ''
+                    'custom_prompts': '',
+                    'fallback_models': '',
+                    'hedge_enabled': False
                 }
 
     def get_all_ai_reply_settings(self) -> Dict[str, dict]:
@@ -1973,7 +2110,7 @@ class DBManager:
                 cursor.execute('''
                 SELECT cookie_id, ai_enabled, model_name, api_key, base_url,
                        max_discount_percent, max_discount_amount, max_bargain_rounds,
-                       custom_prompts
+                       custom_prompts, fallback_models, hedge_enabled
                 FROM ai_reply_settings
                 ''')
 
@@ -1988,7 +2125,9 @@ class DBManager:
                         'max_discount_percent': row[5],
                         'max_discount_amount': row[6],
                         'max_bargain_rounds': row[7],
-                        'custom_prompts': row[8]
+                        'custom_prompts': row[8],
+                        'fallback_models': row[9] or '',
+                        'hedge_enabled': bool(row[10])
                     }
 
                 return result
@@ -1996,6 +2135,50 @@ class DBManager:
                 logger.error(f"获取所有AI回复设置失败: {e}")
                 return {}
 
+    # -------------------- AI商品缓存操作 --------------------
+    def get_ai_item_cache(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """获取AI商品描述缓存"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute('''
+                SELECT data, price, description, last_updated
+                FROM ai_item_cache WHERE item_id = ?
+                ''', (item_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                try:
+                    data = json.loads(row[0]) if row[0] else {}
+                except json.JSONDecodeError:
+                    data = {}
+                return {
+                    'item_id': item_id,
+                    'data': data,
+                    'price': row[1],
+                    'description': row[2] or '',
+                    'last_updated': row[3]
+                }
+            except Exception as e:
+                logger.error(f"获取AI商品缓存失败: {e}")
+                return None
+
+    def save_ai_item_cache(self, item_id: str, data: dict, price: float = None, description: str = '') -> bool:
+        """保存AI商品描述缓存"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute('''
+                INSERT OR REPLACE INTO ai_item_cache (item_id, data, price, description, last_updated)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (item_id, json.dumps(data, ensure_ascii=False), price, description))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"保存AI商品缓存失败: {e}")
+                self.conn.rollback()
+                return False
+
     # -------------------- 默认回复操作 --------------------
     def save_default_reply(self, cookie_id: str, enabled: bool, reply_content: str = None, reply_once: bool = False, reply_image_url: str = None):
         """保存默认回复设置"""
@@ -2686,7 +2869,8 @@ class DBManager:
             chars = string.ascii_uppercase + string.digits
             captcha_text = ''.join(random.choices(chars, k=4))
 
-            # 创建图片
+            # 创建图片（Pillow 只在生成验证码时才导入）
+            from PIL import Image, ImageDraw, ImageFont
             width, height = 120, 40
             image = Image.new('RGB', (width, height), color='white')
             draw = ImageDraw.Draw(image)
@@ -2905,9 +3089,9 @@ class DBManager:
                                  smtp_password: str, smtp_from: str, smtp_use_tls: bool, smtp_use_ssl: bool) -> bool:
         """使用SMTP方式发送邮件"""
         try:
-            import smtplib
             from email.mime.text import MIMEText
             from email.mime.multipart import MIMEMultipart
+            from utils.mail_transport import get_mail_transport
 
             msg = MIMEMultipart()
             msg['Subject'] = subject
@@ -2916,19 +3100,11 @@ class DBManager:
 
             msg.attach(MIMEText(text_content, 'plain', 'utf-8'))
 
-            if smtp_use_ssl:
-                server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-            else:
-                server = smtplib.SMTP(smtp_server, smtp_port)
-
-            server.ehlo()
-            if smtp_use_tls and not smtp_use_ssl:
-                server.starttls()
-                server.ehlo()
-
-            server.login(smtp_user, smtp_password)
-            server.sendmail(smtp_user, [email], msg.as_string())
-            server.quit()
+            # 复用已登录的SMTP连接，阻塞操作在专用线程池中执行
+            await get_mail_transport().send(
+                smtp_server, smtp_port, smtp_user, smtp_password, msg, [email],
+                from_addr=smtp_user, use_ssl=bool(smtp_use_ssl), use_tls=bool(smtp_use_tls)
+            )
 
             logger.info(f"验证码邮件发送成功(SMTP): {email}")
             return True
@@ -4175,11 +4351,33 @@ class DBManager:
             self.conn.rollback()
             return False
 
+    def get_item_sync_state(self, cookie_id: str) -> Dict[str, Dict[str, Any]]:
+        """获取账号所有商品的内容哈希和是否已有详情（商品同步比对用）
+
+        Args:
+            cookie_id: Cookie ID
+
+        Returns:
+            Dict: {item_id: {'content_hash': str, 'has_detail': bool}}
+        """
+        try:
+            with self.lock:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT item_id, content_hash, TRIM(COALESCE(item_detail, '')) != ''
+                FROM item_info WHERE cookie_id = ?
+                ''', (cookie_id,))
+                return {row[0]: {'content_hash': row[1], 'has_detail': bool(row[2])} for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"获取商品同步状态失败: {cookie_id} - {e}")
+            return {}
+
     def batch_save_item_basic_info(self, items_data: list) -> int:
         """批量保存商品基本信息（并发安全）
 
         Args:
-            items_data: 商品数据列表，每个元素包含 cookie_id, item_id, item_title 等字段
+            items_data: 商品数据列表，每个元素包含 cookie_id, item_id, item_title 等字段；
+                        带 content_hash 时表示商品同步检测到内容变化，已有记录的标题、分类、价格会被覆盖
 
         Returns:
             int: 成功保存的商品数量
@@ -4204,6 +4402,7 @@ class DBManager:
                         item_category = item_data.get('item_category', '')
                         item_price = item_data.get('item_price', '')
                         item_detail = item_data.get('item_detail', '')
+                        content_hash = item_data.get('content_hash')
 
                         if not cookie_id or not item_id:
                             continue
@@ -4216,12 +4415,35 @@ class DBManager:
                         # 使用 INSERT OR IGNORE + UPDATE 模式
                         cursor.execute('''
                         INSERT OR IGNORE INTO item_info (cookie_id, item_id, item_title, item_description,
-                                                       item_category, item_price, item_detail, created_at, updated_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                                                       item_category, item_price, item_detail, content_hash,
+                                                       created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
                         ''', (cookie_id, item_id, item_title, item_description,
-                              item_category, item_price, item_detail))
+                              item_category, item_price, item_detail, content_hash))
 
-                        if cursor.rowcount == 0:
+                        if cursor.rowcount == 0 and content_hash is not None:
+                            # 商品内容已变化：覆盖基本信息，详情和描述仍只在为空时填充
+                            update_sql = '''
+                            UPDATE item_info SET
+                                item_title = ?,
+                                item_description = CASE WHEN (item_description IS NULL OR item_description = '') AND ? != '' THEN ? ELSE item_description END,
+                                item_category = CASE WHEN ? != '' THEN ? ELSE item_category END,
+                                item_price = CASE WHEN ? != '' THEN ? ELSE item_price END,
+                                item_detail = CASE WHEN (item_detail IS NULL OR item_detail = '' OR TRIM(item_detail) = '') AND ? != '' THEN ? ELSE item_detail END,
+                                content_hash = ?,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE cookie_id = ? AND item_id = ?
+                            '''
+                            self._execute_sql(cursor, update_sql, (
+                                item_title,
+                                item_description, item_description,
+                                item_category, item_category,
+                                item_price, item_price,
+                                item_detail, item_detail,
+                                content_hash,
+                                cookie_id, item_id
+                            ))
+                        elif cursor.rowcount == 0:
                             # 记录已存在，进行条件更新
                             update_sql = '''
                             UPDATE item_info SET
@@ -4590,6 +4812,12 @@ class DBManager:
                     if order_status is not None:
                         update_fields.append("order_status = ?")
                         update_values.append(order_status)
+                        if order_status not in ('shipped', 'completed', 'cancelled'):
+                            # 状态变为非稳定状态（如退款中），重新参与后台刷新
+                            update_fields.append("refresh_stable = CASE WHEN order_status IS ? THEN refresh_stable ELSE 0 END")
+                            update_fields.append("refresh_attempts = CASE WHEN order_status IS ? THEN refresh_attempts ELSE 0 END")
+                            update_fields.append("refresh_due_at = CASE WHEN order_status IS ? THEN refresh_due_at ELSE 0 END")
+                            update_values.extend([order_status, order_status, order_status])
                     if cookie_id is not None:
                         update_fields.append("cookie_id = ?")
                         update_values.append(cookie_id)
@@ -4673,6 +4901,379 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    def batch_update_orders(self, orders_data: list) -> Dict[str, bool]:
+        """在一个事务中批量更新已存在的订单（字段为None或空时保留原值）
+
+        Args:
+            orders_data: 订单数据列表，每个元素包含 order_id 以及 insert_or_update_order 支持的字段
+
+        Returns:
+            Dict[str, bool]: {order_id: 是否更新成功}
+        """
+        fields = ('item_id', 'buyer_id', 'spec_name', 'spec_value', 'quantity', 'amount',
+                  'order_status', 'created_at', 'receiver_name', 'receiver_phone', 'receiver_address')
+        set_clause = ', '.join(f"{field} = COALESCE(NULLIF(?, ''), {field})" for field in fields)
+        sql = f"UPDATE orders SET {set_clause}, updated_at = CURRENT_TIMESTAMP, version = version + 1 WHERE order_id = ?"
+
+        results = {}
+        if not orders_data:
+            return results
+
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute('BEGIN TRANSACTION')
+                for order_data in orders_data:
+                    order_id = order_data['order_id']
+                    params = [order_data.get(field) for field in fields] + [order_id]
+                    self._execute_sql(cursor, sql, tuple(params))
+                    results[order_id] = cursor.rowcount > 0
+                cursor.execute('COMMIT')
+                logger.info(f"批量更新订单完成: {sum(results.values())}/{len(orders_data)} 个订单")
+                return results
+
+            except Exception as e:
+                logger.error(f"批量更新订单失败: {e}")
+                try:
+                    cursor.execute('ROLLBACK')
+                except:
+                    pass
+                return {order_data['order_id']: False for order_data in orders_data}
+
+    def get_orders_due_for_refresh(self, cookie_id: str, status: str = None, limit: int = 1000,
+                                   max_attempts: int = 6) -> List[Dict[str, Any]]:
+        """获取账号当前需要刷新的订单（未完整、未放弃且已到下次刷新时间），使用 idx_orders_refresh_due 索引
+
+        Args:
+            cookie_id: Cookie ID
+            status: 只返回该状态的订单
+            limit: 最多返回的订单数
+            max_attempts: 已处于最终状态的订单连续获取后信息仍不完整的次数达到该值后放弃该订单
+                （未到最终状态的订单在等待状态变化，不会放弃）
+
+        Returns:
+            List[Dict]: [{'order_id', 'status'}]，按到期时间排序
+        """
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                sql = ("SELECT order_id, order_status FROM orders "
+                       "WHERE cookie_id = ? AND refresh_stable = 0 AND refresh_due_at <= ? "
+                       f"AND (refresh_attempts < ? OR NOT {self.ORDER_TERMINAL_SQL})")
+                params = [cookie_id, time.time(), max_attempts]
+                if status:
+                    sql += " AND order_status = ?"
+                    params.append(status)
+                sql += " ORDER BY refresh_due_at LIMIT ?"
+                params.append(limit)
+                self._execute_sql(cursor, sql, tuple(params))
+                return [{'order_id': row[0], 'status': row[1] or 'unknown'} for row in cursor.fetchall()]
+            except Exception as e:
+                logger.error(f"获取待刷新订单失败: {cookie_id} - {e}")
+                return []
+
+    def record_order_refresh(self, order_ids: List[str], backoff_base: float = 300,
+                             backoff_max: float = 86400, pending_backoff_max: float = 3600) -> bool:
+        """记录订单刷新结果（SET 中的表达式读取的都是更新前的值）：
+        - 信息已完整且处于最终状态的标记为稳定
+        - 处于最终状态但信息不完整的，次数加1并按指数退避推迟下次刷新，次数达到上限后放弃
+        - 未到最终状态的（待付款、待发货等）在等待状态变化，不计次数，刷新间隔在上次间隔基础上翻倍，最长 pending_backoff_max
+
+        Args:
+            order_ids: 本次成功获取到的订单ID（获取失败的不要传入，避免网络/验证码问题导致订单被放弃）
+            backoff_base: 第一次退避时间（秒），之后每次翻倍
+            backoff_max: 最终状态订单的最长退避时间（秒）
+            pending_backoff_max: 未到最终状态订单的最长刷新间隔（秒）
+
+        Returns:
+            bool: 操作是否成功
+        """
+        if not order_ids:
+            return True
+
+        now = time.time()
+        sql = f'''
+        UPDATE orders SET
+            refresh_last_fetched = ?,
+            refresh_stable = CASE WHEN {self.ORDER_COMPLETE_SQL} THEN 1 ELSE 0 END,
+            refresh_attempts = CASE WHEN {self.ORDER_COMPLETE_SQL} OR NOT {self.ORDER_TERMINAL_SQL} THEN 0
+                                    ELSE refresh_attempts + 1 END,
+            refresh_due_at = ? + CASE WHEN {self.ORDER_TERMINAL_SQL}
+                                      THEN MIN(?, ? * (1 << MIN(refresh_attempts, 20)))
+                                      ELSE MIN(?, MAX(?, 2 * (refresh_due_at - refresh_last_fetched))) END
+        WHERE order_id = ?
+        '''
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._executemany_sql(cursor, sql, [(now, now, backoff_max, backoff_base,
+                                                     pending_backoff_max, backoff_base, order_id)
+                                                    for order_id in order_ids])
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"记录订单刷新结果失败: {e}")
+                self.conn.rollback()
+                return False
+
+    # -------------------- 订单刷新任务操作 --------------------
+    def save_order_refresh_job(self, job: Dict[str, Any]) -> bool:
+        """保存订单刷新任务（存在则覆盖）"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                INSERT OR REPLACE INTO order_refresh_jobs
+                    (job_id, user_id, cookie_ids, status_filter, state, total, processed,
+                     updated, no_change, failed, results, error, created_at, finished_at, owner, lease_until)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    job['job_id'], job['user_id'], json.dumps(job.get('cookie_ids', [])),
+                    job.get('status_filter'), job['state'], job.get('total', 0), job.get('processed', 0),
+                    job.get('updated', 0), job.get('no_change', 0), job.get('failed', 0),
+                    json.dumps(job.get('updated_orders', []), ensure_ascii=False), job.get('error'),
+                    job.get('created_at'), job.get('finished_at'), job.get('owner'), job.get('lease_until', 0)
+                ))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"保存订单刷新任务失败: {job.get('job_id')} - {e}")
+                self.conn.rollback()
+                return False
+
+    def _row_to_order_refresh_job(self, row) -> Dict[str, Any]:
+        return {
+            'job_id': row[0],
+            'user_id': row[1],
+            'cookie_ids': json.loads(row[2]) if row[2] else [],
+            'status_filter': row[3],
+            'state': row[4],
+            'total': row[5],
+            'processed': row[6],
+            'updated': row[7],
+            'no_change': row[8],
+            'failed': row[9],
+            'updated_orders': json.loads(row[10]) if row[10] else [],
+            'error': row[11],
+            'created_at': row[12],
+            'finished_at': row[13],
+            'lease_until': row[14] or 0
+        }
+
+    def get_order_refresh_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """根据任务ID获取订单刷新任务"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT job_id, user_id, cookie_ids, status_filter, state, total, processed,
+                       updated, no_change, failed, results, error, created_at, finished_at, lease_until
+                FROM order_refresh_jobs WHERE job_id = ?
+                ''', (job_id,))
+                row = cursor.fetchone()
+                return self._row_to_order_refresh_job(row) if row else None
+            except Exception as e:
+                logger.error(f"获取订单刷新任务失败: {job_id} - {e}")
+                return None
+
+    def get_order_refresh_jobs(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取用户最近的订单刷新任务"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT job_id, user_id, cookie_ids, status_filter, state, total, processed,
+                       updated, no_change, failed, results, error, created_at, finished_at, lease_until
+                FROM order_refresh_jobs WHERE user_id = ?
+                ORDER BY created_at DESC LIMIT ?
+                ''', (user_id, limit))
+                return [self._row_to_order_refresh_job(row) for row in cursor.fetchall()]
+            except Exception as e:
+                logger.error(f"获取订单刷新任务列表失败: {user_id} - {e}")
+                return []
+
+    def mark_interrupted_order_refresh_jobs(self) -> int:
+        """将租约已过期（执行它的进程已退出）的未完成订单刷新任务标记为中断，仍在其他进程中执行的任务不受影响"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                UPDATE order_refresh_jobs SET state = 'interrupted', finished_at = CURRENT_TIMESTAMP
+                WHERE state IN ('queued', 'running') AND COALESCE(lease_until, 0) < ?
+                ''', (time.time(),))
+                self.conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                logger.error(f"标记中断的订单刷新任务失败: {e}")
+                self.conn.rollback()
+                return 0
+
+    def acquire_order_refresh_lease(self, cookie_id: str, job_id: str, owner: str,
+                                    lease_until: float) -> Optional[str]:
+        """
+        获取账号的订单刷新租约（没有租约或已过期时才能获取）
+
+        Returns:
+            Optional[str]: 获取成功返回None，否则返回正在刷新该账号的任务ID
+        """
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                INSERT INTO order_refresh_leases (cookie_id, job_id, owner, lease_until)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(cookie_id) DO UPDATE SET
+                    job_id = excluded.job_id,
+                    owner = excluded.owner,
+                    lease_until = excluded.lease_until
+                WHERE order_refresh_leases.lease_until < ?
+                ''', (cookie_id, job_id, owner, lease_until, time.time()))
+                acquired = cursor.rowcount > 0
+                self.conn.commit()
+                if acquired:
+                    return None
+                self._execute_sql(cursor, "SELECT job_id FROM order_refresh_leases WHERE cookie_id = ?", (cookie_id,))
+                row = cursor.fetchone()
+                return row[0] if row else job_id
+            except Exception as e:
+                logger.error(f"获取订单刷新租约失败: {cookie_id} - {e}")
+                self.conn.rollback()
+                raise
+
+    def renew_order_refresh_leases(self, owner: str, lease_until: float) -> bool:
+        """续期该进程持有的账号租约和未结束任务的租约"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, "UPDATE order_refresh_leases SET lease_until = ? WHERE owner = ?",
+                                  (lease_until, owner))
+                self._execute_sql(cursor, '''
+                UPDATE order_refresh_jobs SET lease_until = ?
+                WHERE owner = ? AND state IN ('queued', 'running')
+                ''', (lease_until, owner))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"续期订单刷新租约失败: {e}")
+                self.conn.rollback()
+                return False
+
+    def release_order_refresh_lease(self, cookie_id: str, owner: str) -> bool:
+        """释放该进程持有的账号租约"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, "DELETE FROM order_refresh_leases WHERE cookie_id = ? AND owner = ?",
+                                  (cookie_id, owner))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"释放订单刷新租约失败: {cookie_id} - {e}")
+                self.conn.rollback()
+                return False
+
+    def save_connect_cache(self, cookie_id: str, unb: str, access_token: str, device_id: str,
+                           token_time: float, last_message_time: float = 0) -> bool:
+        """保存账号最近一次有效的token和连接参数"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                INSERT INTO account_connect_cache
+                    (cookie_id, unb, access_token, device_id, token_time, last_message_time, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(cookie_id) DO UPDATE SET
+                    unb = excluded.unb,
+                    access_token = excluded.access_token,
+                    device_id = excluded.device_id,
+                    token_time = excluded.token_time,
+                    last_message_time = MAX(last_message_time, excluded.last_message_time),
+                    updated_at = CURRENT_TIMESTAMP
+                ''', (cookie_id, unb, access_token, device_id, token_time, last_message_time or 0))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"保存账号连接缓存失败: {cookie_id} - {e}")
+                self.conn.rollback()
+                return False
+
+    def get_connect_cache(self, cookie_id: str) -> Optional[Dict[str, Any]]:
+        """获取账号的连接缓存，不存在返回None"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT unb, access_token, device_id, token_time, last_message_time
+                FROM account_connect_cache WHERE cookie_id = ?
+                ''', (cookie_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                return {
+                    'unb': row[0],
+                    'access_token': row[1],
+                    'device_id': row[2],
+                    'token_time': row[3] or 0,
+                    'last_message_time': row[4] or 0
+                }
+            except Exception as e:
+                logger.error(f"获取账号连接缓存失败: {cookie_id} - {e}")
+                return None
+
+    def invalidate_connect_token(self, cookie_id: str) -> bool:
+        """作废账号缓存的token（保留最近消息时间）"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                UPDATE account_connect_cache SET access_token = NULL, token_time = 0, updated_at = CURRENT_TIMESTAMP
+                WHERE cookie_id = ?
+                ''', (cookie_id,))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"作废账号缓存token失败: {cookie_id} - {e}")
+                self.conn.rollback()
+                return False
+
+    def update_connect_activity(self, cookie_id: str, last_message_time: float) -> bool:
+        """记录账号最近收到消息的时间"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                INSERT INTO account_connect_cache (cookie_id, last_message_time, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(cookie_id) DO UPDATE SET
+                    last_message_time = MAX(last_message_time, excluded.last_message_time),
+                    updated_at = CURRENT_TIMESTAMP
+                ''', (cookie_id, last_message_time))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"记录账号最近消息时间失败: {cookie_id} - {e}")
+                self.conn.rollback()
+                return False
+
+    def get_account_activity(self) -> Dict[str, float]:
+        """获取各账号最近活跃时间（最近消息、订单更新、AI对话中最晚的一个，Unix时间戳）"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT cookie_id, MAX(ts) FROM (
+                    SELECT cookie_id, last_message_time AS ts FROM account_connect_cache
+                    UNION ALL
+                    SELECT cookie_id, CAST(strftime('%s', MAX(updated_at)) AS REAL) FROM orders GROUP BY cookie_id
+                    UNION ALL
+                    SELECT cookie_id, CAST(strftime('%s', MAX(created_at)) AS REAL) FROM ai_conversations GROUP BY cookie_id
+                ) WHERE cookie_id IS NOT NULL GROUP BY cookie_id
+                ''')
+                return {row[0]: row[1] or 0 for row in cursor.fetchall()}
+            except Exception as e:
+                logger.error(f"获取账号活跃时间失败: {e}")
+                return {}
+
     def get_order_by_id(self, order_id: str):
         """根据订单ID获取订单信息"""
         with self.lock:
@@ -83,10 +83,57 @@ export const updateOrderStatus = async (id: string, status: string): Promise<Api
   return await updateOrder(id, { status: status as any })
 }
 
-// 刷新订单状态
-export const refreshOrdersStatus = async (
+// 订单刷新任务
+export interface OrderRefreshJob {
+  job_id: string
+  state: 'queued' | 'running' | 'completed' | 'failed' | 'interrupted'
+  total: number
+  processed: number
+  updated: number
+  no_change: number
+  failed: number
+  updated_orders: Array<{
+    order_id: string
+    old_status: string
+    new_status: string
+    status_text: string
+  }>
+  error?: string | null
+}
+
+// 提交订单刷新任务（后台执行，立即返回任务ID）
+export const submitOrdersRefresh = async (
   cookieId?: string,
   status?: string
+): Promise<{ success: boolean; message?: string; job_id?: string; deduplicated?: boolean; job?: OrderRefreshJob }> => {
+  const formData = new FormData()
+  if (cookieId) formData.append('cookie_id', cookieId)
+  if (status) formData.append('status', status)
+
+  const response = await fetch('/api/orders/refresh', {
+    method: 'POST',
+    headers: {
+      Authorization: `Bearer ${localStorage.getItem('auth_token')}`,
+    },
+    body: formData,
+  })
+
+  if (!response.ok) {
+    throw new Error('刷新失败')
+  }
+  return await response.json()
+}
+
+// 获取订单刷新任务进度（since: 只返回该下标之后的已更新订单）
+export const getOrdersRefreshJob = async (jobId: string, since: number = 0): Promise<{ success: boolean; job: OrderRefreshJob }> => {
+  return get(`/api/orders/refresh/jobs/${jobId}?since=${since}`)
+}
+
+// 刷新订单状态：提交后台任务并轮询直到结束
+export const refreshOrdersStatus = async (
+  cookieId?: string,
+  status?: string,
+  onProgress?: (job: OrderRefreshJob) => void
 ): Promise<{
   success: boolean
   message?: string
@@ -96,32 +143,36 @@ export const refreshOrdersStatus = async (
     no_change: number
     failed: number
   }
-  updated_orders?: Array<{
-    order_id: string
-    old_status: string
-    new_status: string
-    status_text: string
-  }>
+  updated_orders?: OrderRefreshJob['updated_orders']
 }> => {
   try {
-    const formData = new FormData()
-    if (cookieId) formData.append('cookie_id', cookieId)
-    if (status) formData.append('status', status)
-
-    const response = await fetch('/api/orders/refresh', {
-      method: 'POST',
-      headers: {
-        Authorization: `Bearer ${localStorage.getItem('auth_token')}`,
-      },
-      body: formData,
-    })
+    const submitted = await submitOrdersRefresh(cookieId, status)
+    if (!submitted.success || !submitted.job_id || !submitted.job) {
+      return { success: false, message: submitted.message || '刷新订单状态失败' }
+    }
 
-    if (!response.ok) {
-      throw new Error('刷新失败')
+    let job = submitted.job
+    const updatedOrders = [...job.updated_orders]
+    while (job.state === 'queued' || job.state === 'running') {
+      onProgress?.(job)
+      await new Promise((resolve) => setTimeout(resolve, 2000))
+      const result = await getOrdersRefreshJob(submitted.job_id, updatedOrders.length)
+      job = result.job
+      updatedOrders.push(...job.updated_orders)
     }
 
-    const result = await response.json()
-    return result
+    const summary = { total: job.total, updated: job.updated, no_change: job.no_change, failed: job.failed }
+    if (job.state !== 'completed') {
+      return { success: false, message: job.error || '刷新任务被中断', summary, updated_orders: updatedOrders }
+    }
+    return {
+      success: true,
+      message: job.total
+        ? `刷新完成: 更新${job.updated}个, 无变化${job.no_change}个, 失败${job.failed}个`
+        : '没有需要刷新的订单',
+      summary,
+      updated_orders: updatedOrders,
+    }
   } catch (error) {
     return { success: false, message: '刷新订单状态失败' }
   }
@@ -14,7 +14,6 @@ import json
 import os
 import re
 import uvicorn
-import pandas as pd
 import io
 import asyncio
 from collections import defaultdict
@@ -337,6 +336,11 @@ if CAPTCHA_ROUTER_AVAILABLE:
 else:
     logger.warning("⚠️ 刮刮乐远程控制路由未注册")
 
+# API 以独立进程运行时（Start.py 的 process 模式，或直接用 uvicorn 启动），通过 RPC 连接账号运行时
+if cookie_manager.manager is None and os.getenv('XIANYU_RUNTIME_RPC'):
+    from utils.runtime_rpc import connect_runtime
+    cookie_manager.manager = connect_runtime()
+
 # 初始化文件日志收集器
 setup_file_logging()
 
@@ -1192,32 +1196,26 @@ async def send_message_api(request: SendMessageRequest):
                     message=f"参数 {param_name} 不能为空"
                 )
 
-        # 直接获取XianyuLive实例，跳过cookie_manager检查
-        from XianyuAutoAsync import XianyuLive
-        live_instance = XianyuLive.get_instance(cleaned_cookie_id)
-
-        if not live_instance:
-            logger.warning(f"账号实例不存在或未连接: {cleaned_cookie_id}")
-            return SendMessageResponse(
-                success=False,
-                message="账号实例不存在或未连接，请检查账号状态"
-            )
-
-        # 检查WebSocket连接状态
-        if not live_instance.ws or live_instance.ws.closed:
-            logger.warning(f"账号WebSocket连接已断开: {cleaned_cookie_id}")
+        if cookie_manager.manager is None:
             return SendMessageResponse(
                 success=False,
-                message="账号WebSocket连接已断开，请等待重连"
+                message="CookieManager 未就绪"
             )
 
-        # 发送消息（使用清理后的所有参数）
-        await live_instance.send_msg(
-            live_instance.ws,
+        # 由账号所在的事件循环（本进程、分片工作进程或独立的账号运行时）发送消息
+        result = await asyncio.to_thread(
+            cookie_manager.manager.send_message,
+            cleaned_cookie_id,
             cleaned_chat_id,
             cleaned_to_user_id,
             cleaned_message
         )
+        if not result.get('success'):
+            logger.warning(f"API发送消息失败: {cleaned_cookie_id}, {result.get('message')}")
+            return SendMessageResponse(
+                success=False,
+                message=result.get('message', '发送失败')
+            )
 
         logger.info(f"API成功发送消息: {cleaned_cookie_id} -> {cleaned_to_user_id}, 内容: {cleaned_message[:50]}{'...' if len(cleaned_message) > 50 else ''}")
 
@@ -1781,33 +1779,16 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                     # 更新内存中的cookie值
                     cookie_manager.manager.cookies[account_id] = cookies_str
                     log_with_user('info', f"已更新cookie_manager中的Cookie（内存）: {account_id}", current_user)
-                    
+
                     # 如果是新账号，需要启动任务
                     if is_new_account:
-                        # 使用异步方式启动任务，但不保存到数据库（避免覆盖账号密码）
+                        # 启动任务但不保存到数据库（避免覆盖账号密码），run_login在后台线程中运行，add_cookie是线程安全的
                         try:
-                            import asyncio
-                            loop = cookie_manager.manager.loop
-                            if loop:
-                                # 确保关键词列表存在
-                                if account_id not in cookie_manager.manager.keywords:
-                                    cookie_manager.manager.keywords[account_id] = []
-                                
-                                # 在后台启动任务（使用线程安全的方式，因为run_login是在后台线程中运行的）
-                                try:
-                                    # 尝试使用run_coroutine_threadsafe，这是线程安全的方式
-                                    fut = asyncio.run_coroutine_threadsafe(
-                                        cookie_manager.manager._run_xianyu(account_id, cookies_str, user_id),
-                                        loop
-                                    )
-                                    # 不等待结果，让它在后台运行
-                                    log_with_user('info', f"已启动新账号任务: {account_id}", current_user)
-                                except RuntimeError as e:
-                                    # 如果事件循环未运行，记录警告但不影响登录成功
-                                    log_with_user('warning', f"事件循环未运行，无法启动新账号任务: {account_id}, 错误: {str(e)}", current_user)
-                                    log_with_user('info', f"账号已保存，将在系统重启后自动启动任务: {account_id}", current_user)
+                            cookie_manager.manager.add_cookie(account_id, cookies_str, user_id=user_id, save_to_db=False)
+                            log_with_user('info', f"已启动新账号任务: {account_id}", current_user)
                         except Exception as task_err:
                             log_with_user('warning', f"启动新账号任务失败: {account_id}, 错误: {str(task_err)}", current_user)
+                            log_with_user('info', f"账号已保存，将在系统重启后自动启动任务: {account_id}", current_user)
                             import traceback
                             logger.error(traceback.format_exc())
                 
@@ -1843,7 +1824,7 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                                     if refreshed_cookies:
                                         # 更新cookie_manager中的Cookie
                                         if cookie_manager.manager:
-                                            cookie_manager.manager.update_cookie(account_id, refreshed_cookies, save_to_db=False)
+                                            await asyncio.to_thread(cookie_manager.manager.update_cookie, account_id, refreshed_cookies, save_to_db=False)
                                         log_with_user('info', f"已更新刷新后的Cookie到cookie_manager: {account_id}", current_user)
                             else:
                                 log_with_user('warning', f"Cookie刷新失败或跳过: {account_id}", current_user)
@@ -2350,11 +2331,11 @@ async def process_qr_login_cookies(cookies: str, unb: str, current_user: Dict[st
                     # 第二步：将真实cookie添加到cookie_manager（如果是新账号）或更新现有账号
                     if cookie_manager.manager:
                         if is_new_account:
-                            cookie_manager.manager.add_cookie(account_id, real_cookies)
+                            await asyncio.to_thread(cookie_manager.manager.add_cookie, account_id, real_cookies)
                             log_with_user('info', f"已将真实cookie添加到cookie_manager: {account_id}", current_user)
                         else:
                             # refresh_cookies_from_qr_login 已经保存到数据库了，这里不需要再保存
-                            cookie_manager.manager.update_cookie(account_id, real_cookies, save_to_db=False)
+                            await asyncio.to_thread(cookie_manager.manager.update_cookie, account_id, real_cookies, save_to_db=False)
                             log_with_user('info', f"已更新cookie_manager中的真实cookie: {account_id}", current_user)
 
                     return {
@@ -2399,11 +2380,11 @@ async def _fallback_save_qr_cookie(account_id: str, cookies: str, user_id: int,
         # 添加到或更新cookie_manager
         if cookie_manager.manager:
             if is_new_account:
-                cookie_manager.manager.add_cookie(account_id, cookies)
+                await asyncio.to_thread(cookie_manager.manager.add_cookie, account_id, cookies)
                 log_with_user('info', f"降级处理 - 已将原始cookie添加到cookie_manager: {account_id}", current_user)
             else:
                 # update_cookie_account_info 已经保存到数据库了，这里不需要再保存
-                cookie_manager.manager.update_cookie(account_id, cookies, save_to_db=False)
+                await asyncio.to_thread(cookie_manager.manager.update_cookie, account_id, cookies, save_to_db=False)
                 log_with_user('info', f"降级处理 - 已更新cookie_manager中的原始cookie: {account_id}", current_user)
 
         return {
@@ -2463,7 +2444,7 @@ async def refresh_cookies_from_qr_login(
                 updated_cookie_info = db_manager.get_cookie_by_id(cookie_id)
                 if updated_cookie_info:
                     # refresh_cookies_from_qr_login 已经保存到数据库了，这里不需要再保存
-                    cookie_manager.manager.update_cookie(cookie_id, updated_cookie_info['cookies_str'], save_to_db=False)
+                    await asyncio.to_thread(cookie_manager.manager.update_cookie, cookie_id, updated_cookie_info['cookies_str'], save_to_db=False)
                     log_with_user('info', f"已更新cookie_manager中的cookie: {cookie_id}", current_user)
 
             return {
@@ -2901,6 +2882,116 @@ def delete_message_notification(notification_id: int, _: None = Depends(require_
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get('/notification-metrics')
+def get_notification_metrics(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取各通知渠道类型的发送延迟统计和发件箱投递统计（管理员专用）"""
+    from utils.notification_dispatcher import get_notification_dispatcher
+    try:
+        dispatcher = get_notification_dispatcher()
+        return {'success': True, 'metrics': dispatcher.get_metrics(), 'outbox': dispatcher.get_outbox_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/adaptive-concurrency-stats')
+def get_adaptive_concurrency_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取各账号订单/商品详情获取的自适应并发上限、失败统计和吞吐量（管理员专用）"""
+    from utils.adaptive_concurrency import get_limiter_stats
+    try:
+        return {'success': True, 'limiters': get_limiter_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/admin/shards')
+def get_shard_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取账号分片运行状态：各工作进程的健康、负载和账号分布（管理员专用）"""
+    supervisor = cookie_manager.manager.shard_supervisor if cookie_manager.manager else None
+    if not supervisor:
+        return {'success': True, 'enabled': False}
+    return {'success': True, 'enabled': True, **supervisor.get_stats()}
+
+
+@app.post('/admin/shards/workers')
+def add_shard_worker(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """新增一个工作进程，并按一致性哈希把归属它的账号迁移过去（管理员专用）"""
+    supervisor = cookie_manager.manager.shard_supervisor if cookie_manager.manager else None
+    if not supervisor:
+        raise HTTPException(status_code=400, detail='未启用账号分片')
+    try:
+        worker_id, moved = supervisor.add_worker()
+        log_with_user('info', f"新增工作进程 {worker_id}，迁移 {moved} 个账号", admin_user)
+        return {'success': True, 'worker_id': worker_id, 'moved_accounts': moved}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete('/admin/shards/workers/{worker_id}')
+def remove_shard_worker(worker_id: int, admin_user: Dict[str, Any] = Depends(require_admin)):
+    """移除一个工作进程，其账号迁移到其他工作进程（管理员专用）"""
+    supervisor = cookie_manager.manager.shard_supervisor if cookie_manager.manager else None
+    if not supervisor:
+        raise HTTPException(status_code=400, detail='未启用账号分片')
+    try:
+        moved = supervisor.remove_worker(worker_id)
+        log_with_user('info', f"移除工作进程 {worker_id}，迁移 {moved} 个账号", admin_user)
+        return {'success': True, 'worker_id': worker_id, 'moved_accounts': moved}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/admin/startup-status')
+def get_startup_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """账号启动进度：已放行/已连接账号数、所有账号连接成功耗时（管理员专用）"""
+    if cookie_manager.manager is None:
+        raise HTTPException(status_code=500, detail='CookieManager 未就绪')
+    try:
+        return cookie_manager.manager.get_startup_status()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/admin/refresh-status')
+def get_refresh_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """Token/Cookie 刷新调度状态：正在刷新的账号、各类刷新次数和即将到期的刷新（管理员专用）"""
+    if cookie_manager.manager is None:
+        raise HTTPException(status_code=500, detail='CookieManager 未就绪')
+    try:
+        return cookie_manager.manager.get_refresh_status()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/admin/http-stats')
+def get_http_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """账号HTTP连接池按主机的请求数、连接复用率和请求延迟（管理员专用）"""
+    if cookie_manager.manager is None:
+        raise HTTPException(status_code=500, detail='CookieManager 未就绪')
+    try:
+        return cookie_manager.manager.get_http_stats()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get('/admin/heartbeat-status')
+def get_heartbeat_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """共享心跳调度器状态和各账号的心跳往返时间分布（管理员专用）"""
+    if cookie_manager.manager is None:
+        raise HTTPException(status_code=500, detail='CookieManager 未就绪')
+    try:
+        return cookie_manager.manager.get_heartbeat_status()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ------------------------- 系统设置接口 -------------------------
 
 @app.get('/system-settings/public')
@@ -2947,6 +3038,8 @@ def update_system_setting(key: str, setting_data: SystemSettingIn, _: None = Dep
 
         success = db_manager.set_system_setting(key, setting_data.value, setting_data.description)
         if success:
+            if key.startswith('item_sync_') and cookie_manager.manager is not None:
+                cookie_manager.manager.notify_item_sync_settings_changed()
             return {'msg': 'system setting updated'}
         else:
             raise HTTPException(status_code=400, detail='更新失败')
@@ -3510,6 +3603,8 @@ def export_keywords(cid: str, current_user: Dict[str, Any] = Depends(get_current
     if cid not in user_cookies:
         raise HTTPException(status_code=403, detail="无权限访问该Cookie")
 
+    import pandas as pd  # pandas 导入较慢，只在导入导出时加载
+
     try:
         # 获取关键词数据（包含类型信息）
         keywords = db_manager.get_keywords_with_type(cid)
@@ -3601,6 +3696,8 @@ async def import_keywords(cid: str, file: UploadFile = File(...), current_user:
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="请上传Excel文件(.xlsx或.xls)")
 
+    import pandas as pd  # pandas 导入较慢，只在导入导出时加载
+
     try:
         # 读取Excel文件
         contents = await file.read()
@@ -4535,6 +4632,9 @@ class AIReplySettings(BaseModel):
     max_discount_amount: int = 100
     max_bargain_rounds: int = 3
     custom_prompts: str = ""
+    # 以下字段未提交（为None）时保留已保存的值，避免未包含这些字段的设置页面保存时把它们清空
+    fallback_models: Optional[str] = None  # JSON数组，备用模型链，如 [{"model_name": "gpt-4o-mini", "base_url": "...", "api_key": "..."}]
+    hedge_enabled: Optional[bool] = None  # 是否启用对冲请求（主模型超过p95延迟未响应时并发请求备用模型）
 
 
 @app.delete("/items/batch")
@@ -4600,8 +4700,13 @@ def update_ai_reply_settings(cookie_id: str, settings: AIReplySettings, current_
         if cookie_manager.manager is None:
             raise HTTPException(status_code=500, detail='CookieManager 未就绪')
 
-        # 保存设置
+        # 保存设置（未提交的备用模型链/对冲开关沿用已保存的值）
         settings_dict = settings.dict()
+        if settings.fallback_models is None or settings.hedge_enabled is None:
+            saved_settings = db_manager.get_ai_reply_settings(cookie_id)
+            for field in ('fallback_models', 'hedge_enabled'):
+                if settings_dict[field] is None:
+                    settings_dict[field] = saved_settings[field]
         success = db_manager.save_ai_reply_settings(cookie_id, settings_dict)
 
         if success:
@@ -4695,6 +4800,16 @@ def test_ai_reply(cookie_id: str, test_data: dict, _: None = Depends(require_aut
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+@app.get("/ai-reply-provider-stats")
+def get_ai_provider_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取AI提供方的延迟/错误率统计（管理员专用）"""
+    try:
+        return {"success": True, "stats": ai_reply_engine.get_provider_stats()}
+    except Exception as e:
+        logger.error(f"获取AI提供方统计异常: {e}")
+        raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
+
+
 # ==================== 日志管理API ====================
 
 @app.get("/logs")
@@ -4840,7 +4955,8 @@ async def get_all_items_from_account(request: dict, _: None = Depends(require_au
                 "message": f"成功获取商品，共 {total_count} 件，保存 {saved_count} 件",
                 "total_count": total_count,
                 "total_pages": total_pages,
-                "saved_count": saved_count
+                "saved_count": saved_count,
+                "stats": result.get('stats', {})
             }
 
     except Exception as e:
@@ -5571,6 +5687,9 @@ def download_database_backup(admin_user: Dict[str, Any] = Depends(require_admin)
             log_with_user('error', f"数据库文件不存在: {db_file_path}", admin_user)
             raise HTTPException(status_code=404, detail="数据库文件不存在")
 
+        # WAL模式下已提交的数据可能还在 -wal 文件中，先写回数据库文件
+        db_manager.checkpoint()
+
         # 生成带时间戳的文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         download_filename = f"xianyu_backup_{timestamp}.db"
@@ -5654,6 +5773,7 @@ async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_ad
         backup_current_path = os.path.join(db_dir, backup_filename)
 
         if os.path.exists(current_db_path):
+            db_manager.checkpoint()
             shutil.copy2(current_db_path, backup_current_path)
             log_with_user('info', f"当前数据库已备份为: {backup_current_path}", admin_user)
 
@@ -6248,17 +6368,16 @@ async def refresh_orders_status(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
-    智能刷新订单状态
-    1. 从数据库获取订单列表（支持筛选）
-    2. 对非'已发货'状态的订单，使用Playwright查询最新状态
-    3. 更新数据库中有变化的订单
+    智能刷新订单状态（后台任务）
+    1. 从数据库获取订单列表（支持筛选），找出非稳定状态或信息不完整的订单
+    2. 创建后台刷新任务并立即返回任务ID，同一账号正在刷新时直接返回已有任务
+    3. 通过 /api/orders/refresh/jobs/{job_id} 轮询或 /events 订阅进度和部分结果
     """
     try:
-        from db_manager import db_manager
-        from utils.order_fetcher_optimized import process_orders_batch
+        from utils.order_refresh_jobs import get_order_refresh_manager
 
         user_id = current_user['user_id']
-        log_with_user('info', f"开始智能刷新订单状态（优化版：并发处理） (cookie_id={cookie_id}, status={status})", current_user)
+        log_with_user('info', f"提交订单刷新任务 (cookie_id={cookie_id}, status={status})", current_user)
 
         # 获取用户的所有Cookie
         user_cookies = db_manager.get_all_cookies(user_id)
@@ -6269,359 +6388,120 @@ async def refresh_orders_status(
                 raise HTTPException(status_code=404, detail="Cookie不存在或无权访问")
             user_cookies = {cookie_id: user_cookies[cookie_id]}
 
-        # 获取需要刷新的订单
-        orders_to_refresh = []
-        for cid in user_cookies.keys():
-            # 获取该Cookie的所有订单
-            orders = db_manager.get_orders_by_cookie(cid, limit=1000)
-
-            # 筛选需要刷新的订单
-            for order in orders:
-                # 如果指定了状态筛选，只刷新该状态的订单
-                if status and order.get('status') != status:
-                    continue
+        job, deduplicated = get_order_refresh_manager().submit(user_id, user_cookies, status)
+        info = job.to_dict()
 
-                order_status = order.get('status', 'unknown')
-                buyer_id = order.get('buyer_id', '')
-                amount = order.get('amount', '')
-                receiver_name = order.get('receiver_name', '')
-                receiver_phone = order.get('receiver_phone', '')
-                receiver_address = order.get('receiver_address', '')
-
-                # 判断是否需要刷新：
-                # 1. 非稳定状态订单（非已发货、非交易成功、非已关闭）
-                # 2. 买家ID为空或unknown_user
-                # 3. 金额为空
-                # 4. 收货人信息不完整（姓名、电话、地址任一为空或unknown）
-                needs_refresh = (
-                    order_status not in ['shipped', 'completed', 'cancelled'] or
-                    not buyer_id or buyer_id == 'unknown_user' or
-                    not amount or
-                    not receiver_name or receiver_name == 'unknown' or
-                    not receiver_phone or receiver_phone == 'unknown' or
-                    not receiver_address or receiver_address == 'unknown'
-                )
-
-                if needs_refresh:
-                    orders_to_refresh.append({
-                        'order_id': order['order_id'],
-                        'cookie_id': cid,
-                        'current_status': order_status
-                    })
-
-        log_with_user('info', f"找到 {len(orders_to_refresh)} 个需要刷新的订单", current_user)
-
-        if not orders_to_refresh:
-            return JSONResponse({
-                "success": True,
-                "message": "没有需要刷新的订单",
-                "summary": {
-                    "total": 0,
-                    "updated": 0,
-                    "no_change": 0,
-                    "failed": 0
-                },
-                "results": []
-            })
-
-        # 刷新订单信息（包括状态、买家ID、金额等）
-        updated_count = 0
-        failed_count = 0
-        no_change_count = 0
-        refresh_results = []
-
-        # 按cookie_id分组订单（因为每个cookie需要单独的浏览器实例）
-        orders_by_cookie = {}
-        for order_info in orders_to_refresh:
-            cid = order_info['cookie_id']
-            if cid not in orders_by_cookie:
-                orders_by_cookie[cid] = []
-            orders_by_cookie[cid].append(order_info)
-
-        # 对每个cookie的订单进行并发批量处理
-        for cid, cookie_orders in orders_by_cookie.items():
-            cookies_str = user_cookies[cid]
-            if not cookies_str:
-                log_with_user('warning', f"Cookie {cid} 的值为空，跳过", current_user)
-                failed_count += len(cookie_orders)
-                continue
+        if deduplicated:
+            message = "该账号的订单刷新任务正在进行中"
+        elif job.finished and job.total == 0:
+            message = "没有需要刷新的订单"
+        else:
+            message = f"已创建刷新任务，共 {job.total} 个订单需要刷新"
+        log_with_user('info', f"订单刷新任务 {job.job_id}: {message}", current_user)
 
-            # 提取订单ID列表
-            order_ids = [o['order_id'] for o in cookie_orders]
-            log_with_user('info', f"使用并发处理Cookie {cid} 的 {len(order_ids)} 个订单", current_user)
-
-            # 并发批量处理（一次浏览器调用获取所有数据）
-            batch_results = await process_orders_batch(
-                order_ids=order_ids,
-                cookie_id=cid,
-                cookie_string=cookies_str,
-                max_concurrent=5,  # 并发5个
-                timeout=30,
-                headless=True,
-                use_pool=True  # 使用浏览器池
-            )
+        return JSONResponse({
+            "success": True,
+            "message": message,
+            "job_id": job.job_id,
+            "deduplicated": deduplicated,
+            "job": info,
+            "summary": {
+                "total": info['total'],
+                "updated": info['updated'],
+                "no_change": info['no_change'],
+                "failed": info['failed']
+            }
+        }, status_code=202)
 
-            # 处理结果并更新数据库
-            for i, result in enumerate(batch_results):
-                order_info = cookie_orders[i]
-                order_id = order_info['order_id']
-                current_status = order_info['current_status']
-
-                if result and not result.get('error'):
-                    # 状态码映射
-                    order_status = result.get('order_status', 'unknown')
-                    if order_status and str(order_status).isdigit():
-                        status_mapping = {
-                            '1': 'processing',
-                            '2': 'pending_ship',
-                            '3': 'shipped',
-                            '4': 'completed',
-                            '5': 'refunding',
-                            '6': 'cancelled',
-                            '7': 'refunding',
-                            '8': 'cancelled',
-                            '9': 'refunding',
-                            '10': 'cancelled',
-                        }
-                        order_status = status_mapping.get(str(order_status), order_status)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_with_user('error', f"提交订单刷新任务失败: {str(e)}", current_user)
+        raise HTTPException(status_code=500, detail=f"刷新订单状态失败: {str(e)}")
 
-                    # 更新数据库
-                    success = db_manager.insert_or_update_order(
-                        order_id=order_id,
-                        item_id=result.get('item_id') or None,
-                        buyer_id=result.get('buyer_id') or None,
-                        spec_name=result.get('spec_name') or None,
-                        spec_value=result.get('spec_value') or None,
-                        quantity=result.get('quantity') or None,
-                        amount=result.get('amount') or None,
-                        order_status=order_status if order_status != current_status else None,
-                        cookie_id=cid,
-                        created_at=result.get('order_time') or None,
-                        receiver_name=result.get('receiver_name') or None,
-                        receiver_phone=result.get('receiver_phone') or None,
-                        receiver_address=result.get('receiver_address') or None
-                    )
 
-                    if success:
-                        # 检查是否有更新
-                        has_changes = (
-                            order_status != current_status or
-                            result.get('buyer_id') or
-                            result.get('amount')
-                        )
-
-                        if has_changes:
-                            updated_count += 1
-                            refresh_results.append({
-                                'order_id': order_id,
-                                'old_status': current_status,
-                                'new_status': order_status,
-                                'status_text': result.get('status_text', '')
-                            })
-                            log_with_user('info', f"订单 {order_id} 已更新 | {current_status} -> {order_status}", current_user)
-                        else:
-                            no_change_count += 1
-                    else:
-                        failed_count += 1
-                        log_with_user('error', f"订单 {order_id} 更新失败", current_user)
-                else:
-                    failed_count += 1
-                    error_msg = result.get('error', '未知错误') if result else '未知错误'
-                    log_with_user('warning', f"订单 {order_id} 获取失败: {error_msg}", current_user)
+@app.get('/api/orders/refresh/jobs')
+def list_order_refresh_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """获取当前用户最近的订单刷新任务"""
+    from utils.order_refresh_jobs import get_order_refresh_manager
+    try:
+        return {"success": True, "jobs": get_order_refresh_manager().list_jobs(current_user['user_id'], limit)}
+    except Exception as e:
+        log_with_user('error', f"获取订单刷新任务列表失败: {str(e)}", current_user)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 由于我们已经处理完所有订单，跳过原来的循环
-        # 下面的代码需要删除，所以我们需要找到循环结束的位置
-        if False:  # 这个if永远不会执行，只是为了保持代码结构
-            for order_info in orders_to_refresh:
-                order_id = order_info['order_id']
-                cookie_id = order_info['cookie_id']
-                current_status = order_info['current_status']
 
-                try:
-                    # 获取Cookie (get_all_cookies返回的是 {cookie_id: cookie_value} 格式)
-                    cookies_str = user_cookies[cookie_id]
+@app.get('/api/orders/refresh/jobs/{job_id}')
+def get_order_refresh_job(
+    job_id: str,
+    since: int = Query(0, ge=0),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    获取订单刷新任务的进度和结果
+    since: 只返回 updated_orders 中该下标之后的部分结果，用于增量轮询
+    """
+    from utils.order_refresh_jobs import get_order_refresh_manager
 
-                    if not cookies_str:
-                        log_with_user('warning', f"Cookie {cookie_id} 的值为空，跳过订单 {order_id}", current_user)
-                        failed_count += 1
-                        continue
+    info = get_order_refresh_manager().get_job_info(job_id, current_user['user_id'], since)
+    if not info:
+        raise HTTPException(status_code=404, detail="刷新任务不存在")
 
-                    # 使用订单详情获取器获取完整信息（包括买家ID、金额、收货人信息）
-                    # 注意：fetch_order_detail_simple 已经能获取所有需要的数据，无需再调用 OrderStatusQueryPlaywright
-                    order_detail = await fetch_order_detail_simple(order_id, cookies_str, headless=True)
-
-                    if order_detail:
-                        # 提取订单详情（从页面获取）
-                        spec_name = order_detail.get('spec_name', '')
-                        spec_value = order_detail.get('spec_value', '')
-                        quantity = order_detail.get('quantity', '')
-                        amount = order_detail.get('amount', '')
-                        receiver_name = order_detail.get('receiver_name', '')
-                        receiver_phone = order_detail.get('receiver_phone', '')
-                        receiver_address = order_detail.get('receiver_address', '')
-
-                        # 只使用状态查询获取订单状态和买家ID（因为DOM解析无法获取这些）
-                        query = OrderStatusQueryPlaywright(cookies_str, cookie_id, headless=True)
-                        status_result = await query.query_order_status(order_id)
-
-                        new_status = current_status
-                        new_status_text = ''
-                        buyer_id = ''
-                        item_id = ''
-                        is_bargain = None
-
-                        if status_result.get('success'):
-                            new_status_code = status_result.get('order_status')
-                            new_status_text = status_result.get('status_text', '')
-
-                            # 将状态码转换为数据库状态
-                            # 完整的订单状态码映射（基于闲鱼API）
-                            status_mapping = {
-                                1: 'processing',      # 处理中
-                                2: 'pending_ship',    # 待发货
-                                3: 'shipped',         # 已发货
-                                4: 'completed',       # 已完成/交易成功
-                                5: 'refunding',       # 退款中
-                                6: 'cancelled',       # 已取消/已关闭
-                                7: 'refunding',       # 退款申请中
-                                8: 'cancelled',       # 退款成功（订单关闭）
-                                9: 'refunding',       # 退款协商中
-                                10: 'cancelled',      # 退款关闭
-                            }
-                            new_status = status_mapping.get(new_status_code, 'unknown')
-
-                            # 特殊处理：根据状态文本智能识别（优先检查最终状态）
-                            if new_status == 'unknown':
-                                # 优先级1: 检查"退款成功"（最终状态）
-                                if '退款' in new_status_text and '成功' in new_status_text:
-                                    new_status = 'cancelled'  # 退款成功=订单关闭
-                                # 优先级2: 检查"关闭"或"取消"（最终状态）
-                                elif '关闭' in new_status_text or '取消' in new_status_text or '超时' in new_status_text:
-                                    new_status = 'cancelled'
-                                # 优先级3: 检查"完成"或"交易成功"（最终状态）
-                                elif '完成' in new_status_text or '交易成功' in new_status_text or '确认收货' in new_status_text:
-                                    new_status = 'completed'
-                                # 优先级4: 检查"退款"（中间状态）
-                                elif '退款' in new_status_text:
-                                    new_status = 'refunding'
-
-                            log_with_user('debug', f"订单 {order_id}: 状态码={new_status_code}, 状态文本={new_status_text}, 映射结果={new_status}", current_user)
-
-                            # 从 raw_data 中提取完整信息
-                            raw_data = status_result.get('raw_data', {})
-
-                            # 提取买家ID、商品ID、时间信息
-                            created_at = None
-                            try:
-                                # 方法1: 从根级别提取 peerUserId (买家ID)
-                                buyer_id = str(raw_data.get('peerUserId', ''))
-
-                                # 方法2: 从根级别提取 itemId (商品ID)
-                                item_id = str(raw_data.get('itemId', ''))
-
-                                # 方法3: 从 orderStatusVO 组件中提取下单时间
-                                if 'components' in raw_data:
-                                    for component in raw_data['components']:
-                                        if component.get('render') == 'orderStatusVO':
-                                            order_status_data = component.get('data', {})
-                                            # 从 orderStatusNodeList 中找到第一个时间节点（已拍下时间 = 创建时间）
-                                            node_list = order_status_data.get('orderStatusNodeList', [])
-                                            if node_list and len(node_list) > 0:
-                                                created_at = node_list[0].get('time')  # 第一个是"已拍下"时间
-                                            break
-
-                                # 方法4: 从 orderInfoVO 组件中提取是否小刀（如果有 bargainInfo）
-                                if 'components' in raw_data:
-                                    for component in raw_data['components']:
-                                        if component.get('render') == 'orderInfoVO':
-                                            data = component.get('data', {})
-                                            # 检查是否有小刀信息
-                                            if 'bargainInfo' in data:
-                                                bargain_info = data.get('bargainInfo', {})
-                                                is_bargain = bargain_info.get('bargain', False)
-                                            # 如果前面没找到商品ID，尝试从 jumpUrl 中提取
-                                            if not item_id:
-                                                item_info = data.get('itemInfo', {})
-                                                jump_url = item_info.get('jumpUrl', '')
-                                                if 'id=' in jump_url:
-                                                    item_id = jump_url.split('id=')[1].split('&')[0]
-                                            break
-
-                                if created_at:
-                                    log_with_user('debug', f"提取到订单创建时间: {created_at}", current_user)
-
-                            except Exception as e:
-                                log_with_user('warning', f"提取订单信息失败: {str(e)}", current_user)
-
-                        # 更新数据库（包含所有字段）
-                        success = db_manager.insert_or_update_order(
-                            order_id=order_id,
-                            item_id=item_id if item_id else None,
-                            buyer_id=buyer_id if buyer_id else None,
-                            spec_name=spec_name if spec_name else None,
-                            spec_value=spec_value if spec_value else None,
-                            quantity=quantity if quantity else None,
-                            amount=amount if amount else None,
-                            order_status=new_status if new_status != current_status else None,
-                            is_bargain=is_bargain if is_bargain is not None else None,
-                            cookie_id=cookie_id,
-                            created_at=created_at,  # 添加创建时间（从API提取的北京时间）
-                            receiver_name=receiver_name if receiver_name else None,
-                            receiver_phone=receiver_phone if receiver_phone else None,
-                            receiver_address=receiver_address if receiver_address else None
-                        )
-
-                        if success:
-                            # 检查是否有任何更新
-                            has_changes = (
-                                new_status != current_status or
-                                (buyer_id and buyer_id != 'unknown_user') or
-                                amount
-                            )
-
-                            if has_changes:
-                                updated_count += 1
-                                refresh_results.append({
-                                    'order_id': order_id,
-                                    'old_status': current_status,
-                                    'new_status': new_status,
-                                    'status_text': new_status_text
-                                })
-                                log_with_user('info', f"订单 {order_id} 信息已更新 | 状态: {current_status} -> {new_status} | 买家: {buyer_id} | 金额: {amount}", current_user)
-                            else:
-                                no_change_count += 1
-                                log_with_user('debug', f"订单 {order_id} 信息无变化", current_user)
-                        else:
-                            failed_count += 1
-                            log_with_user('error', f"订单 {order_id} 信息更新失败", current_user)
-                    else:
-                        failed_count += 1
-                        log_with_user('warning', f"订单 {order_id} 详情获取失败", current_user)
+    return {
+        "success": True,
+        "job": info,
+        "summary": {
+            "total": info['total'],
+            "updated": info['updated'],
+            "no_change": info['no_change'],
+            "failed": info['failed']
+        }
+    }
 
-                except Exception as e:
-                    failed_count += 1
-                    log_with_user('error', f"刷新订单 {order_id} 时发生异常: {str(e)}", current_user)
 
-        # 返回刷新结果
-        log_with_user('info', f"订单刷新完成: 更新{updated_count}个, 无变化{no_change_count}个, 失败{failed_count}个", current_user)
+@app.get('/api/orders/refresh/jobs/{job_id}/events')
+async def stream_order_refresh_job(job_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """以 server-sent events 推送订单刷新任务进度，每个事件只携带新增的部分结果，任务结束后关闭连接"""
+    from utils.order_refresh_jobs import FINISHED_STATES, get_order_refresh_manager
 
-        return JSONResponse({
-            "success": True,
-            "message": f"刷新完成: 更新{updated_count}个, 无变化{no_change_count}个, 失败{failed_count}个",
-            "summary": {
-                "total": len(orders_to_refresh),
-                "updated": updated_count,
-                "no_change": no_change_count,
-                "failed": failed_count
-            },
-            "updated_orders": refresh_results
-        })
+    manager = get_order_refresh_manager()
+    user_id = current_user['user_id']
+    if not manager.get_job_info(job_id, user_id):
+        raise HTTPException(status_code=404, detail="刷新任务不存在")
+
+    async def event_stream():
+        sent = 0
+        while True:
+            job = manager.get_job(job_id, user_id)
+            if not job:
+                # 任务已结束并移出内存，或在其他 worker 进程中执行：从数据库读取，未结束时定期轮询
+                info = manager.get_job_info(job_id, user_id, sent)
+                if not info:
+                    break
+                sent += len(info['updated_orders'])
+                yield f"event: progress\ndata: {json.dumps(info, ensure_ascii=False)}\n\n"
+                if info['state'] in FINISHED_STATES:
+                    break
+                await asyncio.sleep(2)
+                continue
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        log_with_user('error', f"刷新订单状态失败: {str(e)}", current_user)
-        raise HTTPException(status_code=500, detail=f"刷新订单状态失败: {str(e)}")
+            version = job.version
+            info = job.to_dict(sent)
+            sent += len(info['updated_orders'])
+            yield f"event: progress\ndata: {json.dumps(info, ensure_ascii=False)}\n\n"
+            if job.finished:
+                break
+            # 没有进度变化时最多15秒推送一次当前进度，兼作心跳
+            await job.wait_for_change(version, timeout=15)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # 已取消：全量核对订单数据功能
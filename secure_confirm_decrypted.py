@@ -8,7 +8,8 @@ import json
 import time
 import aiohttp
 from loguru import logger
-from utils.xianyu_utils import generate_sign, trans_cookies
+from utils.cookie_jar import AccountCookieJar
+from utils.xianyu_utils import generate_sign
 
 
 class SecureConfirm:
@@ -30,7 +31,7 @@ class SecureConfirm:
         self.main_instance = main_instance
 
         # 解析cookies
-        self.cookies = trans_cookies(cookies_str) if cookies_str else {}
+        self.cookies = AccountCookieJar(cookies_str)
 
         # Token相关属性
         self.current_token = None
@@ -119,7 +120,7 @@ class SecureConfirm:
         }
 
         # 始终从最新的cookies中获取_m_h5_tk token（刷新后cookies会被更新）
-        token = trans_cookies(self.cookies_str).get('_m_h5_tk', '').split('_')[0] if trans_cookies(self.cookies_str).get('_m_h5_tk') else ''
+        token = self.cookies.token
 
         if token:
             logger.info(f"使用cookies中的_m_h5_tk token: {token}")
@@ -139,21 +140,11 @@ class SecureConfirm:
                 res_json = await response.json()
 
                 # 检查并更新Cookie
-                if 'set-cookie' in response.headers:
-                    new_cookies = {}
-                    for cookie in response.headers.getall('set-cookie', []):
-                        if '=' in cookie:
-                            name, value = cookie.split(';')[0].split('=', 1)
-                            new_cookies[name.strip()] = value.strip()
-
-                    # 更新cookies
-                    if new_cookies:
-                        self.cookies.update(new_cookies)
-                        # 生成新的cookie字符串
-                        self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
-                        # 更新数据库中的Cookie
-                        await self._update_config_cookies()
-                        logger.debug("已更新Cookie到数据库")
+                if self.cookies.update_from_set_cookie(response.headers):
+                    self.cookies_str = self.cookies.value
+                    # 更新数据库中的Cookie
+                    await self._update_config_cookies()
+                    logger.debug("已更新Cookie到数据库")
 
                 logger.info(f"【{self.cookie_id}】自动确认发货响应: {res_json}")
 
@@ -0,0 +1,79 @@
+"""浏览器池预热页面复用"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('playwright.async_api')
+
+from utils.browser_pool import BrowserPool, _BrowserProcess, _ContextEntry
+
+
+class FakePage:
+    """模拟 Playwright 异步 Page（没有 remove_all_listeners）"""
+
+    def __init__(self):
+        self.listeners = {}
+        self.closed = False
+        self.url = 'https://www.goofish.com/'
+
+    def on(self, event, handler):
+        self.listeners.setdefault(event, []).append(handler)
+
+    def remove_listener(self, event, handler):
+        self.listeners[event].remove(handler)
+
+    async def unroute_all(self, behavior=None):
+        pass
+
+    async def route(self, url, handler):
+        pass
+
+    async def goto(self, url, timeout=None):
+        self.url = url
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.created = []
+
+    async def new_page(self):
+        page = FakePage()
+        self.created.append(page)
+        return page
+
+
+def test_released_page_is_reused_from_warm_set():
+    async def run():
+        pool = BrowserPool(warm_pages=2)
+        context = FakeContext()
+        entry = _ContextEntry('acc', _BrowserProcess(None, True), context, 'unb=1')
+        pool.pool['acc'] = entry
+        pool._ensure_reaper = lambda: None
+
+        async def get_context(key, cookie_string, headless, context_options):
+            return entry
+
+        pool._get_context = get_context
+
+        page = await pool.acquire_page('acc', 'unb=1')
+        assert len(page.listeners['response']) == 1
+        await pool.release_page(page)
+
+        assert entry.warm_pages == [page]
+        assert not page.is_closed()
+        assert page.listeners['response'] == []
+        assert page.url == 'about:blank'
+
+        again = await pool.acquire_page('acc', 'unb=1')
+        assert again is page
+        assert len(context.created) == 1
+        assert pool.warm_hits == 1
+        assert len(again.listeners['response']) == 1
+
+    asyncio.run(run())
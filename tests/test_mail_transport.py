@@ -0,0 +1,205 @@
+"""SMTP连接池：会话复用、空闲/断线重连、空闲连接回收"""
+import asyncio
+import base64
+import smtplib
+import socket
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+pytest.importorskip('loguru')
+
+from utils.mail_transport import MailTransport, SMTPConnectionPool
+
+USER = 'bot@example.com'
+PASSWORD = 'secret'
+REJECTED = 'nobody@example.com'
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """极简SMTP服务端：支持 EHLO/AUTH PLAIN/MAIL/RCPT/DATA/RSET/NOOP/QUIT，收到的邮件按会话记录"""
+
+    def handle(self):
+        session = {'authed': False, 'messages': [], 'quit': False}
+        with self.server.lock:
+            self.server.sessions.append(session)
+            self.server.sockets.append(self.request)
+        self._reply('220 sink ready')
+        try:
+            self._serve(session)
+        except OSError:
+            pass
+
+    def _reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+        self.wfile.flush()
+
+    def _serve(self, session):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self._reply('250-sink')
+                self._reply('250 AUTH PLAIN')
+            elif verb == 'AUTH':
+                _, user, password = base64.b64decode(command.split()[2]).decode().split('\0')
+                session['authed'] = (user, password) == (USER, PASSWORD)
+                self._reply('235 ok' if session['authed'] else '535 bad credentials')
+            elif verb == 'MAIL':
+                self._reply('250 ok' if session['authed'] else '530 auth required')
+            elif verb == 'RCPT':
+                self._reply('550 rejected' if REJECTED in command else '250 ok')
+            elif verb == 'DATA':
+                self._reply('354 go ahead')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b''):
+                        break
+                    data.append(chunk)
+                session['messages'].append(b''.join(data))
+                self._reply('250 queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 ok')
+            elif verb == 'QUIT':
+                session['quit'] = True
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('502 not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SinkHandler)
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.sockets = []
+
+    def drop_connections(self):
+        """模拟服务器主动断开所有连接"""
+        with self.lock:
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSink()
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.drop_connections()
+    server.server_close()
+
+
+def _pool(sink, **kwargs):
+    host, port = sink.server_address
+    return SMTPConnectionPool(host, port, USER, PASSWORD, use_tls=False, **kwargs)
+
+
+def _message(index: int, to: str = 'user@example.com'):
+    msg = EmailMessage()
+    msg['From'] = USER
+    msg['To'] = to
+    msg['Subject'] = f'通知 {index}'
+    msg.set_content(f'第 {index} 封')
+    return msg, USER, [to]
+
+
+def _wait_for(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_send_messages_share_one_authenticated_session(sink):
+    pool = _pool(sink)
+
+    assert pool.send_messages([_message(i) for i in range(3)]) == 3
+    assert pool.send_messages([_message(3)]) == 1
+
+    assert len(sink.sessions) == 1
+    assert sink.sessions[0]['authed']
+    assert len(sink.sessions[0]['messages']) == 4
+    assert pool.get_status() == {'idle_connections': 1, 'connects': 1, 'sent': 4}
+
+
+def test_reconnects_after_idle_timeout(sink):
+    pool = _pool(sink, idle_timeout=0.05)
+
+    pool.send_messages([_message(0)])
+    time.sleep(0.1)
+    pool.send_messages([_message(1)])
+
+    assert pool.connects == 2
+    assert [len(session['messages']) for session in sink.sessions] == [1, 1]
+    # 过期的连接被正常关闭
+    assert _wait_for(lambda: sink.sessions[0]['quit'])
+
+
+def test_reconnects_after_server_drop(sink):
+    pool = _pool(sink)
+
+    pool.send_messages([_message(0)])
+    sink.drop_connections()
+    assert pool.send_messages([_message(1), _message(2)]) == 2
+
+    assert pool.connects == 2
+    assert [len(session['messages']) for session in sink.sessions] == [1, 2]
+    assert pool.get_status()['idle_connections'] == 1
+
+
+def test_failed_send_does_not_return_connection_to_pool(sink):
+    pool = _pool(sink)
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_messages([_message(0), _message(1, to=REJECTED)])
+
+    assert pool.sent == 1
+    assert pool.get_status()['idle_connections'] == 0
+    pool.send_messages([_message(2)])
+    assert pool.connects == 2
+
+
+def test_close_idle_evicts_expired_connections(sink):
+    pool = _pool(sink, idle_timeout=0.05)
+
+    pool.send_messages([_message(0)])
+    assert pool.close_idle() == 0
+    time.sleep(0.1)
+    assert pool.close_idle() == 1
+    assert pool.get_status()['idle_connections'] == 0
+    assert _wait_for(lambda: sink.sessions[0]['quit'])
+
+
+def test_transport_close_idle_force(sink):
+    host, port = sink.server_address
+    transport = MailTransport(max_workers=1)
+
+    async def run():
+        for index in range(2):
+            msg, _, to_addrs = _message(index)
+            await transport.send(host, port, USER, PASSWORD, msg, to_addrs, use_tls=False)
+
+    asyncio.run(run())
+
+    assert len(sink.sessions) == 1
+    assert transport.close_idle(force=True) == 1
+    assert transport.get_status()[f'{USER}@{host}:{port}']['idle_connections'] == 0
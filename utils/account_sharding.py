@@ -0,0 +1,619 @@
+"""
+账号分片运行时
+默认所有 XianyuLive 都运行在 Start.py 进程的同一个事件循环中，消息解码、JSON、日志格式化、execjs 等 CPU 工作
+会让一个繁忙账号拖慢所有账号，而且只能用到一个 CPU 核心。开启分片后：
+- 主进程中的 ShardSupervisor 启动 N 个工作进程，按 cookie_id 一致性哈希决定每个账号由哪个工作进程运行
+- 工作进程有自己的事件循环和 CookieManager，只运行分配给它的账号
+- 主进程 CookieManager 的启动/停止/重启/启用/禁用通过 IPC（multiprocessing.connection）转发给所属工作进程
+- 工作进程定期上报健康和负载（运行账号数、事件循环延迟、内存、CPU）
+- 新增或移除工作进程时只迁移归属发生变化的账号（先在原进程停止，确认后再在新进程启动）
+- 工作进程异常退出时自动重启并恢复其账号
+
+工作进程以 `python -m utils.account_sharding --worker-id N --address HOST:PORT` 启动，
+认证密钥通过环境变量 XIANYU_SHARD_AUTHKEY 传递。
+"""
+import argparse
+import asyncio
+import atexit
+import bisect
+import hashlib
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_AUTHKEY_ENV = 'XIANYU_SHARD_AUTHKEY'
+
+
+class ConsistentHashRing:
+    """一致性哈希环，每个节点在环上放置 vnodes 个虚拟节点"""
+
+    def __init__(self, nodes: Optional[List[int]] = None, vnodes: int = 100):
+        self.vnodes = vnodes
+        self.nodes = set()
+        self._keys: List[int] = []
+        self._ring: Dict[int, int] = {}
+        for node in nodes or []:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add_node(self, node: int):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            h = self._hash(f"shard-{node}#{i}")
+            self._ring[h] = node
+            bisect.insort(self._keys, h)
+
+    def remove_node(self, node: int):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for i in range(self.vnodes):
+            h = self._hash(f"shard-{node}#{i}")
+            if self._ring.get(h) == node:
+                del self._ring[h]
+                index = bisect.bisect_left(self._keys, h)
+                if index < len(self._keys) and self._keys[index] == h:
+                    self._keys.pop(index)
+
+    def get_node(self, key: str) -> int:
+        if not self._keys:
+            raise ValueError("哈希环中没有可用节点")
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[self._keys[index]]
+
+
+# ======================== 主进程：分片管理 ========================
+
+class _WorkerHandle:
+    """主进程中一个工作进程的状态"""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process: Optional[subprocess.Popen] = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.outbox: List[Dict[str, Any]] = []  # 连接建立前待发送的命令
+        self.health: Dict[str, Any] = {}
+        self.last_report = 0.0
+        self.started_at = 0.0
+        self.restarts = 0
+        self.next_restart_at = 0.0
+        self.retiring = False
+
+
+class ShardSupervisor:
+    """管理账号工作进程，负责账号分配、命令转发、健康监控和重新平衡"""
+
+    def __init__(self, workers: int = 2, vnodes: int = 100, health_interval: float = 10,
+                 restart_on_crash: bool = True, ack_timeout: float = 30):
+        """
+        初始化分片管理器
+
+        Args:
+            workers: 初始工作进程数
+            vnodes: 每个工作进程在哈希环上的虚拟节点数
+            health_interval: 工作进程上报健康状态的间隔（秒）
+            restart_on_crash: 工作进程异常退出时是否自动重启
+            ack_timeout: 等待工作进程确认命令的超时（秒）
+        """
+        self.initial_workers = max(1, workers)
+        self.health_interval = health_interval
+        self.restart_on_crash = restart_on_crash
+        self.ack_timeout = ack_timeout
+
+        self.ring = ConsistentHashRing(vnodes=vnodes)
+        self.workers: Dict[int, _WorkerHandle] = {}
+        self.accounts: Dict[str, Dict[str, Any]] = {}  # 应运行的账号 {cookie_id: {'user_id': ...}}
+        self.assignments: Dict[str, int] = {}  # {cookie_id: worker_id}
+
+        self._lock = threading.RLock()
+        self._rebalance_lock = threading.Lock()
+        self._pending: Dict[int, Tuple[threading.Event, Dict[str, Any]]] = {}
+        self._req_ids = itertools.count(1)
+        self._listener: Optional[Listener] = None
+        self._authkey = b''
+        self._closing = False
+
+    # ------------------------ 生命周期 ------------------------
+    def start(self):
+        """启动 IPC 监听和初始工作进程"""
+        self._authkey = os.urandom(16)
+        self._listener = Listener(('127.0.0.1', 0), authkey=self._authkey)
+        threading.Thread(target=self._accept_loop, daemon=True, name='shard-accept').start()
+
+        with self._lock:
+            for worker_id in range(self.initial_workers):
+                self._spawn(worker_id)
+                self.ring.add_node(worker_id)
+
+        threading.Thread(target=self._watch_loop, daemon=True, name='shard-watch').start()
+        atexit.register(self.shutdown)
+        logger.info(f"账号分片已启动: {self.initial_workers} 个工作进程，IPC地址 {self._listener.address}")
+
+    def shutdown(self, timeout: float = 15):
+        """通知所有工作进程停止账号并退出"""
+        if self._closing:
+            return
+        self._closing = True
+        for worker_id in list(self.workers):
+            self._send(worker_id, {'op': 'shutdown'})
+
+        deadline = time.time() + timeout
+        for handle in list(self.workers.values()):
+            if handle.process is None:
+                continue
+            try:
+                handle.process.wait(timeout=max(0.1, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"工作进程 {handle.worker_id} 未在 {timeout} 秒内退出，强制终止")
+                handle.process.kill()
+
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        logger.info("账号分片已停止")
+
+    def _spawn(self, worker_id: int):
+        handle = self.workers.get(worker_id)
+        if handle is None:
+            handle = _WorkerHandle(worker_id)
+            self.workers[worker_id] = handle
+
+        host, port = self._listener.address
+        env = dict(os.environ, **{_AUTHKEY_ENV: self._authkey.hex()})
+        handle.conn = None
+        handle.health = {}
+        handle.started_at = time.time()
+        handle.process = subprocess.Popen(
+            [sys.executable, '-m', 'utils.account_sharding',
+             '--worker-id', str(worker_id), '--address', f"{host}:{port}",
+             '--health-interval', str(self.health_interval)],
+            cwd=_PROJECT_DIR,
+            env=env
+        )
+        logger.info(f"工作进程 {worker_id} 已启动 (PID: {handle.process.pid})")
+
+    # ------------------------ IPC ------------------------
+    def _accept_loop(self):
+        while not self._closing:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._closing:
+                    return
+                logger.warning(f"接受工作进程连接失败: {e}")
+                continue
+            threading.Thread(target=self._serve_worker, args=(conn,), daemon=True).start()
+
+    def _serve_worker(self, conn):
+        try:
+            hello = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            return
+
+        handle = self.workers.get(hello.get('worker_id'))
+        if handle is None or hello.get('type') != 'hello':
+            conn.close()
+            return
+
+        with handle.send_lock:
+            handle.conn = conn
+            pending, handle.outbox = handle.outbox, []
+            for msg in pending:
+                conn.send(msg)
+        logger.info(f"工作进程 {handle.worker_id} 已连接 (PID: {hello.get('pid')})，补发 {len(pending)} 条命令")
+
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                break
+            self._on_message(handle, msg)
+
+        with handle.send_lock:
+            if handle.conn is conn:
+                handle.conn = None
+        if not self._closing and not handle.retiring:
+            logger.warning(f"工作进程 {handle.worker_id} 的连接已断开")
+
+    def _on_message(self, handle: _WorkerHandle, msg: Dict[str, Any]):
+        msg_type = msg.get('type')
+        if msg_type == 'health':
+            handle.health = msg
+            handle.last_report = time.time()
+        elif msg_type == 'ack':
+            pending = self._pending.pop(msg.get('req_id'), None)
+            if pending:
+                event, reply = pending
+                reply.update(msg)
+                event.set()
+
+    def _send(self, worker_id: int, msg: Dict[str, Any]):
+        handle = self.workers.get(worker_id)
+        if handle is None:
+            return
+        with handle.send_lock:
+            if handle.conn is not None:
+                try:
+                    handle.conn.send(msg)
+                    return
+                except (OSError, ValueError):
+                    handle.conn = None
+            # 工作进程尚未连接（启动或重启中），连接后补发
+            handle.outbox.append(msg)
+
+    def _request(self, worker_id: int, msg: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """发送命令并等待工作进程确认（阻塞，不要在事件循环中调用）"""
+        req_id = next(self._req_ids)
+        event = threading.Event()
+        reply: Dict[str, Any] = {}
+        self._pending[req_id] = (event, reply)
+        self._send(worker_id, dict(msg, req_id=req_id))
+        if not event.wait(timeout or self.ack_timeout):
+            self._pending.pop(req_id, None)
+            return {'ok': False, 'error': '等待工作进程确认超时'}
+        return reply
+
+    # ------------------------ 账号控制 ------------------------
+    def owner_of(self, cookie_id: str) -> int:
+        """账号所属的工作进程"""
+        with self._lock:
+            return self.assignments.get(cookie_id, self.ring.get_node(cookie_id))
+
+    def start_account(self, cookie_id: str, cookie_value: Optional[str] = None, user_id: Optional[int] = None):
+        """
+        在所属工作进程中启动（或重启）账号，不阻塞
+
+        Args:
+            cookie_id: 账号ID
+            cookie_value: Cookie值，为空时工作进程从数据库读取
+            user_id: 账号所属用户ID
+        """
+        with self._lock:
+            worker_id = self.ring.get_node(cookie_id)
+            old_worker_id = self.assignments.get(cookie_id)
+            self.accounts[cookie_id] = {'user_id': user_id}
+            self.assignments[cookie_id] = worker_id
+        if old_worker_id is not None and old_worker_id != worker_id:
+            self._send(old_worker_id, {'op': 'stop', 'cookie_id': cookie_id})
+        self._send(worker_id, {'op': 'start', 'cookie_id': cookie_id, 'cookie_value': cookie_value, 'user_id': user_id})
+
+    def stop_account(self, cookie_id: str):
+        """在所属工作进程中停止账号（保留账号数据），不阻塞"""
+        with self._lock:
+            self.accounts.pop(cookie_id, None)
+            worker_id = self.assignments.pop(cookie_id, None)
+        if worker_id is not None:
+            self._send(worker_id, {'op': 'stop', 'cookie_id': cookie_id})
+
+    def send_message(self, cookie_id: str, chat_id: str, to_user_id: str, message: str) -> Dict[str, Any]:
+        """通过账号所属工作进程发送消息（阻塞）"""
+        with self._lock:
+            worker_id = self.assignments.get(cookie_id)
+        if worker_id is None:
+            return {'success': False, 'message': '账号未运行'}
+        reply = self._request(worker_id, {'op': 'send_message', 'cookie_id': cookie_id, 'chat_id': chat_id,
+                                          'to_user_id': to_user_id, 'message': message})
+        if not reply.get('ok'):
+            return {'success': False, 'message': reply.get('error') or '发送失败'}
+        return reply.get('result')
+
+    def broadcast(self, op: str, **kwargs):
+        """向所有工作进程发送命令"""
+        for worker_id in list(self.workers):
+            self._send(worker_id, dict(kwargs, op=op))
+
+    # ------------------------ 扩缩容 ------------------------
+    def add_worker(self) -> Tuple[int, int]:
+        """
+        新增一个工作进程，并把哈希环上归属它的账号迁移过去（阻塞）
+
+        Returns:
+            (新工作进程ID, 迁移的账号数)
+        """
+        with self._rebalance_lock:
+            with self._lock:
+                worker_id = max(self.workers, default=-1) + 1
+                self._spawn(worker_id)
+                self.ring.add_node(worker_id)
+            moved = self._rebalance()
+        logger.info(f"已新增工作进程 {worker_id}，迁移 {moved} 个账号")
+        return worker_id, moved
+
+    def remove_worker(self, worker_id: int) -> int:
+        """
+        移除一个工作进程，其账号迁移到其他工作进程（阻塞）
+
+        Returns:
+            迁移的账号数
+        """
+        with self._rebalance_lock:
+            with self._lock:
+                handle = self.workers.get(worker_id)
+                if handle is None:
+                    raise ValueError(f"工作进程 {worker_id} 不存在")
+                if len(self.ring.nodes) <= 1:
+                    raise ValueError("至少需要保留一个工作进程")
+                handle.retiring = True
+                self.ring.remove_node(worker_id)
+            moved = self._rebalance()
+
+            self._send(worker_id, {'op': 'shutdown'})
+            try:
+                handle.process.wait(timeout=self.ack_timeout)
+            except subprocess.TimeoutExpired:
+                handle.process.kill()
+            with self._lock:
+                self.workers.pop(worker_id, None)
+        logger.info(f"已移除工作进程 {worker_id}，迁移 {moved} 个账号")
+        return moved
+
+    def _rebalance(self) -> int:
+        """把归属发生变化的账号迁移到新的工作进程：先在原进程停止并等待确认，再在新进程启动"""
+        with self._lock:
+            moves = []
+            for cookie_id, old_worker_id in self.assignments.items():
+                new_worker_id = self.ring.get_node(cookie_id)
+                if new_worker_id != old_worker_id:
+                    moves.append((cookie_id, old_worker_id, new_worker_id))
+
+        for cookie_id, old_worker_id, new_worker_id in moves:
+            reply = self._request(old_worker_id, {'op': 'stop', 'cookie_id': cookie_id})
+            if not reply.get('ok'):
+                logger.warning(f"【{cookie_id}】在工作进程 {old_worker_id} 中停止失败: {reply.get('error')}，继续迁移")
+            with self._lock:
+                # 迁移期间账号可能已被停止或重新启动
+                if self.assignments.get(cookie_id) != old_worker_id:
+                    continue
+                self.assignments[cookie_id] = new_worker_id
+                user_id = self.accounts.get(cookie_id, {}).get('user_id')
+            self._send(new_worker_id, {'op': 'start', 'cookie_id': cookie_id, 'user_id': user_id})
+            logger.info(f"【{cookie_id}】已从工作进程 {old_worker_id} 迁移到 {new_worker_id}")
+
+        return len(moves)
+
+    # ------------------------ 健康监控 ------------------------
+    def _watch_loop(self):
+        while not self._closing:
+            time.sleep(2)
+            for handle in list(self.workers.values()):
+                if self._closing or handle.retiring or handle.process is None:
+                    continue
+                exit_code = handle.process.poll()
+                if exit_code is None or not self.restart_on_crash:
+                    continue
+                now = time.time()
+                if now < handle.next_restart_at:
+                    continue
+                # 连续崩溃时延长重启间隔，避免反复拉起
+                handle.restarts += 1
+                uptime = now - handle.started_at
+                delay = 0 if uptime > 60 else min(60, 2 ** min(handle.restarts, 6))
+                handle.next_restart_at = now + delay
+                logger.error(f"工作进程 {handle.worker_id} 已退出 (退出码: {exit_code})，正在重启并恢复其账号")
+                self._restart_worker(handle)
+
+    def _restart_worker(self, handle: _WorkerHandle):
+        with self._lock:
+            with handle.send_lock:
+                handle.outbox = []
+            self._spawn(handle.worker_id)
+            accounts = [(cookie_id, self.accounts.get(cookie_id, {}).get('user_id'))
+                        for cookie_id, worker_id in self.assignments.items() if worker_id == handle.worker_id]
+        for cookie_id, user_id in accounts:
+            self._send(handle.worker_id, {'op': 'start', 'cookie_id': cookie_id, 'user_id': user_id})
+        logger.info(f"工作进程 {handle.worker_id} 已重启，恢复 {len(accounts)} 个账号")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各工作进程的健康和负载"""
+        now = time.time()
+        with self._lock:
+            assigned: Dict[int, int] = {}
+            for worker_id in self.assignments.values():
+                assigned[worker_id] = assigned.get(worker_id, 0) + 1
+
+            workers = []
+            for worker_id, handle in sorted(self.workers.items()):
+                health = handle.health
+                alive = handle.process is not None and handle.process.poll() is None
+                report_age = round(now - handle.last_report, 1) if handle.last_report else None
+                workers.append({
+                    'worker_id': worker_id,
+                    'pid': handle.process.pid if handle.process else None,
+                    'alive': alive,
+                    'connected': handle.conn is not None,
+                    'healthy': alive and report_age is not None and report_age <= self.health_interval * 3,
+                    'retiring': handle.retiring,
+                    'assigned_accounts': assigned.get(worker_id, 0),
+                    'running_accounts': len(health.get('accounts', [])),
+                    'loop_lag_ms': health.get('loop_lag_ms'),
+                    'tasks': health.get('tasks'),
+                    'rss_mb': health.get('rss_mb'),
+                    'cpu_percent': health.get('cpu_percent'),
+                    'restarts': handle.restarts,
+                    'uptime': round(now - handle.started_at, 1) if handle.started_at else None,
+                    'report_age': report_age
+                })
+
+            return {
+                'workers': workers,
+                'accounts': len(self.accounts),
+                'vnodes': self.ring.vnodes
+            }
+
+
+# ======================== 工作进程 ========================
+
+class _ShardWorker:
+    """工作进程：运行分配给它的账号，执行主进程转发的命令并上报健康状态"""
+
+    def __init__(self, worker_id: int, conn, loop: asyncio.AbstractEventLoop, health_interval: float):
+        self.worker_id = worker_id
+        self.conn = conn
+        self.loop = loop
+        self.health_interval = health_interval
+        self.manager = None
+        self._send_lock = threading.Lock()
+        self._stopped: Optional[asyncio.Event] = None
+        self._loop_lag = 0.0
+        self._process = psutil.Process() if psutil else None
+
+    def send(self, msg: Dict[str, Any]):
+        with self._send_lock:
+            try:
+                self.conn.send(msg)
+            except (OSError, ValueError):
+                pass
+
+    async def run(self):
+        import cookie_manager as cm
+
+        self._stopped = asyncio.Event()
+        cm.manager = cm.CookieManager(self.loop)
+        self.manager = cm.manager
+
+        threading.Thread(target=self._recv_loop, daemon=True, name=f"shard-{self.worker_id}-ipc").start()
+        self.send({'type': 'hello', 'worker_id': self.worker_id, 'pid': os.getpid()})
+        logger.info(f"工作进程 {self.worker_id} 已就绪 (PID: {os.getpid()})")
+
+        health_task = self.loop.create_task(self._report_health())
+        await self._stopped.wait()
+        health_task.cancel()
+
+        for cookie_id in list(self.manager.tasks):
+            await self.manager._cancel_task_async(cookie_id)
+        logger.info(f"工作进程 {self.worker_id} 已停止所有账号，退出")
+
+    def _recv_loop(self):
+        while True:
+            try:
+                msg = self.conn.recv()
+            except (EOFError, OSError):
+                logger.warning(f"工作进程 {self.worker_id} 与主进程的连接已断开，准备退出")
+                msg = {'op': 'shutdown'}
+            try:
+                asyncio.run_coroutine_threadsafe(self._handle(msg), self.loop)
+            except RuntimeError:
+                return
+            if msg.get('op') == 'shutdown':
+                return
+
+    async def _handle(self, msg: Dict[str, Any]):
+        from db_manager import db_manager
+
+        op = msg.get('op')
+        cookie_id = msg.get('cookie_id')
+        result = None
+        error = None
+        try:
+            if op == 'start':
+                cookie_value = msg.get('cookie_value') or db_manager.get_cookie(cookie_id)
+                if not cookie_value:
+                    raise ValueError(f"账号 {cookie_id} 的Cookie不存在")
+                # 主进程只会启动已启用的账号
+                self.manager.cookie_status[cookie_id] = True
+                self.manager.keywords.setdefault(cookie_id, [])
+                await self.manager._add_cookie_async(cookie_id, cookie_value, msg.get('user_id'), save_to_db=False)
+            elif op == 'stop':
+                await self.manager._cancel_task_async(cookie_id)
+            elif op == 'send_message':
+                result = await self.manager._send_message_async(cookie_id, msg.get('chat_id'), msg.get('to_user_id'), msg.get('message'))
+            elif op == 'item_sync_settings':
+                self.manager.notify_item_sync_settings_changed()
+            elif op == 'ping':
+                result = self._health()
+            elif op == 'shutdown':
+                self._stopped.set()
+            else:
+                raise ValueError(f"未知命令: {op}")
+        except Exception as e:
+            error = str(e)
+            logger.error(f"工作进程 {self.worker_id} 执行命令 {op} 失败: {e}")
+
+        if msg.get('req_id') is not None:
+            self.send({'type': 'ack', 'req_id': msg['req_id'], 'ok': error is None, 'result': result, 'error': error})
+
+    def _health(self) -> Dict[str, Any]:
+        running = [cookie_id for cookie_id, task in self.manager.tasks.items() if not task.done()]
+        info = {
+            'type': 'health',
+            'worker_id': self.worker_id,
+            'pid': os.getpid(),
+            'time': time.time(),
+            'accounts': sorted(running),
+            'tasks': len(asyncio.all_tasks(self.loop)),
+            'loop_lag_ms': round(self._loop_lag * 1000, 1)
+        }
+        if self._process:
+            try:
+                info['rss_mb'] = round(self._process.memory_info().rss / 1024 / 1024, 1)
+                info['cpu_percent'] = self._process.cpu_percent(None)
+            except Exception:
+                pass
+        return info
+
+    async def _report_health(self):
+        """每秒测一次事件循环延迟，按 health_interval 上报期间的最大值"""
+        max_lag = 0.0
+        last_report = time.monotonic()
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(1)
+            max_lag = max(max_lag, time.monotonic() - start - 1)
+            if time.monotonic() - last_report >= self.health_interval:
+                self._loop_lag = max_lag
+                self.send(self._health())
+                max_lag = 0.0
+                last_report = time.monotonic()
+
+
+def run_worker(worker_id: int, address: Tuple[str, int], authkey: bytes, health_interval: float = 10):
+    """工作进程入口"""
+    logger.add(
+        os.path.join(_PROJECT_DIR, 'logs', f"shard_{worker_id}.log"),
+        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level} | {name}:{function}:{line} - {message}",
+        level="INFO",
+        rotation="10 MB",
+        retention="3 days"
+    )
+
+    conn = Client(address, authkey=authkey)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    worker = _ShardWorker(worker_id, conn, loop, health_interval)
+    try:
+        loop.run_until_complete(worker.run())
+    finally:
+        conn.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='闲鱼账号分片工作进程')
+    parser.add_argument('--worker-id', type=int, required=True)
+    parser.add_argument('--address', required=True, help='主进程IPC地址 HOST:PORT')
+    parser.add_argument('--health-interval', type=float, default=10)
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(':', 1)
+    run_worker(args.worker_id, (host, int(port)), bytes.fromhex(os.environ[_AUTHKEY_ENV]), args.health_interval)
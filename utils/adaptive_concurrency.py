@@ -0,0 +1,213 @@
+"""
+自适应并发控制（AIMD）
+按账号和任务类型共享并发上限：请求健康时逐步加并发，遇到滑块/验证码或超时时快速减半，
+并统计实际吞吐量，用于订单详情批量获取和商品详情获取
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+
+class _Slot:
+    """一次受控执行，调用方通过 success/fail 标记结果"""
+    __slots__ = ('outcome',)
+
+    def __init__(self):
+        self.outcome: Optional[str] = None
+
+    def success(self):
+        self.outcome = 'success'
+
+    def skip(self):
+        """不计入统计（如命中缓存，没有真正发起请求）"""
+        self.outcome = 'skip'
+
+    def fail(self, kind: str = 'error'):
+        """
+        标记失败
+
+        Args:
+            kind: 失败类型，captcha（滑块/验证码/风控）、timeout（超时）、error（其他错误）
+        """
+        self.outcome = kind
+
+
+class AIMDLimiter:
+    """
+    加性增、乘性减的并发限制器
+
+    - 连续成功且耗时不超过 latency_threshold 的次数达到当前并发上限时，上限 +1
+    - 滑块/验证码或超时：上限乘以 backoff_factor（默认减半）；验证码额外冷却 captcha_cooldown 秒
+    - 其他错误：上限乘以 error_factor
+    """
+
+    def __init__(self, name: str, initial_limit: int = 3, min_limit: int = 1, max_limit: int = 10,
+                 latency_threshold: float = 15.0, backoff_factor: float = 0.5, error_factor: float = 0.75,
+                 captcha_cooldown: float = 30.0):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.latency_threshold = latency_threshold
+        self.backoff_factor = backoff_factor
+        self.error_factor = error_factor
+        self.captcha_cooldown = captcha_cooldown
+
+        self.in_flight = 0
+        self._streak = 0
+        self._cooldown_until = 0.0
+        self._cond = asyncio.Condition()
+
+        self.successes = 0
+        self.failures: Dict[str, int] = {'captcha': 0, 'timeout': 0, 'error': 0}
+        self.avg_latency = 0.0
+        self._completed: Deque[float] = deque(maxlen=1000)
+        self._started_at = time.time()
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                wait = self._cooldown_until - time.monotonic()
+                if wait <= 0 and self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                try:
+                    # 冷却期内定时醒来重新检查
+                    await asyncio.wait_for(self._cond.wait(), timeout=wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, outcome: str, latency: float):
+        async with self._cond:
+            self.in_flight -= 1
+            if outcome != 'skip':
+                self._record(outcome, latency)
+            self._cond.notify_all()
+
+    def _record(self, outcome: str, latency: float):
+        self._completed.append(time.time())
+        self.avg_latency = latency if self.avg_latency == 0 else self.avg_latency * 0.8 + latency * 0.2
+
+        if outcome == 'success':
+            self.successes += 1
+            if latency <= self.latency_threshold:
+                self._streak += 1
+                if self._streak >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._streak = 0
+                    logger.debug(f"【{self.name}】并发上限提高到 {self.limit}")
+            else:
+                self._streak = 0
+            return
+
+        kind = outcome if outcome in self.failures else 'error'
+        self.failures[kind] += 1
+        self._streak = 0
+        factor = self.error_factor if kind == 'error' else self.backoff_factor
+        old_limit = self.limit
+        self.limit = max(self.min_limit, int(self.limit * factor))
+        if kind == 'captcha':
+            self._cooldown_until = time.monotonic() + self.captcha_cooldown
+        if self.limit != old_limit or kind == 'captcha':
+            logger.warning(f"【{self.name}】检测到{kind}，并发上限 {old_limit} -> {self.limit}"
+                           f"{f'，暂停 {self.captcha_cooldown:.0f} 秒' if kind == 'captcha' else ''}")
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        获取一个并发名额
+
+        用法:
+            async with limiter.slot() as slot:
+                result = await fetch()
+                if not result:
+                    slot.fail('captcha')
+
+        未标记时正常退出记为成功，抛出超时异常记为timeout，其他异常记为error
+        """
+        await self.acquire()
+        slot = _Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except asyncio.TimeoutError:
+            slot.outcome = slot.outcome or 'timeout'
+            raise
+        except Exception:
+            slot.outcome = slot.outcome or 'error'
+            raise
+        finally:
+            await self.release(slot.outcome or 'success', time.perf_counter() - start)
+
+    def throughput(self, window: float = 60.0) -> float:
+        """最近 window 秒内每分钟完成的任务数"""
+        now = time.time()
+        span = min(window, max(now - self._started_at, 1.0))
+        done = sum(1 for t in self._completed if now - t <= window)
+        return done * 60.0 / span
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'in_flight': self.in_flight,
+            'successes': self.successes,
+            'failures': dict(self.failures),
+            'avg_latency': round(self.avg_latency, 3),
+            'throughput_per_min': round(self.throughput(), 2),
+            'cooling_down': self._cooldown_until > time.monotonic()
+        }
+
+
+# 各事件循环的限制器：{loop: {(账号, 任务类型): AIMDLimiter}}
+_limiters: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AIMDLimiter]]' = weakref.WeakKeyDictionary()
+
+
+def get_account_limiter(cookie_id: str, kind: str, max_limit: Optional[int] = None) -> AIMDLimiter:
+    """
+    获取账号某类任务共享的自适应并发限制器，参数读取 ADAPTIVE_CONCURRENCY 配置
+
+    Args:
+        cookie_id: 账号ID
+        kind: 任务类型，如 order_detail、item_detail
+        max_limit: 并发上限（覆盖配置，仅在首次创建时生效）
+
+    Returns:
+        AIMDLimiter实例
+    """
+    loop = asyncio.get_running_loop()
+    limiters = _limiters.setdefault(loop, {})
+    key = (cookie_id, kind)
+
+    limiter = limiters.get(key)
+    if limiter is None:
+        from config import ADAPTIVE_CONCURRENCY_CONFIG
+        cfg = ADAPTIVE_CONCURRENCY_CONFIG
+        limiter = AIMDLimiter(
+            name=f"{cookie_id}/{kind}",
+            initial_limit=cfg.get('initial_limit', 3),
+            min_limit=cfg.get('min_limit', 1),
+            max_limit=max_limit or cfg.get('max_limit', 10),
+            latency_threshold=cfg.get('latency_threshold', 15),
+            backoff_factor=cfg.get('backoff_factor', 0.5),
+            error_factor=cfg.get('error_factor', 0.75),
+            captcha_cooldown=cfg.get('captcha_cooldown', 30)
+        )
+        limiters[key] = limiter
+
+    return limiter
+
+
+def get_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有账号限制器的统计（包括各事件循环）"""
+    stats = {}
+    for limiters in list(_limiters.values()):
+        for (cookie_id, kind), limiter in list(limiters.items()):
+            stats[f"{cookie_id}/{kind}"] = limiter.get_stats()
+    return stats
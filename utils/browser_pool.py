@@ -1,14 +1,210 @@
 """
 浏览器实例池管理器
-用于复用浏览器实例，减少浏览器启动次数，提升性能
+同一事件循环内共享一个Playwright运行时和少量Chromium进程，
+每个账号使用独立的BrowserContext（Cookie只在创建时注入一次），
+所有调用方通过 acquire_page / release_page（或 lease）获取和归还页面；
+归还的页面重置后留作预热页面，并可按预设拦截图片、字体等与数据无关的请求；
+后台回收任务按闲置时间、内存占用和复用率淘汰上下文，并定期重启用久了的浏览器进程
 """
 import asyncio
-import time
+import hashlib
+import math
 import os
-from typing import Dict, Optional, Tuple
+import time
+import weakref
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
 from loguru import logger
-from collections import defaultdict
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# 浏览器启动参数（Docker环境优化）
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--no-zygote',
+    '--disable-gpu',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection',
+    '--disable-extensions',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-translate',
+    '--hide-scrollbars',
+    '--mute-audio',
+    '--no-default-browser-check',
+    '--no-pings'
+]
+
+# Docker环境额外参数
+DOCKER_BROWSER_ARGS = [
+    '--disable-background-networking',
+    '--disable-client-side-phishing-detection',
+    '--disable-hang-monitor',
+    '--disable-popup-blocking',
+    '--disable-prompt-on-repost',
+    '--disable-web-resources',
+    '--metrics-recording-only',
+    '--safebrowsing-disable-auto-update',
+    '--enable-automation',
+    '--password-store=basic',
+    '--use-mock-keychain',
+    '--memory-pressure-off',
+    '--max_old_space_size=512',
+    '--disable-component-extensions-with-background-pages',
+    '--disable-features=TranslateUI,BlinkGenPropertyTrees',
+    '--disable-logging',
+    '--disable-permissions-api',
+    '--disable-notifications'
+]
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+
+DEFAULT_EXTRA_HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "accept-language": "en,zh-CN;q=0.9,zh;q=0.8,ru;q=0.7",
+    "cache-control": "no-cache",
+    "pragma": "no-cache",
+    "priority": "u=0, i",
+    "sec-ch-ua": "\"Not)A;Brand\";v=\"8\", \"Chromium\";v=\"138\", \"Google Chrome\";v=\"138\"",
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": "\"Windows\"",
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "same-origin",
+    "sec-fetch-user": "?1",
+    "upgrade-insecure-requests": "1"
+}
+
+
+# 浏览器进程名关键字（chromium / chrome / chrome-headless-shell / headless_shell）
+_BROWSER_PROCESS_NAMES = ('chrom', 'headless_shell')
+
+
+def _browser_pids() -> set:
+    """当前进程派生的所有浏览器进程PID"""
+    if psutil is None:
+        return set()
+    pids = set()
+    try:
+        for proc in psutil.Process().children(recursive=True):
+            try:
+                name = (proc.name() or '').lower()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            if any(k in name for k in _BROWSER_PROCESS_NAMES):
+                pids.add(proc.pid)
+    except Exception:
+        pass
+    return pids
+
+
+def _process_tree_rss(pid: int) -> int:
+    """浏览器主进程及其所有子进程（渲染进程、GPU进程等）的常驻内存之和（字节）"""
+    if psutil is None or not pid:
+        return 0
+    try:
+        root = psutil.Process(pid)
+        total = root.memory_info().rss
+        for child in root.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total
+    except Exception:
+        return 0
+
+
+# 请求拦截预设：只取数据的抓取不需要加载图片、媒体、字体和统计脚本
+ROUTE_PRESETS: Dict[str, Dict[str, Any]] = {
+    'data_only': {
+        'resource_types': {'image', 'media', 'font'},
+        'url_keywords': [
+            'mmstat.com', 'arms-retcode', '/alilog/', 'aplus_', 'google-analytics.com',
+            'googletagmanager.com', 'hm.baidu.com', 'cnzz.com'
+        ]
+    },
+    'no_media': {
+        'resource_types': {'media', 'font'},
+        'url_keywords': []
+    }
+}
+
+
+def parse_cookie_string(cookie_string: str, domain: str = '.goofish.com') -> List[Dict[str, str]]:
+    """将 'a=1; b=2' 形式的Cookie字符串转换为Playwright的Cookie列表"""
+    cookies = []
+    for cookie_pair in (cookie_string or '').split(';'):
+        cookie_pair = cookie_pair.strip()
+        if '=' in cookie_pair:
+            name, value = cookie_pair.split('=', 1)
+            cookies.append({
+                'name': name.strip(),
+                'value': value.strip(),
+                'domain': domain,
+                'path': '/'
+            })
+    return cookies
+
+
+class _BrowserProcess:
+    """一个Chromium进程及其承载的上下文数、内存占用和使用次数"""
+    __slots__ = ('browser', 'headless', 'contexts', 'launched_at', 'pid', 'rss', 'uses', 'retiring')
+
+    def __init__(self, browser: Browser, headless: bool, pid: Optional[int] = None):
+        self.browser = browser
+        self.headless = headless
+        self.contexts = 0
+        self.launched_at = time.time()
+        self.pid = pid
+        self.rss = 0
+        self.uses = 0
+        # 标记为待回收后不再分配新上下文，借出的页面全部归还后关闭
+        self.retiring = False
+
+
+class _FetchStats:
+    """单次借用页面期间的请求统计"""
+    __slots__ = ('preset', 'started', 'requests', 'blocked', 'bytes', 'response_handler')
+
+    def __init__(self, preset: Optional[str]):
+        self.preset = preset
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.blocked = 0
+        self.bytes = 0
+        # 挂在页面上的 response 监听，归还时移除
+        self.response_handler = None
+
+
+class _ContextEntry:
+    """一个账号的浏览器上下文"""
+    __slots__ = ('key', 'process', 'context', 'cookie_string', 'pages', 'warm_pages', 'created_at', 'last_used', 'uses')
+
+    def __init__(self, key: str, process: _BrowserProcess, context: BrowserContext, cookie_string: str):
+        self.key = key
+        self.process = process
+        self.context = context
+        self.cookie_string = cookie_string
+        self.pages = set()
+        self.warm_pages: List[Page] = []
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
 
 
 class BrowserPool:
@@ -16,335 +212,665 @@ class BrowserPool:
     浏览器实例池
 
     功能:
-    - 按cookie_id维护浏览器实例
-    - 复用同一账号的浏览器
-    - 支持懒加载和自动清理
-    - 超时自动关闭闲置浏览器
+    - 共享一个Playwright运行时，按需启动最多 max_browsers 个Chromium进程
+    - 每个账号一个独立的BrowserContext，Cookie在创建时注入，变化时增量更新
+    - 上下文总数不超过 max_size，满时淘汰最久未用的空闲上下文，无可淘汰时排队等待
+    - 归还的页面重置后作为预热页面复用，每个上下文最多保留 warm_pages 个
+    - 按 ROUTE_PRESETS 拦截与数据无关的请求，记录每次抓取的耗时和传输字节数
+    - 后台回收任务定期采样浏览器进程内存，按加权LRU（闲置时间、内存占用、复用率）淘汰上下文，
+      超出内存上限或使用次数达到 max_uses 的浏览器进程在页面归还后重启
+    - 记录页面获取耗时和上下文命中/未命中/淘汰次数
     """
 
-    def __init__(self, max_size: int = 3, idle_timeout: int = 300):
+    # 淘汰评分权重：闲置越久、内存占用越大得分越高，复用越频繁得分越低，得分高的优先淘汰
+    IDLE_WEIGHT = 1.0
+    MEMORY_WEIGHT = 0.5
+    REUSE_WEIGHT = 0.5
+
+    def __init__(self, max_size: int = 6, idle_timeout: int = 300, max_browsers: int = 1, acquire_timeout: float = 60,
+                 warm_pages: int = 2, reap_interval: float = 30, max_browser_rss_mb: int = 800,
+                 max_total_rss_mb: int = 1500, max_uses: int = 200):
         """
         初始化浏览器池
 
         Args:
-            max_size: 最大浏览器实例数
-            idle_timeout: 闲置超时时间（秒），默认5分钟
+            max_size: 最大账号上下文数
+            idle_timeout: 上下文闲置超时时间（秒），默认5分钟
+            max_browsers: 最大Chromium进程数
+            acquire_timeout: 上下文数已满时等待的超时时间（秒）
+            warm_pages: 每个上下文保留的预热页面数
+            reap_interval: 后台回收任务的执行间隔（秒）
+            max_browser_rss_mb: 单个浏览器进程（含子进程）的内存上限（MB）
+            max_total_rss_mb: 所有浏览器进程的内存总上限（MB）
+            max_uses: 浏览器进程累计借出页面次数达到该值后重启
         """
         self.max_size = max_size
         self.idle_timeout = idle_timeout
-
-        # 存储浏览器实例：{cookie_id: (playwright, browser, context, page, last_used_time)}
-        self.pool: Dict[str, Tuple[Playwright, Browser, BrowserContext, Page, float]] = {}
-
-        # 锁：确保同一cookie_id的浏览器不会被并发初始化
+        self.max_browsers = max(1, max_browsers)
+        self.acquire_timeout = acquire_timeout
+        self.warm_pages = warm_pages
+        self.reap_interval = reap_interval
+        self.max_browser_rss_mb = max_browser_rss_mb
+        self.max_total_rss_mb = max_total_rss_mb
+        self.max_uses = max_uses
+        self._reaper_task: Optional[asyncio.Task] = None
+
+        self._playwright: Optional[Playwright] = None
+        self._browsers: List[_BrowserProcess] = []
+        self._runtime_lock = asyncio.Lock()
+
+        # 账号上下文：{key: _ContextEntry}
+        self.pool: Dict[str, _ContextEntry] = {}
+        self._creating = 0
+
+        # 锁：确保同一账号的上下文不会被并发初始化或在使用中被淘汰
         self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
 
-        # 全局锁：保护pool的读写
-        self._pool_lock = asyncio.Lock()
-
-        logger.info(f"浏览器池初始化完成，最大实例数: {max_size}，闲置超时: {idle_timeout}秒")
-
-    async def get_browser(
+        # 保护pool的读写，并在有上下文/页面释放时唤醒排队者
+        self._pool_lock = asyncio.Condition()
+
+        # 已借出的页面：{id(page): (key, 本次抓取统计)}
+        self._leases: Dict[int, Tuple[str, _FetchStats]] = {}
+
+        # 获取页面耗时统计
+        self._acquire_times: Deque[float] = deque(maxlen=200)
+        self.acquire_count = 0
+        self.acquire_failures = 0
+        self.warm_hits = 0
+        self.warm_misses = 0
+        self.context_hits = 0
+        self.context_misses = 0
+        self.recycled_browsers = 0
+        # 按原因统计的上下文淘汰次数：capacity / idle / memory / recycle / broken / manual
+        self.evictions: Dict[str, int] = defaultdict(int)
+
+        # 按拦截预设汇总的抓取统计：{preset: {count, seconds, bytes, requests, blocked}}
+        self._fetch_stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {'count': 0, 'seconds': 0.0, 'bytes': 0, 'requests': 0, 'blocked': 0}
+        )
+
+        logger.info(f"浏览器池初始化完成，最大上下文数: {max_size}，最大浏览器进程数: {self.max_browsers}，闲置超时: {idle_timeout}秒")
+
+    @staticmethod
+    def derive_key(cookie_string: str) -> str:
+        """没有cookie_id时根据Cookie推导账号标识（优先使用unb）"""
+        for cookie in parse_cookie_string(cookie_string):
+            if cookie['name'] == 'unb' and cookie['value']:
+                return f"unb_{cookie['value']}"
+        return f"cookie_{hashlib.md5((cookie_string or '').encode('utf-8')).hexdigest()[:12]}"
+
+    async def acquire_page(
         self,
-        cookie_id: str,
+        cookie_id: Optional[str],
         cookie_string: str,
         headless: bool = True,
-        create_new_page: bool = True
-    ) -> Optional[Tuple[Browser, BrowserContext, Page]]:
+        context_options: Optional[Dict[str, Any]] = None,
+        block_preset: Optional[str] = None
+    ) -> Optional[Page]:
         """
-        获取浏览器实例（如果不存在则创建）
+        获取账号上下文中的页面（优先使用预热页面），用完必须调用 release_page 归还
 
         Args:
-            cookie_id: Cookie ID
+            cookie_id: 账号ID（为空时根据Cookie推导）
             cookie_string: Cookie字符串
             headless: 是否无头模式
-            create_new_page: 是否创建新页面（默认True，避免并发冲突）
+            context_options: 创建上下文时覆盖的参数（viewport、user_agent、locale、storage_state等）
+            block_preset: 请求拦截预设名（见 ROUTE_PRESETS），为空则不拦截
 
         Returns:
-            (browser, context, page) 元组，失败返回None
+            Page对象，失败返回None
         """
-        async with self._locks[cookie_id]:
-            # 检查是否已存在该cookie_id的浏览器实例
-            async with self._pool_lock:
-                if cookie_id in self.pool:
-                    playwright, browser, context, page, _ = self.pool[cookie_id]
-
-                    # 检查浏览器是否仍然连接
-                    if browser.is_connected():
-                        try:
-                            # 验证上下文是否可用
-                            pages = context.pages
-                            if not pages:
-                                raise Exception("上下文没有可用页面")
-
-                            # 更新最后使用时间
-                            self.pool[cookie_id] = (playwright, browser, context, pages[0], time.time())
-
-                            # 为每次请求创建新页面，避免并发导航冲突
-                            if create_new_page:
-                                new_page = await context.new_page()
-                                logger.info(f"复用浏览器实例并创建新页面: {cookie_id}")
-                                return browser, context, new_page
-                            else:
-                                logger.info(f"复用已存在的浏览器实例: {cookie_id}")
-                                return browser, context, pages[0]
-                        except Exception as e:
-                            logger.warning(f"浏览器实例 {cookie_id} 不可用: {e}，将重新创建")
-                            await self._close_browser_unsafe(cookie_id)
-                    else:
-                        logger.warning(f"浏览器实例 {cookie_id} 已断开连接，将重新创建")
-                        await self._close_browser_unsafe(cookie_id)
-
-            # 如果池已满，清理最旧的实例
-            await self._ensure_pool_size()
-
-            # 创建新的浏览器实例
-            logger.info(f"创建新的浏览器实例: {cookie_id}")
-            result = await self._create_browser(cookie_id, cookie_string, headless)
-
-            if result:
-                playwright, browser, context, page = result
-
-                async with self._pool_lock:
-                    self.pool[cookie_id] = (playwright, browser, context, page, time.time())
-
-                logger.info(f"浏览器实例创建成功: {cookie_id}")
-                return browser, context, page
-            else:
-                logger.error(f"浏览器实例创建失败: {cookie_id}")
+        key = cookie_id or self.derive_key(cookie_string)
+        start_time = time.perf_counter()
+        self._ensure_reaper()
+
+        async with self._locks[key]:
+            entry = await self._get_context(key, cookie_string, headless, context_options)
+            if not entry:
+                self.acquire_failures += 1
                 return None
 
-    async def _create_browser(
-        self,
-        cookie_id: str,
-        cookie_string: str,
-        headless: bool = True
-    ) -> Optional[Tuple[Playwright, Browser, BrowserContext, Page]]:
+            page = None
+            while entry.warm_pages and page is None:
+                candidate = entry.warm_pages.pop()
+                if not candidate.is_closed():
+                    page = candidate
+
+            try:
+                if page is not None:
+                    self.warm_hits += 1
+                else:
+                    self.warm_misses += 1
+                    page = await entry.context.new_page()
+            except Exception as e:
+                logger.warning(f"浏览器上下文 {key} 不可用: {e}，将重新创建")
+                await self._close_context(key, reason='broken')
+                entry = await self._get_context(key, cookie_string, headless, context_options)
+                if not entry:
+                    self.acquire_failures += 1
+                    return None
+                try:
+                    page = await entry.context.new_page()
+                except Exception as e:
+                    logger.error(f"创建页面失败: {key}, {e}")
+                    self.acquire_failures += 1
+                    return None
+
+            stats = _FetchStats(block_preset)
+            try:
+                await self._instrument_page(page, stats)
+            except Exception as e:
+                logger.debug(f"设置页面请求拦截失败: {e}")
+
+            entry.pages.add(page)
+            entry.uses += 1
+            entry.process.uses += 1
+            entry.last_used = time.time()
+            self._leases[id(page)] = (key, stats)
+
+        elapsed = time.perf_counter() - start_time
+        self._acquire_times.append(elapsed)
+        self.acquire_count += 1
+        logger.debug(f"获取浏览器页面: {key}，耗时 {elapsed * 1000:.0f}ms")
+        return page
+
+    async def _instrument_page(self, page: Page, stats: _FetchStats):
+        """为借出的页面挂载请求统计和拦截预设"""
+        preset = ROUTE_PRESETS.get(stats.preset) if stats.preset else None
+
+        def on_response(response):
+            stats.requests += 1
+            try:
+                stats.bytes += int(response.headers.get('content-length') or 0)
+            except (TypeError, ValueError):
+                pass
+
+        page.on('response', on_response)
+        stats.response_handler = on_response
+
+        if preset:
+            resource_types = preset['resource_types']
+            url_keywords = preset['url_keywords']
+
+            async def handle_route(route):
+                request = route.request
+                if request.resource_type in resource_types or any(k in request.url for k in url_keywords):
+                    stats.blocked += 1
+                    await route.abort()
+                else:
+                    await route.fallback()
+
+            await page.route('**/*', handle_route)
+
+    async def _reset_page(self, page: Page, stats: Optional[_FetchStats]) -> bool:
+        """清除本次借用挂载的拦截规则和事件监听并回到空白页，便于下次复用"""
+        try:
+            try:
+                await page.unroute_all(behavior='ignoreErrors')
+            except AttributeError:
+                await page.unroute('**/*')
+            if stats and stats.response_handler:
+                page.remove_listener('response', stats.response_handler)
+                stats.response_handler = None
+            await page.goto('about:blank', timeout=5000)
+            return True
+        except Exception as e:
+            logger.debug(f"重置页面失败: {e}")
+            return False
+
+    async def release_page(self, page: Optional[Page]) -> Optional[Dict[str, Any]]:
         """
-        创建新的浏览器实例
+        归还页面：重置后作为预热页面保留（超出数量则关闭），上下文保留给该账号后续使用
 
         Args:
-            cookie_id: Cookie ID
-            cookie_string: Cookie字符串
-            headless: 是否无头模式
+            page: acquire_page 返回的页面
 
         Returns:
-            (playwright, browser, context, page) 元组，失败返回None
+            本次借用期间的抓取统计（耗时、请求数、拦截数、传输字节数）
         """
+        if page is None:
+            return None
+
+        key, stats = self._leases.pop(id(page), (None, None))
+        entry = self.pool.get(key) if key else None
+
+        reused = False
+        if entry and len(entry.warm_pages) < self.warm_pages and not page.is_closed():
+            if await self._reset_page(page, stats) and self.pool.get(key) is entry and not page.is_closed():
+                entry.warm_pages.append(page)
+                reused = True
+
+        if not reused:
+            try:
+                if not page.is_closed():
+                    await page.close()
+            except Exception as e:
+                logger.debug(f"关闭页面失败: {e}")
+
+        if entry:
+            entry.pages.discard(page)
+            entry.last_used = time.time()
+
+        async with self._pool_lock:
+            self._pool_lock.notify_all()
+
+        if not stats:
+            return None
+
+        elapsed = time.perf_counter() - stats.started
+        summary = self._fetch_stats[stats.preset or 'default']
+        summary['count'] += 1
+        summary['seconds'] += elapsed
+        summary['bytes'] += stats.bytes
+        summary['requests'] += stats.requests
+        summary['blocked'] += stats.blocked
+
+        return {
+            'preset': stats.preset,
+            'elapsed': elapsed,
+            'requests': stats.requests,
+            'blocked': stats.blocked,
+            'bytes': stats.bytes
+        }
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        cookie_id: Optional[str],
+        cookie_string: str,
+        headless: bool = True,
+        context_options: Optional[Dict[str, Any]] = None,
+        block_preset: Optional[str] = None
+    ):
+        """
+        以上下文管理器方式借用页面，退出时自动归还
+
+        用法:
+            async with get_browser_pool().lease(cookie_id, cookie_string, block_preset='data_only') as page:
+                await page.goto(url)
+        """
+        page = await self.acquire_page(cookie_id, cookie_string, headless, context_options, block_preset)
+        if page is None:
+            raise RuntimeError(f"获取浏览器页面失败: {cookie_id or '未命名账号'}")
         try:
-            # 启动Playwright
-            playwright = await async_playwright().start()
-
-            # 浏览器启动参数（Docker环境优化）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
+            yield page
+        finally:
+            await self.release_page(page)
 
-            # Docker环境额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-default-apps',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-sync',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain',
-                    '--memory-pressure-off',
-                    '--max_old_space_size=512',
-                    '--disable-component-extensions-with-background-pages',
-                    '--disable-features=TranslateUI,BlinkGenPropertyTrees',
-                    '--disable-logging',
-                    '--disable-permissions-api',
-                    '--disable-notifications',
-                    '--no-pings'
-                ])
-
-            # 启动浏览器
-            browser = await playwright.chromium.launch(
-                headless=headless,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            )
-
-            # 设置Cookie
-            cookies = []
-            for cookie_pair in cookie_string.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
-            logger.info(f"已设置 {len(cookies)} 个Cookie")
-
-            # 创建页面
-            page = await context.new_page()
-
-            # 设置额外的HTTP头
-            headers = {
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-                "accept-language": "en,zh-CN;q=0.9,zh;q=0.8,ru;q=0.7",
-                "cache-control": "no-cache",
-                "pragma": "no-cache",
-                "priority": "u=0, i",
-                "sec-ch-ua": "\"Not)A;Brand\";v=\"8\", \"Chromium\";v=\"138\", \"Google Chrome\";v=\"138\"",
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-platform": "\"Windows\"",
-                "sec-fetch-dest": "document",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-site": "same-origin",
-                "sec-fetch-user": "?1",
-                "upgrade-insecure-requests": "1"
+    async def _get_context(
+        self,
+        key: str,
+        cookie_string: str,
+        headless: bool,
+        context_options: Optional[Dict[str, Any]]
+    ) -> Optional[_ContextEntry]:
+        """获取或创建账号上下文（调用方需持有该账号的锁）"""
+        entry = self.pool.get(key)
+
+        if entry and not entry.process.browser.is_connected():
+            logger.warning(f"浏览器进程已断开连接，将重新创建上下文: {key}")
+            await self._close_context(key, reason='broken')
+            entry = None
+
+        if entry and entry.process.retiring and not entry.pages:
+            # 所在浏览器进程待回收，迁移到新进程
+            await self._close_context(key, reason='recycle')
+            entry = None
+
+        if entry:
+            self.context_hits += 1
+            if cookie_string and cookie_string != entry.cookie_string:
+                try:
+                    await entry.context.add_cookies(parse_cookie_string(cookie_string))
+                    entry.cookie_string = cookie_string
+                    logger.info(f"已更新浏览器上下文Cookie: {key}")
+                except Exception as e:
+                    logger.warning(f"更新浏览器上下文Cookie失败: {key}, {e}")
+            return entry
+
+        if not await self._reserve_slot():
+            logger.error(f"浏览器上下文数已达上限({self.max_size})，等待 {self.acquire_timeout} 秒后仍无空闲: {key}")
+            return None
+
+        self.context_misses += 1
+        entry = None
+        try:
+            entry = await self._create_context(key, cookie_string, headless, context_options)
+        finally:
+            async with self._pool_lock:
+                self._creating -= 1
+                if entry:
+                    self.pool[key] = entry
+                self._pool_lock.notify_all()
+
+        return entry
+
+    async def _reserve_slot(self) -> bool:
+        """为新上下文预留名额，池满时淘汰最久未用的空闲上下文，没有可淘汰的则等待"""
+        deadline = time.monotonic() + self.acquire_timeout
+        async with self._pool_lock:
+            while True:
+                if len(self.pool) + self._creating < self.max_size:
+                    self._creating += 1
+                    return True
+
+                victim = self._pick_idle_victim()
+                if victim:
+                    logger.info(f"浏览器池已满，淘汰上下文: {victim}")
+                    await self._close_context_unsafe(victim, reason='capacity')
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self._pool_lock.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return False
+
+    def _eviction_score(self, entry: _ContextEntry, now: float) -> float:
+        """加权LRU评分：闲置时间、分摊的进程内存、复用率（每分钟借出次数）"""
+        idle = (now - entry.last_used) / max(self.idle_timeout, 1)
+        memory = entry.process.rss / max(entry.process.contexts, 1) / (1024 * 1024) / max(self.max_browser_rss_mb, 1)
+        age_minutes = max((now - entry.created_at) / 60, 1)
+        reuse = min(entry.uses / age_minutes, 10) / 10
+        return self.IDLE_WEIGHT * idle + self.MEMORY_WEIGHT * memory - self.REUSE_WEIGHT * reuse
+
+    def _idle_candidates(self, process: Optional[_BrowserProcess] = None) -> List[_ContextEntry]:
+        """可淘汰的上下文（没有借出页面、没有正在初始化），按评分从高到低排序"""
+        now = time.time()
+        candidates = [
+            entry for key, entry in self.pool.items()
+            if not entry.pages and not self._locks[key].locked()
+            and (process is None or entry.process is process)
+        ]
+        candidates.sort(key=lambda entry: self._eviction_score(entry, now), reverse=True)
+        return candidates
+
+    def _pick_idle_victim(self) -> Optional[str]:
+        """选出评分最高的可淘汰上下文"""
+        candidates = self._idle_candidates()
+        return candidates[0].key if candidates else None
+
+    async def _create_context(
+        self,
+        key: str,
+        cookie_string: str,
+        headless: bool,
+        context_options: Optional[Dict[str, Any]]
+    ) -> Optional[_ContextEntry]:
+        """在共享的浏览器进程中创建账号上下文并注入Cookie"""
+        try:
+            process = await self._get_process(headless)
+            if not process:
+                return None
+
+            options = {
+                'viewport': {'width': 1920, 'height': 1080},
+                'user_agent': DEFAULT_USER_AGENT
             }
-            await context.set_extra_http_headers(headers)
+            if context_options:
+                options.update(context_options)
 
-            # 等待浏览器完全初始化
-            await asyncio.sleep(1)
+            context = await process.browser.new_context(**options)
+            await context.set_extra_http_headers(DEFAULT_EXTRA_HEADERS)
 
-            return playwright, browser, context, page
+            cookies = parse_cookie_string(cookie_string)
+            if cookies:
+                await context.add_cookies(cookies)
+
+            process.contexts += 1
+            logger.info(f"浏览器上下文创建成功: {key}，已设置 {len(cookies)} 个Cookie")
+            return _ContextEntry(key, process, context, cookie_string)
 
         except Exception as e:
-            logger.error(f"创建浏览器实例失败: {e}")
+            logger.error(f"创建浏览器上下文失败: {key}, {e}")
             return None
 
-    async def _ensure_pool_size(self):
-        """确保池大小不超过最大限制，如果超过则清理最旧的实例"""
-        async with self._pool_lock:
-            while len(self.pool) >= self.max_size:
-                # 找到最旧的实例（最后使用时间最早）
-                oldest_cookie_id = None
-                oldest_time = float('inf')
-
-                for cookie_id, (_, _, _, _, last_used) in self.pool.items():
-                    if last_used < oldest_time:
-                        oldest_time = last_used
-                        oldest_cookie_id = cookie_id
-
-                if oldest_cookie_id:
-                    logger.info(f"浏览器池已满，清理最旧的实例: {oldest_cookie_id}")
-                    await self._close_browser_unsafe(oldest_cookie_id)
-                else:
-                    break
+    async def _get_process(self, headless: bool) -> Optional[_BrowserProcess]:
+        """选择上下文最少的浏览器进程，都已满载且未达进程上限时启动新进程"""
+        async with self._runtime_lock:
+            self._browsers = [p for p in self._browsers if p.browser.is_connected()]
+
+            active = [p for p in self._browsers if not p.retiring]
+            candidates = [p for p in active if p.headless == headless]
+            per_browser = math.ceil(self.max_size / self.max_browsers)
+            process = min(candidates, key=lambda p: p.contexts) if candidates else None
+
+            if process is None or (process.contexts >= per_browser and len(active) < self.max_browsers):
+                before = await asyncio.to_thread(_browser_pids)
+                browser = await self._create_browser(headless)
+                if browser:
+                    process = _BrowserProcess(browser, headless, await self._find_browser_pid(before))
+                    self._browsers.append(process)
+
+            return process
+
+    @staticmethod
+    async def _find_browser_pid(before: set) -> Optional[int]:
+        """对比启动前后的进程列表，找出新浏览器的主进程PID"""
+        new_pids = await asyncio.to_thread(_browser_pids) - before
+        if not new_pids or psutil is None:
+            return None
+        for pid in new_pids:
+            try:
+                if psutil.Process(pid).ppid() not in new_pids:
+                    return pid
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return None
+
+    async def _ensure_runtime(self) -> Optional[Playwright]:
+        """启动共享的Playwright运行时（调用方需持有 _runtime_lock）"""
+        if self._playwright is None:
+            try:
+                self._playwright = await asyncio.wait_for(async_playwright().start(), timeout=30.0)
+                logger.info("Playwright运行时已启动")
+            except Exception as e:
+                logger.error(f"启动Playwright失败: {e}")
+                return None
+        return self._playwright
 
-    async def _close_browser_unsafe(self, cookie_id: str):
+    async def _create_browser(self, headless: bool = True) -> Optional[Browser]:
         """
-        关闭浏览器实例（不加锁，内部使用）
+        启动新的Chromium进程
 
         Args:
-            cookie_id: Cookie ID
+            headless: 是否无头模式
+
+        Returns:
+            Browser对象，失败返回None
         """
-        if cookie_id not in self.pool:
-            return
+        playwright = await self._ensure_runtime()
+        if not playwright:
+            return None
 
-        playwright, browser, context, page, _ = self.pool[cookie_id]
+        browser_args = list(BROWSER_ARGS)
+        if os.getenv('DOCKER_ENV'):
+            browser_args.extend(DOCKER_BROWSER_ARGS)
 
         try:
-            # 关闭页面
-            if page:
-                try:
-                    await page.close()
-                except Exception as e:
-                    logger.debug(f"关闭页面失败: {e}")
+            browser = await playwright.chromium.launch(headless=headless, args=browser_args)
+            logger.info(f"浏览器进程已启动（headless={headless}），当前进程数: {len(self._browsers) + 1}")
+            return browser
+        except Exception as e:
+            logger.error(f"启动浏览器失败: {e}")
+            return None
 
-            # 关闭上下文
-            if context:
-                try:
-                    await context.close()
-                except Exception as e:
-                    logger.debug(f"关闭上下文失败: {e}")
+    async def _close_context_unsafe(self, key: str, reason: Optional[str] = None):
+        """
+        关闭账号上下文（需持有 _pool_lock，内部使用）
 
-            # 关闭浏览器
-            if browser:
-                try:
-                    await browser.close()
-                except Exception as e:
-                    logger.debug(f"关闭浏览器失败: {e}")
+        Args:
+            key: 账号标识
+            reason: 淘汰原因，用于统计（为空则不计入淘汰次数）
+        """
+        entry = self.pool.pop(key, None)
+        if not entry:
+            return
+        if reason:
+            self.evictions[reason] += 1
 
-            # 停止Playwright
-            if playwright:
-                try:
-                    await playwright.stop()
-                except Exception as e:
-                    logger.debug(f"停止Playwright失败: {e}")
+        for page in list(entry.pages):
+            self._leases.pop(id(page), None)
+        entry.pages.clear()
+        entry.warm_pages.clear()
 
-            logger.info(f"浏览器实例已关闭: {cookie_id}")
+        try:
+            await entry.context.close()
         except Exception as e:
-            logger.error(f"关闭浏览器实例失败: {e}")
-        finally:
-            # 从池中移除
-            del self.pool[cookie_id]
+            logger.debug(f"关闭上下文失败: {e}")
+
+        entry.process.contexts = max(0, entry.process.contexts - 1)
+        logger.info(f"浏览器上下文已关闭: {key}{f'（{reason}）' if reason else ''}")
+
+    async def _close_context(self, key: str, reason: Optional[str] = None):
+        async with self._pool_lock:
+            await self._close_context_unsafe(key, reason)
+            self._pool_lock.notify_all()
 
     async def close_browser(self, cookie_id: str):
         """
-        关闭指定的浏览器实例
+        关闭指定账号的浏览器上下文
 
         Args:
             cookie_id: Cookie ID
         """
-        async with self._pool_lock:
-            await self._close_browser_unsafe(cookie_id)
+        await self._close_context(cookie_id, reason='manual')
 
     async def cleanup_idle_browsers(self):
-        """清理闲置的浏览器实例"""
+        """清理闲置的账号上下文，并关闭不再承载上下文的浏览器进程"""
         current_time = time.time()
-        to_close = []
 
         async with self._pool_lock:
-            for cookie_id, (_, _, _, _, last_used) in self.pool.items():
-                if current_time - last_used > self.idle_timeout:
-                    to_close.append(cookie_id)
+            to_close = [
+                key for key, entry in self.pool.items()
+                if not entry.pages and not self._locks[key].locked()
+                and current_time - entry.last_used > self.idle_timeout
+            ]
+            for key in to_close:
+                logger.info(f"清理闲置的浏览器上下文: {key}（闲置时间: {current_time - self.pool[key].last_used:.2f}秒）")
+                await self._close_context_unsafe(key, reason='idle')
+            if to_close:
+                self._pool_lock.notify_all()
+
+        async with self._runtime_lock:
+            if self._creating:
+                return
+            for process in [p for p in self._browsers if p.contexts == 0]:
+                self._browsers.remove(process)
+                try:
+                    await process.browser.close()
+                    logger.info("已关闭空闲的浏览器进程")
+                except Exception as e:
+                    logger.debug(f"关闭浏览器失败: {e}")
 
-        # 关闭闲置的浏览器
-        for cookie_id in to_close:
-            logger.info(f"清理闲置的浏览器实例: {cookie_id}（闲置时间: {current_time - self.pool[cookie_id][4]:.2f}秒）")
-            await self.close_browser(cookie_id)
+    def _ensure_reaper(self):
+        """在当前事件循环中启动后台回收任务（只启动一次）"""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self._reaper_loop())
+
+    async def _reaper_loop(self):
+        """后台回收任务：定期采样内存、清理闲置上下文、回收超限或用久了的浏览器进程"""
+        try:
+            while True:
+                await asyncio.sleep(self.reap_interval)
+                try:
+                    await self.reap()
+                except Exception as e:
+                    logger.error(f"浏览器池回收任务异常: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def sample_memory(self):
+        """采样每个浏览器进程（含子进程）的常驻内存"""
+        for process in list(self._browsers):
+            if process.pid:
+                process.rss = await asyncio.to_thread(_process_tree_rss, process.pid)
+
+    async def reap(self):
+        """执行一轮回收"""
+        await self.sample_memory()
+        await self.cleanup_idle_browsers()
+
+        mb = 1024 * 1024
+        total_rss = sum(p.rss for p in self._browsers)
+        async with self._pool_lock:
+            for process in sorted(self._browsers, key=lambda p: p.rss, reverse=True):
+                over_process = process.rss > self.max_browser_rss_mb * mb
+                over_total = total_rss > self.max_total_rss_mb * mb
+                if not (over_process or over_total):
+                    continue
+
+                # 先淘汰该进程中评分最高的空闲上下文，按分摊内存估算释放量
+                share = process.rss / max(process.contexts, 1)
+                for entry in self._idle_candidates(process):
+                    if process.rss <= self.max_browser_rss_mb * mb and total_rss <= self.max_total_rss_mb * mb:
+                        break
+                    logger.warning(f"浏览器进程内存 {process.rss / mb:.0f}MB 超出上限，淘汰上下文: {entry.key}")
+                    await self._close_context_unsafe(entry.key, reason='memory')
+                    process.rss -= share
+                    total_rss -= share
+
+                # 没有可淘汰的空闲上下文仍超限，待页面归还后重启该进程
+                if process.rss > self.max_browser_rss_mb * mb and not process.retiring:
+                    logger.warning(f"浏览器进程内存 {process.rss / mb:.0f}MB 仍超出上限，标记为待回收")
+                    process.retiring = True
+
+            for process in self._browsers:
+                if not process.retiring and self.max_uses and process.uses >= self.max_uses:
+                    logger.info(f"浏览器进程已借出 {process.uses} 次页面，标记为待回收")
+                    process.retiring = True
+
+            # 待回收进程上的上下文都没有借出页面时，关闭这些上下文
+            for process in [p for p in self._browsers if p.retiring]:
+                entries = [entry for entry in self.pool.values() if entry.process is process]
+                if any(entry.pages or self._locks[entry.key].locked() for entry in entries):
+                    continue
+                for entry in entries:
+                    await self._close_context_unsafe(entry.key, reason='recycle')
+
+            self._pool_lock.notify_all()
+
+        async with self._runtime_lock:
+            for process in [p for p in self._browsers if p.retiring and p.contexts == 0]:
+                self._browsers.remove(process)
+                self.recycled_browsers += 1
+                try:
+                    await process.browser.close()
+                    logger.info(f"已重启浏览器进程（内存 {process.rss / mb:.0f}MB，借出 {process.uses} 次）")
+                except Exception as e:
+                    logger.debug(f"关闭浏览器失败: {e}")
 
     async def close_all(self):
-        """关闭所有浏览器实例"""
+        """关闭所有上下文、浏览器进程和Playwright运行时"""
+        if self._reaper_task and not self._reaper_task.done():
+            self._reaper_task.cancel()
+        self._reaper_task = None
+
         async with self._pool_lock:
-            cookie_ids = list(self.pool.keys())
+            for key in list(self.pool.keys()):
+                await self._close_context_unsafe(key)
+            self._pool_lock.notify_all()
 
-        for cookie_id in cookie_ids:
-            await self.close_browser(cookie_id)
+        async with self._runtime_lock:
+            for process in self._browsers:
+                try:
+                    await process.browser.close()
+                except Exception as e:
+                    logger.debug(f"关闭浏览器失败: {e}")
+            self._browsers = []
+
+            if self._playwright:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    logger.debug(f"停止Playwright失败: {e}")
+                self._playwright = None
 
         logger.info("所有浏览器实例已关闭")
 
-    def get_pool_status(self) -> Dict[str, any]:
+    def get_pool_status(self) -> Dict[str, Any]:
         """
         获取池状态信息
 
@@ -352,42 +878,101 @@ class BrowserPool:
             包含池状态的字典
         """
         current_time = time.time()
+        samples = sorted(self._acquire_times)
+        acquire = {
+            'count': self.acquire_count,
+            'failures': self.acquire_failures,
+            'avg_ms': round(sum(samples) / len(samples) * 1000, 1) if samples else 0,
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1) if samples else 0,
+            'max_ms': round(samples[-1] * 1000, 1) if samples else 0
+        }
+
         status = {
             'total': len(self.pool),
             'max_size': self.max_size,
+            'browsers': len(self._browsers),
+            'max_browsers': self.max_browsers,
+            'leased_pages': len(self._leases),
+            'warm_pages': sum(len(entry.warm_pages) for entry in self.pool.values()),
+            'warm_hits': self.warm_hits,
+            'warm_misses': self.warm_misses,
+            'hits': self.context_hits,
+            'misses': self.context_misses,
+            'evictions': dict(self.evictions),
+            'recycled_browsers': self.recycled_browsers,
+            'rss_mb': round(sum(p.rss for p in self._browsers) / (1024 * 1024), 1),
+            'processes': [
+                {
+                    'pid': p.pid,
+                    'headless': p.headless,
+                    'contexts': p.contexts,
+                    'uses': p.uses,
+                    'rss_mb': round(p.rss / (1024 * 1024), 1),
+                    'retiring': p.retiring,
+                    'uptime': current_time - p.launched_at
+                }
+                for p in self._browsers
+            ],
+            'acquire': acquire,
+            'fetch': {
+                preset: {
+                    'count': item['count'],
+                    'avg_ms': round(item['seconds'] / item['count'] * 1000, 1) if item['count'] else 0,
+                    'avg_kb': round(item['bytes'] / item['count'] / 1024, 1) if item['count'] else 0,
+                    'requests': item['requests'],
+                    'blocked': item['blocked']
+                }
+                for preset, item in self._fetch_stats.items()
+            },
             'instances': []
         }
 
-        for cookie_id, (_, browser, _, _, last_used) in self.pool.items():
-            idle_time = current_time - last_used
+        for key, entry in self.pool.items():
             status['instances'].append({
-                'cookie_id': cookie_id,
-                'connected': browser.is_connected() if browser else False,
-                'idle_time': idle_time,
-                'last_used': last_used
+                'cookie_id': key,
+                'connected': entry.process.browser.is_connected(),
+                'pages': len(entry.pages),
+                'warm_pages': len(entry.warm_pages),
+                'uses': entry.uses,
+                'score': round(self._eviction_score(entry, current_time), 3),
+                'idle_time': current_time - entry.last_used,
+                'last_used': entry.last_used
             })
 
         return status
 
 
-# 全局浏览器池实例（单例模式）
-_global_browser_pool: Optional[BrowserPool] = None
+# 各事件循环的浏览器池实例（Playwright对象绑定创建它的事件循环，每个循环一个实例）
+_global_browser_pools: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BrowserPool]' = weakref.WeakKeyDictionary()
 
 
-def get_browser_pool(max_size: int = 3, idle_timeout: int = 300) -> BrowserPool:
+def get_browser_pool(max_size: Optional[int] = None, idle_timeout: Optional[int] = None) -> BrowserPool:
     """
-    获取全局浏览器池实例（单例模式）
+    获取当前事件循环的浏览器池实例（单例模式），默认参数读取 BROWSER_POOL 配置
 
     Args:
-        max_size: 最大浏览器实例数
+        max_size: 最大账号上下文数
         idle_timeout: 闲置超时时间（秒）
 
     Returns:
         BrowserPool实例
     """
-    global _global_browser_pool
-
-    if _global_browser_pool is None:
-        _global_browser_pool = BrowserPool(max_size=max_size, idle_timeout=idle_timeout)
-
-    return _global_browser_pool
+    loop = asyncio.get_running_loop()
+    pool = _global_browser_pools.get(loop)
+
+    if pool is None:
+        from config import BROWSER_POOL_CONFIG
+        pool = BrowserPool(
+            max_size=max_size or BROWSER_POOL_CONFIG.get('max_contexts', 6),
+            idle_timeout=idle_timeout or BROWSER_POOL_CONFIG.get('idle_timeout', 300),
+            max_browsers=BROWSER_POOL_CONFIG.get('max_browsers', 1),
+            acquire_timeout=BROWSER_POOL_CONFIG.get('acquire_timeout', 60),
+            warm_pages=BROWSER_POOL_CONFIG.get('warm_pages', 2),
+            reap_interval=BROWSER_POOL_CONFIG.get('reap_interval', 30),
+            max_browser_rss_mb=BROWSER_POOL_CONFIG.get('max_browser_rss_mb', 800),
+            max_total_rss_mb=BROWSER_POOL_CONFIG.get('max_total_rss_mb', 1500),
+            max_uses=BROWSER_POOL_CONFIG.get('max_uses', 200)
+        )
+        _global_browser_pools[loop] = pool
+
+    return pool
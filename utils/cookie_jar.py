@@ -0,0 +1,194 @@
+"""
+账号 Cookie 容器
+每个账号一个 AccountCookieJar，取代到处调用 trans_cookies(self.cookies_str) 重复解析整段 Cookie 字符串：
+- 创建或整体替换时解析一次，之后按 Set-Cookie 响应头、浏览器刷新结果增量更新
+- _m_h5_tk token、unb 和序列化后的 Cookie 字符串惰性计算并缓存，内容变化时失效
+- 可绑定 aiohttp 会话的 cookie_jar，变化的字段直接同步过去，请求时不再拼接/拆分 Cookie 字符串
+
+AccountCookieJar 本身是 dict 的子类，原有按字典读取 Cookie 的代码无需修改。
+"""
+from http.cookies import CookieError, Morsel
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+from loguru import logger
+
+
+def parse_cookies(cookies_str: str) -> Dict[str, str]:
+    """解析 "k1=v1; k2=v2" 格式的 Cookie 字符串"""
+    cookies = {}
+    if not cookies_str:
+        return cookies
+    for cookie in cookies_str.split('; '):
+        if '=' in cookie:
+            key, value = cookie.split('=', 1)
+            cookies[key] = value
+    return cookies
+
+
+def parse_set_cookie(set_cookie_headers: Iterable[str]) -> Dict[str, str]:
+    """从 Set-Cookie 响应头中提取 {名称: 值}"""
+    cookies = {}
+    for header in set_cookie_headers:
+        pair = header.split(';', 1)[0]
+        if '=' in pair:
+            name, value = pair.split('=', 1)
+            cookies[name.strip()] = value.strip()
+    return cookies
+
+
+class AccountCookieJar(dict):
+    """一个账号的 Cookie（解析一次、增量更新、惰性缓存）"""
+
+    def __init__(self, cookies: Union[str, Mapping[str, str], None] = None):
+        super().__init__(parse_cookies(cookies) if isinstance(cookies, str) else (cookies or {}))
+        # 由字符串创建/替换时原样保留该字符串作为序列化结果，与数据库中保存的值保持一致
+        self._value: Optional[str] = cookies if isinstance(cookies, str) else None
+        self._token: Optional[str] = None
+        self._session_jar = None
+        self._session_domain: Optional[str] = None
+
+    # ------------------------ 缓存的派生值 ------------------------
+    @property
+    def value(self) -> str:
+        """序列化后的 Cookie 字符串"""
+        if self._value is None:
+            self._value = '; '.join(f"{k}={v}" for k, v in self.items())
+        return self._value
+
+    @property
+    def token(self) -> str:
+        """_m_h5_tk 中用于签名的 token 部分"""
+        if self._token is None:
+            self._token = self.get('_m_h5_tk', '').split('_')[0]
+        return self._token
+
+    @property
+    def unb(self) -> Optional[str]:
+        return self.get('unb')
+
+    def __str__(self) -> str:
+        return self.value
+
+    # ------------------------ 更新 ------------------------
+    def _changed(self, changed: Optional[Mapping[str, str]] = None):
+        """内容变化：清空缓存并同步到绑定的 aiohttp cookie_jar（changed 为空表示整体替换）"""
+        self._value = None
+        self._token = None
+        if self._session_jar is not None:
+            if changed is None:
+                self._session_jar.clear()
+            self._feed_session_jar(self if changed is None else changed)
+
+    def replace(self, cookies: Union[str, Mapping[str, str]]) -> bool:
+        """
+        整体替换（数据库重新加载、扫码登录等）
+
+        Returns:
+            bool: 内容是否有变化
+        """
+        source = None
+        if isinstance(cookies, str):
+            if cookies == self.value:
+                return False
+            source, cookies = cookies, parse_cookies(cookies)
+        elif cookies is self or dict(cookies) == dict(self):
+            return False
+        super().clear()
+        super().update(cookies)
+        self._changed()
+        self._value = source
+        return True
+
+    def merge(self, cookies: Mapping[str, str]) -> Dict[str, str]:
+        """
+        合并新的 Cookie 字段（浏览器刷新、滑块验证等）
+
+        Returns:
+            Dict[str, str]: 实际发生变化的字段
+        """
+        changed = {k: v for k, v in cookies.items() if self.get(k) != v}
+        if changed:
+            super().update(changed)
+            self._changed(changed)
+        return changed
+
+    def update_from_set_cookie(self, headers) -> Dict[str, str]:
+        """
+        按响应的 Set-Cookie 头增量更新
+
+        Args:
+            headers: aiohttp/requests 响应头
+
+        Returns:
+            Dict[str, str]: 实际发生变化的字段
+        """
+        if hasattr(headers, 'getall'):
+            set_cookies = headers.getall('set-cookie', [])
+        else:
+            set_cookies = [headers['set-cookie']] if 'set-cookie' in headers else []
+        return self.merge(parse_set_cookie(set_cookies)) if set_cookies else {}
+
+    # dict 的写操作也要让缓存失效
+    def __setitem__(self, key: str, value: str):
+        self.merge({key: value})
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        self.merge(dict(*args, **kwargs))
+
+    def setdefault(self, key: str, default: str = '') -> str:
+        if key not in self:
+            self.merge({key: default})
+        return self[key]
+
+    def pop(self, key: str, *default) -> Any:
+        if key not in self:
+            return super().pop(key, *default)
+        value = super().pop(key)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    # ------------------------ aiohttp ------------------------
+    def bind(self, session_jar, domain: Optional[str] = None):
+        """
+        绑定 aiohttp 会话的 cookie_jar（建议 aiohttp.CookieJar(quote_cookie=False)），之后的变化直接同步过去
+
+        Args:
+            session_jar: aiohttp 的 cookie_jar
+            domain: Cookie 所属域名（如 goofish.com），只发送给该域名及其子域名；为空时对所有请求生效
+        """
+        self._session_jar = session_jar
+        self._session_domain = domain
+        session_jar.clear()
+        self._feed_session_jar(self)
+
+    def unbind(self):
+        self._session_jar = None
+
+    def _feed_session_jar(self, cookies: Mapping[str, str]):
+        morsels = {}
+        for name, value in cookies.items():
+            morsel = Morsel()
+            try:
+                # 值原样发送，不做引号转义
+                morsel.set(name, value, value)
+            except CookieError as e:
+                logger.debug(f"跳过无法写入会话的Cookie字段 {name}: {e}")
+                continue
+            if self._session_domain:
+                morsel['domain'] = self._session_domain
+                morsel['path'] = '/'
+            morsels[name] = morsel
+        self._session_jar.update_cookies(morsels)
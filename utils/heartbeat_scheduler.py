@@ -0,0 +1,343 @@
+"""
+WebSocket 心跳调度器
+由 CookieManager 持有，用一个时间轮统一发送和跟踪所有账号连接的心跳，取代每个 XianyuLive 各自的
+heartbeat_loop 任务（账号多时每个心跳间隔内有同样多的计时器各自唤醒、各自包一层 wait_for）：
+- 时间轮按 tick 划分一个心跳间隔，连接注册时放入当前最空的槽位，心跳均匀分散在整个间隔内
+- 单个任务按 tick 转动时间轮，到达的槽位内所有连接一起处理：批量检查超时未响应的心跳、批量发送新心跳
+  （整批共用一个发送超时）
+- 心跳发出后超过 heartbeat_timeout 既没有对应响应、期间也没有收到任何响应，记为丢失；
+  连续丢失 max_missed 次或连续发送失败 max_send_failures 次的连接被关闭，由账号主循环重连
+- 按心跳 mid 匹配响应计算往返时间（RTT），按账号统计分布
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# RTT 分布直方图的桶上限（毫秒）
+_RTT_BUCKETS_MS = (50, 100, 200, 500, 1000, 3000)
+
+
+class _RTTStats:
+    """单个账号的心跳统计"""
+
+    def __init__(self, window: int = 100):
+        self.sent = 0
+        self.answered = 0
+        self.missed = 0
+        self.send_failures = 0
+        self.reconnects = 0
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * (len(_RTT_BUCKETS_MS) + 1)
+
+    def record(self, rtt: float):
+        self.answered += 1
+        self.samples.append(rtt)
+        rtt_ms = rtt * 1000
+        for index, limit in enumerate(_RTT_BUCKETS_MS):
+            if rtt_ms < limit:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(ordered[min(len(ordered) - 1, int(p * (len(ordered) - 1) + 0.5))] * 1000, 1) if ordered else None
+
+        labels = [f"<{limit}ms" for limit in _RTT_BUCKETS_MS] + [f">={_RTT_BUCKETS_MS[-1]}ms"]
+        return {
+            'sent': self.sent,
+            'answered': self.answered,
+            'missed': self.missed,
+            'send_failures': self.send_failures,
+            'reconnects': self.reconnects,
+            'last_ms': round(self.samples[-1] * 1000, 1) if self.samples else None,
+            'p50_ms': percentile(0.5),
+            'p90_ms': percentile(0.9),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(ordered[-1] * 1000, 1) if ordered else None,
+            'histogram': dict(zip(labels, self.buckets))
+        }
+
+
+class _Connection:
+    """时间轮中的一个连接"""
+
+    __slots__ = ('live', 'ws', 'slot', 'pending', 'last_response', 'consecutive_missed', 'send_failures', 'paused')
+
+    def __init__(self, live, ws, slot: int):
+        self.live = live
+        self.ws = ws
+        self.slot = slot
+        self.pending: Dict[str, float] = {}  # {心跳mid: 发送时间}
+        self.last_response = 0.0
+        self.consecutive_missed = 0
+        self.send_failures = 0
+        self.paused = False
+
+
+class HeartbeatScheduler:
+    """所有账号共享的心跳调度器（运行在主事件循环中）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 15, timeout: float = 30,
+                 tick: float = 1.0, max_missed: int = 2, max_send_failures: int = 3, send_timeout: float = 2.0,
+                 rtt_window: int = 100, enabled: bool = True):
+        """
+        初始化调度器
+
+        Args:
+            loop: 主事件循环（XianyuLive 所在的循环）
+            interval: 心跳间隔（秒）
+            timeout: 心跳发出后等待响应的时间（秒）
+            tick: 时间轮转动一格的时间（秒）
+            max_missed: 连续丢失多少次心跳后关闭连接触发重连
+            max_send_failures: 连续发送失败多少次后关闭连接触发重连
+            send_timeout: 一批心跳的发送超时（秒）
+            rtt_window: 每个账号保留的RTT样本数
+            enabled: 为 False 时各账号使用自身的心跳循环
+        """
+        self.loop = loop
+        self.interval = interval
+        self.timeout = timeout
+        self.tick = max(0.1, tick)
+        self.max_missed = max(1, max_missed)
+        self.max_send_failures = max(1, max_send_failures)
+        self.send_timeout = send_timeout
+        self.rtt_window = rtt_window
+        self.enabled = enabled
+
+        self._slots: List[Dict[str, _Connection]] = [{} for _ in range(max(1, round(interval / self.tick)))]
+        self._connections: Dict[str, _Connection] = {}
+        self._cursor = 0
+        self._rtt: Dict[str, _RTTStats] = {}
+        self._send_tasks = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {'sent': 0, 'missed': 0, 'send_failures': 0, 'reconnects': 0}
+
+    # ------------------------ 连接注册 ------------------------
+    def register(self, live, ws):
+        """
+        注册账号的当前连接（重连、Token轮换换到新连接时重新注册即可替换旧连接）
+
+        Args:
+            live: XianyuLive 实例
+            ws: 已初始化完成的 WebSocket 连接
+        """
+        cookie_id = live.cookie_id
+        self._remove(cookie_id)
+        slot = min(range(len(self._slots)), key=lambda index: len(self._slots[index]))
+        connection = _Connection(live, ws, slot)
+        self._slots[slot][cookie_id] = connection
+        self._connections[cookie_id] = connection
+        self._rtt.setdefault(cookie_id, _RTTStats(self.rtt_window))
+        logger.info(f"【{cookie_id}】心跳已交由心跳调度器（槽位 {slot}/{len(self._slots)}）")
+        self._ensure_running()
+
+    def unregister(self, cookie_id: str, live=None):
+        """
+        移除账号的连接和统计
+
+        Args:
+            cookie_id: 账号ID
+            live: 指定时只有注册的正是该实例才移除（避免旧实例退出时移除新实例）
+        """
+        connection = self._connections.get(cookie_id)
+        if live is not None and (connection is None or connection.live is not live):
+            return
+        self._remove(cookie_id)
+        self._rtt.pop(cookie_id, None)
+
+    def is_registered(self, cookie_id: str) -> bool:
+        return cookie_id in self._connections
+
+    def _remove(self, cookie_id: str):
+        connection = self._connections.pop(cookie_id, None)
+        if connection is not None:
+            self._slots[connection.slot].pop(cookie_id, None)
+
+    def pause(self, cookie_id: str) -> bool:
+        """
+        暂停账号的心跳（如浏览器刷新Cookie期间）
+
+        Returns:
+            bool: 暂停前心跳是否在运行
+        """
+        connection = self._connections.get(cookie_id)
+        if connection is None or connection.paused:
+            return False
+        connection.paused = True
+        connection.pending.clear()
+        return True
+
+    def resume(self, cookie_id: str):
+        connection = self._connections.get(cookie_id)
+        if connection is not None:
+            connection.paused = False
+
+    def on_response(self, cookie_id: str, mid: Optional[str]):
+        """收到连接上的成功响应（code 200），mid 与心跳匹配时记录RTT"""
+        connection = self._connections.get(cookie_id)
+        if connection is None:
+            return
+        now = time.time()
+        connection.last_response = now
+        connection.consecutive_missed = 0
+        sent_at = connection.pending.pop(mid, None) if mid else None
+        if sent_at is not None:
+            self._rtt[cookie_id].record(now - sent_at)
+
+    # ------------------------ 时间轮 ------------------------
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = self.loop.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    async def _run(self):
+        logger.info(f"心跳调度器已启动（间隔 {self.interval}秒，{len(self._slots)} 个槽位，超时 {self.timeout}秒）")
+        next_tick = time.monotonic()
+        while True:
+            try:
+                if not self._connections:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    next_tick = time.monotonic()
+
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_tick += self.tick
+                if next_tick < time.monotonic():
+                    # 事件循环卡顿过久时不补转错过的格子，从当前时间重新计时
+                    next_tick = time.monotonic() + self.tick
+
+                slot = self._slots[self._cursor]
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                if slot:
+                    self._process_slot(list(slot.items()))
+
+            except asyncio.CancelledError:
+                logger.info("心跳调度器已停止")
+                raise
+            except Exception as e:
+                logger.error(f"心跳调度器异常: {e}")
+                await asyncio.sleep(self.tick)
+
+    def _process_slot(self, connections):
+        """处理一个槽位：批量检查丢失的心跳、关闭失联的连接、发送新一轮心跳"""
+        from cookie_manager import manager as cookie_manager
+
+        now = time.time()
+        batch = []
+        missed_accounts = []
+        for cookie_id, connection in connections:
+            if connection.ws.closed:
+                # 连接已断开，账号主循环重连后会重新注册
+                self._remove(cookie_id)
+                continue
+            if connection.paused:
+                continue
+            if cookie_manager and not cookie_manager.get_cookie_status(cookie_id):
+                continue
+
+            # 超时未响应的心跳：期间收到过任何响应都说明连接仍然存活
+            expired = [mid for mid, sent_at in connection.pending.items() if now - sent_at >= self.timeout]
+            for mid in expired:
+                sent_at = connection.pending.pop(mid)
+                if connection.last_response < sent_at:
+                    connection.consecutive_missed += 1
+                    self._rtt[cookie_id].missed += 1
+                    self.stats['missed'] += 1
+                    missed_accounts.append(cookie_id)
+
+            if connection.consecutive_missed >= self.max_missed:
+                self._reconnect(cookie_id, connection, f"连续 {connection.consecutive_missed} 次心跳无响应")
+            elif connection.send_failures >= self.max_send_failures:
+                self._reconnect(cookie_id, connection, f"连续 {connection.send_failures} 次心跳发送失败")
+            else:
+                batch.append((cookie_id, connection))
+
+        if missed_accounts:
+            logger.warning(f"本轮 {len(missed_accounts)} 个连接心跳超时未响应: {', '.join(sorted(set(missed_accounts)))}")
+        if batch:
+            task = self.loop.create_task(self._send_batch(batch, now))
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+
+    async def _send_batch(self, batch, now: float):
+        """并发发送一批心跳，整批共用一个发送超时"""
+        sends = {}
+        for cookie_id, connection in batch:
+            mid, payload = connection.live._build_heartbeat()
+            connection.pending[mid] = now
+            sends[self.loop.create_task(connection.ws.send(payload))] = (cookie_id, connection, mid)
+
+        done, not_done = await asyncio.wait(sends, timeout=self.send_timeout)
+        for task in not_done:
+            task.cancel()
+
+        for task, (cookie_id, connection, mid) in sends.items():
+            stats = self._rtt.get(cookie_id)
+            if task in done and not task.cancelled() and task.exception() is None:
+                connection.send_failures = 0
+                connection.live.last_heartbeat_time = now
+                self.stats['sent'] += 1
+                if stats:
+                    stats.sent += 1
+            else:
+                connection.pending.pop(mid, None)
+                connection.send_failures += 1
+                self.stats['send_failures'] += 1
+                if stats:
+                    stats.send_failures += 1
+                reason = '发送超时' if task in not_done else self._safe_exception(task)
+                logger.warning(f"【{cookie_id}】心跳发送失败 ({connection.send_failures}/{self.max_send_failures}): {reason}")
+
+    @staticmethod
+    def _safe_exception(task: asyncio.Task) -> str:
+        try:
+            return str(task.exception())
+        except asyncio.CancelledError:
+            return '已取消'
+
+    def _reconnect(self, cookie_id: str, connection: _Connection, reason: str):
+        """关闭失联的连接，账号主循环检测到连接关闭后重连"""
+        logger.warning(f"【{cookie_id}】{reason}，关闭连接触发重连")
+        self._remove(cookie_id)
+        self.stats['reconnects'] += 1
+        if cookie_id in self._rtt:
+            self._rtt[cookie_id].reconnects += 1
+        task = self.loop.create_task(self._close(cookie_id, connection.ws))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    @staticmethod
+    async def _close(cookie_id: str, ws):
+        try:
+            await asyncio.wait_for(ws.close(), timeout=5.0)
+        except Exception as e:
+            logger.warning(f"【{cookie_id}】关闭心跳失联的连接时出错: {e}")
+
+    # ------------------------ 状态 ------------------------
+    def get_status(self) -> Dict[str, Any]:
+        """调度器状态和各账号的心跳RTT分布"""
+        return {
+            'enabled': self.enabled,
+            'connections': len(self._connections),
+            'paused': sum(1 for c in self._connections.values() if c.paused),
+            'interval': self.interval,
+            'timeout': self.timeout,
+            'tick': self.tick,
+            'slots': [len(slot) for slot in self._slots],
+            'stats': self.stats,
+            'accounts': {cookie_id: dict(stats.snapshot(), connected=cookie_id in self._connections)
+                         for cookie_id, stats in self._rtt.items()}
+        }
@@ -0,0 +1,222 @@
+"""
+账号HTTP连接池
+进程内的账号共享 TCPConnector（DNS缓存 + keep-alive），每个账号在其上创建自己的 ClientSession
+（账号 Cookie、默认请求头），取代 token 刷新、图片尺寸探测、图片上传等处各自临时创建的会话，
+避免每次请求都重新进行DNS解析、TCP连接和TLS握手。
+
+连接器的连接数上限（limit / limit_per_host）是所有共享它的会话一起用的，请求的总超时也包含等待空闲连接
+的时间，账号多时消息触发的订单、商品请求会在连接器上排队直至超时。因此每 accounts_per_connector 个会话
+使用一个连接器，连接数上限随账号数增长：值越大连接复用越多、占用的连接越少，但高峰时排队越久。
+
+通过 aiohttp 的 TraceConfig 按主机统计：请求数、失败数、新建/复用连接数（连接复用率）和请求延迟。
+"""
+import asyncio
+import time
+import weakref
+from collections import defaultdict, deque
+from typing import Any, Dict, List
+
+import aiohttp
+from loguru import logger
+
+
+class _HostMetrics:
+    """单个主机的请求统计"""
+
+    def __init__(self, window: int = 200):
+        self.requests = 0
+        self.failed = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.total_time = 0.0
+        self.samples = deque(maxlen=window)
+
+    def record(self, elapsed: float, success: bool):
+        self.requests += 1
+        if not success:
+            self.failed += 1
+        self.total_time += elapsed
+        self.samples.append(elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * (len(ordered) - 1) + 0.5))] * 1000, 1) if ordered else 0.0
+
+        connections = self.new_connections + self.reused_connections
+        return {
+            'requests': self.requests,
+            'failed': self.failed,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'reuse_ratio': round(self.reused_connections / connections, 3) if connections else None,
+            'avg_ms': round(self.total_time / self.requests * 1000, 1) if self.requests else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(ordered[-1] * 1000, 1) if ordered else 0.0,
+        }
+
+
+class HttpPool:
+    """
+    账号共享的HTTP连接池
+
+    功能:
+    - 每个事件循环维护若干共享的 TCPConnector（限制总连接数和单主机连接数、DNS缓存、keep-alive），
+      每个连接器最多分给 accounts_per_connector 个未关闭的会话
+    - create_session() 创建使用共享连接器的会话（关闭会话不会关闭连接器）
+    - 按主机统计连接复用率和请求延迟（响应头返回的耗时）
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, accounts_per_connector: int = 10,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30, timeout: float = 30):
+        """
+        Args:
+            limit: 每个连接器的最大连接数
+            limit_per_host: 每个连接器单个主机的最大连接数
+            accounts_per_connector: 每个连接器最多分给多少个会话（账号），超出时新建连接器
+            dns_cache_ttl: DNS缓存时间（秒）
+            keepalive_timeout: 空闲连接保持时间（秒）
+            timeout: 会话默认的单次请求总超时（秒，包含等待空闲连接的时间）
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.accounts_per_connector = max(1, accounts_per_connector)
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+
+        # {事件循环: [[连接器, 使用它的会话]]}
+        self._connectors: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, List[list]]' = \
+            weakref.WeakKeyDictionary()
+        self._metrics: Dict[str, _HostMetrics] = defaultdict(_HostMetrics)
+        self._trace_config = self._build_trace_config()
+
+        logger.info(f"账号HTTP连接池初始化完成，每 {self.accounts_per_connector} 个账号一个连接器，"
+                    f"每个连接器最大连接数: {limit}，单主机连接数: {limit_per_host}，keep-alive: {keepalive_timeout}秒")
+
+    def _new_connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            enable_cleanup_closed=True
+        )
+
+    def get_connector(self) -> aiohttp.TCPConnector:
+        """
+        为新会话分配当前事件循环的共享连接器：选未关闭会话最少的连接器，都已分满时新建一个
+
+        Returns:
+            aiohttp.TCPConnector
+        """
+        loop = asyncio.get_running_loop()
+        groups = [group for group in self._connectors.get(loop, []) if not group[0].closed]
+        self._connectors[loop] = groups
+
+        def load(group) -> int:
+            return sum(1 for session in group[1] if not session.closed)
+
+        group = min(groups, key=load, default=None)
+        if group is None or load(group) >= self.accounts_per_connector:
+            group = [self._new_connector(), weakref.WeakSet()]
+            groups.append(group)
+        return group[0]
+
+    def create_session(self, **kwargs) -> aiohttp.ClientSession:
+        """
+        创建使用共享连接器的会话（需在事件循环中调用）
+
+        Args:
+            **kwargs: 透传给 aiohttp.ClientSession 的参数（headers/cookie_jar/timeout等）
+        """
+        kwargs.setdefault('timeout', aiohttp.ClientTimeout(total=self.timeout))
+        connector = self.get_connector()
+        session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,
+            trace_configs=[self._trace_config],
+            **kwargs
+        )
+        for group in self._connectors[asyncio.get_running_loop()]:
+            if group[0] is connector:
+                group[1].add(session)
+        return session
+
+    async def close(self):
+        """关闭当前事件循环的所有共享连接器"""
+        for connector, _ in self._connectors.pop(asyncio.get_running_loop(), []):
+            if not connector.closed:
+                await connector.close()
+
+    # ------------------------ 统计 ------------------------
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host or ''
+            ctx.started = time.monotonic()
+
+        async def on_connection_create_end(session, ctx, params):
+            self._metrics[ctx.host].new_connections += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self._metrics[ctx.host].reused_connections += 1
+
+        async def on_request_end(session, ctx, params):
+            self._metrics[ctx.host].record(time.monotonic() - ctx.started, params.response.status < 500)
+
+        async def on_request_exception(session, ctx, params):
+            self._metrics[ctx.host].record(time.monotonic() - ctx.started, False)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        按主机的请求统计
+
+        Returns:
+            {'hosts': {host: {requests, failed, new_connections, reused_connections, reuse_ratio,
+                              avg_ms, p50_ms, p95_ms, max_ms}}, 'limit': ..., 'limit_per_host': ...,
+             'accounts_per_connector': ..., 'connectors': 连接器数}
+        """
+        return {
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'accounts_per_connector': self.accounts_per_connector,
+            'connectors': sum(len(groups) for groups in self._connectors.values()),
+            'hosts': {host: metrics.snapshot()
+                      for host, metrics in sorted(self._metrics.items(), key=lambda x: -x[1].requests)}
+        }
+
+
+_global_http_pool = None
+
+
+def get_http_pool() -> HttpPool:
+    """
+    获取全局账号HTTP连接池（单例模式），参数读取 HTTP_POOL 配置
+
+    Returns:
+        HttpPool实例
+    """
+    global _global_http_pool
+
+    if _global_http_pool is None:
+        from config import HTTP_POOL_CONFIG
+        _global_http_pool = HttpPool(
+            limit=HTTP_POOL_CONFIG.get('limit', 100),
+            limit_per_host=HTTP_POOL_CONFIG.get('limit_per_host', 20),
+            accounts_per_connector=HTTP_POOL_CONFIG.get('accounts_per_connector', 10),
+            dns_cache_ttl=HTTP_POOL_CONFIG.get('dns_cache_ttl', 300),
+            keepalive_timeout=HTTP_POOL_CONFIG.get('keepalive_timeout', 30),
+            timeout=HTTP_POOL_CONFIG.get('timeout', 30)
+        )
+    return _global_http_pool
@@ -15,27 +15,32 @@ import io
 class ImageUploader:
     """图片上传器 - 上传图片到闲鱼CDN"""
     
-    def __init__(self, cookies_str: str):
+    def __init__(self, cookies_str: str, session: Optional[aiohttp.ClientSession] = None):
+        """
+        Args:
+            cookies_str: Cookie字符串
+            session: 账号会话（Cookie由会话的cookie_jar携带，上传完成后不关闭）；为空时自行创建
+        """
         self.cookies_str = cookies_str
         self.upload_url = "https://stream-upload.goofish.com/api/upload.api?floderId=0&appkey=xy_chat&_input_charset=utf-8"
-        self.session = None
+        self.session = session
+        self._owns_session = session is None
     
     async def create_session(self):
-        """创建HTTP会话"""
+        """创建HTTP会话（使用共享连接池）"""
         if not self.session:
-            connector = aiohttp.TCPConnector(limit=100, limit_per_host=30)
-            timeout = aiohttp.ClientTimeout(total=30)
-            self.session = aiohttp.ClientSession(
-                connector=connector,
-                timeout=timeout,
+            from utils.http_pool import get_http_pool
+            self.session = get_http_pool().create_session(
+                timeout=aiohttp.ClientTimeout(total=30),
                 headers={
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
                 }
             )
+            self._owns_session = True
     
     async def close_session(self):
-        """关闭HTTP会话"""
-        if self.session:
+        """关闭HTTP会话（借用的账号会话不关闭）"""
+        if self.session and self._owns_session:
             await self.session.close()
             self.session = None
     
@@ -117,7 +122,6 @@ class ImageUploader:
             
             # 构造请求头
             headers = {
-                'cookie': self.cookies_str,
                 'Referer': 'https://www.goofish.com/',
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                 'x-requested-with': 'XMLHttpRequest',
@@ -129,6 +133,8 @@ class ImageUploader:
                 'Sec-Fetch-Mode': 'cors',
                 'Sec-Fetch-Site': 'same-site'
             }
+            if self._owns_session:
+                headers['cookie'] = self.cookies_str
             
             # 构造multipart/form-data
             data = aiohttp.FormData()
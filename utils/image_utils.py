@@ -1,7 +1,6 @@
 import os
 import uuid
 import hashlib
-from PIL import Image
 from typing import Optional, Tuple
 from loguru import logger
 
@@ -86,6 +85,7 @@ class ImageManager:
             
             # 尝试打开图片验证格式
             from io import BytesIO
+            from PIL import Image
             with Image.open(BytesIO(image_data)) as img:
                 if img.format not in self.allowed_formats:
                     logger.warning(f"不支持的图片格式: {img.format}")
@@ -115,6 +115,7 @@ class ImageManager:
         """获取图片扩展名"""
         try:
             from io import BytesIO
+            from PIL import Image
             with Image.open(BytesIO(image_data)) as img:
                 format_to_ext = {
                     'JPEG': 'jpg',
@@ -130,7 +131,8 @@ class ImageManager:
         """处理图片（压缩、调整尺寸等）"""
         try:
             from io import BytesIO
-            
+            from PIL import Image
+
             with Image.open(BytesIO(image_data)) as img:
                 # 转换为RGB模式（如果需要）
                 if img.mode in ('RGBA', 'LA', 'P'):
@@ -220,7 +222,8 @@ class ImageManager:
             
             if not os.path.exists(full_path):
                 return None
-            
+
+            from PIL import Image
             with Image.open(full_path) as img:
                 return {
                     'width': img.width,
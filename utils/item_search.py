@@ -5,6 +5,7 @@
 """
 
 import asyncio
+import importlib.util
 import json
 import time
 import sys
@@ -31,11 +32,9 @@ if os.getenv('DOCKER_ENV'):
     except Exception as e:
         logger.warning(f"设置SelectorEventLoop失败: {e}")
 
-try:
-    from playwright.async_api import async_playwright
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+# 浏览器页面由浏览器池提供，这里只检查 Playwright 是否已安装
+PLAYWRIGHT_AVAILABLE = importlib.util.find_spec('playwright') is not None
+if not PLAYWRIGHT_AVAILABLE:
     logger.warning("Playwright 未安装，将使用模拟数据")
 
 
@@ -682,86 +681,60 @@ class XianyuSearcher:
             logger.error(f"设置浏览器cookies失败: {str(e)}")
             return False
 
+    # 搜索器在浏览器池中使用的上下文标识，以及跨会话保存Cookie/LocalStorage的文件
+    POOL_KEY = 'item_search'
+
+    @staticmethod
+    def _storage_state_path() -> str:
+        import tempfile
+        return os.path.join(tempfile.gettempdir(), 'xianyu_browser_cache', 'storage_state.json')
+
     async def init_browser(self):
-        """初始化浏览器（使用持久化上下文，保留缓存和cookies）"""
+        """从共享浏览器池获取搜索专用上下文中的页面（状态持久化到文件，保留滑块验证结果）"""
         if not PLAYWRIGHT_AVAILABLE:
             raise Exception("Playwright 未安装，无法使用真实搜索功能")
 
         if not self.browser:
-            playwright = await async_playwright().start()
-            
-            # 设置持久化数据目录（保存缓存、cookies等）
-            import tempfile
-            user_data_dir = os.path.join(tempfile.gettempdir(), 'xianyu_browser_cache')
-            os.makedirs(user_data_dir, exist_ok=True)
-            logger.info(f"使用持久化数据目录（保留缓存）: {user_data_dir}")
-            
-            # 简化的浏览器启动参数，避免冲突
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--no-first-run',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--no-default-browser-check',
-                # 中文语言设置
-                '--lang=zh-CN',
-                '--accept-lang=zh-CN,zh,en-US,en'
-            ]
+            from utils.browser_pool import get_browser_pool
+
+            # 上下文首次创建时加载上次保存的Cookie和LocalStorage
+            # 这样通过一次滑块验证后，下次搜索可以复用状态，避免再次出现滑块
+            storage_state_path = self._storage_state_path()
+            os.makedirs(os.path.dirname(storage_state_path), exist_ok=True)
+            context_options = {
+                'user_agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                'viewport': {'width': 1280, 'height': 720},
+                'locale': 'zh-CN',  # 设置语言为中文
+            }
+            if os.path.exists(storage_state_path):
+                context_options['storage_state'] = storage_state_path
+                logger.info(f"使用持久化浏览器状态: {storage_state_path}")
 
-            # 只在确实是Docker环境时添加额外参数
-            if os.getenv('DOCKER_ENV') == 'true':
-                browser_args.extend([
-                    '--disable-gpu',
-                    # 移除--single-process参数，使用多进程模式提高稳定性
-                    # '--single-process'  # 注释掉，避免崩溃
-                ])
+            logger.info("正在从浏览器池获取页面（中文模式）...")
+            self.page = await get_browser_pool().acquire_page(self.POOL_KEY, '', context_options=context_options)
+            if not self.page:
+                raise Exception("浏览器池未能提供页面")
 
-            logger.info("正在启动浏览器（中文模式，持久化缓存）...")
-            
-            # 使用 launch_persistent_context 实现跨会话的缓存持久化
-            # 这样通过一次滑块验证后，下次搜索可以复用缓存，避免再次出现滑块
-            self.context = await playwright.chromium.launch_persistent_context(
-                user_data_dir,  # 第一个参数是用户数据目录，用于持久化
-                headless=True,  # 无头模式，后台运行
-                args=browser_args,
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                viewport={'width': 1280, 'height': 720},
-                locale='zh-CN',  # 设置语言为中文
-                # 持久化上下文会自动保存和加载：
-                # - Cookies
-                # - 缓存
-                # - LocalStorage
-                # - SessionStorage
-                # - 其他浏览器状态
-            )
-            
-            # launch_persistent_context 返回的是 context，不是 browser
-            # 需要通过 context.browser 获取 browser 对象
+            self.context = self.page.context
             self.browser = self.context.browser
 
-            logger.info("浏览器启动成功（持久化上下文已创建）...")
-
-            logger.info("创建页面...")
-            self.page = await self.context.new_page()
-
-            logger.info("浏览器初始化完成（缓存将持久化保存）")
+            logger.info("浏览器初始化完成")
 
     async def close_browser(self):
-        """关闭浏览器（持久化上下文会自动保存缓存和cookies）"""
+        """归还页面（搜索上下文留在浏览器池中复用，并把状态保存到文件）"""
         try:
+            if self.context:
+                try:
+                    await self.context.storage_state(path=self._storage_state_path())
+                except Exception as e:
+                    logger.debug(f"保存浏览器状态失败: {e}")
             if self.page:
-                await self.page.close()
+                from utils.browser_pool import get_browser_pool
+                await get_browser_pool().release_page(self.page)
                 self.page = None
-            # 注意：使用 persistent_context 时，关闭 context 会自动保存所有数据
-            if self.context:
-                await self.context.close()
-                self.context = None
-            # persistent_context 的 browser 会在 context 关闭时自动关闭
-            # 不需要单独关闭 browser
+            self.context = None
             self.browser = None
-            logger.debug("商品搜索器浏览器已关闭（缓存已保存）")
+            logger.debug("商品搜索器页面已归还（状态已保存）")
         except Exception as e:
             logger.warning(f"关闭商品搜索器浏览器时出错: {e}")
     
@@ -0,0 +1,269 @@
+"""
+商品同步调度器
+由 CookieManager 持有，统一安排所有账号的定时商品同步，取代每个 XianyuLive 各自轮询的 item_sync_loop：
+- 按下次同步时间维护一个最小堆，只在最近一个账号到期时醒来
+- 首次同步在启动后随机分散，之后每次间隔附加随机抖动，避免所有账号同时同步
+- 全局限制同时进行的同步数量
+- 同步配置（system_settings 中的 item_sync_*）只在启动和收到变更通知时读取
+"""
+import asyncio
+import heapq
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class ItemSyncScheduler:
+    """所有账号共享的商品同步调度器（运行在主事件循环中）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_concurrent: int = 3,
+                 jitter: float = 0.1, initial_spread: float = 120):
+        """
+        初始化调度器
+
+        Args:
+            loop: 主事件循环（XianyuLive 所在的循环）
+            max_concurrent: 全局同时进行的商品同步数
+            jitter: 同步间隔的随机抖动比例（0.1 表示 ±10%）
+            initial_spread: 账号首次同步在该时间窗口（秒）内随机分散
+        """
+        self.loop = loop
+        self.max_concurrent = max(1, max_concurrent)
+        self.jitter = jitter
+        self.initial_spread = initial_spread
+
+        self.enabled = True
+        self.interval = 600
+        self.max_pages: Optional[int] = 5
+
+        self._accounts: Dict[str, Any] = {}  # {cookie_id: XianyuLive}
+        self._due: Dict[str, float] = {}  # {cookie_id: 下次同步时间}
+        self._last_sync: Dict[str, float] = {}  # {cookie_id: 上次同步完成时间}
+        self._heap: List[Tuple[float, str]] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.syncs = 0
+        self.failures = 0
+        self.settings_loaded = False
+
+    # ------------------------ 配置 ------------------------
+    def load_settings(self):
+        """从 system_settings 读取商品同步配置，不存在时使用 global_config.yml 中的 ITEM_SYNC 默认值"""
+        from config import config
+        from db_manager import db_manager
+
+        defaults = config.get('ITEM_SYNC', {})
+        enabled_str = db_manager.get_system_setting('item_sync_enabled')
+        interval_str = db_manager.get_system_setting('item_sync_interval')
+        max_pages_str = db_manager.get_system_setting('item_sync_max_pages')
+
+        self.enabled = enabled_str == 'true' if enabled_str is not None else defaults.get('enabled', True)
+        try:
+            self.interval = max(60, int(interval_str)) if interval_str is not None else defaults.get('interval', 600)
+        except ValueError:
+            self.interval = defaults.get('interval', 600)
+        try:
+            self.max_pages = int(max_pages_str) if max_pages_str else defaults.get('max_pages', 5)
+        except ValueError:
+            self.max_pages = defaults.get('max_pages', 5)
+        self.settings_loaded = True
+
+        logger.info(f"商品同步配置: {'启用' if self.enabled else '禁用'}，间隔 {self.interval}秒，最多 {self.max_pages} 页")
+
+    def notify_settings_changed(self):
+        """商品同步配置已修改（可在任意线程调用），重新读取配置并按新间隔重新安排所有账号"""
+        try:
+            self.loop.call_soon_threadsafe(self._apply_settings)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _apply_settings(self):
+        old_interval = self.interval
+        self.load_settings()
+        if self.interval != old_interval:
+            now = time.time()
+            for cookie_id in list(self._accounts):
+                last = self._last_sync.get(cookie_id)
+                if last is not None:
+                    self._schedule(cookie_id, max(now, last + self._jittered(self.interval)))
+        self._wake()
+
+    # ------------------------ 账号注册 ------------------------
+    def register(self, live) -> bool:
+        """
+        注册账号（XianyuLive 实例），由调度器负责其定时商品同步
+
+        Returns:
+            bool: 是否为新注册
+        """
+        cookie_id = live.cookie_id
+        is_new = cookie_id not in self._accounts
+        self._accounts[cookie_id] = live
+        if is_new:
+            if not self.settings_loaded:
+                self.load_settings()
+            last = live.last_item_sync_time or self._last_sync.get(cookie_id)
+            if last:
+                due = last + self._jittered(self.interval)
+            else:
+                due = time.time() + random.uniform(0, self.initial_spread)
+            self._schedule(cookie_id, due)
+            logger.info(f"【{cookie_id}】已加入商品同步调度，{max(0, int(due - time.time()))}秒后首次同步")
+        self._ensure_running()
+        return is_new
+
+    def unregister(self, cookie_id: str, live=None):
+        """
+        移除账号，取消其正在进行的同步
+
+        Args:
+            cookie_id: 账号ID
+            live: 指定时只有注册的正是该实例才移除（避免旧实例退出时移除新实例）
+        """
+        if live is not None and self._accounts.get(cookie_id) is not live:
+            return
+        self._accounts.pop(cookie_id, None)
+        self._due.pop(cookie_id, None)
+        task = self._running.pop(cookie_id, None)
+        if task and not task.done():
+            task.cancel()
+        self._wake()
+
+    def is_registered(self, cookie_id: str) -> bool:
+        return cookie_id in self._accounts
+
+    def trigger(self, cookie_id: str):
+        """让账号尽快同步一次"""
+        if cookie_id in self._accounts:
+            self._schedule(cookie_id, time.time())
+            self._wake()
+
+    # ------------------------ 调度 ------------------------
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule(self, cookie_id: str, due: float):
+        self._due[cookie_id] = due
+        heapq.heappush(self._heap, (due, cookie_id))
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._task = self.loop.create_task(self._run())
+
+    async def _run(self):
+        logger.info(f"商品同步调度器已启动（全局并发 {self.max_concurrent}）")
+        while True:
+            try:
+                self._wakeup.clear()
+
+                # 丢弃过期的堆条目（账号已移除或已重新安排）
+                while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+
+                if not self.enabled or not self._heap:
+                    await self._wakeup.wait()
+                    continue
+
+                due, cookie_id = self._heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # 到期：等待全局并发名额，拿到后重新检查堆顶（等待期间可能有变化）
+                await self._semaphore.acquire()
+                while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                if not self.enabled or not self._heap or self._heap[0][0] > time.time():
+                    self._semaphore.release()
+                    continue
+                due, cookie_id = heapq.heappop(self._heap)
+                del self._due[cookie_id]
+                task = self.loop.create_task(self._sync_account(cookie_id))
+                # 名额随任务结束归还：任务在开始执行前就被取消时也会调用
+                semaphore = self._semaphore
+                task.add_done_callback(lambda _: semaphore.release())
+                self._running[cookie_id] = task
+
+            except asyncio.CancelledError:
+                logger.info("商品同步调度器已停止")
+                raise
+            except Exception as e:
+                logger.error(f"商品同步调度器异常: {e}")
+                await asyncio.sleep(5)
+
+    async def _sync_account(self, cookie_id: str):
+        live = self._accounts.get(cookie_id)
+        try:
+            if live is None:
+                return
+
+            from cookie_manager import manager as cookie_manager
+            if cookie_manager and not cookie_manager.get_cookie_status(cookie_id):
+                logger.info(f"【{cookie_id}】账号已禁用，跳过商品同步")
+                return
+
+            if live.item_sync_lock.locked():
+                logger.info(f"【{cookie_id}】商品同步任务正在进行中，跳过本次执行")
+                return
+
+            async with live.item_sync_lock:
+                logger.info(f"【{cookie_id}】🔄 开始定时同步商品信息...")
+                result = await live.get_all_items(page_size=20, max_pages=self.max_pages)
+
+            if result.get('success'):
+                stats = result.get('stats', {})
+                live.last_item_sync_time = time.time()
+                self.syncs += 1
+                logger.info(f"【{cookie_id}】✅ 商品同步完成: 共 {result.get('total_count', 0)} 件商品，"
+                            f"变化 {stats.get('new', 0) + stats.get('changed', 0)} 件，写入 {result.get('total_saved', 0)} 件")
+            else:
+                self.failures += 1
+                logger.warning(f"【{cookie_id}】❌ 商品同步失败: {result.get('error', '未知错误')}")
+
+        except asyncio.CancelledError:
+            logger.info(f"【{cookie_id}】商品同步被取消")
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"【{cookie_id}】商品同步异常: {e}")
+        finally:
+            if self._running.get(cookie_id) is asyncio.current_task():
+                del self._running[cookie_id]
+            # 无论成功与否，都按间隔安排下一次同步
+            if cookie_id in self._accounts:
+                now = time.time()
+                self._last_sync[cookie_id] = now
+                self._schedule(cookie_id, now + self._jittered(self.interval))
+
+    def get_status(self) -> Dict[str, Any]:
+        """调度器状态"""
+        now = time.time()
+        upcoming = sorted(self._due.items(), key=lambda x: x[1])[:10]
+        return {
+            'enabled': self.enabled,
+            'interval': self.interval,
+            'max_pages': self.max_pages,
+            'max_concurrent': self.max_concurrent,
+            'accounts': len(self._accounts),
+            'running': list(self._running),
+            'syncs': self.syncs,
+            'failures': self.failures,
+            'next_due': [{'cookie_id': cid, 'in_seconds': round(due - now, 1)} for cid, due in upcoming]
+        }
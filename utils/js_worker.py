@@ -0,0 +1,281 @@
+"""
+常驻 JavaScript 工作进程池
+execjs 使用 Node 运行时时，每次 call 都会启动一个新的 node 进程并重新执行整个脚本。这里改为启动固定数量的常驻
+node 进程，每个进程只加载一次脚本，通过 stdin/stdout 按行收发 JSON 请求：
+- 请求带 id，同一进程上可以有多个未完成的请求（多路复用），由读取线程按 id 分发结果
+- 调用分配给未完成请求最少的进程
+- 进程崩溃时，未完成的请求立即失败并在其他进程上重试一次，崩溃的进程在下次使用时自动重启
+
+用法与 execjs 编译后的上下文相同：pool.call('函数名', *参数)
+
+基准测试（对比 execjs）：
+    python -m utils.js_worker --calls 200
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# node 端引导脚本：在独立的 vm 上下文中加载脚本一次，之后按行处理 {"id", "fn", "args"} 请求
+_BOOTSTRAP = r"""
+const fs = require('fs');
+const vm = require('vm');
+const readline = require('readline');
+const { Console } = require('console');
+const scriptPath = process.argv[1];
+const ctx = vm.createContext({
+    require, Buffer, atob, btoa, TextDecoder, TextEncoder, setTimeout, clearTimeout,
+    console: new Console(process.stderr)
+});
+vm.runInContext(fs.readFileSync(scriptPath, 'utf8'), ctx, { filename: scriptPath });
+const fns = {};
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+    let req;
+    try { req = JSON.parse(line); } catch (e) { return; }
+    let resp;
+    try {
+        if (req.fn === '__ping__') {
+            resp = { id: req.id, result: 'pong' };
+        } else {
+            const fn = fns[req.fn] || (fns[req.fn] = vm.runInContext(req.fn, ctx));
+            resp = { id: req.id, result: fn(...req.args) };
+        }
+    } catch (e) {
+        resp = { id: req.id, error: String((e && e.stack) || e) };
+    }
+    process.stdout.write(JSON.stringify(resp) + '\n');
+});
+"""
+
+
+class JSWorkerCrashed(RuntimeError):
+    """工作进程在返回结果前退出"""
+
+
+class _JSWorker:
+    """一个常驻 node 进程"""
+
+    def __init__(self, node: str, script_path: str, index: int):
+        self.index = index
+        self.pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.process = subprocess.Popen(
+            [node, '-e', _BOOTSTRAP, script_path],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding='utf-8', bufsize=1
+        )
+        self._stderr_tail: List[str] = []
+        threading.Thread(target=self._read_stdout, daemon=True, name=f'js-worker-{index}').start()
+        threading.Thread(target=self._read_stderr, daemon=True, name=f'js-worker-{index}-err').start()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def submit(self, fn: str, args: list) -> Future:
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                raise JSWorkerCrashed(f"JS工作进程{self.index}已退出")
+            request_id = next(self._ids)
+            self.pending[request_id] = future
+            try:
+                self.process.stdin.write(json.dumps({'id': request_id, 'fn': fn, 'args': args}) + '\n')
+                self.process.stdin.flush()
+            except (OSError, ValueError) as e:
+                self.pending.pop(request_id, None)
+                raise JSWorkerCrashed(f"JS工作进程{self.index}写入失败: {e}")
+        return future
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            with self._lock:
+                future = self.pending.pop(response.get('id'), None)
+            if future is None:
+                continue
+            if 'error' in response:
+                future.set_exception(RuntimeError(response['error']))
+            else:
+                future.set_result(response.get('result'))
+
+        # 进程已退出：所有未完成的请求失败
+        self.process.wait()
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        detail = '\n'.join(self._stderr_tail[-5:])
+        for future in pending.values():
+            future.set_exception(JSWorkerCrashed(f"JS工作进程{self.index}已退出: {detail}"))
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self._stderr_tail = (self._stderr_tail + [line.rstrip()])[-20:]
+
+    def discard(self, future: Future):
+        """放弃一个未完成的请求（调用超时）"""
+        with self._lock:
+            for request_id, pending in list(self.pending.items()):
+                if pending is future:
+                    del self.pending[request_id]
+                    break
+
+    def kill(self):
+        """强制结束进程（如脚本陷入死循环），其余未完成的请求随之失败，下次使用时重启"""
+        if self.alive:
+            self.process.kill()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                pass
+
+    def close(self):
+        if self.alive:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except Exception:
+                self.process.kill()
+
+
+class JSWorkerPool:
+    """常驻 node 进程池，接口与 execjs 编译后的上下文相同（call）"""
+
+    def __init__(self, script_path: str, workers: int = 2, call_timeout: float = 10, node: Optional[str] = None):
+        """
+        Args:
+            script_path: 要加载的脚本
+            workers: node 进程数
+            call_timeout: 单次调用超时（秒）
+            node: node 可执行文件，默认从 PATH 查找
+        """
+        self.script_path = script_path
+        self.size = max(1, workers)
+        self.call_timeout = call_timeout
+        self.node = node or shutil.which('node')
+        if not self.node:
+            raise RuntimeError("未找到Node.js可执行文件")
+
+        self._workers: List[Optional[_JSWorker]] = [None] * self.size
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.restarts = 0
+
+    def start(self):
+        """启动所有进程并确认脚本加载成功"""
+        for index in range(self.size):
+            self.call_on(self._get_worker(index), '__ping__')
+        logger.info(f"JS工作进程池已启动: {self.size} 个node进程，脚本 {os.path.basename(self.script_path)}")
+        return self
+
+    def _get_worker(self, index: int) -> _JSWorker:
+        with self._lock:
+            worker = self._workers[index]
+            if worker is None or not worker.alive:
+                if worker is not None:
+                    self.restarts += 1
+                    logger.warning(f"JS工作进程{index}已退出（返回码 {worker.process.returncode}），正在重启")
+                worker = self._workers[index] = _JSWorker(self.node, self.script_path, index)
+            return worker
+
+    def _pick_worker(self, exclude: Optional[_JSWorker] = None) -> _JSWorker:
+        # 有进程未启动或已崩溃时优先启动/重启
+        for index, worker in enumerate(self._workers):
+            if worker is None or not worker.alive:
+                return self._get_worker(index)
+        candidates = [w for w in self._workers if w is not exclude] or self._workers
+        return min(candidates, key=lambda w: len(w.pending))
+
+    def call_on(self, worker: _JSWorker, fn: str, *args) -> Any:
+        future = worker.submit(fn, list(args))
+        try:
+            return future.result(timeout=self.call_timeout)
+        except FutureTimeoutError:
+            # 进程可能卡死在该请求上：丢弃请求并结束进程，下次使用时自动重启
+            worker.discard(future)
+            logger.warning(f"JS调用 {fn} 超时（{self.call_timeout}秒），结束JS工作进程{worker.index}")
+            worker.kill()
+            raise TimeoutError(f"JS调用 {fn} 超时（{self.call_timeout}秒）")
+
+    def call(self, fn: str, *args) -> Any:
+        """调用脚本中的函数，进程崩溃时换一个进程重试一次"""
+        self.calls += 1
+        worker = self._pick_worker()
+        try:
+            return self.call_on(worker, fn, *args)
+        except JSWorkerCrashed as e:
+            logger.warning(f"JS调用 {fn} 时工作进程崩溃，重试: {e}")
+            return self.call_on(self._pick_worker(exclude=worker), fn, *args)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.size,
+            'alive': sum(1 for w in self._workers if w is not None and w.alive),
+            'pending': sum(len(w.pending) for w in self._workers if w is not None),
+            'calls': self.calls,
+            'restarts': self.restarts
+        }
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers:
+                if worker is not None:
+                    worker.close()
+            self._workers = [None] * self.size
+
+
+def _benchmark(calls: int, workers: int, threads: int):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.xianyu_utils import get_js_path
+
+    script = get_js_path()
+    args = ('1700000000000', 'token', '{"itemId":"123"}')
+    results = {}
+
+    pool = JSWorkerPool(script, workers=workers).start()
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda _: pool.call('generate_sign', *args), range(calls)))
+        results['常驻进程池'] = calls / (time.perf_counter() - started)
+    finally:
+        pool.close()
+
+    try:
+        import execjs
+        with open(script, 'r', encoding='utf-8') as f:
+            ctx = execjs.compile(f.read())
+        execjs_calls = max(1, min(calls, 50))
+        started = time.perf_counter()
+        for _ in range(execjs_calls):
+            ctx.call('generate_sign', *args)
+        results['execjs'] = execjs_calls / (time.perf_counter() - started)
+    except ImportError:
+        print("未安装 execjs，跳过对比")
+
+    for name, rate in results.items():
+        print(f"{name}: {rate:.1f} 次/秒")
+    if len(results) == 2:
+        print(f"提升: {results['常驻进程池'] / results['execjs']:.1f} 倍")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JS工作进程池基准测试')
+    parser.add_argument('--calls', type=int, default=200, help='调用次数')
+    parser.add_argument('--workers', type=int, default=2, help='node进程数')
+    parser.add_argument('--threads', type=int, default=8, help='并发调用线程数')
+    cli_args = parser.parse_args()
+    _benchmark(cli_args.calls, cli_args.workers, cli_args.threads)
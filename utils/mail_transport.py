@@ -0,0 +1,256 @@
+"""
+异步邮件发送
+smtplib 的阻塞调用全部放在专用线程池中执行，事件循环只等待结果；
+按 (服务器, 端口, 用户, 加密方式) 维护已认证的SMTP长连接池，
+连接空闲超时或被服务器断开后自动重连，同一连接上可连续发送多封邮件
+"""
+import asyncio
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class _PooledConnection:
+    __slots__ = ('server', 'last_used', 'sent')
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    单个SMTP账号的连接池（同步实现，只在 MailTransport 的线程池中调用）
+
+    - 最多保持 max_connections 个已登录的连接
+    - 连接空闲超过 idle_timeout 秒后丢弃重建（大多数服务器会主动断开空闲连接）
+    - 发送时遇到连接断开会用新连接重试一次
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str, use_ssl: bool = False,
+                 use_tls: bool = True, max_connections: int = 2, idle_timeout: float = 60, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+        self.connects = 0
+        self.sent = 0
+
+    def _connect(self) -> _PooledConnection:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+        if self.user and self.password:
+            try:
+                server.login(self.user, self.password)
+            except Exception:
+                self._close_quietly(server)
+                raise
+        self.connects += 1
+        logger.debug(f"SMTP连接已建立: {self.host}:{self.port} ({self.user})")
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _close_quietly(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _acquire(self) -> _PooledConnection:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if now - conn.last_used < self.idle_timeout:
+                    return conn
+                self._close_quietly(conn.server)
+        return self._connect()
+
+    def _release(self, conn: _PooledConnection, broken: bool = False):
+        if broken:
+            self._close_quietly(conn.server)
+            return
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+
+    def send_messages(self, messages: List[Tuple[Message, Optional[str], List[str]]]) -> int:
+        """
+        在同一个SMTP会话中依次发送多封邮件
+
+        Args:
+            messages: [(邮件对象, 信封发件人, 收件人列表)]
+
+        Returns:
+            成功发送的邮件数
+        """
+        self._slots.acquire()
+        try:
+            conn = self._acquire()
+            sent = 0
+            try:
+                for msg, from_addr, to_addrs in messages:
+                    try:
+                        conn.server.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+                    except smtplib.SMTPServerDisconnected:
+                        # 服务器已断开空闲连接，重建后重试当前邮件
+                        self._close_quietly(conn.server)
+                        conn = self._connect()
+                        conn.server.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+                    sent += 1
+                    conn.sent += 1
+            except Exception:
+                self._release(conn, broken=True)
+                raise
+            finally:
+                self.sent += sent
+            self._release(conn)
+            return sent
+        finally:
+            self._slots.release()
+
+    def close_idle(self, force: bool = False) -> int:
+        """关闭空闲超时（或全部）的连接，返回关闭数量"""
+        now = time.monotonic()
+        with self._lock:
+            keep, close = [], []
+            for conn in self._idle:
+                (close if force or now - conn.last_used >= self.idle_timeout else keep).append(conn)
+            self._idle = keep
+        for conn in close:
+            self._close_quietly(conn.server)
+        return len(close)
+
+    def get_status(self) -> Dict[str, int]:
+        with self._lock:
+            idle = len(self._idle)
+        return {'idle_connections': idle, 'connects': self.connects, 'sent': self.sent}
+
+
+class MailTransport:
+    """
+    异步邮件发送器
+
+    通知邮件和注册验证码邮件共用；阻塞的SMTP操作在专用线程池中执行，
+    不会因为邮件服务器缓慢或不可达而卡住事件循环
+    """
+
+    def __init__(self, max_workers: int = 4, max_connections: int = 2, idle_timeout: float = 60, timeout: float = 30):
+        """
+        初始化邮件发送器
+
+        Args:
+            max_workers: SMTP线程池大小
+            max_connections: 每个SMTP账号最多保持的连接数
+            idle_timeout: 连接空闲超时（秒），超时后重新建立连接
+            timeout: SMTP网络操作超时（秒）
+        """
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='smtp')
+        self._pools: Dict[Tuple, SMTPConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+
+    def _get_pool(self, host: str, port: int, user: str, password: str,
+                  use_ssl: bool, use_tls: bool) -> SMTPConnectionPool:
+        key = (host, port, user, password, use_ssl, use_tls)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = SMTPConnectionPool(
+                    host, port, user, password, use_ssl=use_ssl, use_tls=use_tls,
+                    max_connections=self.max_connections, idle_timeout=self.idle_timeout, timeout=self.timeout
+                )
+            return pool
+
+    async def send_many(self, host: str, port: int, user: str, password: str,
+                        messages: List[Tuple[Message, Optional[str], List[str]]],
+                        use_ssl: bool = False, use_tls: bool = True) -> int:
+        """
+        通过连接池在一个SMTP会话中发送多封邮件
+
+        Args:
+            host: SMTP服务器
+            port: SMTP端口
+            user: 登录用户名
+            password: 登录密码/授权码
+            messages: [(邮件对象, 信封发件人, 收件人列表)]
+            use_ssl: 是否使用SSL直连（通常为465端口）
+            use_tls: 非SSL连接时是否STARTTLS
+
+        Returns:
+            成功发送的邮件数，失败时抛出smtplib异常
+        """
+        pool = self._get_pool(host, int(port), user, password, use_ssl, use_tls)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, pool.send_messages, messages)
+
+    async def send(self, host: str, port: int, user: str, password: str, msg: Message,
+                   to_addrs: List[str], from_addr: Optional[str] = None,
+                   use_ssl: bool = False, use_tls: bool = True):
+        """发送单封邮件，失败时抛出smtplib异常"""
+        await self.send_many(host, port, user, password, [(msg, from_addr or user, to_addrs)],
+                             use_ssl=use_ssl, use_tls=use_tls)
+
+    def close_idle(self, force: bool = False) -> int:
+        """关闭所有连接池中的空闲连接"""
+        with self._pools_lock:
+            pools = list(self._pools.values())
+        return sum(pool.close_idle(force=force) for pool in pools)
+
+    def get_status(self) -> Dict[str, Dict[str, int]]:
+        """获取各SMTP账号的连接池状态"""
+        with self._pools_lock:
+            pools = list(self._pools.items())
+        return {f"{key[2]}@{key[0]}:{key[1]}": pool.get_status() for key, pool in pools}
+
+
+# 全局邮件发送器实例（单例模式）
+_global_mail_transport: Optional[MailTransport] = None
+
+
+def get_mail_transport() -> MailTransport:
+    """
+    获取全局邮件发送器实例（单例模式），参数读取 NOTIFICATION 配置
+
+    Returns:
+        MailTransport实例
+    """
+    global _global_mail_transport
+
+    if _global_mail_transport is None:
+        from config import NOTIFICATION_CONFIG
+        _global_mail_transport = MailTransport(
+            max_workers=NOTIFICATION_CONFIG.get('smtp_workers', 4),
+            max_connections=NOTIFICATION_CONFIG.get('smtp_max_connections', 2),
+            idle_timeout=NOTIFICATION_CONFIG.get('smtp_idle_timeout', 60),
+            timeout=NOTIFICATION_CONFIG.get('smtp_timeout', 30)
+        )
+
+    return _global_mail_transport
@@ -0,0 +1,334 @@
+"""
+通知发送调度器
+进程内所有 XianyuLive 实例共享带连接池的 aiohttp 会话发送通知，
+避免每条通知都重新进行DNS解析、TCP连接和TLS握手，并按渠道类型统计发送耗时。
+消息通知通过发件箱（outbox）异步投递：调用方入队后立即返回，
+后台按渠道并发发送、短时间窗口内合并为摘要消息，并在失败时退避重试
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+
+class _ChannelMetrics:
+    """单个渠道类型的发送统计"""
+
+    def __init__(self, window: int = 200):
+        self.sent = 0
+        self.failed = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.samples = deque(maxlen=window)
+
+    def record(self, elapsed: float, success: bool):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.samples.append(elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = self.sent + self.failed
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1) + 0.5))] if ordered else 0.0
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'avg_ms': round(self.total_time / count * 1000, 1) if count else 0.0,
+            'p95_ms': round(p95 * 1000, 1),
+            'max_ms': round(self.max_time * 1000, 1),
+        }
+
+
+# 渠道投递函数：返回True表示成功，False表示可重试的失败，None表示配置无效不再重试
+DeliverFunc = Callable[[Dict[str, Any], str], Awaitable[Optional[bool]]]
+
+
+class NotificationOutbox:
+    """
+    通知发件箱（每个事件循环一个）
+
+    - submit() 只做入队，不访问数据库、不发网络请求
+    - 后台worker加载账号的通知渠道，按 (账号, 渠道) 聚合批次
+    - 同一渠道在 batch_window 秒内的多条通知合并为一条摘要消息
+    - 各渠道独立并发发送，失败按指数退避重试
+    """
+
+    def __init__(self, batch_window: float = 3.0, max_retries: int = 3, retry_base_delay: float = 2.0,
+                 max_concurrent: int = 20, max_queue_size: int = 10000):
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._batches: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+        self._worker: Optional[asyncio.Task] = None
+
+        self.stats = {'queued': 0, 'dropped': 0, 'batches': 0, 'delivered': 0, 'failed': 0, 'retries': 0}
+
+    def submit(self, cookie_id: str, message: str, deliver: DeliverFunc,
+               channel_loader: Callable[[str], List[Dict[str, Any]]]) -> bool:
+        """
+        提交一条通知（立即返回）
+
+        Args:
+            cookie_id: 账号ID
+            message: 通知内容
+            deliver: 渠道投递函数
+            channel_loader: 同步函数，按账号加载通知渠道列表（在线程池中执行）
+
+        Returns:
+            是否成功入队
+        """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        try:
+            self._queue.put_nowait((cookie_id, message, deliver, channel_loader))
+            self.stats['queued'] += 1
+            return True
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            logger.warning(f"📱 通知发件箱已满，丢弃通知 - 账号: {cookie_id}")
+            return False
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self):
+        while True:
+            cookie_id, message, deliver, channel_loader = await self._queue.get()
+            try:
+                notifications = await asyncio.to_thread(channel_loader, cookie_id)
+            except Exception as e:
+                logger.error(f"📱 加载通知渠道失败 - 账号: {cookie_id}: {e}")
+                continue
+
+            if not notifications:
+                logger.warning(f"📱 账号 {cookie_id} 未配置消息通知，跳过通知发送")
+                continue
+
+            for notification in notifications:
+                if not notification.get('enabled', True):
+                    continue
+                key = (cookie_id, notification.get('channel_id') or notification.get('id'))
+                batch = self._batches.get(key)
+                if batch is None:
+                    self._batches[key] = {'notification': notification, 'deliver': deliver, 'messages': [message]}
+                    self._spawn(self._flush_after_window(key))
+                else:
+                    batch['messages'].append(message)
+
+    async def _flush_after_window(self, key: Tuple[str, Any]):
+        await asyncio.sleep(self.batch_window)
+        batch = self._batches.pop(key, None)
+        if not batch:
+            return
+
+        messages = batch['messages']
+        if len(messages) == 1:
+            digest = messages[0]
+        else:
+            digest = f"📦 通知汇总（共{len(messages)}条）\n\n" + "\n————————\n\n".join(messages)
+
+        notification = batch['notification']
+        channel_type = notification.get('channel_type', 'unknown')
+        channel_name = notification.get('channel_name', channel_type)
+        self.stats['batches'] += 1
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = await batch['deliver'](notification, digest)
+                except Exception as e:
+                    logger.error(f"📱 通知投递异常 ({channel_name}): {e}")
+                    result = False
+
+                if result:
+                    self.stats['delivered'] += 1
+                    return
+                if result is None or attempt == self.max_retries:
+                    break
+
+                delay = self.retry_base_delay * (2 ** attempt)
+                self.stats['retries'] += 1
+                logger.warning(f"📱 通知发送失败 ({channel_name})，{delay:.0f}秒后第{attempt + 1}次重试")
+                await asyncio.sleep(delay)
+
+        self.stats['failed'] += 1
+        logger.error(f"📱 通知最终发送失败 ({channel_name})，共{len(messages)}条消息")
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, pending=self._queue.qsize(), open_batches=len(self._batches))
+
+
+class NotificationDispatcher:
+    """
+    通知HTTP发送器
+
+    功能:
+    - 每个事件循环维护一个共享的 ClientSession（连接池 + DNS缓存 + keep-alive）
+    - 限制总连接数和单个主机的连接数
+    - 统一超时配置
+    - 按渠道类型记录发送延迟和失败次数
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, timeout: float = 10,
+                 connect_timeout: float = 5, dns_cache_ttl: int = 300):
+        """
+        初始化通知发送器
+
+        Args:
+            limit: 连接池最大连接数
+            limit_per_host: 单个主机最大连接数
+            timeout: 单次请求总超时（秒）
+            connect_timeout: 建立连接超时（秒）
+            dns_cache_ttl: DNS缓存时间（秒）
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+
+        # 会话按事件循环区分（API服务线程和主循环各自持有）：{loop: session}
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._metrics: Dict[str, _ChannelMetrics] = defaultdict(_ChannelMetrics)
+        self._outboxes: Dict[asyncio.AbstractEventLoop, NotificationOutbox] = {}
+        self.outbox_options: Dict[str, Any] = {}
+
+        logger.info(f"通知发送器初始化完成，最大连接数: {limit}，单主机连接数: {limit_per_host}，超时: {timeout}秒")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环的共享会话，不存在或已关闭时创建"""
+        loop = asyncio.get_running_loop()
+
+        # 清理已关闭事件循环的会话引用
+        for stale_loop in [l for l in self._sessions if l.is_closed()]:
+            del self._sessions[stale_loop]
+
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                enable_cleanup_closed=True
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def request(self, channel_type: str, method: str, url: str, **kwargs) -> Tuple[int, str]:
+        """
+        通过共享会话发送通知请求
+
+        Args:
+            channel_type: 渠道类型（用于统计，如 dingtalk/feishu/bark）
+            method: HTTP方法
+            url: 请求地址
+            **kwargs: 透传给 aiohttp 的参数（json/headers/data等）
+
+        Returns:
+            (状态码, 响应文本) 元组
+        """
+        session = self._get_session()
+        start = time.monotonic()
+        success = False
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                text = await response.text()
+                success = 200 <= response.status < 300
+                return response.status, text
+        finally:
+            self._metrics[channel_type].record(time.monotonic() - start, success)
+
+    async def post(self, channel_type: str, url: str, **kwargs) -> Tuple[int, str]:
+        return await self.request(channel_type, 'POST', url, **kwargs)
+
+    def record(self, channel_type: str, elapsed: float, success: bool):
+        """记录非HTTP渠道（如邮件）的发送耗时"""
+        self._metrics[channel_type].record(elapsed, success)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各渠道类型的发送统计
+
+        Returns:
+            {channel_type: {sent, failed, avg_ms, p95_ms, max_ms}}
+        """
+        return {channel_type: metrics.snapshot() for channel_type, metrics in self._metrics.items()}
+
+    def get_outbox(self) -> NotificationOutbox:
+        """获取当前事件循环的通知发件箱"""
+        loop = asyncio.get_running_loop()
+        for stale_loop in [l for l in self._outboxes if l.is_closed()]:
+            del self._outboxes[stale_loop]
+        outbox = self._outboxes.get(loop)
+        if outbox is None:
+            outbox = self._outboxes[loop] = NotificationOutbox(**self.outbox_options)
+        return outbox
+
+    def submit(self, cookie_id: str, message: str, deliver: DeliverFunc,
+               channel_loader: Callable[[str], List[Dict[str, Any]]]) -> bool:
+        """将通知放入当前事件循环的发件箱，立即返回"""
+        return self.get_outbox().submit(cookie_id, message, deliver, channel_loader)
+
+    def get_outbox_stats(self) -> Dict[str, int]:
+        """汇总所有发件箱的投递统计"""
+        total: Dict[str, int] = defaultdict(int)
+        for outbox in list(self._outboxes.values()):
+            for key, value in outbox.get_stats().items():
+                total[key] += value
+        return dict(total)
+
+    async def close(self):
+        """关闭当前事件循环的共享会话"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.pop(loop, None)
+        if session and not session.closed:
+            await session.close()
+            logger.info("通知发送器会话已关闭")
+
+
+# 全局通知发送器实例（单例模式）
+_global_notification_dispatcher: Optional[NotificationDispatcher] = None
+
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """
+    获取全局通知发送器实例（单例模式），连接池和超时参数读取 NOTIFICATION 配置
+
+    Returns:
+        NotificationDispatcher实例
+    """
+    global _global_notification_dispatcher
+
+    if _global_notification_dispatcher is None:
+        from config import NOTIFICATION_CONFIG
+        _global_notification_dispatcher = NotificationDispatcher(
+            limit=NOTIFICATION_CONFIG.get('pool_limit', 100),
+            limit_per_host=NOTIFICATION_CONFIG.get('pool_limit_per_host', 10),
+            timeout=NOTIFICATION_CONFIG.get('timeout', 10),
+            connect_timeout=NOTIFICATION_CONFIG.get('connect_timeout', 5),
+            dns_cache_ttl=NOTIFICATION_CONFIG.get('dns_cache_ttl', 300)
+        )
+        _global_notification_dispatcher.outbox_options = {
+            'batch_window': NOTIFICATION_CONFIG.get('batch_window', 3),
+            'max_retries': NOTIFICATION_CONFIG.get('max_retries', 3),
+            'retry_base_delay': NOTIFICATION_CONFIG.get('retry_base_delay', 2),
+        }
+
+    return _global_notification_dispatcher
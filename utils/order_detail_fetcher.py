@@ -8,13 +8,15 @@ import time
 import sys
 import os
 from typing import Optional, Dict, Any
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import Browser, BrowserContext, Page
 from loguru import logger
 import re
 import json
 from threading import Lock
 from collections import defaultdict
 
+from utils.browser_pool import get_browser_pool
+
 # 修复Docker环境中的asyncio事件循环策略问题
 if sys.platform.startswith('linux') or os.getenv('DOCKER_ENV'):
     try:
@@ -40,133 +42,33 @@ class OrderDetailFetcher:
     # 类级别的锁字典，为每个order_id维护一个锁
     _order_locks = defaultdict(lambda: asyncio.Lock())
 
-    def __init__(self, cookie_string: str = None, headless: bool = True):
+    def __init__(self, cookie_string: str = None, headless: bool = True, cookie_id: str = None):
+        self.cookie_id = cookie_id
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.headless = headless  # 保存headless设置
 
-        # 请求头配置
-        self.headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "accept-language": "en,zh-CN;q=0.9,zh;q=0.8,ru;q=0.7",
-            "cache-control": "no-cache",
-            "pragma": "no-cache",
-            "priority": "u=0, i",
-            "sec-ch-ua": "\"Not)A;Brand\";v=\"8\", \"Chromium\";v=\"138\", \"Google Chrome\";v=\"138\"",
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": "\"Windows\"",
-            "sec-fetch-dest": "document",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-site": "same-origin",
-            "sec-fetch-user": "?1",
-            "upgrade-insecure-requests": "1"
-        }
-
         # Cookie配置 - 支持动态传入
         self.cookie = cookie_string
 
     async def init_browser(self, headless: bool = None):
-        """初始化浏览器"""
+        """从共享浏览器池获取该账号上下文中的页面"""
         try:
             # 如果没有传入headless参数，使用实例的设置
             if headless is None:
                 headless = self.headless
 
-            logger.info(f"开始初始化浏览器，headless模式: {headless}")
-
-            playwright = await async_playwright().start()
-
-            # 启动浏览器（Docker环境优化）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
+            logger.info(f"从浏览器池获取页面，headless模式: {headless}")
+
+            # 账号上下文、HTTP头和Cookie由浏览器池统一创建和注入
+            self.page = await get_browser_pool().acquire_page(self.cookie_id, self.cookie, headless, block_preset='data_only')
+            if not self.page:
+                logger.error("浏览器池未能提供页面")
+                return False
 
-            # 移除--single-process参数，使用多进程模式提高稳定性
-            # if os.getenv('DOCKER_ENV'):
-            #     browser_args.append('--single-process')  # 注释掉，避免崩溃
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    '--disable-background-networking',
-                    '--disable-background-timer-throttling',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-default-apps',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-sync',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--no-first-run',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain',
-                    # 添加内存优化和稳定性参数
-                    '--memory-pressure-off',
-                    '--max_old_space_size=512',
-                    '--disable-ipc-flooding-protection',
-                    '--disable-component-extensions-with-background-pages',
-                    '--disable-features=TranslateUI,BlinkGenPropertyTrees',
-                    '--disable-logging',
-                    '--disable-permissions-api',
-                    '--disable-notifications',
-                    '--no-pings',
-                    '--no-zygote'
-                ])
-
-            logger.info(f"启动浏览器，参数: {browser_args}")
-            self.browser = await playwright.chromium.launch(
-                headless=headless,
-                args=browser_args
-            )
-
-            logger.info("浏览器启动成功，创建上下文...")
-
-            # 创建浏览器上下文
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            )
-
-            logger.info("浏览器上下文创建成功，设置HTTP头...")
-
-            # 设置额外的HTTP头
-            await self.context.set_extra_http_headers(self.headers)
-
-            logger.info("创建页面...")
-
-            # 创建页面
-            self.page = await self.context.new_page()
-
-            logger.info("页面创建成功，设置Cookie...")
-
-            # 设置Cookie
-            await self._set_cookies()
-
-            # 等待一段时间确保浏览器完全初始化
-            await asyncio.sleep(1)
+            self.context = self.page.context
+            self.browser = self.context.browser
 
             logger.info("浏览器初始化成功")
             return True
@@ -175,28 +77,6 @@ class OrderDetailFetcher:
             logger.error(f"浏览器初始化失败: {e}")
             return False
 
-    async def _set_cookies(self):
-        """设置Cookie"""
-        try:
-            # 解析Cookie字符串
-            cookies = []
-            for cookie_pair in self.cookie.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-            
-            # 添加Cookie到上下文
-            await self.context.add_cookies(cookies)
-            logger.info(f"已设置 {len(cookies)} 个Cookie")
-            
-        except Exception as e:
-            logger.error(f"设置Cookie失败: {e}")
-
     async def fetch_order_detail(self, order_id: str, timeout: int = 30) -> Optional[Dict[str, Any]]:
         """
         获取订单详情（带锁机制和数据库缓存）
@@ -822,46 +702,33 @@ class OrderDetailFetcher:
             return False
 
     async def _force_close_browser(self):
-        """强制关闭浏览器，忽略所有错误"""
+        """归还页面并关闭该账号在浏览器池中的上下文（浏览器异常时使用），忽略所有错误"""
         try:
+            pool = get_browser_pool()
             if self.page:
-                try:
-                    await self.page.close()
-                except:
-                    pass
-                self.page = None
-
-            if self.context:
-                try:
-                    await self.context.close()
-                except:
-                    pass
-                self.context = None
-
-            if self.browser:
-                try:
-                    await self.browser.close()
-                except:
-                    pass
-                self.browser = None
-
+                await pool.release_page(self.page)
+            await pool.close_browser(self.cookie_id or pool.derive_key(self.cookie))
         except Exception as e:
             logger.debug(f"强制关闭浏览器过程中的异常（可忽略）: {e}")
+        finally:
+            self.page = None
+            self.context = None
+            self.browser = None
 
     async def close(self):
-        """关闭浏览器"""
+        """归还页面，账号上下文留在浏览器池中复用"""
         try:
             if self.page:
-                await self.page.close()
-            if self.context:
-                await self.context.close()
-            if self.browser:
-                await self.browser.close()
-            logger.info("浏览器已关闭")
+                stats = await get_browser_pool().release_page(self.page)
+                if stats:
+                    logger.info(f"页面已归还浏览器池，本次耗时 {stats['elapsed']:.2f}秒，"
+                                f"请求 {stats['requests']} 个（拦截 {stats['blocked']} 个），传输 {stats['bytes'] / 1024:.1f}KB")
         except Exception as e:
-            logger.error(f"关闭浏览器失败: {e}")
-            # 如果正常关闭失败，尝试强制关闭
-            await self._force_close_browser()
+            logger.error(f"归还页面失败: {e}")
+        finally:
+            self.page = None
+            self.context = None
+            self.browser = None
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -874,7 +741,8 @@ class OrderDetailFetcher:
 
 
 # 便捷函数
-async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, headless: bool = True) -> Optional[Dict[str, Any]]:
+async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, headless: bool = True,
+                                    cookie_id: str = None) -> Optional[Dict[str, Any]]:
     """
     简单的订单详情获取函数（优化版：先检查数据库，再初始化浏览器）
 
@@ -882,6 +750,7 @@ async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, he
         order_id: 订单ID
         cookie_string: Cookie字符串，如果不提供则使用默认值
         headless: 是否无头模式
+        cookie_id: 账号ID，用于复用浏览器池中该账号的上下文
 
     Returns:
         订单详情字典，包含以下字段：
@@ -959,7 +828,7 @@ async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, he
     logger.info(f"🌐 订单 {order_id} 需要浏览器获取，开始初始化浏览器...")
     print(f"🔍 订单 {order_id} 开始浏览器获取详情...")
 
-    fetcher = OrderDetailFetcher(cookie_string, headless)
+    fetcher = OrderDetailFetcher(cookie_string, headless, cookie_id)
     try:
         if await fetcher.init_browser(headless=headless):
             return await fetcher.fetch_order_detail(order_id)
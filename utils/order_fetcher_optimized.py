@@ -1,12 +1,15 @@
 """
 订单获取优化模块
-合并订单状态查询和订单详情获取，减少浏览器启动次数
+优先直接调用订单详情mtop接口（纯HTTP），签名或风控失败时再用浏览器访问订单页，
+浏览器模式下合并订单状态查询和订单详情获取，减少浏览器启动次数
 """
 import asyncio
 import time
 import json
 import re
-from typing import Dict, Any, Optional, List
+import weakref
+from typing import Dict, Any, Optional, List, Tuple
+import aiohttp
 from playwright.async_api import Browser, BrowserContext, Page
 from loguru import logger
 from collections import defaultdict
@@ -14,20 +17,62 @@ from collections import defaultdict
 from utils.browser_pool import get_browser_pool
 
 
+# 订单详情mtop接口
+ORDER_DETAIL_API = 'mtop.idle.web.trade.order.detail'
+ORDER_DETAIL_API_VERSION = '1.0'
+
+# 令牌过期/签名错误：用响应下发的新_m_h5_tk重试一次，仍失败则回退浏览器
+TOKEN_ERROR_KEYWORDS = ('FAIL_SYS_TOKEN_EXOIRED', 'FAIL_SYS_TOKEN_EXPIRED', 'FAIL_SYS_TOKEN_EMPTY',
+                        'FAIL_SYS_ILLEGAL_ACCESS', 'FAIL_SYS_SESSION_EXPIRED', 'ILLEGAL_SIGN')
+# 风控/验证：只能交给浏览器处理
+RISK_ERROR_KEYWORDS = ('RGV587', 'FAIL_SYS_USER_VALIDATE', '哎哟喂', '被挤爆', 'punish', 'captcha')
+
+# 各事件循环共享的mtop HTTP会话（建立在账号HTTP连接池之上）；Cookie按请求头逐个账号传入，不使用会话Cookie
+_mtop_sessions: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]' = weakref.WeakKeyDictionary()
+
+
+def _get_mtop_session() -> aiohttp.ClientSession:
+    """获取当前事件循环的mtop HTTP会话"""
+    loop = asyncio.get_running_loop()
+    session = _mtop_sessions.get(loop)
+    if session is None or session.closed:
+        from utils.http_pool import get_http_pool
+        session = get_http_pool().create_session(
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=15, connect=5)
+        )
+        _mtop_sessions[loop] = session
+    return session
+
+
+def _cookie_dict(cookie_string: str) -> Dict[str, str]:
+    cookies = {}
+    for cookie_pair in (cookie_string or '').split(';'):
+        cookie_pair = cookie_pair.strip()
+        if '=' in cookie_pair:
+            name, value = cookie_pair.split('=', 1)
+            cookies[name.strip()] = value.strip()
+    return cookies
+
+
 class OrderFetcherOptimized:
     """
     优化的订单获取器
 
     特性:
-    - 一次浏览器访问同时获取订单状态和订单详情
+    - 默认直接请求订单详情mtop接口，毫秒级完成，不占用浏览器
+    - 签名/令牌失效或触发风控时回退浏览器：一次访问同时获取订单状态和订单详情
     - 使用浏览器池复用实例
     - 同时监听API响应和解析DOM
     """
 
+    # 获取方式：auto（HTTP优先，必要时回退浏览器）、http（仅HTTP）、browser（仅浏览器）
+    FETCH_MODES = ('auto', 'http', 'browser')
+
     # 类级别的锁字典，为每个order_id维护一个锁
     _order_locks = defaultdict(lambda: asyncio.Lock())
 
-    def __init__(self, cookie_id: str, cookie_string: str, use_pool: bool = True):
+    def __init__(self, cookie_id: str, cookie_string: str, use_pool: bool = True, fetch_mode: str = 'auto'):
         """
         初始化订单获取器
 
@@ -35,12 +80,17 @@ class OrderFetcherOptimized:
             cookie_id: Cookie ID
             cookie_string: Cookie字符串
             use_pool: 是否使用浏览器池（默认True）
+            fetch_mode: 获取方式，auto / http / browser
         """
         self.cookie_id = cookie_id
         self.cookie_string = cookie_string
         self.use_pool = use_pool
+        self.fetch_mode = fetch_mode if fetch_mode in self.FETCH_MODES else 'auto'
         self.api_responses = []
 
+        # 最近一次获取失败的类型（captcha / timeout / error），供自适应并发控制使用
+        self.last_error: Optional[str] = None
+
         # 浏览器实例
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
@@ -130,17 +180,28 @@ class OrderFetcherOptimized:
                             logger.info(f"📋 订单 {order_id} 金额无效({amount})，需要重新获取")
                             print(f"⚠️ 订单 {order_id} 金额无效，重新获取...")
 
+                # 优先直接调用订单详情接口
+                if self.fetch_mode != 'browser':
+                    http_result, need_browser = await self._fetch_order_via_http(order_id)
+                    if http_result:
+                        return http_result
+                    if not need_browser or self.fetch_mode == 'http':
+                        return None
+                    logger.info(f"订单 {order_id} 接口获取未成功，回退到浏览器获取")
+
                 # 获取浏览器实例（使用浏览器池或创建新实例）
                 if self.use_pool:
                     logger.info(f"🌐 从浏览器池获取浏览器实例...")
-                    browser_pool = get_browser_pool()
-                    result = await browser_pool.get_browser(self.cookie_id, self.cookie_string, headless)
+                    self.page = await get_browser_pool().acquire_page(
+                        self.cookie_id, self.cookie_string, headless, block_preset='data_only'
+                    )
 
-                    if not result:
+                    if not self.page:
                         logger.error("从浏览器池获取浏览器失败")
                         return None
 
-                    self.browser, self.context, self.page = result
+                    self.context = self.page.context
+                    self.browser = self.context.browser
                 else:
                     logger.error("非池模式暂未实现")
                     return None
@@ -166,8 +227,12 @@ class OrderFetcherOptimized:
                         except Exception as e:
                             logger.error(f"解析API响应失败: {e}")
 
-                    # 继续所有请求
-                    await route.continue_()
+                        # 用已获取的响应回填，避免再次请求
+                        await route.fulfill(response=response, body=body)
+                        return
+
+                    # 其他请求交给浏览器池的拦截预设处理（图片、字体等直接丢弃）
+                    await route.fallback()
 
                 # 设置路由拦截
                 await self.page.route('**/*', handle_route)
@@ -179,6 +244,11 @@ class OrderFetcherOptimized:
 
                 response = await self.page.goto(url, wait_until='networkidle', timeout=timeout * 1000)
 
+                if any(k in self.page.url for k in ('punish', 'captcha', 'baxia')):
+                    logger.warning(f"订单 {order_id} 页面触发滑块验证: {self.page.url}")
+                    self.last_error = 'captcha'
+                    return None
+
                 if not response or response.status != 200:
                     logger.error(f"页面访问失败，状态码: {response.status if response else 'None'}")
                     return None
@@ -248,19 +318,185 @@ class OrderFetcherOptimized:
                 return result
 
             except Exception as e:
+                self.last_error = 'timeout' if 'Timeout' in type(e).__name__ or 'Timeout' in str(e) else 'error'
                 logger.error(f"获取订单完整信息失败: {e}")
                 print(f"❌ 获取订单 {order_id} 失败: {e}")
                 return None
             finally:
-                # 清理：关闭页面（因为浏览器池为每个请求创建新页面）
+                # 清理：归还页面，账号上下文留在浏览器池中复用
                 if self.page and self.use_pool:
-                    try:
-                        await self.page.close()
-                        logger.debug(f"已关闭页面: {order_id}")
-                    except Exception as e:
-                        logger.debug(f"关闭页面失败: {e}")
+                    stats = await get_browser_pool().release_page(self.page)
+                    if stats:
+                        logger.debug(f"已归还页面: {order_id}，耗时 {stats['elapsed']:.2f}秒，"
+                                     f"请求 {stats['requests']} 个（拦截 {stats['blocked']} 个），传输 {stats['bytes'] / 1024:.1f}KB")
                     self.page = None
 
+    async def _request_order_detail(self, order_id: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        调用订单详情mtop接口
+
+        Returns:
+            (响应JSON, 响应下发的新Cookie)
+        """
+        from utils.xianyu_utils import generate_sign
+
+        cookies = _cookie_dict(self.cookie_string)
+        token = cookies.get('_m_h5_tk', '').split('_')[0]
+        t = str(int(time.time() * 1000))
+        data_val = json.dumps({'tid': order_id}, separators=(',', ':'))
+
+        params = {
+            'jsv': '2.7.2',
+            'appKey': '34839810',
+            't': t,
+            'sign': generate_sign(t, token, data_val),
+            'v': ORDER_DETAIL_API_VERSION,
+            'type': 'originaljson',
+            'accountSite': 'xianyu',
+            'dataType': 'json',
+            'timeout': '20000',
+            'api': ORDER_DETAIL_API,
+            'sessionOption': 'AutoLoginOnly',
+        }
+        headers = {
+            'accept': 'application/json',
+            'content-type': 'application/x-www-form-urlencoded',
+            'origin': 'https://www.goofish.com',
+            'referer': f'https://www.goofish.com/order-detail?orderId={order_id}&role=seller',
+            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
+            'cookie': self.cookie_string,
+        }
+
+        url = f'https://h5api.m.goofish.com/h5/{ORDER_DETAIL_API}/{ORDER_DETAIL_API_VERSION}/'
+        async with _get_mtop_session().post(url, params=params, data={'data': data_val}, headers=headers) as response:
+            new_cookies = {}
+            for cookie in response.headers.getall('set-cookie', []):
+                if '=' in cookie:
+                    name, value = cookie.split(';')[0].split('=', 1)
+                    new_cookies[name.strip()] = value.strip()
+            res_json = await response.json(content_type=None)
+        return res_json, new_cookies
+
+    async def _fetch_order_via_http(self, order_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        直接通过接口获取订单信息
+
+        Returns:
+            (订单信息, 是否需要回退浏览器)；成功时第二项为False
+        """
+        start_time = time.perf_counter()
+        try:
+            for attempt in range(2):
+                res_json, new_cookies = await self._request_order_detail(order_id)
+
+                # 令牌刷新后更新本地Cookie（仅本次获取使用，账号Cookie由账号连接负责持久化）
+                if new_cookies:
+                    cookies = _cookie_dict(self.cookie_string)
+                    cookies.update(new_cookies)
+                    self.cookie_string = '; '.join(f"{k}={v}" for k, v in cookies.items())
+
+                ret = res_json.get('ret', []) if isinstance(res_json, dict) else []
+                ret_text = ' '.join(str(r) for r in ret)
+
+                if any(str(r).startswith('SUCCESS') for r in ret):
+                    break
+                if any(k in ret_text for k in RISK_ERROR_KEYWORDS):
+                    logger.warning(f"订单 {order_id} 接口触发风控: {ret_text}")
+                    self.last_error = 'captcha'
+                    return None, True
+                if any(k in ret_text for k in TOKEN_ERROR_KEYWORDS):
+                    if attempt == 0 and '_m_h5_tk' in new_cookies:
+                        logger.info(f"订单 {order_id} 接口令牌失效，使用新令牌重试")
+                        continue
+                    logger.warning(f"订单 {order_id} 接口签名/令牌错误: {ret_text}")
+                    return None, True
+                logger.warning(f"订单 {order_id} 接口返回失败: {ret_text or res_json}")
+                return None, False
+            else:
+                return None, True
+
+            order_data = res_json.get('data', {}) or {}
+            api_data = self._parse_api_response(order_data)
+            api_data.update({k: v for k, v in self._parse_api_extras(order_data).items() if v})
+
+            if not api_data.get('price'):
+                # 接口数据缺少金额时交给浏览器从页面补全
+                logger.info(f"订单 {order_id} 接口数据缺少金额，需要浏览器补全")
+                return None, True
+
+            elapsed = (time.perf_counter() - start_time) * 1000
+            logger.info(f"订单 {order_id} 接口获取成功，耗时 {elapsed:.0f}ms")
+
+            result = {
+                'order_id': order_id,
+                'url': f"https://www.goofish.com/order-detail?orderId={order_id}&role=seller",
+                'title': f"订单详情 - {order_id}",
+                'timestamp': time.time(),
+                'from_cache': False,
+                'fetch_mode': 'http',
+                'order_status': api_data.get('order_status', 'unknown'),
+                'status_text': api_data.get('status_text', ''),
+                'item_title': api_data.get('item_title', ''),
+                'buyer_id': api_data.get('buyer_id', ''),
+                'item_id': api_data.get('item_id', ''),
+                'can_rate': api_data.get('can_rate', False),
+                'spec_name': api_data.get('spec_name', ''),
+                'spec_value': api_data.get('spec_value', ''),
+                'quantity': api_data.get('quantity', '1'),
+                'amount': api_data.get('price', ''),
+                'order_time': api_data.get('order_time', ''),
+                'receiver_name': api_data.get('receiver_name', ''),
+                'receiver_phone': api_data.get('receiver_phone', ''),
+                'receiver_address': api_data.get('receiver_address', ''),
+                'receiver_city': api_data.get('receiver_city', ''),
+            }
+            return result, False
+
+        except Exception as e:
+            logger.warning(f"订单 {order_id} 接口请求异常: {e}")
+            return None, True
+
+    def _parse_api_extras(self, order_data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        从接口数据中补充浏览器模式下由DOM解析的字段：下单时间、规格、数量
+
+        接口中这些字段以 {title/label/name: 标题, value/content: 值} 的形式分散在各组件里，
+        这里遍历整棵数据树按标题匹配
+        """
+        result = {}
+
+        def walk(node):
+            if isinstance(node, dict):
+                title = node.get('title') or node.get('label') or node.get('name')
+                value = node.get('value') or node.get('content') or node.get('text')
+                if isinstance(title, str) and isinstance(value, (str, int, float)):
+                    value = str(value).strip()
+                    if any(k in title for k in ('下单时间', '创建时间', '成交时间')) and 'order_time' not in result:
+                        time_match = re.search(r'(\d{4}[-/]\d{2}[-/]\d{2}\s+\d{2}:\d{2}(?::\d{2})?)', value)
+                        if time_match:
+                            result['order_time'] = time_match.group(1).replace('/', '-')
+                for key in ('skuInfo', 'skuText', 'sku'):
+                    sku = node.get(key)
+                    if isinstance(sku, str) and ':' in sku and 'spec_name' not in result:
+                        spec_name, spec_value = sku.split(':', 1)
+                        result['spec_name'] = spec_name.strip()
+                        result['spec_value'] = spec_value.strip()
+                for key in ('buyAmount', 'quantity', 'itemNum'):
+                    if key in node and 'quantity' not in result and str(node[key]).lstrip('x').isdigit():
+                        result['quantity'] = str(node[key]).lstrip('x')
+                for child in node.values():
+                    walk(child)
+            elif isinstance(node, list):
+                for child in node:
+                    walk(child)
+
+        try:
+            walk(order_data)
+        except Exception as e:
+            logger.debug(f"解析接口补充字段失败: {e}")
+
+        return result
+
     def _parse_api_response(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         解析API响应数据
@@ -484,7 +720,8 @@ async def fetch_order_complete(
     cookie_string: str,
     timeout: int = 30,
     headless: bool = True,
-    use_pool: bool = True
+    use_pool: bool = True,
+    fetch_mode: str = 'auto'
 ) -> Optional[Dict[str, Any]]:
     """
     获取完整的订单信息（便捷函数）
@@ -496,11 +733,12 @@ async def fetch_order_complete(
         timeout: 超时时间（秒）
         headless: 是否无头模式
         use_pool: 是否使用浏览器池
+        fetch_mode: 获取方式，auto（接口优先，必要时回退浏览器）/ http / browser
 
     Returns:
         完整的订单信息字典，失败返回None
     """
-    fetcher = OrderFetcherOptimized(cookie_id, cookie_string, use_pool)
+    fetcher = OrderFetcherOptimized(cookie_id, cookie_string, use_pool, fetch_mode)
     return await fetcher.fetch_order_complete(order_id, timeout, headless)
 
 
@@ -516,13 +754,14 @@ async def process_orders_batch(
     """
     并发批量处理订单
 
-    使用asyncio.gather()并发处理多个订单，控制并发数避免被封
+    使用asyncio.gather()并发处理多个订单，并发数由账号共享的自适应限制器控制：
+    获取顺利时逐步提高，遇到滑块/验证码或超时时快速降低，避免被封
 
     Args:
         order_ids: 订单ID列表
         cookie_id: Cookie ID
         cookie_string: Cookie字符串
-        max_concurrent: 最大并发数（默认5）
+        max_concurrent: 本批次最大并发数（默认5），自适应并发不会超过该值
         timeout: 超时时间（秒）
         headless: 是否无头模式
         use_pool: 是否使用浏览器池
@@ -530,11 +769,15 @@ async def process_orders_batch(
     Returns:
         订单信息字典列表（包含成功和失败的结果）
     """
-    logger.info(f"开始批量处理 {len(order_ids)} 个订单，最大并发数: {max_concurrent}")
-    print(f"🚀 批量处理 {len(order_ids)} 个订单（并发数: {max_concurrent}）")
+    from utils.adaptive_concurrency import get_account_limiter
 
-    # 创建信号量控制并发数
+    # 账号共享的自适应并发限制器，本批次再用信号量限制上限
+    limiter = get_account_limiter(cookie_id, 'order_detail')
     semaphore = asyncio.Semaphore(max_concurrent)
+    batch_start = time.time()
+
+    logger.info(f"开始批量处理 {len(order_ids)} 个订单，最大并发数: {max_concurrent}，当前自适应并发: {limiter.limit}")
+    print(f"🚀 批量处理 {len(order_ids)} 个订单（并发数: {min(max_concurrent, limiter.limit)}）")
 
     async def process_single_order(order_id: str, index: int) -> Dict[str, Any]:
         """
@@ -547,19 +790,21 @@ async def process_orders_batch(
         Returns:
             订单信息字典（成功或失败）
         """
-        async with semaphore:
+        async with semaphore, limiter.slot() as slot:
             try:
                 logger.info(f"[{index + 1}/{len(order_ids)}] 开始处理订单: {order_id}")
                 print(f"[{index + 1}/{len(order_ids)}] 处理订单: {order_id}")
 
-                result = await fetch_order_complete(
-                    order_id=order_id,
-                    cookie_id=cookie_id,
-                    cookie_string=cookie_string,
-                    timeout=timeout,
-                    headless=headless,
-                    use_pool=use_pool
-                )
+                fetcher = OrderFetcherOptimized(cookie_id, cookie_string, use_pool)
+                result = await fetcher.fetch_order_complete(order_id, timeout, headless)
+
+                # 反馈给自适应限制器：缓存命中不计入，风控信号即使最终成功也要降速
+                if result and result.get('from_cache'):
+                    slot.skip()
+                elif fetcher.last_error == 'captcha' or not result:
+                    slot.fail(fetcher.last_error or 'error')
+                else:
+                    slot.success()
 
                 if result:
                     logger.info(f"[{index + 1}/{len(order_ids)}] 订单 {order_id} 处理成功")
@@ -575,6 +820,7 @@ async def process_orders_batch(
                     }
 
             except Exception as e:
+                slot.fail('timeout' if 'Timeout' in type(e).__name__ else 'error')
                 logger.error(f"[{index + 1}/{len(order_ids)}] 订单 {order_id} 处理异常: {e}")
                 print(f"❌ [{index + 1}/{len(order_ids)}] 订单 {order_id} 异常: {e}")
                 return {
@@ -610,10 +856,14 @@ async def process_orders_batch(
     success_count = sum(1 for r in processed_results if r and not r.get('error'))
     fail_count = len(processed_results) - success_count
 
-    logger.info(f"批量处理完成: 成功 {success_count}，失败 {fail_count}")
+    elapsed = max(time.time() - batch_start, 0.001)
+    stats = limiter.get_stats()
+    logger.info(f"批量处理完成: 成功 {success_count}，失败 {fail_count}，耗时 {elapsed:.1f}秒，"
+                f"吞吐 {len(processed_results) * 60 / elapsed:.1f} 单/分钟，自适应并发 {stats['limit']}")
     print(f"\n📊 批量处理完成:")
     print(f"   ✅ 成功: {success_count}")
     print(f"   ❌ 失败: {fail_count}")
+    print(f"   ⚡ 吞吐: {len(processed_results) * 60 / elapsed:.1f} 单/分钟（当前并发 {stats['limit']}）")
 
     return processed_results
 
@@ -639,7 +889,7 @@ async def process_orders_in_batches(
         cookie_id: Cookie ID
         cookie_string: Cookie字符串
         batch_size: 每批次的订单数（默认10）
-        max_concurrent: 每批次内的最大并发数（默认5）
+        max_concurrent: 每批次内的并发上限（默认5），实际并发由账号的自适应并发控制决定
         timeout: 超时时间（秒）
         headless: 是否无头模式
         use_pool: 是否使用浏览器池
@@ -651,13 +901,14 @@ async def process_orders_in_batches(
     total_orders = len(order_ids)
     total_batches = (total_orders + batch_size - 1) // batch_size
 
-    logger.info(f"开始分批处理 {total_orders} 个订单，分为 {total_batches} 批，每批 {batch_size} 个，批内并发 {max_concurrent}")
+    logger.info(f"开始分批处理 {total_orders} 个订单，分为 {total_batches} 批，每批 {batch_size} 个，批内并发上限 {max_concurrent}（自适应）")
     print(f"🔄 分批处理 {total_orders} 个订单:")
     print(f"   📦 总批次: {total_batches}")
     print(f"   📊 每批: {batch_size} 个")
-    print(f"   ⚡ 批内并发: {max_concurrent}")
+    print(f"   ⚡ 批内并发上限: {max_concurrent}（自适应）")
 
     all_results = []
+    start_time = time.time()
 
     for batch_index in range(total_batches):
         start_idx = batch_index * batch_size
@@ -690,7 +941,9 @@ async def process_orders_in_batches(
     success_count = sum(1 for r in all_results if r and not r.get('error'))
     fail_count = len(all_results) - success_count
 
-    logger.info(f"\n所有批次处理完成: 成功 {success_count}，失败 {fail_count}")
+    elapsed = max(time.time() - start_time, 0.001)
+    logger.info(f"\n所有批次处理完成: 成功 {success_count}，失败 {fail_count}，"
+                f"总耗时 {elapsed:.1f}秒，吞吐 {total_orders * 60 / elapsed:.1f} 单/分钟")
     print(f"\n🎉 所有批次处理完成:")
     print(f"   ✅ 成功: {success_count}/{total_orders}")
     print(f"   ❌ 失败: {fail_count}/{total_orders}")
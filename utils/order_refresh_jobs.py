@@ -0,0 +1,502 @@
+"""
+订单刷新后台任务
+POST /api/orders/refresh 只负责创建任务并立即返回任务ID，实际的浏览器/接口刷新由后台工作协程执行：
+- 同一账号同一时间只有一个刷新任务在执行，重复提交直接返回已有任务；通过数据库中的账号租约去重，
+  API 以多个 worker 进程运行时同样生效
+- 任务由创建它的进程执行并定期续期租约，租约过期（进程已退出）的未完成任务标记为中断，
+  任务不在本进程时进度从数据库读取
+- 只刷新到期的不完整订单（orders 表的刷新记录列），仍不完整的按指数退避推迟，多次后放弃
+- 固定数量的工作协程从队列中按批取订单处理，限制全局浏览器并发
+- 每批处理完成后在一个事务中批量写回 orders 表，并把进度保存到 order_refresh_jobs 表
+- 客户端通过轮询或 SSE 获取进度和已完成的部分结果
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# 闲鱼订单状态码 -> 数据库订单状态
+ORDER_STATUS_MAPPING = {
+    '1': 'processing',
+    '2': 'pending_ship',
+    '3': 'shipped',
+    '4': 'completed',
+    '5': 'refunding',
+    '6': 'cancelled',
+    '7': 'refunding',
+    '8': 'cancelled',
+    '9': 'refunding',
+    '10': 'cancelled',
+}
+
+# 已结束的任务状态
+FINISHED_STATES = ('completed', 'failed', 'interrupted')
+
+
+class RefreshJob:
+    """一次订单刷新任务的进度和结果"""
+
+    def __init__(self, user_id: int, cookie_ids: List[str], status_filter: Optional[str] = None):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.cookie_ids = cookie_ids
+        self.status_filter = status_filter
+        self.state = 'queued'
+        self.total = 0
+        self.processed = 0
+        self.updated = 0
+        self.no_change = 0
+        self.failed = 0
+        self.updated_orders: List[Dict[str, Any]] = []
+        self.skipped_accounts: Dict[str, str] = {}  # {cookie_id: 正在刷新该账号的任务ID}
+        self.error: Optional[str] = None
+        self.created_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.finished_at: Optional[str] = None
+
+        self.pending_units = 0
+        self.account_units: Dict[str, int] = {}
+        self._version = 0
+        self._changed = asyncio.Event()
+
+    @classmethod
+    def from_dict(cls, info: Dict[str, Any]) -> 'RefreshJob':
+        """由数据库中保存的任务创建只读快照（任务在其他进程中执行）"""
+        job = cls(info['user_id'], info.get('cookie_ids', []), info.get('status_filter'))
+        for field in ('job_id', 'state', 'total', 'processed', 'updated', 'no_change', 'failed',
+                      'updated_orders', 'error', 'created_at', 'finished_at'):
+            setattr(job, field, info.get(field, getattr(job, field)))
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def version(self) -> int:
+        """进度版本号，每次进度变化加1"""
+        return self._version
+
+    def touch(self):
+        """进度有变化，唤醒等待中的 SSE 连接"""
+        self._version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, version: int, timeout: float):
+        """等待进度在 version 之后发生变化（或超时）"""
+        if self._version == version and not self.finished:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def to_dict(self, since: int = 0) -> Dict[str, Any]:
+        """
+        导出任务状态
+
+        Args:
+            since: 只返回 updated_orders 中该下标之后的部分结果（增量轮询）
+        """
+        return {
+            'job_id': self.job_id,
+            'user_id': self.user_id,
+            'cookie_ids': self.cookie_ids,
+            'status_filter': self.status_filter,
+            'state': self.state,
+            'total': self.total,
+            'processed': self.processed,
+            'updated': self.updated,
+            'no_change': self.no_change,
+            'failed': self.failed,
+            'updated_orders': self.updated_orders[since:],
+            'skipped_accounts': self.skipped_accounts,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class _WorkUnit:
+    __slots__ = ('job', 'cookie_id', 'cookie_string', 'orders')
+
+    def __init__(self, job: RefreshJob, cookie_id: str, cookie_string: str, orders: List[Dict[str, Any]]):
+        self.job = job
+        self.cookie_id = cookie_id
+        self.cookie_string = cookie_string
+        self.orders = orders
+
+
+class OrderRefreshJobManager:
+    """订单刷新任务管理器（运行在API服务的事件循环中）"""
+
+    def __init__(self, workers: int = 2, max_concurrent: int = 3, chunk_size: int = 20,
+                 max_orders_per_account: int = 1000, history_size: int = 50, max_attempts: int = 6,
+                 backoff_base: float = 300, backoff_max: float = 86400, pending_backoff_max: float = 3600,
+                 lease_ttl: float = 60):
+        """
+        初始化任务管理器
+
+        Args:
+            workers: 工作协程数
+            max_concurrent: 每个工作协程处理一批订单时的并发上限
+            chunk_size: 每批订单数（也是批量写回数据库的粒度）
+            max_orders_per_account: 每个账号最多检查的订单数
+            history_size: 内存中保留的已结束任务数
+            max_attempts: 订单连续获取后仍不完整的次数达到该值后不再自动刷新
+            backoff_base: 订单获取后仍不完整时，下次刷新的最短间隔（秒），之后每次翻倍
+            backoff_max: 最长刷新间隔（秒）
+            pending_backoff_max: 未到最终状态（待付款、待发货等）的订单最长刷新间隔（秒）
+            lease_ttl: 账号和任务租约的有效期（秒），执行中每 1/3 有效期续期一次
+        """
+        self.workers = max(1, workers)
+        self.max_concurrent = max(1, max_concurrent)
+        self.chunk_size = max(1, chunk_size)
+        self.max_orders_per_account = max_orders_per_account
+        self.history_size = history_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pending_backoff_max = pending_backoff_max
+        self.lease_ttl = max(10, lease_ttl)
+        # 租约所有者：区分同一数据库上的多个API进程
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._jobs: 'OrderedDict[str, RefreshJob]' = OrderedDict()
+        self._active_accounts: Dict[str, str] = {}  # {cookie_id: job_id}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker_tasks = []
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        while len(self._worker_tasks) < self.workers:
+            index = len(self._worker_tasks)
+            self._worker_tasks.append(loop.create_task(self._worker(index)))
+        if self._lease_task is None or self._lease_task.done() or self._lease_task.get_loop() is not loop:
+            self._lease_task = loop.create_task(self._lease_loop())
+
+    async def _lease_loop(self):
+        """续期本进程执行中的任务和账号租约，并把其他已退出进程遗留的任务标记为中断"""
+        from db_manager import db_manager
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                if self._active_accounts or any(not job.finished for job in self._jobs.values()):
+                    db_manager.renew_order_refresh_leases(self.owner, time.time() + self.lease_ttl)
+                interrupted = db_manager.mark_interrupted_order_refresh_jobs()
+                if interrupted:
+                    logger.warning(f"{interrupted} 个订单刷新任务的执行进程已退出，标记为中断")
+            except Exception as e:
+                logger.error(f"续期订单刷新租约异常: {e}")
+
+    def _collect_orders(self, cookie_id: str, status_filter: Optional[str]) -> List[Dict[str, Any]]:
+        """从数据库中找出该账号到期需要刷新的订单"""
+        from db_manager import db_manager
+
+        orders = db_manager.get_orders_due_for_refresh(cookie_id, status_filter, limit=self.max_orders_per_account,
+                                                       max_attempts=self.max_attempts)
+        return [{'order_id': order['order_id'], 'current_status': order['status']} for order in orders]
+
+    def submit(self, user_id: int, user_cookies: Dict[str, str],
+               status_filter: Optional[str] = None) -> Tuple[RefreshJob, bool]:
+        """
+        提交订单刷新任务
+
+        Args:
+            user_id: 用户ID
+            user_cookies: 要刷新的账号 {cookie_id: cookie字符串}
+            status_filter: 只刷新该状态的订单
+
+        Returns:
+            (任务, 是否复用了已有任务)
+        """
+        from db_manager import db_manager
+        self._ensure_workers()
+
+        job = RefreshJob(user_id, [], status_filter)
+        lease_until = time.time() + self.lease_ttl
+        accounts = {}
+        skipped = {}
+        for cookie_id, cookie_string in user_cookies.items():
+            # 账号可能正由本进程或其他API进程中的任务刷新，以数据库中的账号租约为准
+            active_job_id = self._active_accounts.get(cookie_id) or db_manager.acquire_order_refresh_lease(
+                cookie_id, job.job_id, self.owner, lease_until)
+            if active_job_id:
+                skipped[cookie_id] = active_job_id
+            else:
+                accounts[cookie_id] = cookie_string
+
+        # 所有账号都已有任务在刷新，直接返回已有任务（在其他进程中执行的从数据库读取）
+        if not accounts and skipped:
+            existing_id = next(iter(skipped.values()))
+            existing = self._jobs.get(existing_id)
+            if existing is None:
+                info = db_manager.get_order_refresh_job(existing_id)
+                if info and self._from_db(info)['state'] not in FINISHED_STATES:
+                    existing = RefreshJob.from_dict(info)
+            if existing:
+                logger.info(f"订单刷新任务已在进行中，复用任务 {existing.job_id}")
+                return existing, True
+
+        job.cookie_ids = list(accounts)
+        job.skipped_accounts = skipped
+        self._jobs[job.job_id] = job
+
+        for cookie_id, cookie_string in accounts.items():
+            orders = self._collect_orders(cookie_id, status_filter)
+            if not cookie_string:
+                logger.warning(f"订单刷新任务 {job.job_id}: 账号 {cookie_id} 的Cookie为空，跳过")
+                job.total += len(orders)
+                job.processed += len(orders)
+                job.failed += len(orders)
+                db_manager.release_order_refresh_lease(cookie_id, self.owner)
+                continue
+            if not orders:
+                db_manager.release_order_refresh_lease(cookie_id, self.owner)
+                continue
+
+            job.total += len(orders)
+            self._active_accounts[cookie_id] = job.job_id
+            for start in range(0, len(orders), self.chunk_size):
+                job.pending_units += 1
+                job.account_units[cookie_id] = job.account_units.get(cookie_id, 0) + 1
+                self._queue.put_nowait(_WorkUnit(job, cookie_id, cookie_string, orders[start:start + self.chunk_size]))
+
+        logger.info(f"创建订单刷新任务 {job.job_id}: {len(accounts)} 个账号，{job.total} 个订单需要刷新"
+                    f"{f'，{len(skipped)} 个账号已在其他任务中刷新' if skipped else ''}")
+
+        if job.pending_units == 0:
+            self._finish(job)
+        else:
+            self._persist(job)
+
+        return job, False
+
+    async def _worker(self, index: int):
+        queue = self._queue
+        while True:
+            unit = await queue.get()
+            try:
+                await self._run_unit(unit)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"订单刷新工作协程 {index} 处理异常: {e}")
+                unit.job.processed += len(unit.orders)
+                unit.job.failed += len(unit.orders)
+                unit.job.error = str(e)
+            finally:
+                queue.task_done()
+                self._unit_done(unit)
+
+    async def _run_unit(self, unit: _WorkUnit):
+        from db_manager import db_manager
+        from utils.order_fetcher_optimized import process_orders_batch
+
+        job = unit.job
+        if job.state == 'queued':
+            job.state = 'running'
+            job.touch()
+
+        order_ids = [o['order_id'] for o in unit.orders]
+        batch_results = await process_orders_batch(
+            order_ids=order_ids,
+            cookie_id=unit.cookie_id,
+            cookie_string=unit.cookie_string,
+            max_concurrent=self.max_concurrent,
+            timeout=30,
+            headless=True,
+            use_pool=True
+        )
+
+        # 整理本批结果，在一个事务中写回数据库
+        writes = []
+        fetched = {}
+        for order_info, result in zip(unit.orders, batch_results):
+            order_id = order_info['order_id']
+            if not result or result.get('error'):
+                error_msg = result.get('error', '未知错误') if result else '未知错误'
+                logger.warning(f"订单 {order_id} 获取失败: {error_msg}")
+                continue
+
+            order_status = result.get('order_status', 'unknown')
+            if order_status and str(order_status).isdigit():
+                order_status = ORDER_STATUS_MAPPING.get(str(order_status), order_status)
+
+            fetched[order_id] = (result, order_status)
+            writes.append({
+                'order_id': order_id,
+                'item_id': result.get('item_id') or None,
+                'buyer_id': result.get('buyer_id') or None,
+                'spec_name': result.get('spec_name') or None,
+                'spec_value': result.get('spec_value') or None,
+                'quantity': result.get('quantity') or None,
+                'amount': result.get('amount') or None,
+                'order_status': order_status if order_status != order_info['current_status'] else None,
+                'created_at': result.get('order_time') or None,
+                'receiver_name': result.get('receiver_name') or None,
+                'receiver_phone': result.get('receiver_phone') or None,
+                'receiver_address': result.get('receiver_address') or None
+            })
+
+        saved = db_manager.batch_update_orders(writes) if writes else {}
+        # 更新刷新记录：已完整的订单不再刷新，其余按退避推迟（获取失败的订单不计入，下次刷新时重试）
+        db_manager.record_order_refresh(list(fetched), self.backoff_base, self.backoff_max, self.pending_backoff_max)
+
+        for order_info in unit.orders:
+            order_id = order_info['order_id']
+            current_status = order_info['current_status']
+            job.processed += 1
+            if order_id not in fetched or not saved.get(order_id):
+                job.failed += 1
+                continue
+
+            result, order_status = fetched[order_id]
+            has_changes = order_status != current_status or result.get('buyer_id') or result.get('amount')
+            if has_changes:
+                job.updated += 1
+                job.updated_orders.append({
+                    'order_id': order_id,
+                    'old_status': current_status,
+                    'new_status': order_status,
+                    'status_text': result.get('status_text', '')
+                })
+            else:
+                job.no_change += 1
+
+        logger.info(f"订单刷新任务 {job.job_id}: 账号 {unit.cookie_id} 完成 {len(unit.orders)} 个订单，"
+                    f"总进度 {job.processed}/{job.total}")
+
+    def _unit_done(self, unit: _WorkUnit):
+        job = unit.job
+        job.pending_units -= 1
+        job.account_units[unit.cookie_id] -= 1
+        if job.account_units[unit.cookie_id] <= 0 and self._active_accounts.get(unit.cookie_id) == job.job_id:
+            from db_manager import db_manager
+            del self._active_accounts[unit.cookie_id]
+            db_manager.release_order_refresh_lease(unit.cookie_id, self.owner)
+
+        if job.pending_units <= 0:
+            self._finish(job)
+        else:
+            self._persist(job)
+            job.touch()
+
+    def _finish(self, job: RefreshJob):
+        job.state = 'failed' if job.total and job.failed == job.total and job.error else 'completed'
+        job.finished_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._persist(job)
+        job.touch()
+        logger.info(f"订单刷新任务 {job.job_id} 结束: 更新{job.updated}个, 无变化{job.no_change}个, 失败{job.failed}个")
+
+        # 只在内存中保留最近的已结束任务，更早的从数据库读取
+        finished = [job_id for job_id, j in self._jobs.items() if j.finished]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def _persist(self, job: RefreshJob):
+        from db_manager import db_manager
+        info = job.to_dict()
+        info['owner'] = self.owner
+        info['lease_until'] = 0 if job.finished else time.time() + self.lease_ttl
+        db_manager.save_order_refresh_job(info)
+
+    @staticmethod
+    def _from_db(info: Dict[str, Any]) -> Dict[str, Any]:
+        """整理数据库中读取的任务：租约已过期的未完成任务（执行进程已退出）视为中断"""
+        lease_until = info.pop('lease_until', 0)
+        if info['state'] not in FINISHED_STATES and lease_until < time.time():
+            info['state'] = 'interrupted'
+        return info
+
+    def get_job(self, job_id: str, user_id: Optional[int] = None) -> Optional[RefreshJob]:
+        """获取本进程内存中的任务（本进程创建的未结束任务一定在内存中）"""
+        job = self._jobs.get(job_id)
+        if job and (user_id is None or job.user_id == user_id):
+            return job
+        return None
+
+    def get_job_info(self, job_id: str, user_id: Optional[int] = None, since: int = 0) -> Optional[Dict[str, Any]]:
+        """获取任务状态，内存中没有时（已移出内存或在其他进程中执行）从数据库读取"""
+        job = self.get_job(job_id, user_id)
+        if job:
+            return job.to_dict(since)
+
+        from db_manager import db_manager
+        info = db_manager.get_order_refresh_job(job_id)
+        if not info or (user_id is not None and info['user_id'] != user_id):
+            return None
+        self._from_db(info)
+        info['updated_orders'] = info['updated_orders'][since:]
+        info['skipped_accounts'] = {}
+        return info
+
+    def list_jobs(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取用户最近的刷新任务（不含结果明细）"""
+        from db_manager import db_manager
+
+        jobs = db_manager.get_order_refresh_jobs(user_id, limit)
+        for info in jobs:
+            self._from_db(info)
+            job = self._jobs.get(info['job_id'])
+            if job:
+                info.update(job.to_dict())
+            info.pop('updated_orders', None)
+        return jobs
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': len([task for task in self._worker_tasks if not task.done()]),
+            'queued_units': self._queue.qsize() if self._queue else 0,
+            'active_jobs': len([job for job in self._jobs.values() if not job.finished]),
+            'active_accounts': len(self._active_accounts)
+        }
+
+
+# 全局订单刷新任务管理器实例（单例模式）
+_global_order_refresh_manager: Optional[OrderRefreshJobManager] = None
+
+
+def get_order_refresh_manager() -> OrderRefreshJobManager:
+    """
+    获取全局订单刷新任务管理器实例（单例模式），参数读取 ORDER_REFRESH 配置；
+    首次创建时把已退出进程遗留的未完成任务（租约已过期）标记为中断
+
+    Returns:
+        OrderRefreshJobManager实例
+    """
+    global _global_order_refresh_manager
+
+    if _global_order_refresh_manager is None:
+        from config import ORDER_REFRESH_CONFIG
+        from db_manager import db_manager
+
+        interrupted = db_manager.mark_interrupted_order_refresh_jobs()
+        if interrupted:
+            logger.warning(f"{interrupted} 个订单刷新任务因服务重启被中断")
+
+        _global_order_refresh_manager = OrderRefreshJobManager(
+            workers=ORDER_REFRESH_CONFIG.get('workers', 2),
+            max_concurrent=ORDER_REFRESH_CONFIG.get('max_concurrent', 3),
+            chunk_size=ORDER_REFRESH_CONFIG.get('chunk_size', 20),
+            max_orders_per_account=ORDER_REFRESH_CONFIG.get('max_orders_per_account', 1000),
+            history_size=ORDER_REFRESH_CONFIG.get('history_size', 50),
+            max_attempts=ORDER_REFRESH_CONFIG.get('max_attempts', 6),
+            backoff_base=ORDER_REFRESH_CONFIG.get('backoff_base', 300),
+            backoff_max=ORDER_REFRESH_CONFIG.get('backoff_max', 86400),
+            pending_backoff_max=ORDER_REFRESH_CONFIG.get('pending_backoff_max', 3600),
+            lease_ttl=ORDER_REFRESH_CONFIG.get('lease_ttl', 60)
+        )
+
+    return _global_order_refresh_manager
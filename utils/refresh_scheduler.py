@@ -0,0 +1,264 @@
+"""
+Token/Cookie 刷新调度器
+由 CookieManager 持有，统一安排所有账号的 token 刷新和浏览器 Cookie 刷新，取代每个 XianyuLive 各自
+每分钟轮询一次的 token_refresh_loop 和 cookie_refresh_loop：
+- 按到期时间维护一个最小堆，只在最近一个刷新到期时醒来
+- 刷新间隔附加随机抖动（只提前不推后），首次 Cookie 刷新在启动后随机分散，避免所有账号同时刷新、同时重连
+- 分别限制全局同时进行的 token 刷新数和浏览器 Cookie 刷新数
+- 到期时账号刚收到过消息则顺延到空闲窗口（消息冷却结束）再刷新，同一账号的 token 和 Cookie 刷新不同时进行
+"""
+import asyncio
+import heapq
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+TOKEN = 'token'
+COOKIE = 'cookie'
+
+_KIND_NAMES = {TOKEN: 'Token刷新', COOKIE: 'Cookie刷新'}
+
+
+class RefreshScheduler:
+    """所有账号共享的 token/Cookie 刷新调度器（运行在主事件循环中）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_token_concurrent: int = 5,
+                 max_browser_concurrent: int = 2, jitter: float = 0.1, initial_spread: float = 600,
+                 idle_slack: float = 30):
+        """
+        初始化调度器
+
+        Args:
+            loop: 主事件循环（XianyuLive 所在的循环）
+            max_token_concurrent: 全局同时进行的 token 刷新数
+            max_browser_concurrent: 全局同时进行的浏览器 Cookie 刷新数
+            jitter: 刷新间隔的随机抖动比例（0.1 表示最多提前 10%）
+            initial_spread: 账号首次 Cookie 刷新在该时间窗口（秒）内随机分散
+            idle_slack: 顺延到空闲窗口时额外附加的随机等待上限（秒）
+        """
+        self.loop = loop
+        self.max_token_concurrent = max(1, max_token_concurrent)
+        self.max_browser_concurrent = max(1, max_browser_concurrent)
+        self.jitter = jitter
+        self.initial_spread = initial_spread
+        self.idle_slack = idle_slack
+
+        self._accounts: Dict[str, Any] = {}  # {cookie_id: XianyuLive}
+        self._due: Dict[Tuple[str, str], float] = {}  # {(cookie_id, kind): 到期时间}
+        self._heap: List[Tuple[float, str, str]] = []
+        self._running: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._active: Dict[str, str] = {}  # {cookie_id: 正在执行的刷新类型}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {kind: {'runs': 0, 'failures': 0, 'deferred': 0} for kind in _KIND_NAMES}
+
+    # ------------------------ 账号注册 ------------------------
+    def register(self, live) -> bool:
+        """
+        注册账号（XianyuLive 实例），由调度器负责其定时 token 和 Cookie 刷新
+
+        Returns:
+            bool: 是否为新注册
+        """
+        cookie_id = live.cookie_id
+        is_new = cookie_id not in self._accounts
+        self._accounts[cookie_id] = live
+        if is_new:
+            now = time.time()
+            token_due = live.last_token_refresh_time + self._jittered(live.token_refresh_interval)
+            self._schedule(cookie_id, TOKEN, max(now, token_due))
+            if live.last_cookie_refresh_time:
+                cookie_due = live.last_cookie_refresh_time + self._jittered(live.cookie_refresh_interval)
+            else:
+                cookie_due = now + random.uniform(0, self.initial_spread)
+            self._schedule(cookie_id, COOKIE, max(now, cookie_due))
+            logger.info(f"【{cookie_id}】已加入刷新调度: {max(0, int(token_due - now))}秒后刷新Token，"
+                        f"{max(0, int(cookie_due - now))}秒后刷新Cookie")
+        self._ensure_running()
+        return is_new
+
+    def unregister(self, cookie_id: str, live=None):
+        """
+        移除账号，取消其正在进行的刷新
+
+        Args:
+            cookie_id: 账号ID
+            live: 指定时只有注册的正是该实例才移除（避免旧实例退出时移除新实例）
+        """
+        if live is not None and self._accounts.get(cookie_id) is not live:
+            return
+        self._accounts.pop(cookie_id, None)
+        for kind in _KIND_NAMES:
+            self._due.pop((cookie_id, kind), None)
+            task = self._running.pop((cookie_id, kind), None)
+            if task and not task.done() and task is not asyncio.current_task():
+                task.cancel()
+        self._wake()
+
+    def is_registered(self, cookie_id: str) -> bool:
+        return cookie_id in self._accounts
+
+    # ------------------------ 调度 ------------------------
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1)
+
+    def _schedule(self, cookie_id: str, kind: str, due: float):
+        self._due[(cookie_id, kind)] = due
+        heapq.heappush(self._heap, (due, cookie_id, kind))
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._semaphores = {
+                TOKEN: asyncio.Semaphore(self.max_token_concurrent),
+                COOKIE: asyncio.Semaphore(self.max_browser_concurrent)
+            }
+            self._task = self.loop.create_task(self._run())
+
+    async def _run(self):
+        logger.info(f"刷新调度器已启动（Token并发 {self.max_token_concurrent}，浏览器并发 {self.max_browser_concurrent}）")
+        while True:
+            try:
+                self._wakeup.clear()
+
+                # 丢弃过期的堆条目（账号已移除或已重新安排）
+                while self._heap and self._due.get(self._heap[0][1:]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # 到期：交给独立任务执行，并发名额在任务内等待，不阻塞其他类型的刷新
+                due, cookie_id, kind = heapq.heappop(self._heap)
+                del self._due[(cookie_id, kind)]
+                self._running[(cookie_id, kind)] = self.loop.create_task(self._refresh(cookie_id, kind))
+
+            except asyncio.CancelledError:
+                logger.info("刷新调度器已停止")
+                raise
+            except Exception as e:
+                logger.error(f"刷新调度器异常: {e}")
+                await asyncio.sleep(5)
+
+    def _idle_at(self, live) -> float:
+        """账号空闲窗口的开始时间（收到消息后的冷却结束时间），已空闲时返回0"""
+        if live.last_message_received_time <= 0:
+            return 0
+        idle_at = live.last_message_received_time + live.message_cookie_refresh_cooldown
+        return idle_at if idle_at > time.time() else 0
+
+    async def _refresh(self, cookie_id: str, kind: str):
+        live = self._accounts.get(cookie_id)
+        next_due = None
+        try:
+            if live is None:
+                return
+
+            from cookie_manager import manager as cookie_manager
+            if cookie_manager and not cookie_manager.get_cookie_status(cookie_id):
+                logger.info(f"【{cookie_id}】账号已禁用，跳过{_KIND_NAMES[kind]}")
+                next_due = time.time() + 300
+                return
+
+            async with self._semaphores[kind]:
+                # 拿到名额后再检查（等待期间可能已由其他途径刷新，或账号收到了消息）
+                if kind == TOKEN:
+                    last, interval = live.last_token_refresh_time, live.token_refresh_interval
+                else:
+                    if not live.cookie_refresh_enabled:
+                        next_due = time.time() + 300
+                        return
+                    last, interval = live.last_cookie_refresh_time, live.cookie_refresh_interval
+                if last and time.time() - last < interval * (1 - self.jitter):
+                    next_due = last + self._jittered(interval)
+                    return
+
+                idle_at = self._idle_at(live)
+                if idle_at:
+                    self.stats[kind]['deferred'] += 1
+                    next_due = idle_at + random.uniform(0, self.idle_slack)
+                    logger.info(f"【{cookie_id}】最近收到消息，{_KIND_NAMES[kind]}顺延 {int(next_due - time.time())} 秒到空闲时执行")
+                    return
+                if cookie_id in self._active or (kind == COOKIE and live.cookie_refresh_lock.locked()):
+                    next_due = time.time() + 60
+                    return
+
+                self._active[cookie_id] = kind
+                try:
+                    self.stats[kind]['runs'] += 1
+                    if kind == TOKEN:
+                        if await live._refresh_token_and_reconnect():
+                            next_due = live.last_token_refresh_time + self._jittered(interval)
+                        else:
+                            self.stats[kind]['failures'] += 1
+                            next_due = time.time() + live.token_retry_interval
+                    else:
+                        logger.info(f"【{cookie_id}】开始执行Cookie刷新任务...")
+                        await live._execute_cookie_refresh(time.time())
+                        next_due = live.last_cookie_refresh_time + self._jittered(interval)
+                finally:
+                    self._active.pop(cookie_id, None)
+
+        except asyncio.CancelledError:
+            logger.info(f"【{cookie_id}】{_KIND_NAMES[kind]}被取消")
+            raise
+        except Exception as e:
+            self.stats[kind]['failures'] += 1
+            logger.error(f"【{cookie_id}】{_KIND_NAMES[kind]}异常: {e}")
+            next_due = time.time() + 60
+        finally:
+            if self._running.get((cookie_id, kind)) is asyncio.current_task():
+                del self._running[(cookie_id, kind)]
+            # 账号仍在调度中且未被重新安排时，安排下一次刷新
+            if cookie_id in self._accounts and (cookie_id, kind) not in self._due:
+                self._schedule(cookie_id, kind, max(time.time(), next_due or time.time() + 60))
+
+    def get_rotation_stats(self) -> Dict[str, Any]:
+        """汇总所有账号Token轮换（先建后断）的接收中断时长和重放消息数"""
+        totals = {'rotations': 0, 'fallbacks': 0, 'max_gap_ms': 0, 'total_gap_ms': 0, 'replayed_messages': 0}
+        for live in self._accounts.values():
+            stats = getattr(live, 'rotation_stats', None)
+            if not stats:
+                continue
+            for key in ('rotations', 'fallbacks', 'total_gap_ms', 'replayed_messages'):
+                totals[key] += stats[key]
+            totals['max_gap_ms'] = max(totals['max_gap_ms'], stats['max_gap_ms'])
+        switches = totals['rotations'] + totals['fallbacks']
+        totals['avg_gap_ms'] = round(totals['total_gap_ms'] / switches, 1) if switches else None
+        totals['avg_replayed_per_rotation'] = round(totals['replayed_messages'] / totals['rotations'], 2) \
+            if totals['rotations'] else None
+        return totals
+
+    def get_status(self) -> Dict[str, Any]:
+        """调度器状态"""
+        now = time.time()
+        upcoming = sorted(self._due.items(), key=lambda x: x[1])[:10]
+        return {
+            'accounts': len(self._accounts),
+            'max_token_concurrent': self.max_token_concurrent,
+            'max_browser_concurrent': self.max_browser_concurrent,
+            'running': [{'cookie_id': cid, 'kind': kind} for cid, kind in self._active.items()],
+            'waiting': len(self._running) - len(self._active),
+            'stats': self.stats,
+            'rotation': self.get_rotation_stats(),
+            'next_due': [{'cookie_id': cid, 'kind': kind, 'in_seconds': round(due - now, 1)}
+                         for (cid, kind), due in upcoming]
+        }
@@ -7,7 +7,7 @@ import hashlib
 import base64
 import struct
 import math
-from typing import Any, Dict, List
+from typing import Any, List
 import requests
 from loguru import logger
 import asyncio
@@ -17,6 +17,8 @@ import random
 from loguru import logger
 from DrissionPage import Chromium, ChromiumOptions
 
+from utils.cookie_jar import AccountCookieJar, parse_cookies
+
 def log_captcha_event(cookie_id: str, event_type: str, success: bool = None, details: str = ""):
     """简单记录滑块验证事件到txt文件"""
     try:
@@ -251,11 +253,7 @@ class DrissionHandler:
                 return
 
             # 解析cookies字符串
-            cookies_dict = {}
-            for cookie_pair in cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies_dict[name.strip()] = value.strip()
+            cookies_dict = {name.strip(): value.strip() for name, value in parse_cookies(cookies_str).items()}
 
             # 设置cookies到浏览器
             for name, value in cookies_dict.items():
@@ -1886,7 +1884,7 @@ class XianyuApis:
                         )
                         cookies = drission.get_cookies(url)
                         if cookies:
-                            new_x5sec = trans_cookies(cookies)
+                            new_x5sec = parse_cookies(cookies)
                             self.session.cookies.set("x5sec",new_x5sec["x5sec"])
                     if 'Set-Cookie' in response.headers:
                         # logger.debug("检测到Set-Cookie，更新cookie")  # 降级为DEBUG并简化
@@ -1973,8 +1971,8 @@ class XianyuLive:
      def __init__(self, cookies_str):
         self.xianyu = XianyuApis()
         self.base_url = 'wss://wss-goofish.dingtalk.com/'
-        self.cookies_str = cookies_str
-        self.cookies = trans_cookies(cookies_str)
+        self.cookies = AccountCookieJar(cookies_str)
+        self.cookies_str = self.cookies.value
         self.xianyu.session.cookies.update(self.cookies)  # 直接使用 session.cookies.update
         self.myid = self.cookies['unb']
         self.device_id = generate_device_id(self.myid)
@@ -2001,19 +1999,6 @@ class XianyuLive:
              return None
      
 
-def trans_cookies(cookies_str: str) -> Dict[str, str]:
-    """解析cookie字符串为字典"""
-    cookies = {}
-    for cookie in cookies_str.split("; "):
-        try:
-            parts = cookie.split('=', 1)
-            if len(parts) == 2:
-                cookies[parts[0]] = parts[1]
-        except:
-            continue
-    return cookies
-
-
 def generate_mid() -> str:
     """生成mid"""
     import random
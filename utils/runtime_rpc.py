@@ -0,0 +1,309 @@
+"""
+账号运行时 RPC
+让 FastAPI 管理服务可以运行在独立进程（或多个 uvicorn worker）中，与运行 XianyuLive 的账号运行时分离：
+- 账号运行时进程（Start.py）启动 RuntimeRPCServer，把 CookieManager 的控制命令暴露出来
+- API 进程中 cookie_manager.manager 是 RemoteCookieManager：读操作直接查数据库，
+  新增/删除/更新账号、启用禁用、发送消息等命令通过 RPC 交给账号运行时执行
+- 两个进程之间只通过数据库共享状态
+
+API 进程通过环境变量 XIANYU_RUNTIME_RPC（HOST:PORT）和 XIANYU_RUNTIME_AUTHKEY（十六进制密钥）连接账号运行时。
+"""
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+RPC_ADDRESS_ENV = 'XIANYU_RUNTIME_RPC'
+RPC_AUTHKEY_ENV = 'XIANYU_RUNTIME_AUTHKEY'
+
+# 允许通过 RPC 调用的 CookieManager 方法（均为线程安全接口）
+_MANAGER_METHODS = {
+    'add_cookie',
+    'remove_cookie',
+    'update_cookie',
+    'update_keywords',
+    'update_cookie_status',
+    'update_auto_confirm_setting',
+    'notify_item_sync_settings_changed',
+    'reload_from_db',
+    'send_message',
+    'get_startup_status',
+    'get_refresh_status',
+    'get_http_stats',
+    'get_heartbeat_status',
+}
+
+
+class RuntimeRPCServer:
+    """运行在账号运行时进程中的 RPC 服务，每个连接一个线程，按顺序处理请求"""
+
+    def __init__(self, manager, host: str = '127.0.0.1', port: int = 0, authkey: Optional[bytes] = None):
+        """
+        Args:
+            manager: 本进程的 CookieManager
+            host: 监听地址，默认只监听本机
+            port: 监听端口，0 表示随机端口
+            authkey: 认证密钥，为空时随机生成
+        """
+        self.manager = manager
+        self.authkey = authkey or os.urandom(16)
+        self._listener = Listener((host, port), authkey=self.authkey)
+        self._closing = False
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._listener.address
+
+    def env(self) -> Dict[str, str]:
+        """API 进程连接本服务所需的环境变量"""
+        host, port = self.address
+        return {RPC_ADDRESS_ENV: f"{host}:{port}", RPC_AUTHKEY_ENV: self.authkey.hex()}
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True, name='runtime-rpc').start()
+        logger.info(f"账号运行时RPC已启动: {self.address}")
+
+    def close(self):
+        self._closing = True
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+
+    def _accept_loop(self):
+        while not self._closing:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._closing:
+                    return
+                logger.warning(f"接受RPC连接失败: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                response = {'id': request.get('id'), 'ok': True, 'result': None}
+                try:
+                    response['result'] = self._dispatch(request.get('method'), request.get('params') or {})
+                except Exception as e:
+                    response.update(ok=False, error=str(e), error_type=type(e).__name__)
+                    logger.error(f"RPC调用 {request.get('method')} 失败: {e}")
+                try:
+                    conn.send(response)
+                except (OSError, ValueError):
+                    return
+
+    def _dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        manager = self.manager
+        supervisor = getattr(manager, 'shard_supervisor', None)
+
+        if method == 'status':
+            return {
+                'pid': os.getpid(),
+                'running_accounts': len([t for t in manager.tasks.values() if not t.done()]),
+                'sharding': supervisor is not None
+            }
+        if method in _MANAGER_METHODS:
+            return getattr(manager, method)(**params)
+        if method.startswith('shard_'):
+            if supervisor is None:
+                raise ValueError('未启用账号分片')
+            if method == 'shard_stats':
+                return supervisor.get_stats()
+            if method == 'shard_add_worker':
+                return supervisor.add_worker()
+            if method == 'shard_remove_worker':
+                return supervisor.remove_worker(**params)
+        raise ValueError(f"未知的RPC方法: {method}")
+
+
+class RuntimeRPCClient:
+    """线程安全的 RPC 客户端，空闲连接放回连接池复用"""
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes, timeout: float = 60):
+        """
+        Args:
+            address: 账号运行时RPC地址
+            authkey: 认证密钥
+            timeout: 等待单次调用结果的超时（秒），需大于运行时侧新增/更新账号的等待时间
+        """
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._idle: List[Any] = []
+        self._lock = threading.Lock()
+        self._ids = 0
+
+    def _acquire(self):
+        with self._lock:
+            self._ids += 1
+            request_id = self._ids
+            conn = self._idle.pop() if self._idle else None
+        return request_id, conn or Client(self.address, authkey=self.authkey)
+
+    def call(self, method: str, **params) -> Any:
+        """
+        调用账号运行时的方法
+
+        Raises:
+            ValueError: 运行时返回参数错误
+            RuntimeError: 运行时执行失败、无法连接或超时未返回
+        """
+        for attempt in range(2):
+            try:
+                request_id, conn = self._acquire()
+            except Exception as e:
+                raise RuntimeError(f"无法连接账号运行时: {e}")
+            try:
+                conn.send({'id': request_id, 'method': method, 'params': params})
+                if not conn.poll(self.timeout):
+                    # 迟到的响应会错位到下一次调用，连接不能再放回连接池
+                    conn.close()
+                    raise RuntimeError(f"账号运行时 {self.timeout} 秒内未返回 {method} 的结果")
+                response = conn.recv()
+            except (OSError, EOFError) as e:
+                # 连接已失效（运行时重启等），丢弃后重试一次
+                conn.close()
+                if attempt:
+                    raise RuntimeError(f"账号运行时连接中断: {e}")
+                continue
+
+            with self._lock:
+                self._idle.append(conn)
+            if not response.get('ok'):
+                if response.get('error_type') == 'ValueError':
+                    raise ValueError(response.get('error'))
+                raise RuntimeError(response.get('error'))
+            return response.get('result')
+
+
+class _RemoteShardSupervisor:
+    """API 进程中的分片管理器替身"""
+
+    def __init__(self, client: RuntimeRPCClient):
+        self.client = client
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.client.call('shard_stats')
+
+    def add_worker(self) -> Tuple[int, int]:
+        return tuple(self.client.call('shard_add_worker'))
+
+    def remove_worker(self, worker_id: int) -> int:
+        return self.client.call('shard_remove_worker', worker_id=worker_id)
+
+
+class RemoteCookieManager:
+    """API 进程中的 CookieManager 替身：读操作直接查数据库，控制命令通过 RPC 交给账号运行时"""
+
+    loop = None
+
+    def __init__(self, client: RuntimeRPCClient):
+        self.client = client
+
+    # ------------------------ 读操作（数据库） ------------------------
+    @property
+    def cookies(self) -> Dict[str, str]:
+        from db_manager import db_manager
+        return db_manager.get_all_cookies()
+
+    @property
+    def keywords(self) -> Dict[str, List[Tuple[str, str]]]:
+        from db_manager import db_manager
+        return db_manager.get_all_keywords()
+
+    @property
+    def cookie_status(self) -> Dict[str, bool]:
+        from db_manager import db_manager
+        return db_manager.get_all_cookie_status()
+
+    def list_cookies(self) -> List[str]:
+        return list(self.cookies.keys())
+
+    def get_keywords(self, cookie_id: str) -> List[Tuple[str, str]]:
+        from db_manager import db_manager
+        return db_manager.get_keywords(cookie_id)
+
+    def get_cookie_status(self, cookie_id: str) -> bool:
+        from db_manager import db_manager
+        return db_manager.get_cookie_status(cookie_id)
+
+    def get_enabled_cookies(self) -> Dict[str, str]:
+        status = self.cookie_status
+        return {cid: value for cid, value in self.cookies.items() if status.get(cid, True)}
+
+    def get_auto_confirm_setting(self, cookie_id: str) -> bool:
+        from db_manager import db_manager
+        return db_manager.get_auto_confirm(cookie_id)
+
+    def get_startup_status(self) -> Dict[str, Any]:
+        return self.client.call('get_startup_status')
+
+    def get_refresh_status(self) -> Dict[str, Any]:
+        return self.client.call('get_refresh_status')
+
+    def get_http_stats(self) -> Dict[str, Any]:
+        return self.client.call('get_http_stats')
+
+    def get_heartbeat_status(self) -> Dict[str, Any]:
+        return self.client.call('get_heartbeat_status')
+
+    @property
+    def shard_supervisor(self) -> Optional[_RemoteShardSupervisor]:
+        if self.client.call('status').get('sharding'):
+            return _RemoteShardSupervisor(self.client)
+        return None
+
+    # ------------------------ 控制命令（RPC） ------------------------
+    def add_cookie(self, cookie_id: str, cookie_value: str, kw_list: Optional[List[Tuple[str, str]]] = None,
+                   user_id: int = None, save_to_db: bool = True):
+        return self.client.call('add_cookie', cookie_id=cookie_id, cookie_value=cookie_value,
+                                kw_list=kw_list, user_id=user_id, save_to_db=save_to_db)
+
+    def remove_cookie(self, cookie_id: str):
+        return self.client.call('remove_cookie', cookie_id=cookie_id)
+
+    def update_cookie(self, cookie_id: str, new_value: str, save_to_db: bool = True):
+        return self.client.call('update_cookie', cookie_id=cookie_id, new_value=new_value, save_to_db=save_to_db)
+
+    def update_keywords(self, cookie_id: str, kw_list: List[Tuple[str, str]]):
+        return self.client.call('update_keywords', cookie_id=cookie_id, kw_list=kw_list)
+
+    def update_cookie_status(self, cookie_id: str, enabled: bool):
+        return self.client.call('update_cookie_status', cookie_id=cookie_id, enabled=enabled)
+
+    def update_auto_confirm_setting(self, cookie_id: str, auto_confirm: bool):
+        return self.client.call('update_auto_confirm_setting', cookie_id=cookie_id, auto_confirm=auto_confirm)
+
+    def notify_item_sync_settings_changed(self):
+        return self.client.call('notify_item_sync_settings_changed')
+
+    def reload_from_db(self):
+        return self.client.call('reload_from_db')
+
+    def send_message(self, cookie_id: str, chat_id: str, to_user_id: str, message: str) -> Dict[str, Any]:
+        return self.client.call('send_message', cookie_id=cookie_id, chat_id=chat_id,
+                                to_user_id=to_user_id, message=message)
+
+
+def connect_runtime(address: Optional[str] = None, authkey: Optional[bytes] = None) -> RemoteCookieManager:
+    """
+    创建连接账号运行时的 RemoteCookieManager（首次调用时才建立连接）
+
+    Args:
+        address: 运行时RPC地址 HOST:PORT，默认读取环境变量 XIANYU_RUNTIME_RPC
+        authkey: 认证密钥，默认读取环境变量 XIANYU_RUNTIME_AUTHKEY
+    """
+    address = address or os.environ[RPC_ADDRESS_ENV]
+    authkey = authkey or bytes.fromhex(os.environ[RPC_AUTHKEY_ENV])
+    host, port = address.rsplit(':', 1)
+    logger.info(f"API进程将通过RPC连接账号运行时: {address}")
+    return RemoteCookieManager(RuntimeRPCClient((host, int(port)), authkey))
@@ -0,0 +1,130 @@
+"""
+启动耗时基准
+- 导入耗时：在独立进程中用 python -X importtime 导入主要模块，统计累计耗时并与 STARTUP.import_budget_ms 预算比较，
+  同时列出自身耗时最多的模块，便于找出需要延迟导入的依赖
+- 启动耗时（--boot）：启动 Start.py，统计从进程启动到 /health 返回成功的时间（会按配置启动所有账号，请在测试环境运行）
+
+用法：
+    python -m utils.startup_benchmark               # 导入耗时，超出预算时返回码为1
+    python -m utils.startup_benchmark --runs 5      # 每个模块导入5次取中位数
+    python -m utils.startup_benchmark --boot        # 同时测量完整启动耗时
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = {
+    'XianyuAutoAsync': 1500,
+    'reply_server': 2500,
+}
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """解析 -X importtime 输出，返回 [(模块名, 自身耗时us, 累计耗时us)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            entries.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return entries
+
+
+def measure_import(module: str, runs: int = 3) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """
+    在独立进程中导入模块
+
+    Returns:
+        (累计耗时中位数ms, 最后一次导入中自身耗时最多的模块)
+    """
+    totals = []
+    entries = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=str(ROOT_DIR), capture_output=True, text=True, encoding='utf-8', errors='replace'
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+        entries = _parse_importtime(result.stderr)
+        top = [e for e in entries if e[0] == module]
+        totals.append(top[-1][2] / 1000 if top else 0)
+    slowest = sorted(entries, key=lambda e: e[1], reverse=True)[:10]
+    return statistics.median(totals), slowest
+
+
+def measure_boot(health_url: str, timeout: float = 120) -> float:
+    """启动 Start.py，返回 /health 首次返回成功的耗时（秒）"""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'Start.py'], cwd=str(ROOT_DIR),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Start.py 提前退出，返回码 {process.returncode}")
+            try:
+                with urllib.request.urlopen(health_url, timeout=2) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except Exception:
+                pass
+            time.sleep(0.2)
+        raise TimeoutError(f"{timeout} 秒内 {health_url} 未就绪")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _default_health_url() -> str:
+    sys.path.insert(0, str(ROOT_DIR))
+    from config import AUTO_REPLY
+    port = AUTO_REPLY.get('api', {}).get('port') or os.getenv('API_PORT', '8080')
+    return f"http://127.0.0.1:{port}/health"
+
+
+def _load_budget() -> Dict[str, float]:
+    sys.path.insert(0, str(ROOT_DIR))
+    from config import STARTUP_CONFIG
+    return STARTUP_CONFIG.get('import_budget_ms') or DEFAULT_BUDGET_MS
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='启动耗时基准')
+    parser.add_argument('--runs', type=int, default=3, help='每个模块导入次数（取中位数）')
+    parser.add_argument('--boot', action='store_true', help='同时测量 Start.py 到 /health 就绪的耗时')
+    parser.add_argument('--health-url', default=None, help='健康检查地址，默认按配置的端口')
+    args = parser.parse_args()
+
+    budget = _load_budget()
+    over_budget = False
+    for module, budget_ms in budget.items():
+        elapsed_ms, slowest = measure_import(module, args.runs)
+        ok = elapsed_ms <= budget_ms
+        over_budget |= not ok
+        print(f"{'[OK]' if ok else '[超出预算]'} import {module}: {elapsed_ms:.0f} ms（预算 {budget_ms} ms）")
+        for name, self_us, cumulative_us in slowest:
+            print(f"    {self_us / 1000:8.1f} ms 自身  {cumulative_us / 1000:8.1f} ms 累计  {name}")
+
+    if args.boot:
+        boot_seconds = measure_boot(args.health_url or _default_health_url())
+        print(f"Start.py 启动到 /health 就绪: {boot_seconds:.2f} 秒")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
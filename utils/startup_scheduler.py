@@ -0,0 +1,143 @@
+"""
+账号启动调度器
+启动时不再为所有账号同时创建任务（每个账号立即连接、刷新token并启动后台循环，账号多时会在启动瞬间
+集中产生大量token请求、浏览器启动和数据库写入），而是：
+- 按最近活跃时间排序，最近有消息/订单的账号优先启动
+- 按令牌桶限速放行（rate 个/秒，允许 burst 个突发）
+- 同时处于"启动中、尚未连接成功"的账号数不超过 max_connecting
+- 统计从开始启动到所有账号连接成功的耗时
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class StartupScheduler:
+    """按速率放行账号启动（运行在 CookieManager 的事件循环中）"""
+
+    def __init__(self, manager, rate: float = 2.0, burst: int = 5, max_connecting: int = 10,
+                 connect_timeout: float = 120):
+        """
+        Args:
+            manager: CookieManager
+            rate: 每秒放行的账号数
+            burst: 允许连续放行的账号数
+            max_connecting: 同时处于启动中（尚未连接成功）的账号数上限
+            connect_timeout: 启动后超过该时间（秒）仍未连接成功的账号不再占用启动名额
+        """
+        self.manager = manager
+        self.rate = max(0.01, rate)
+        self.burst = max(1, burst)
+        self.max_connecting = max(1, max_connecting)
+        self.connect_timeout = connect_timeout
+
+        self._queue: List[Tuple[str, str, Optional[int]]] = []
+        self._connecting: Dict[str, float] = {}  # {cookie_id: 放行时间}
+        self._task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+
+        self.total = 0
+        self.admitted = 0
+        self.connected: Dict[str, float] = {}  # {cookie_id: 从开始启动到连接成功的秒数}
+        self.started_at: Optional[float] = None
+        self.all_connected_after: Optional[float] = None
+
+    def schedule(self, accounts: List[Tuple[str, str, Optional[int]]]):
+        """
+        安排一批账号启动，最近活跃的账号优先
+
+        Args:
+            accounts: [(cookie_id, cookie_value, user_id)]
+        """
+        from db_manager import db_manager
+
+        activity = db_manager.get_account_activity()
+        accounts = sorted(accounts, key=lambda a: activity.get(a[0], 0), reverse=True)
+        self._queue.extend(accounts)
+        self.total += len(accounts)
+        if self.started_at is None:
+            self.started_at = time.time()
+        self.all_connected_after = None
+
+        logger.info(f"账号启动调度: {len(accounts)} 个账号排队，速率 {self.rate}/秒，同时启动上限 {self.max_connecting}")
+        if self._task is None or self._task.done():
+            self._changed = asyncio.Event()
+            self._task = self.manager.loop.create_task(self._run())
+
+    def mark_connected(self, cookie_id: str):
+        """账号首次连接成功（由 XianyuLive 调用）"""
+        self._connecting.pop(cookie_id, None)
+        if self.started_at is None or cookie_id in self.connected:
+            return
+        self.connected[cookie_id] = round(time.time() - self.started_at, 2)
+        if self._changed:
+            self._changed.set()
+        if self.total and len(self.connected) >= self.total and self.all_connected_after is None:
+            self.all_connected_after = round(time.time() - self.started_at, 2)
+            logger.info(f"✅ 所有 {self.total} 个账号已连接，耗时 {self.all_connected_after} 秒")
+
+    async def _run(self):
+        tokens = float(self.burst)
+        last = time.monotonic()
+        while self._queue:
+            # 补充令牌
+            now = time.monotonic()
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            last = now
+
+            # 清理超时未连接的账号，避免卡住的账号一直占用启动名额
+            deadline = time.time() - self.connect_timeout
+            for cookie_id, admitted_at in list(self._connecting.items()):
+                if admitted_at < deadline:
+                    logger.warning(f"【{cookie_id}】启动 {self.connect_timeout:.0f} 秒后仍未连接成功，不再占用启动名额")
+                    del self._connecting[cookie_id]
+
+            if tokens < 1 or len(self._connecting) >= self.max_connecting:
+                self._changed.clear()
+                wait = (1 - tokens) / self.rate if tokens < 1 else 1.0
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=max(0.05, wait))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            tokens -= 1
+            cookie_id, cookie_value, user_id = self._queue.pop(0)
+            if not self.manager.get_cookie_status(cookie_id) or cookie_id in self.manager.tasks:
+                # 排队期间账号被禁用或已由其他途径启动
+                self.total -= 1
+                continue
+
+            if not self.manager.shard_supervisor:
+                # 分片模式下账号在工作进程中连接，本进程只按速率转发
+                self._connecting[cookie_id] = time.time()
+            self.admitted += 1
+            self.manager.tasks[cookie_id] = self.manager.loop.create_task(
+                self.manager._run_xianyu(cookie_id, cookie_value, user_id)
+            )
+            logger.info(f"【{cookie_id}】启动账号任务 ({self.admitted}/{self.total})")
+
+        logger.info(f"账号启动调度完成: 已放行 {self.admitted} 个账号")
+
+    def get_status(self) -> Dict[str, Any]:
+        """启动进度（在事件循环中调用）
+
+        分片模式下账号在工作进程中连接，本进程不知道连接结果，连接相关的字段为 None
+        """
+        sharding = bool(self.manager.shard_supervisor)
+        connect_times = sorted(self.connected.values())
+        return {
+            'total': self.total,
+            'admitted': self.admitted,
+            'queued': len(self._queue),
+            'sharding': sharding,
+            'connecting': None if sharding else len(self._connecting),
+            'connected': None if sharding else len(self.connected),
+            'elapsed': round(time.time() - self.started_at, 2) if self.started_at else None,
+            'time_to_all_connected': None if sharding else self.all_connected_after,
+            'median_connect_time': connect_times[len(connect_times) // 2] if connect_times and not sharding else None,
+            'rate': self.rate,
+            'max_connecting': self.max_connecting
+        }
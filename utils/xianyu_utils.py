@@ -2,17 +2,19 @@ import base64
 import json
 import subprocess
 from functools import partial
+import threading
 import time
 import hashlib
 import struct
 import os
+import shutil
 from typing import Any, Dict, List
 
-import blackboxprotobuf
 from loguru import logger
 
+from utils.cookie_jar import parse_cookies
+
 subprocess.Popen = partial(subprocess.Popen, encoding="utf-8")
-import execjs
 
 def get_js_path():
     """获取JavaScript文件的路径"""
@@ -21,51 +23,80 @@ def get_js_path():
     js_path = os.path.join(root_dir, 'static', 'xianyu_js_version_2.js')
     return js_path
 
-try:
-    # 检查JavaScript运行时是否可用
-    available_runtimes = execjs.runtime_names
-    logger.info(f"可用的JavaScript运行时: {available_runtimes}")
-
-    # 尝试获取默认运行时
-    current_runtime = execjs.get()
-    logger.info(f"当前JavaScript运行时: {current_runtime.name}")
-
-    xianyu_js = execjs.compile(open(get_js_path(), 'r', encoding='utf-8').read())
-    logger.info("JavaScript文件加载成功")
-except Exception as e:
-    error_msg = str(e)
-    logger.error(f"JavaScript运行时错误: {error_msg}")
-
-    if "Could not find an available JavaScript runtime" in error_msg:
-        logger.error("解决方案:")
-        logger.error("1. 确保已安装Node.js: apt-get install nodejs")
-        logger.error("2. 或安装其他JS运行时: apt-get install nodejs npm")
-        logger.error("3. 检查PATH环境变量是否包含Node.js路径")
-
-        # 尝试检测系统中的JavaScript运行时
-        import subprocess
+
+# JavaScript运行时在首次使用时才加载（会启动Node进程），避免导入本模块就拖慢启动
+_xianyu_js = None
+_xianyu_js_lock = threading.Lock()
+
+
+def get_xianyu_js():
+    """获取加载好的 xianyu_js_version_2.js（首次调用时加载），通过 call('函数名', *参数) 调用
+
+    有 Node.js 时使用常驻的 JS 工作进程池（脚本只加载一次），否则回退到 execjs
+    """
+    global _xianyu_js
+    if _xianyu_js is not None:
+        return _xianyu_js
+
+    with _xianyu_js_lock:
+        if _xianyu_js is not None:
+            return _xianyu_js
+
+        from config import JS_WORKER_CONFIG
+        if JS_WORKER_CONFIG.get('enabled', True) and shutil.which('node'):
+            from utils.js_worker import JSWorkerPool
+            try:
+                _xianyu_js = JSWorkerPool(
+                    get_js_path(),
+                    workers=JS_WORKER_CONFIG.get('workers', 2),
+                    call_timeout=JS_WORKER_CONFIG.get('call_timeout', 10)
+                ).start()
+                return _xianyu_js
+            except Exception as e:
+                logger.error(f"JS工作进程池启动失败，回退到execjs: {e}")
+
+        import execjs
         try:
-            result = subprocess.run(['node', '--version'], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info(f"检测到Node.js版本: {result.stdout.strip()}")
-            else:
-                logger.error("Node.js未正确安装或不在PATH中")
-        except FileNotFoundError:
-            logger.error("未找到Node.js可执行文件")
+            # 检查JavaScript运行时是否可用
+            available_runtimes = execjs.runtime_names
+            logger.info(f"可用的JavaScript运行时: {available_runtimes}")
+
+            # 尝试获取默认运行时
+            current_runtime = execjs.get()
+            logger.info(f"当前JavaScript运行时: {current_runtime.name}")
+
+            with open(get_js_path(), 'r', encoding='utf-8') as f:
+                _xianyu_js = execjs.compile(f.read())
+            logger.info("JavaScript文件加载成功")
+            return _xianyu_js
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"JavaScript运行时错误: {error_msg}")
+
+            if "Could not find an available JavaScript runtime" in error_msg:
+                logger.error("解决方案:")
+                logger.error("1. 确保已安装Node.js: apt-get install nodejs")
+                logger.error("2. 或安装其他JS运行时: apt-get install nodejs npm")
+                logger.error("3. 检查PATH环境变量是否包含Node.js路径")
+
+                # 尝试检测系统中的JavaScript运行时
+                try:
+                    result = subprocess.run(['node', '--version'], capture_output=True, text=True)
+                    if result.returncode == 0:
+                        logger.info(f"检测到Node.js版本: {result.stdout.strip()}")
+                    else:
+                        logger.error("Node.js未正确安装或不在PATH中")
+                except FileNotFoundError:
+                    logger.error("未找到Node.js可执行文件")
+
+            raise RuntimeError(f"无法加载JavaScript文件: {error_msg}")
 
-    raise RuntimeError(f"无法加载JavaScript文件: {error_msg}")
 
 def trans_cookies(cookies_str: str) -> dict:
     """将cookies字符串转换为字典"""
     if not cookies_str:
         raise ValueError("cookies不能为空")
-        
-    cookies = {}
-    for cookie in cookies_str.split("; "):
-        if "=" in cookie:
-            key, value = cookie.split("=", 1)
-            cookies[key] = value
-    return cookies
+    return parse_cookies(cookies_str)
 
 
 def generate_mid() -> str: